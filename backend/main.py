@@ -4,6 +4,7 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
 import os
@@ -14,7 +15,7 @@ from fastapi import status
 
 # БЕЗОПАСНЫЕ ИМПОРТЫ МОДЕЛЕЙ
 try:
-    from models.database import engine, SessionLocal
+    from models.database import engine, SessionLocal, async_engine
     from models.models import Base  # Базовые модели
     print("✅ Base models imported successfully")
 except Exception as e:
@@ -40,7 +41,8 @@ except Exception as e:
 try:
     from routers import (
         auth, admin, properties, rentals, clients, 
-        orders, reports, documents, tasks, payroll, inventory, organization, payments,order_payments,export_reports,acquiring,comprehensive_reports
+        orders, reports, documents, tasks, payroll, inventory, organization, payments,order_payments,export_reports,acquiring,comprehensive_reports,
+        changes
     )
     print("✅ Core routers imported successfully")
 except Exception as e:
@@ -58,21 +60,20 @@ except Exception as e:
 
 # Остальные импорты
 from services.init_service import DatabaseInitService
-from utils.logging_config import setup_logging
+from utils.logging_config import setup_logging, AccessLogSampler
+from utils.metrics import METRICS_ENABLED, MetricsMiddleware, gauge_lines, register_collector, render_metrics
 from utils.exceptions import (
     http_exception_handler,
     validation_exception_handler, 
     general_exception_handler
 )
-from utils.rate_limiter import RateLimiter
+from utils.rate_limit_middleware import RateLimitMiddleware
+from utils.executor import shutdown_blocking_executor
 
 # Настройка логирования
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# Глобальный rate limiter
-rate_limiter = RateLimiter()
-
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -110,6 +111,18 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"⚠️  Could not check initialization status: {e}")
         
+        # Фоновая пакетная запись аудита
+        from services.audit_log_service import AuditLogService
+        AuditLogService.start()
+        
+        # Задания массовой генерации документов, оставшиеся от прежнего процесса
+        try:
+            from services.document_job_service import DocumentJobService
+            with SessionLocal() as db:
+                DocumentJobService.recover_jobs(db)
+        except Exception as e:
+            logger.warning(f"⚠️  Document jobs not recovered: {e}")
+        
         # Запускаем фоновые задачи
         try:
             from services.background_service import BackgroundService
@@ -127,6 +140,15 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("🛑 Shutting down Enhanced Rental System API...")
     
+    shutdown_blocking_executor()
+    
+    from services.change_feed_service import ChangeFeedService
+    ChangeFeedService.stop()
+    
+    # Дописываем накопленные события аудита
+    from services.audit_log_service import AuditLogService
+    AuditLogService.stop()
+    
     # Очистка старых данных
     try:
         with SessionLocal() as db:
@@ -135,6 +157,8 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Cleanup failed: {e}")
 
+    await async_engine.dispose()
+
 
 # Создание приложения FastAPI
 app = FastAPI(
@@ -157,6 +181,10 @@ app.add_middleware(
     allowed_hosts=os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1,0.0.0.0").split(",")
 )
 
+# Лимиты запросов по маршрутам, пользователям и IP. Добавляется раньше CORS,
+# поэтому выполняется внутри него и ответы 429 тоже получают CORS-заголовки
+app.add_middleware(RateLimitMiddleware)
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -167,26 +195,54 @@ app.add_middleware(
 )
 
 # Middleware для логирования запросов
+access_logger = logging.getLogger("app.access")
+access_log_sampler = AccessLogSampler()
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Логирование HTTP запросов"""
-    start_time = time.time()
-    
-    # Логируем входящий запрос
-    logger.info(f"📥 {request.method} {request.url.path} from {request.client.host}")
+    """Логирование HTTP запросов (одна запись на запрос, с выборкой)"""
+    start_time = time.perf_counter()
     
     # Выполняем запрос
     response = await call_next(request)
     
-    # Логируем время выполнения
-    process_time = time.time() - start_time
-    logger.info(f"📤 {request.method} {request.url.path} completed in {process_time:.3f}s with status {response.status_code}")
+    process_time = time.perf_counter() - start_time
+    duration_ms = process_time * 1000
+    
+    if access_logger.isEnabledFor(logging.INFO) and access_log_sampler.should_log(response.status_code, duration_ms):
+        access_logger.info(
+            "%s %s %s %.1fms",
+            request.method, request.url.path, response.status_code, duration_ms,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "duration_ms": round(duration_ms, 1),
+                "client": request.client.host if request.client else None
+            }
+        )
     
     # Добавляем заголовок с временем выполнения
     response.headers["X-Process-Time"] = str(process_time)
     
     return response
 
+# Метрики запросов: внешний слой, чтобы учитывать все middleware
+app.add_middleware(MetricsMiddleware)
+
+
+def _audit_metrics_collector():
+    from services.audit_log_service import AuditLogService
+    audit = AuditLogService.get_metrics()
+    return (
+        gauge_lines("audit_queue_depth", "Audit events waiting to be written", {"": audit["queue_depth"] + audit["pending"]})
+        + gauge_lines("audit_events_dropped", "Audit events dropped on a full queue", {"": audit["dropped"]})
+    )
+
+
+register_collector(_audit_metrics_collector)
+
 # Обработчики исключений
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
@@ -213,6 +269,7 @@ app.include_router(order_payments.router)
 app.include_router(export_reports.router)
 app.include_router(acquiring.router)
 app.include_router(comprehensive_reports.router)
+app.include_router(changes.router)
 
 
 # Расширенные роутеры зарплат (если доступны)
@@ -285,6 +342,19 @@ async def health_check():
             "error": str(e)
         }
 
+# Метрики в формате Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Метрики производительности для Prometheus"""
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics are disabled\n", status_code=status.HTTP_404_NOT_FOUND)
+    
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        return PlainTextResponse("unauthorized\n", status_code=status.HTTP_401_UNAUTHORIZED)
+    
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Остальные endpoints остаются без изменений...
 
 
@@ -1,9 +1,9 @@
 # backend/models/extended_models.py
 from sqlalchemy import (
-    Column, String, Text, Boolean, DateTime, Integer, Float, 
-    ForeignKey, Enum, TIMESTAMP, JSON, CheckConstraint, Index
+    Column, String, Text, Boolean, Date, DateTime, Integer, BigInteger, Float, 
+    ForeignKey, Enum, TIMESTAMP, JSON, CheckConstraint, Index, Computed, text
 )
-from sqlalchemy.dialects.postgresql import UUID, INET, JSONB
+from sqlalchemy.dialects.postgresql import UUID, INET, JSONB, TSTZRANGE
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, timezone
@@ -153,6 +153,7 @@ class Property(Base):
         CheckConstraint("max_occupancy > 0", name="check_positive_occupancy"),
         Index("idx_property_org_number", "organization_id", "number", unique=True),
         Index("idx_property_status", "status"),
+        Index("idx_property_org_status", "organization_id", "status"),
     )
 
 
@@ -210,6 +211,7 @@ class Client(Base):
         Index("idx_client_org_phone", "organization_id", "phone"),
         Index("idx_client_org_email", "organization_id", "email"),
         Index("idx_client_document", "document_type", "document_number"),
+        Index("idx_client_org_created", "organization_id", "created_at"),
     )
 
 
@@ -226,6 +228,8 @@ class Rental(Base):
     rental_type = Column(Enum(RentalType), nullable=False)
     start_date = Column(TIMESTAMP(timezone=True), nullable=False)
     end_date = Column(TIMESTAMP(timezone=True), nullable=False)
+    # Период [start_date, end_date) для поиска пересечений по GiST-индексу
+    period = Column(TSTZRANGE, Computed("tstzrange(start_date, end_date, '[)')", persisted=True))
     
     # Финансы
     rate = Column(Float, nullable=False)  # тариф
@@ -266,6 +270,10 @@ class Rental(Base):
         CheckConstraint("guest_count > 0", name="check_positive_guests"),
         Index("idx_rental_dates", "start_date", "end_date"),
         Index("idx_rental_property", "property_id"),
+        Index("idx_rental_active_period", "period", postgresql_using="gist", postgresql_where=text("is_active")),
+        Index("idx_rental_org_dates", "organization_id", "start_date", "end_date"),
+        Index("idx_rental_org_created", "organization_id", "created_at"),
+        Index("idx_rental_org_active_end", "organization_id", "end_date", postgresql_where=text("is_active")),
     )
 
 
@@ -323,6 +331,13 @@ class Task(Base):
         Index("idx_task_status", "status"),
         Index("idx_task_property", "property_id"),
         Index("idx_task_payroll", "payroll_id"),  # Индекс для нового поля
+        Index("idx_task_assignee_status_completed", "assigned_to", "status", "completed_at"),
+        Index("idx_task_org_status_created", "organization_id", "status", "created_at"),
+        # Открытые задачи (значения Enum хранятся по именам членов)
+        Index(
+            "idx_task_org_open_due", "organization_id", "due_date",
+            postgresql_where=text("status IN ('PENDING', 'ASSIGNED', 'IN_PROGRESS')")
+        ),
     )
 
 
@@ -383,6 +398,8 @@ class RoomOrder(Base):
     __table_args__ = (
         Index("idx_order_property", "property_id"),
         Index("idx_order_status", "status"),
+        Index("idx_order_assignee_status", "assigned_to", "status"),
+        Index("idx_order_org_status_created", "organization_id", "status", "created_at"),
         Index("idx_order_number", "order_number", unique=True),
     )
 
@@ -405,6 +422,46 @@ def setup_order_payment_relationships():
             print(f"⚠️  Failed to configure order payment relationships: {e}")
 
 
+# Лента изменений задач и заказов для push-обновлений дашбордов
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+
+    # Курсор ленты: внутри организации растет в порядке коммитов
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False)
+
+    entity_type = Column(String(20), nullable=False)  # task, order
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    action = Column(String(30), nullable=False)  # assigned, started, completed
+    # Сотрудники, которых касается изменение (текущий и прежний исполнитель)
+    user_ids = Column(JSONB, nullable=False, default=list)
+    payload = Column(JSONB)
+
+    created_at = Column(TIMESTAMP(timezone=True), default=func.now())
+
+    __table_args__ = (
+        Index("idx_change_event_org_id", "organization_id", "id"),
+    )
+
+
+# Счетчик изменений задач и заказов сотрудника (ETag списка "моя работа")
+class UserChangeCounter(Base):
+    __tablename__ = "user_change_counters"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), default=func.now())
+
+
+# Версия исходных данных отчетов организации (ключ кэша полного отчета)
+class ReportDataVersion(Base):
+    __tablename__ = "report_data_versions"
+
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), default=func.now())
+
+
 def setup_all_relationships():
     """Настройка всех отношений после определения всех моделей"""
     
@@ -570,6 +627,7 @@ class Payroll(Base):
         CheckConstraint("period_end > period_start", name="check_payroll_period"),
         CheckConstraint("gross_amount >= 0", name="check_positive_gross"),
         Index("idx_payroll_user_period", "user_id", "period_start", "period_end"),
+        Index("idx_payroll_org_period", "organization_id", "period_start"),
     )
 
 # Модель материалов/инвентаря
@@ -644,8 +702,8 @@ class InventoryMovement(Base):
     # Остаток после операции
     stock_after = Column(Float, nullable=False)
     
-    # Даты
-    created_at = Column(TIMESTAMP(timezone=True), default=func.now())
+    # Даты (ключ секционирования входит в первичный ключ)
+    created_at = Column(TIMESTAMP(timezone=True), primary_key=True, default=func.now())
     
     # Отношения
     organization = relationship("Organization")
@@ -656,8 +714,97 @@ class InventoryMovement(Base):
     __table_args__ = (
         Index("idx_movement_inventory", "inventory_id"),
         Index("idx_movement_date", "created_at"),
+        Index("idx_movement_org_type_date", "organization_id", "movement_type", "created_at"),
+        # Помесячные секции по created_at (см. PartitionService)
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
+
+# Материализованные дневные показатели для отчетов
+class DailyPropertyFact(Base):
+    __tablename__ = "daily_property_facts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False)
+    # NULL - показатели без привязки к помещению (например, списания материалов на заказы)
+    property_id = Column(UUID(as_uuid=True), ForeignKey("properties.id", ondelete="CASCADE"))
+    day = Column(Date, nullable=False)
+    
+    # Показатели дня
+    occupied = Column(Boolean, default=False)
+    rental_revenue = Column(Float, default=0)  # пропорциональная выручка от аренды
+    order_revenue = Column(Float, default=0)  # оплаченные заказы в номер
+    material_cost = Column(Float, default=0)  # списанные материалы
+    
+    updated_at = Column(TIMESTAMP(timezone=True), default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("idx_fact_org_day", "organization_id", "day"),
+        Index("idx_fact_org_property_day", "organization_id", "property_id", "day"),
+    )
+
+
+# Диапазон дат, за который дневные показатели организации актуальны
+class ReportFactCoverage(Base):
+    __tablename__ = "report_fact_coverage"
+
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    covered_from = Column(Date, nullable=False)
+    covered_to = Column(Date, nullable=False)
+    rebuilt_at = Column(TIMESTAMP(timezone=True), default=func.now())
+
+
+# Предрассчитанная сводка дашборда организации
+class DashboardSnapshot(Base):
+    __tablename__ = "dashboard_snapshots"
+
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)  # увеличивается при каждом пересчете
+    data = Column(JSONB, nullable=False)
+    computed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+
+# Последний выданный номер документа за день (резервирование блоками)
+class DocumentNumberCounter(Base):
+    __tablename__ = "document_number_counters"
+
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    document_type = Column(Enum(DocumentType), primary_key=True)
+    day = Column(Date, primary_key=True)
+    last_value = Column(Integer, nullable=False)
+
+
+# Фоновое задание массовой генерации документов
+class DocumentJob(Base):
+    __tablename__ = "document_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
+
+    document_type = Column(Enum(DocumentType), nullable=False)
+    rental_ids = Column(JSONB, nullable=False)
+    prerender = Column(Boolean, default=False)
+
+    # pending -> running -> completed | failed
+    status = Column(String(20), nullable=False, default="pending")
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    rendered = Column(Integer, nullable=False, default=0)
+    results = Column(JSONB, default=list)
+    error = Column(Text)
+
+    created_at = Column(TIMESTAMP(timezone=True), default=func.now())
+    started_at = Column(TIMESTAMP(timezone=True))
+    finished_at = Column(TIMESTAMP(timezone=True))
+
+    __table_args__ = (
+        Index("idx_document_job_org_created", "organization_id", "created_at"),
+    )
+
+
 def setup_all_relationships():
     """Настройка всех отношений после определения всех моделей"""
     
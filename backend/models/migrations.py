@@ -0,0 +1,98 @@
+# backend/models/migrations.py
+"""
+Версионированные миграции схемы для существующих баз
+
+create_all создает только отсутствующие таблицы, поэтому новые столбцы
+и индексы уже созданных таблиц добавляются здесь. Шаги применяются по
+порядку и один раз; примененные версии хранятся в schema_migrations.
+Индексы описываются только в моделях, миграция создает их по имени.
+"""
+from typing import Callable, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from models.database import Base
+from models import models, extended_models  # регистрируют таблицы и индексы в Base.metadata
+
+
+def _find_index(name: str):
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"Index {name} is not declared in models")
+
+
+def create_indexes(*names: str) -> Callable[[Session], None]:
+    """Шаг миграции: создать объявленные в моделях индексы, если их нет"""
+    def apply(db: Session):
+        for name in names:
+            db.execute(CreateIndex(_find_index(name), if_not_exists=True))
+    return apply
+
+
+def execute_sql(*statements: str) -> Callable[[Session], None]:
+    """Шаг миграции: выполнить SQL-выражения"""
+    def apply(db: Session):
+        for statement in statements:
+            db.execute(text(statement))
+    return apply
+
+
+def combine(*steps: Callable[[Session], None]) -> Callable[[Session], None]:
+    def apply(db: Session):
+        for step in steps:
+            step(db)
+    return apply
+
+
+def partition_tables(*qualified_names: str) -> Callable[[Session], None]:
+    """Шаг миграции: перевести таблицы на помесячные секции по created_at"""
+    def apply(db: Session):
+        from services.partition_service import PartitionService
+        for qualified_name in qualified_names:
+            PartitionService.convert_to_partitioned(db, qualified_name)
+    return apply
+
+
+MIGRATIONS: List[Tuple[str, str, Callable[[Session], None]]] = [
+    (
+        "0001_rental_period",
+        "Период аренды tstzrange и GiST-индекс активных аренд",
+        combine(
+            execute_sql("""
+                ALTER TABLE rentals ADD COLUMN IF NOT EXISTS period tstzrange
+                GENERATED ALWAYS AS (tstzrange(start_date, end_date, '[)')) STORED
+            """),
+            create_indexes("idx_rental_active_period")
+        )
+    ),
+    (
+        "0002_tenant_composite_indexes",
+        "Составные индексы по организации/исполнителю со статусом и датой",
+        create_indexes(
+            "idx_property_org_status",
+            "idx_client_org_created",
+            "idx_rental_org_dates",
+            "idx_rental_org_created",
+            "idx_rental_org_active_end",
+            "idx_task_assignee_status_completed",
+            "idx_task_org_status_created",
+            "idx_task_org_open_due",
+            "idx_order_assignee_status",
+            "idx_order_org_status_created",
+            "idx_payroll_org_period",
+            "idx_movement_org_type_date",
+        )
+    ),
+    (
+        "0003_partition_time_series",
+        "Секционирование журналов аудита и движения материалов по месяцам",
+        partition_tables(
+            "audit.user_actions",
+            "audit.login_attempts",
+            "public.inventory_movements",
+        )
+    ),
+]
@@ -1,6 +1,6 @@
 # backend/models/models.py - ПРАВИЛЬНАЯ ВЕРСИЯ
 from sqlalchemy import (
-    Column, String, Text, Boolean, DateTime, Integer, 
+    Column, String, Text, Boolean, DateTime, Integer, Float,
     ForeignKey, Enum, TIMESTAMP, JSON, CheckConstraint
 )
 from sqlalchemy.dialects.postgresql import UUID, INET, JSONB
@@ -166,7 +166,8 @@ class RefreshToken(Base):
 
 class UserAction(Base):
     __tablename__ = "user_actions"
-    __table_args__ = {"schema": "audit"}
+    # Помесячные секции по created_at (см. PartitionService)
+    __table_args__ = {"schema": "audit", "postgresql_partition_by": "RANGE (created_at)"}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
@@ -186,7 +187,8 @@ class UserAction(Base):
     success = Column(Boolean, nullable=False)
     error_message = Column(Text)
     
-    created_at = Column(TIMESTAMP(timezone=True), default=func.now())
+    # Ключ секционирования входит в первичный ключ
+    created_at = Column(TIMESTAMP(timezone=True), primary_key=True, default=func.now())
     
     # Отношения
     user = relationship("User", back_populates="user_actions")
@@ -194,7 +196,8 @@ class UserAction(Base):
 
 class LoginAttempt(Base):
     __tablename__ = "login_attempts"
-    __table_args__ = {"schema": "audit"}
+    # Помесячные секции по created_at (см. PartitionService)
+    __table_args__ = {"schema": "audit", "postgresql_partition_by": "RANGE (created_at)"}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String(255), nullable=False)
@@ -209,7 +212,28 @@ class LoginAttempt(Base):
     user_agent = Column(Text)
     device_fingerprint = Column(String(255))
     
-    created_at = Column(TIMESTAMP(timezone=True), default=func.now())
+    # Ключ секционирования входит в первичный ключ
+    created_at = Column(TIMESTAMP(timezone=True), primary_key=True, default=func.now())
     
     # Отношения
     organization = relationship("Organization", back_populates="login_attempts")
+
+
+class RateLimitBucket(Base):
+    """Состояние GCRA для общего (между воркерами) rate limiter"""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(255), primary_key=True)
+    
+    # Теоретическое время прибытия следующего запроса (unix time, секунды)
+    tat = Column(Float, nullable=False)
+    allowed = Column(Boolean, nullable=False, default=True)
+
+
+class SchemaMigration(Base):
+    """Примененные миграции схемы (см. models/migrations.py)"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(String(100), primary_key=True)
+    description = Column(String(255))
+    applied_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
@@ -9,8 +9,9 @@ import uuid
 import logging
 
 from models.database import get_db
-from models.models import User, UserRole, Organization
-from utils.dependencies import get_current_active_user, require_role
+from models.models import UserRole, Organization
+from utils.dependencies import get_current_principal, require_principal_role
+from services.principal_cache_service import Principal
 from schemas.acquiring import (
     AcquiringSettingsCreate, AcquiringSettingsUpdate, AcquiringSettingsResponse,
     QuickAcquiringSetup, AcquiringStatsResponse, AcquiringProviderConfig
@@ -22,11 +23,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/acquiring", tags=["Acquiring"])
 
 # FIXED: Use the correct require_role function
-admin_required = require_role(UserRole.ADMIN, UserRole.ACCOUNTANT)
+admin_required = require_principal_role(UserRole.ADMIN, UserRole.ACCOUNTANT)
 
 @router.get("/debug/user-info")
 async def debug_user_info(
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Debug endpoint to check user information for acquiring access"""
     return {
@@ -43,7 +44,7 @@ async def debug_user_info(
 
 @router.get("/settings", response_model=AcquiringSettingsResponse)
 async def get_acquiring_settings(
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Получить настройки эквайринга"""
@@ -77,7 +78,7 @@ async def get_acquiring_settings(
 @router.post("/settings", response_model=AcquiringSettingsResponse)
 async def create_acquiring_settings(
     settings_data: AcquiringSettingsCreate,
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Создать настройки эквайринга"""
@@ -118,7 +119,7 @@ async def create_acquiring_settings(
 
 @router.get("/providers/available")
 async def get_available_providers(
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Получить список доступных провайдеров эквайринга"""
@@ -153,7 +154,7 @@ async def get_available_providers(
 async def get_acquiring_statistics(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по эквайрингу"""
@@ -211,7 +212,7 @@ async def get_acquiring_statistics(
 @router.post("/test-provider/{provider_id}")
 async def test_provider_connection(
     provider_id: str,
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Тестировать подключение к провайдеру"""
@@ -256,7 +257,7 @@ async def test_provider_connection(
 
 @router.delete("/settings")
 async def delete_acquiring_settings(
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Удалить настройки эквайринга"""
@@ -280,7 +281,7 @@ async def delete_acquiring_settings(
 
 @router.post("/settings/enable")
 async def enable_acquiring(
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Включить эквайринг"""
@@ -306,7 +307,7 @@ async def enable_acquiring(
 
 @router.post("/settings/disable")
 async def disable_acquiring(
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Отключить эквайринг"""
@@ -334,7 +335,7 @@ async def disable_acquiring(
 async def calculate_commission(
     amount: float = Query(..., gt=0),
     provider: str = Query(...),
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Калькулятор комиссии по провайдеру"""
@@ -374,7 +375,7 @@ async def calculate_commission(
 @router.post("/settings/quick-setup")
 async def quick_acquiring_setup(
     setup_data: QuickAcquiringSetup,
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
     """Быстрая настройка эквайринга с популярными банками"""
@@ -13,20 +13,21 @@ from schemas.admin import (
     SystemStatsResponse
 )
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user, require_role
+from services.principal_cache_service import Principal, PrincipalCacheService
+from utils.dependencies import require_principal_role
 
 # Создаем роутер
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
 # Зависимость для проверки прав системного администратора
-get_system_owner = require_role(UserRole.SYSTEM_OWNER)
+get_system_owner = require_principal_role(UserRole.SYSTEM_OWNER)
 
 
 @router.get("/organizations", response_model=List[OrganizationResponse])
 async def get_organizations(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Получить список всех организаций"""
@@ -47,7 +48,7 @@ async def get_organizations(
 @router.post("/organizations", response_model=OrganizationResponse)
 async def create_organization(
     org_data: OrganizationCreate,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Создать новую организацию"""
@@ -125,7 +126,7 @@ async def create_organization(
 @router.get("/organizations/{org_id}", response_model=OrganizationResponse)
 async def get_organization(
     org_id: uuid.UUID,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Получить организацию по ID"""
@@ -148,7 +149,7 @@ async def get_organization(
 async def update_organization(
     org_id: uuid.UUID,
     org_data: OrganizationUpdate,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Обновить организацию"""
@@ -171,6 +172,9 @@ async def update_organization(
     db.commit()
     db.refresh(organization)
     
+    # Статус организации влияет на доступ всех ее пользователей
+    PrincipalCacheService.invalidate_organization(organization.id)
+    
     # Логируем действие
     AuthService.log_user_action(
         db=db,
@@ -189,7 +193,7 @@ async def update_organization(
 @router.delete("/organizations/{org_id}")
 async def delete_organization(
     org_id: uuid.UUID,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Удалить организацию (вместе со всеми пользователями)"""
@@ -221,6 +225,7 @@ async def delete_organization(
     # Удаляем организацию (CASCADE удалит связанных пользователей)
     db.delete(organization)
     db.commit()
+    PrincipalCacheService.invalidate_organization(org_id)
     
     return {"message": f"Organization '{organization.name}' and {user_count} users deleted successfully"}
 
@@ -230,7 +235,7 @@ async def get_organization_users(
     org_id: uuid.UUID,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Получить пользователей организации"""
@@ -257,7 +262,7 @@ async def get_organization_users(
 async def create_organization_user(
     org_id: uuid.UUID,
     user_data: UserCreate,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Создать пользователя в организации"""
@@ -325,7 +330,7 @@ async def create_organization_user(
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: uuid.UUID,
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Удалить пользователя"""
@@ -361,13 +366,14 @@ async def delete_user(
     # Удаляем пользователя
     db.delete(user)
     db.commit()
+    PrincipalCacheService.invalidate_user(user_id)
     
     return {"message": f"User '{user.email}' deleted successfully"}
 
 
 @router.get("/stats", response_model=SystemStatsResponse)
 async def get_system_stats(
-    current_user: User = Depends(get_system_owner),
+    current_user: Principal = Depends(get_system_owner),
     db: Session = Depends(get_db)
 ):
     """Получить статистику системы"""
@@ -375,4 +381,13 @@ async def get_system_stats(
     from services.init_service import DatabaseInitService
     stats = DatabaseInitService.get_system_stats(db)
     
-    return SystemStatsResponse(**stats)
\ No newline at end of file
+    return SystemStatsResponse(**stats)
+
+@router.get("/audit/metrics")
+async def get_audit_writer_metrics(
+    current_user: Principal = Depends(get_system_owner)
+):
+    """Метрики фоновой записи аудита (глубина очереди, задержка записи)"""
+    
+    from services.audit_log_service import AuditLogService
+    return AuditLogService.get_metrics()
@@ -12,7 +12,8 @@ from models.database import get_db
 from models.extended_models import User, UserRole
 from schemas.payroll_extended import *
 from services.payroll_extended_service import PayrollExtendedService
-from utils.dependencies import get_current_active_user, require_role
+from utils.dependencies import get_current_active_user, require_role, require_principal_role
+from services.principal_cache_service import Principal
 from schemas.payroll_extended import PayrollOperationCreate, PayrollOperationUpdate, BulkOperationResponse
 
 
@@ -25,6 +26,8 @@ router = APIRouter(prefix="/api/admin/payroll", tags=["Admin Payroll"])
 
 # Только админы и система
 admin_required = require_role(UserRole.ADMIN, UserRole.ACCOUNTANT, UserRole.SYSTEM_OWNER)
+# Для операций, которым достаточно id, роли и организации (без загрузки User)
+admin_principal_required = require_principal_role(UserRole.ADMIN, UserRole.ACCOUNTANT, UserRole.SYSTEM_OWNER)
 # ========== УПРАВЛЕНИЕ ШАБЛОНАМИ ==========
 
 @router.post("/templates/quick-setup")
@@ -37,7 +40,7 @@ async def quick_setup_templates_for_organization(
         "cleaner": 250000,
         "storekeeper": 280000
     },
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Быстрая настройка шаблонов для всех сотрудников организации"""
@@ -134,7 +137,7 @@ async def quick_setup_templates_for_organization(
 @router.post("/templates/bulk-update")
 async def bulk_update_templates(
     updates: Dict[str, Dict[str, Any]],  # user_id -> update_data
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Массовое обновление шаблонов"""
@@ -193,7 +196,7 @@ async def bulk_update_templates(
 @router.post("/operations/bulk")
 async def create_bulk_operations(
     bulk_operation: BulkOperationCreate,
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Массовое создание операций для группы сотрудников"""
@@ -319,7 +322,7 @@ async def create_seasonal_bonus(
 async def get_organization_payroll_summary(
     year: int = Query(..., ge=2020, le=2030),
     month: Optional[int] = Query(None, ge=1, le=12),
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Получить сводку по зарплатам организации"""
@@ -449,7 +452,7 @@ async def get_organization_payroll_summary(
 @router.get("/forecast")
 async def get_payroll_forecast(
     months: int = Query(3, ge=1, le=12),
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Получить прогноз расходов на зарплату"""
@@ -463,49 +466,74 @@ async def get_payroll_forecast(
     return PayrollForecastResponse(**forecast)
 
 
+@router.post("/recalculate/{year}/{month}")
+async def recalculate_period_payrolls(
+    year: int = Path(..., ge=2020, le=2030),
+    month: int = Path(..., ge=1, le=12),
+    dry_run: bool = Query(False),
+    current_user: Principal = Depends(admin_principal_required),
+    db: Session = Depends(get_db)
+):
+    """Пересчитать все неоплаченные зарплаты за месяц с учетом новых операций"""
+    
+    result = PayrollExtendedService.recalculate_period_payrolls(
+        db=db,
+        organization_id=current_user.organization_id,
+        year=year,
+        month=month,
+        dry_run=dry_run
+    )
+    
+    if not dry_run:
+        from services.auth_service import AuthService
+        AuthService.log_user_action(
+            db=db,
+            user_id=current_user.id,
+            action="recalculate_payrolls",
+            organization_id=current_user.organization_id,
+            details={
+                "year": year,
+                "month": month,
+                "payrolls_recalculated": result["payrolls_recalculated"],
+                "operations_applied": result["operations_applied"]
+            }
+        )
+    
+    return result
+
+
 @router.post("/auto-generate/{year}/{month}")
 async def auto_generate_monthly_payrolls(
     year: int = Path(..., ge=2020, le=2030),
     month: int = Path(..., ge=1, le=12),
     force_recreate: bool = Query(False),
-    current_user: User = Depends(admin_required),
+    dry_run: bool = Query(False),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Автоматическая генерация зарплат за месяц"""
     
-    if force_recreate:
-        # Удаляем существующие неоплаченные зарплаты
-        period_start = datetime(year, month, 1, tzinfo=timezone.utc)
-        if month == 12:
-            period_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
-        else:
-            period_end = datetime(year, month + 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
-        
-        existing_payrolls = db.query(Payroll).filter(
-            and_(
-                Payroll.organization_id == current_user.organization_id,
-                Payroll.period_start == period_start,
-                Payroll.period_end == period_end,
-                Payroll.is_paid == False
-            )
-        ).all()
-        
-        for payroll in existing_payrolls:
-            for operation in payroll.operations:
-                operation.is_applied = False
-                operation.applied_at = None
-                operation.payroll_id = None
-            db.delete(payroll)
-        
-        db.commit()
-    
-    payrolls = PayrollExtendedService.auto_generate_monthly_payrolls(
+    result = PayrollExtendedService.generate_monthly_payrolls_bulk(
         db=db,
         organization_id=current_user.organization_id,
         year=year,
-        month=month
+        month=month,
+        dry_run=dry_run,
+        replace_unpaid=force_recreate
     )
     
+    if dry_run:
+        return {
+            "message": f"Preview of {len(result['payrolls'])} payroll entries for {year}-{month:02d}",
+            "year": year,
+            "month": month,
+            "dry_run": True,
+            "payrolls_created": 0,
+            "total_amount": result["total_net"],
+            "generation_ms": result["generation_ms"],
+            "payrolls": result["payrolls"]
+        }
+    
     PayrollExtendedService.apply_recurring_operations(
         db=db,
         organization_id=current_user.organization_id
@@ -520,33 +548,27 @@ async def auto_generate_monthly_payrolls(
         details={
             "year": year,
             "month": month,
-            "payrolls_created": len(payrolls),
-            "force_recreate": force_recreate
+            "payrolls_created": result["payrolls_created"],
+            "force_recreate": force_recreate,
+            "generation_ms": result["generation_ms"]
         }
     )
     
     return {
-        "message": f"Generated {len(payrolls)} payroll entries for {year}-{month:02d}",
+        "message": f"Generated {result['payrolls_created']} payroll entries for {year}-{month:02d}",
         "year": year,
         "month": month,
-        "payrolls_created": len(payrolls),
-        "total_amount": sum(p.net_amount for p in payrolls),
-        "payrolls": [
-            {
-                "payroll_id": str(p.id),
-                "user_name": f"{p.user.first_name} {p.user.last_name}" if p.user else "Unknown",
-                "gross_amount": p.gross_amount,
-                "net_amount": p.net_amount,
-                "operations_applied": len(p.operations) if hasattr(p, 'operations') else 0
-            }
-            for p in payrolls
-        ]
+        "dry_run": False,
+        "payrolls_created": result["payrolls_created"],
+        "total_amount": result["total_net"],
+        "generation_ms": result["generation_ms"],
+        "payrolls": result["payrolls"]
     }
 # ========== УПРАВЛЕНИЕ НАСТРОЙКАМИ ==========
 
 @router.get("/settings")
 async def get_payroll_settings(
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Получить настройки зарплатной системы"""
@@ -574,7 +596,7 @@ async def get_payroll_settings(
 @router.put("/settings")
 async def update_payroll_settings(
     settings_update: PayrollSettingsUpdate,
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Обновить настройки зарплатной системы"""
@@ -635,20 +657,16 @@ async def export_detailed_payroll_report(
             end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
             filename = f"payroll_report_{year}.xlsx"
         
-        excel_data = ReportsService.export_data_to_excel(
-            db=db,
+        from utils.streaming_export import streaming_file_response, XLSX_MEDIA_TYPE
+        
+        chunks = ReportsService.stream_data_export(
             organization_id=current_user.organization_id,
             data_type="payroll",
             start_date=start_date,
             end_date=end_date
         )
         
-        from fastapi.responses import Response
-        return Response(
-            content=excel_data,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        return streaming_file_response(chunks, filename, XLSX_MEDIA_TYPE)
 
 
 @router.post("/notify/payroll-ready")
@@ -656,7 +674,7 @@ async def notify_payroll_ready(
     year: int,
     month: int,
     user_ids: Optional[List[str]] = None,
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Уведомить сотрудников о готовности зарплаты"""
@@ -713,7 +731,7 @@ async def notify_payroll_ready(
 @router.post("/archive/old-payrolls")
 async def archive_old_payrolls(
     months_old: int = Query(24, ge=12, le=60),  # Архивируем зарплаты старше X месяцев
-    current_user: User = Depends(admin_required),
+    current_user: Principal = Depends(admin_principal_required),
     db: Session = Depends(get_db)
 ):
     """Архивировать старые зарплаты"""
@@ -17,13 +17,13 @@ from services.auth_service import AuthService
 from services.init_service import DatabaseInitService
 from models.models import User, Organization, UserRole
 from utils.dependencies import get_current_user, get_current_active_user
-from utils.rate_limiter import RateLimiter
+from utils.rate_limiter import get_rate_limiter
 
 
 # Создаем роутер
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 security = HTTPBearer()
-rate_limiter = RateLimiter()
+rate_limiter = get_rate_limiter()
 
 
 def get_client_info(request: Request) -> dict:
@@ -59,11 +59,11 @@ async def initialize_system(
             )
         
         # Проверяем rate limiting для инициализации
-        if not rate_limiter.check_rate_limit(
+        if not (await rate_limiter.hit(
             f"system_init:{client_info['ip_address']}", 
             max_requests=3, 
             window_seconds=3600  # 3 попытки в час
-        ):
+        )).allowed:
             print(f"❌ Rate limit exceeded for system init from {client_info['ip_address']}")
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -140,11 +140,11 @@ async def login(
         print(f"🔍 Client info: {client_info}")
         
         # Проверяем rate limiting
-        if not rate_limiter.check_rate_limit(
+        if not (await rate_limiter.hit(
             f"login:{client_info['ip_address']}", 
             max_requests=5, 
             window_seconds=300  # 5 попыток в 5 минут
-        ):
+        )).allowed:
             print(f"❌ Rate limit exceeded for {client_info['ip_address']}")
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -265,11 +265,11 @@ async def refresh_token(
         client_info = get_client_info(request)
         
         # Проверяем rate limiting
-        if not rate_limiter.check_rate_limit(
+        if not (await rate_limiter.hit(
             f"refresh:{client_info['ip_address']}", 
             max_requests=10, 
             window_seconds=300  # 10 попыток в 5 минут
-        ):
+        )).allowed:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Too many token refresh attempts. Please try again later."
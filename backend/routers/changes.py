@@ -0,0 +1,112 @@
+# backend/routers/changes.py
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+import asyncio
+import json
+import os
+
+from models.database import get_db, AsyncSessionLocal
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
+from services.change_feed_service import ChangeFeedService
+from utils.executor import run_blocking
+
+router = APIRouter(prefix="/api/changes", tags=["Changes"])
+
+# Интервал keepalive и страховочной дочитки ленты без уведомлений
+KEEPALIVE_SECONDS = float(os.getenv("CHANGE_FEED_KEEPALIVE", "15"))
+
+
+async def _read_changes(principal: Principal, since: Optional[int]):
+    # Короткая асинхронная сессия на каждую дочитку: поток SSE не держит
+    # соединение из пула и не занимает общий пул потоков run_blocking
+    async with AsyncSessionLocal() as db:
+        return await ChangeFeedService.get_changes_async(
+            db, principal.organization_id, principal.id, principal.role, since
+        )
+
+
+@router.get("")
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="Курсор последнего полученного изменения"),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    Изменения задач и заказов после курсора (дочитка после переподключения)
+
+    Без since возвращается текущий курсор. reset=true - курсор устарел,
+    список нужно загрузить заново.
+    """
+
+    return await run_blocking(
+        ChangeFeedService.get_changes,
+        db,
+        current_user.organization_id,
+        current_user.id,
+        current_user.role,
+        since
+    )
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Курсор последнего полученного изменения"),
+    last_event_id: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Поток изменений (Server-Sent Events), отфильтрованный по пользователю
+
+    Каждое событие: id - курсор, event - change, data - изменение.
+    При переподключении курсор берется из Last-Event-ID или since.
+    event: reset - курсор устарел, список нужно загрузить заново.
+    """
+
+    cursor = since
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+
+    async def events():
+        subscription = ChangeFeedService.subscribe(current_user.organization_id)
+        position = cursor
+        try:
+            yield "retry: 5000\n\n"
+
+            while True:
+                subscription.event.clear()
+
+                result = await _read_changes(current_user, position)
+                if result["reset"]:
+                    yield f"id: {result['cursor']}\nevent: reset\ndata: {{}}\n\n"
+                for change in result["changes"]:
+                    yield f"id: {change['id']}\nevent: change\ndata: {json.dumps(change, ensure_ascii=False)}\n\n"
+
+                if position != result["cursor"] and not result["changes"] and not result["reset"]:
+                    # Курсор сдвинулся на невидимых пользователю событиях
+                    yield f"id: {result['cursor']}\n\n"
+                position = result["cursor"]
+
+                if result["has_more"]:
+                    continue
+
+                try:
+                    await asyncio.wait_for(subscription.event.wait(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+        finally:
+            ChangeFeedService.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -10,7 +10,8 @@ from models.extended_models import Client, Rental, RoomOrder
 from schemas.client import ClientCreate, ClientUpdate, ClientResponse
 from models.models import User, UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_active_user, get_current_principal
+from services.principal_cache_service import Principal
 from services.client_service import ClientService
 
 router = APIRouter(prefix="/api/clients", tags=["Clients"])
@@ -22,7 +23,7 @@ async def get_clients(
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = None,
     source: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить список клиентов"""
@@ -124,7 +125,7 @@ async def create_client(
 @router.get("/{client_id}", response_model=ClientResponse)
 async def get_client(
     client_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить информацию о клиенте"""
@@ -143,7 +144,7 @@ async def get_client(
 async def update_client(
     client_id: uuid.UUID,
     client_data: ClientUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить клиента"""
@@ -197,7 +198,7 @@ async def update_client(
 @router.delete("/{client_id}")
 async def delete_client(
     client_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Удалить клиента"""
@@ -252,7 +253,7 @@ async def delete_client(
 @router.get("/{client_id}/history")
 async def get_client_history(
     client_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить историю клиента"""
@@ -272,7 +273,7 @@ async def get_client_history(
 @router.get("/{client_id}/statistics")
 async def get_client_statistics(
     client_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по клиенту"""
@@ -10,12 +10,14 @@ from enum import Enum
 from sqlalchemy import and_, desc
 
 from models.database import get_db
-from models.models import User, UserRole
+from models.models import UserRole
 from schemas.comprehensive_report import (
     ComprehensiveReportRequest, ComprehensiveReportResponse,
     AdministrativeExpense, ReportFormat
 )
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
+from utils.executor import run_blocking
 from services.auth_service import AuthService
 from services.comprehensive_report_service import ComprehensiveReportService
 
@@ -25,7 +27,7 @@ router = APIRouter(prefix="/api/comprehensive-reports", tags=["Comprehensive Rep
 @router.post("/generate", response_model=ComprehensiveReportResponse)
 async def generate_comprehensive_report(
     request: ComprehensiveReportRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Генерировать полный комплексный отчет"""
@@ -37,7 +39,8 @@ async def generate_comprehensive_report(
         )
     
     try:
-        report = ComprehensiveReportService.generate_comprehensive_report(
+        report = await run_blocking(
+            ComprehensiveReportService.generate_comprehensive_report,
             db=db,
             organization_id=current_user.organization_id,
             request=request
@@ -70,7 +73,7 @@ async def generate_comprehensive_report(
 @router.post("/export")
 async def export_comprehensive_report(
     request: ComprehensiveReportRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать полный отчет в файл"""
@@ -83,7 +86,8 @@ async def export_comprehensive_report(
     
     try:
         # Генерируем отчет
-        report = ComprehensiveReportService.generate_comprehensive_report(
+        report = await run_blocking(
+            ComprehensiveReportService.generate_comprehensive_report,
             db=db,
             organization_id=current_user.organization_id,
             request=request
@@ -91,11 +95,11 @@ async def export_comprehensive_report(
         
         # Экспортируем в нужном формате
         if request.format == ReportFormat.XLSX:
-            file_content = ComprehensiveReportService.export_to_xlsx(report)
+            file_content = await run_blocking(ComprehensiveReportService.export_to_xlsx, report)
             media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             file_extension = "xlsx"
         elif request.format == ReportFormat.XML:
-            file_content = ComprehensiveReportService.export_to_xml(report)
+            file_content = await run_blocking(ComprehensiveReportService.export_to_xml, report)
             media_type = "application/xml"
             file_extension = "xml"
         else:
@@ -140,7 +144,7 @@ async def preview_comprehensive_report(
     start_date: datetime = Query(..., description="Дата начала периода"),
     end_date: datetime = Query(..., description="Дата окончания периода"),
     utility_bills_amount: float = Query(0, ge=0, description="Сумма коммунальных услуг"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Предварительный просмотр данных для отчета"""
@@ -162,7 +166,8 @@ async def preview_comprehensive_report(
         )
         
         # Генерируем сокращенную версию отчета
-        report = ComprehensiveReportService.generate_comprehensive_report(
+        report = await run_blocking(
+            ComprehensiveReportService.generate_comprehensive_report,
             db=db,
             organization_id=current_user.organization_id,
             request=preview_request
@@ -202,7 +207,7 @@ async def preview_comprehensive_report(
 
 @router.get("/templates/administrative-expenses")
 async def get_administrative_expense_templates(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить шаблоны административных расходов"""
@@ -286,7 +291,7 @@ async def get_administrative_expense_templates(
 @router.get("/statistics/export-history")
 async def get_export_history(
     limit: int = Query(10, ge=1, le=100),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить историю экспорта отчетов"""
@@ -339,7 +344,7 @@ async def get_export_history(
 async def validate_data_completeness(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Проверить полноту данных для генерации отчета"""
@@ -1,18 +1,23 @@
 from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from sqlalchemy.orm import Session
+import os
 import uuid
 
 from fastapi.responses import FileResponse
 from sqlalchemy import and_ , or_
 from models.database import get_db
 from models.extended_models import Document, DocumentType, Rental, Client
-from schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
+from schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse, BulkDocumentJobCreate
 from models.models import User, UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_active_user, get_current_principal
+from services.principal_cache_service import Principal
 from services.document_service import DocumentService
+from services.document_render_service import DocumentRenderService
+from services.document_job_service import DocumentJobService
+from utils.executor import run_blocking
 
 
 router = APIRouter(prefix="/api/documents", tags=["Documents"])
@@ -25,7 +30,7 @@ async def get_documents(
     document_type: Optional[DocumentType] = None,
     rental_id: Optional[str] = None,
     client_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить список документов"""
@@ -48,7 +53,7 @@ async def get_documents(
 @router.post("", response_model=DocumentResponse)
 async def create_document(
     document_data: DocumentCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать документ"""
@@ -84,10 +89,82 @@ async def create_document(
     return document
 
 
+@router.post("/bulk-generate", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_generate_documents(
+    job_data: BulkDocumentJobCreate,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Массовая генерация документов по арендам (фоновое задание)"""
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER, UserRole.ACCOUNTANT, UserRole.SYSTEM_OWNER]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions to generate documents"
+        )
+    
+    if job_data.document_type not in DocumentService.BULK_DOCUMENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Bulk generation is not supported for {job_data.document_type.value}"
+        )
+    
+    if len(job_data.rental_ids) > DocumentJobService.MAX_RENTALS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many rentals: maximum is {DocumentJobService.MAX_RENTALS}"
+        )
+    
+    job = await run_blocking(
+        DocumentJobService.create_job,
+        db,
+        job_data.rental_ids,
+        job_data.document_type,
+        current_user.id,
+        current_user.organization_id,
+        job_data.prerender
+    )
+    
+    AuthService.log_user_action(
+        db=db,
+        user_id=current_user.id,
+        action="documents_bulk_generation_started",
+        organization_id=current_user.organization_id,
+        resource_type="document_job",
+        resource_id=job.id,
+        details={
+            "document_type": job.document_type.value,
+            "total": job.total,
+            "prerender": job.prerender
+        }
+    )
+    
+    return DocumentJobService.to_dict(job, include_results=False)
+
+
+@router.get("/jobs/{job_id}")
+async def get_document_job(
+    job_id: uuid.UUID,
+    include_results: bool = True,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Прогресс и результаты задания массовой генерации"""
+    
+    job = DocumentJobService.get_job(db, job_id, current_user.organization_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document job not found"
+        )
+    
+    return DocumentJobService.to_dict(job, include_results=include_results)
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить документ"""
@@ -106,7 +183,7 @@ async def get_document(
 async def update_document(
     document_id: uuid.UUID,
     document_data: DocumentUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить документ"""
@@ -141,13 +218,73 @@ async def update_document(
     return updated_document
 
 
+def _read_file_range(path: str, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+def _parse_range(range_header: str, size: int):
+    """Один диапазон bytes=start-end; None - заголовок не поддерживается"""
+    if not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            # bytes=-N: последние N байт
+            start = max(size - int(end_text), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    return start, end
+
+
+async def _pdf_response(request: Request, path: str, etag: str, filename: str) -> Response:
+    """Ответ с PDF: 304 по If-None-Match, 206 по Range, иначе файл целиком"""
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        size = os.path.getsize(path)
+        byte_range = _parse_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            if start >= size or start > end:
+                return Response(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "Content-Range": f"bytes */{size}"}
+                )
+            content = await run_blocking(_read_file_range, path, start, end - start + 1)
+            return Response(
+                content=content,
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type="application/pdf",
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+            )
+    
+    return FileResponse(path=path, media_type="application/pdf", filename=filename, headers=headers)
+
+
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Скачать PDF документа"""
+    """Скачать PDF документа (ETag и Range поддерживаются)"""
     
     document = DocumentService.get_document_by_id(db, document_id, current_user.organization_id)
     if not document:
@@ -156,11 +293,16 @@ async def download_document(
             detail="Document not found"
         )
     
-    # Генерируем PDF если его нет
-    if not document.file_path:
-        pdf_content = DocumentService.generate_pdf(db, document)
-        
-        # Логируем скачивание
+    filename = f"{document.document_type.value}_{document.document_number or document.id}.pdf"
+    
+    # Загруженный файл отдаем как есть, иначе PDF из кэша рендеринга
+    if document.file_path and os.path.exists(document.file_path):
+        path, etag = document.file_path, DocumentRenderService.file_etag(document.file_path)
+    else:
+        path, etag = await DocumentRenderService.get_pdf(db, document)
+    
+    # Логируем скачивание (без повторных частичных запросов)
+    if not request.headers.get("range"):
         AuthService.log_user_action(
             db=db,
             user_id=current_user.id,
@@ -173,21 +315,8 @@ async def download_document(
                 "title": document.title
             }
         )
-        
-        filename = f"{document.document_type.value}_{document.document_number or document.id}.pdf"
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
     
-    # Возвращаем существующий файл
-    return FileResponse(
-        path=document.file_path,
-        media_type="application/pdf",
-        filename=f"{document.document_type.value}_{document.document_number or document.id}.pdf"
-    )
+    return await _pdf_response(request, path, etag, filename)
 
 
 @router.post("/{document_id}/sign")
@@ -235,7 +364,7 @@ async def sign_document(
 @router.post("/rental/{rental_id}/generate-contract")
 async def generate_rental_contract(
     rental_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Сгенерировать договор аренды"""
@@ -273,7 +402,7 @@ async def generate_rental_contract(
 @router.post("/rental/{rental_id}/generate-act")
 async def generate_work_act(
     rental_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Сгенерировать акт выполненных работ"""
@@ -311,7 +440,7 @@ async def generate_work_act(
 @router.post("/{document_id}/send-esf")
 async def send_esf(
     document_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отправить ЭСФ в ИС"""
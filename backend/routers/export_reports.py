@@ -9,8 +9,9 @@ import xlsxwriter
 
 from models.database import get_db
 from models.extended_models import Task, TaskStatus, TaskType, TaskPriority, Payroll
-from models.models import User, UserRole
-from utils.dependencies import get_current_active_user
+from models.models import UserRole
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 
 router = APIRouter(prefix="/api/export", tags=["Export Reports"])
 
@@ -22,7 +23,7 @@ async def export_tasks_report(
     status: Optional[TaskStatus] = None,
     assigned_to: Optional[str] = None,
     format: str = Query("xlsx", regex="^(xlsx|csv)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспорт отчета по задачам"""
@@ -186,7 +187,7 @@ async def export_payroll_report(
     user_id: Optional[str] = None,
     is_paid: Optional[bool] = None,
     format: str = Query("xlsx", regex="^(xlsx|csv)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспорт отчета по зарплате с разделением налогов"""
@@ -14,8 +14,14 @@ from schemas.inventory import (
 )
 from models.models import User, UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_active_user, get_current_principal
+from services.principal_cache_service import Principal
 from services.order_service import OrderService
+from services.report_facts_service import ReportFactsService
+from utils.streaming_export import (
+    iter_query, with_session, csv_stream, xlsx_stream,
+    streaming_file_response, XLSX_MEDIA_TYPE, CSV_MEDIA_TYPE
+)
 from typing import Dict, Any
 
 
@@ -30,7 +36,7 @@ async def get_inventory_items(
     search: Optional[str] = None,
     low_stock: bool = Query(False),
     is_active: Optional[bool] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить список товаров инвентаря"""
@@ -61,7 +67,7 @@ async def get_inventory_items(
 async def create_inventory_movement(
     item_id: uuid.UUID,
     movement_data: InventoryMovementCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать движение товара (поступление/расход)"""
@@ -141,6 +147,11 @@ async def create_inventory_movement(
     db.commit()
     db.refresh(movement)
     
+    if movement.movement_type == "out":
+        ReportFactsService.sync_days(
+            db, current_user.organization_id, movement.created_at, movement.created_at
+        )
+    
     # Логируем действие
     AuthService.log_user_action(
         db=db,
@@ -166,7 +177,7 @@ async def get_inventory_movements(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     movement_type: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить движения товара"""
@@ -197,7 +208,7 @@ async def get_inventory_movements(
 
 @router.get("/low-stock/alert")
 async def get_low_stock_items(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить товары с низким остатком"""
@@ -235,7 +246,7 @@ async def get_low_stock_items(
 @router.post("/bulk", response_model=List[InventoryResponse])
 async def create_inventory_items_bulk(
     items_data: List[InventoryCreate],
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Массовое создание товаров инвентаря"""
@@ -320,7 +331,7 @@ async def create_inventory_items_bulk(
 
 @router.get("/statistics/overview")
 async def get_inventory_statistics(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по инвентарю"""
@@ -410,7 +421,7 @@ async def get_inventory_statistics(
 @router.post("/bulk-update-stock")
 async def bulk_update_stock(
     updates: List[dict],
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Массовое обновление остатков"""
@@ -507,7 +518,7 @@ async def export_inventory_data(
     category: Optional[str] = None,
     in_stock_only: bool = Query(False, description="Экспортировать только товары в наличии"),
     low_stock_only: bool = Query(False, description="Экспортировать только товары с низким остатком"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспорт данных инвентаря с расширенными фильтрами"""
@@ -524,19 +535,7 @@ async def export_inventory_data(
             detail="Supported formats: xlsx, csv"
         )
     
-    # Получаем данные с фильтрами
-    query = db.query(Inventory).filter(Inventory.organization_id == current_user.organization_id)
-    
-    if category:
-        query = query.filter(Inventory.category == category)
-    
-    if in_stock_only:
-        query = query.filter(Inventory.current_stock > 0)
-    
-    if low_stock_only:
-        query = query.filter(Inventory.current_stock <= Inventory.min_stock)
-    
-    items = query.order_by(Inventory.name).all()
+    organization_id = current_user.organization_id
     
     # Формируем имя файла
     filename_parts = ["inventory"]
@@ -549,120 +548,103 @@ async def export_inventory_data(
     
     filename = f"{'_'.join(filename_parts)}.{format}"
     
-    if format == "xlsx":
-        import xlsxwriter
-        import io
-        
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet("Инвентарь")
+    headers = [
+        'Название', 'Описание', 'Категория', 'SKU', 'Единица измерения',
+        'Текущий остаток', 'Мин. остаток', 'Макс. остаток', 'Цена за единицу',
+        'Общая стоимость', 'Поставщик', 'Контакты поставщика', 'Активен', 
+        'Статус остатка', 'Создан', 'Обновлен', 'Последнее пополнение'
+    ]
+    
+    def iter_items(export_db: Session):
+        """Товары с фильтрами, читаемые порциями"""
+        query = export_db.query(Inventory).filter(Inventory.organization_id == organization_id)
         
-        # Стили
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#D7E4BC',
-            'border': 1,
-            'align': 'center'
-        })
-        money_format = workbook.add_format({'num_format': '#,##0.00" ₸"'})
-        number_format = workbook.add_format({'num_format': '#,##0.00'})
+        if category:
+            query = query.filter(Inventory.category == category)
         
-        # Заголовки с дополнительными полями
-        headers = [
-            'Название', 'Описание', 'Категория', 'SKU', 'Единица измерения',
-            'Текущий остаток', 'Мин. остаток', 'Макс. остаток', 'Цена за единицу',
-            'Общая стоимость', 'Поставщик', 'Контакты поставщика', 'Активен', 
-            'Статус остатка', 'Создан', 'Обновлен', 'Последнее пополнение'
-        ]
+        if in_stock_only:
+            query = query.filter(Inventory.current_stock > 0)
         
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
+        if low_stock_only:
+            query = query.filter(Inventory.current_stock <= Inventory.min_stock)
         
-        # Данные
-        for row, item in enumerate(items, 1):
-            # Определяем статус остатка
-            if item.current_stock == 0:
-                stock_status = "Нет в наличии"
-            elif item.current_stock <= item.min_stock:
-                stock_status = "Низкий остаток"
-            elif item.max_stock and item.current_stock >= item.max_stock:
-                stock_status = "Переизбыток"
-            else:
-                stock_status = "В норме"
+        return iter_query(query.order_by(Inventory.name))
+    
+    def stock_status_of(item: Inventory) -> str:
+        if item.current_stock == 0:
+            return "Нет в наличии"
+        elif item.current_stock <= item.min_stock:
+            return "Низкий остаток"
+        elif item.max_stock and item.current_stock >= item.max_stock:
+            return "Переизбыток"
+        return "В норме"
+    
+    if format == "xlsx":
+        def build_workbook(export_db: Session, workbook):
+            worksheet = workbook.add_worksheet("Инвентарь")
             
-            worksheet.write(row, 0, item.name)
-            worksheet.write(row, 1, item.description or "")
-            worksheet.write(row, 2, item.category or "")
-            worksheet.write(row, 3, item.sku or "")
-            worksheet.write(row, 4, item.unit)
-            worksheet.write(row, 5, item.current_stock, number_format)
-            worksheet.write(row, 6, item.min_stock, number_format)
-            worksheet.write(row, 7, item.max_stock or 0, number_format)
-            worksheet.write(row, 8, item.cost_per_unit or 0, money_format)
-            worksheet.write(row, 9, item.total_value, money_format)
-            worksheet.write(row, 10, item.supplier or "")
-            worksheet.write(row, 11, item.supplier_contact or "")
-            worksheet.write(row, 12, "Да" if item.is_active else "Нет")
-            worksheet.write(row, 13, stock_status)
-            worksheet.write(row, 14, item.created_at.strftime('%d.%m.%Y'))
-            worksheet.write(row, 15, item.updated_at.strftime('%d.%m.%Y'))
-            worksheet.write(row, 16, item.last_restock_date.strftime('%d.%m.%Y') if item.last_restock_date else "")
-        
-        # Автоширина колонок
-        worksheet.set_column('A:A', 25)  # Название
-        worksheet.set_column('B:B', 30)  # Описание
-        worksheet.set_column('C:C', 15)  # Категория
-        worksheet.set_column('D:D', 12)  # SKU
-        worksheet.set_column('E:E', 12)  # Единица
-        worksheet.set_column('F:H', 12)  # Остатки
-        worksheet.set_column('I:J', 15)  # Стоимость
-        worksheet.set_column('K:L', 20)  # Поставщик
-        worksheet.set_column('M:N', 15)  # Статусы
-        worksheet.set_column('O:Q', 12)  # Даты
-        
-        # Итоговая строка
-        last_row = len(items) + 2
-        worksheet.write(last_row, 0, "ИТОГО:", header_format)
-        worksheet.write(last_row, 5, f"=SUM(F2:F{len(items)+1})", number_format)
-        worksheet.write(last_row, 9, f"=SUM(J2:J{len(items)+1})", money_format)
-        
-        workbook.close()
-        output.seek(0)
+            # Стили
+            header_format = workbook.add_format({
+                'bold': True,
+                'bg_color': '#D7E4BC',
+                'border': 1,
+                'align': 'center'
+            })
+            money_format = workbook.add_format({'num_format': '#,##0.00" ₸"'})
+            number_format = workbook.add_format({'num_format': '#,##0.00'})
+            
+            # Автоширина колонок
+            worksheet.set_column('A:A', 25)  # Название
+            worksheet.set_column('B:B', 30)  # Описание
+            worksheet.set_column('C:C', 15)  # Категория
+            worksheet.set_column('D:D', 12)  # SKU
+            worksheet.set_column('E:E', 12)  # Единица
+            worksheet.set_column('F:H', 12)  # Остатки
+            worksheet.set_column('I:J', 15)  # Стоимость
+            worksheet.set_column('K:L', 20)  # Поставщик
+            worksheet.set_column('M:N', 15)  # Статусы
+            worksheet.set_column('O:Q', 12)  # Даты
+            
+            for col, header in enumerate(headers):
+                worksheet.write(0, col, header, header_format)
+            
+            # Данные (constant_memory: строки пишутся строго по порядку)
+            items_count = 0
+            for row, item in enumerate(iter_items(export_db), 1):
+                worksheet.write(row, 0, item.name)
+                worksheet.write(row, 1, item.description or "")
+                worksheet.write(row, 2, item.category or "")
+                worksheet.write(row, 3, item.sku or "")
+                worksheet.write(row, 4, item.unit)
+                worksheet.write(row, 5, item.current_stock, number_format)
+                worksheet.write(row, 6, item.min_stock, number_format)
+                worksheet.write(row, 7, item.max_stock or 0, number_format)
+                worksheet.write(row, 8, item.cost_per_unit or 0, money_format)
+                worksheet.write(row, 9, item.total_value, money_format)
+                worksheet.write(row, 10, item.supplier or "")
+                worksheet.write(row, 11, item.supplier_contact or "")
+                worksheet.write(row, 12, "Да" if item.is_active else "Нет")
+                worksheet.write(row, 13, stock_status_of(item))
+                worksheet.write(row, 14, item.created_at.strftime('%d.%m.%Y'))
+                worksheet.write(row, 15, item.updated_at.strftime('%d.%m.%Y'))
+                worksheet.write(row, 16, item.last_restock_date.strftime('%d.%m.%Y') if item.last_restock_date else "")
+                items_count = row
+            
+            # Итоговая строка
+            last_row = items_count + 2
+            worksheet.write(last_row, 0, "ИТОГО:", header_format)
+            worksheet.write(last_row, 5, f"=SUM(F2:F{items_count+1})", number_format)
+            worksheet.write(last_row, 9, f"=SUM(J2:J{items_count+1})", money_format)
         
-        return Response(
-            content=output.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        chunks = with_session(
+            lambda export_db: xlsx_stream(lambda workbook: build_workbook(export_db, workbook))
         )
+        return streaming_file_response(chunks, filename, XLSX_MEDIA_TYPE)
     
-    elif format == "csv":
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=';')  # Используем ; для лучшей совместимости с Excel
-        
-        # Заголовки
-        writer.writerow([
-            'Название', 'Описание', 'Категория', 'SKU', 'Единица измерения',
-            'Текущий остаток', 'Мин. остаток', 'Макс. остаток', 'Цена за единицу',
-            'Общая стоимость', 'Поставщик', 'Контакты поставщика', 'Активен',
-            'Статус остатка', 'Создан', 'Обновлен', 'Последнее пополнение'
-        ])
-        
-        # Данные
-        for item in items:
-            # Определяем статус остатка
-            if item.current_stock == 0:
-                stock_status = "Нет в наличии"
-            elif item.current_stock <= item.min_stock:
-                stock_status = "Низкий остаток"
-            elif item.max_stock and item.current_stock >= item.max_stock:
-                stock_status = "Переизбыток"
-            else:
-                stock_status = "В норме"
-            
-            writer.writerow([
+    # CSV (; для лучшей совместимости с Excel)
+    def produce_csv(export_db: Session):
+        rows = (
+            [
                 item.name,
                 item.description or "",
                 item.category or "",
@@ -676,20 +658,16 @@ async def export_inventory_data(
                 item.supplier or "",
                 item.supplier_contact or "",
                 "Да" if item.is_active else "Нет",
-                stock_status,
+                stock_status_of(item),
                 item.created_at.strftime('%d.%m.%Y'),
                 item.updated_at.strftime('%d.%m.%Y'),
                 item.last_restock_date.strftime('%d.%m.%Y') if item.last_restock_date else ""
-            ])
-        
-        output.seek(0)
-        content = output.getvalue().encode('utf-8-sig')  # BOM для корректного отображения в Excel
-        
-        return Response(
-            content=content,
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            ]
+            for item in iter_items(export_db)
         )
+        return csv_stream(headers, rows)
+    
+    return streaming_file_response(with_session(produce_csv), filename, CSV_MEDIA_TYPE)
 
 @router.get("/{item_id}/movements/export/{format}")
 async def export_inventory_movements(
@@ -698,7 +676,7 @@ async def export_inventory_movements(
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     movement_type: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспорт движений конкретного товара"""
@@ -729,87 +707,98 @@ async def export_inventory_movements(
             detail="Inventory item not found"
         )
     
-    # Получаем движения
-    query = db.query(InventoryMovement).filter(InventoryMovement.inventory_id == item_id)
+    filename = f"movements_{item.name.replace(' ', '_')}_{item_id}.{format}"
     
-    if start_date:
-        query = query.filter(InventoryMovement.created_at >= start_date)
-    if end_date:
-        query = query.filter(InventoryMovement.created_at <= end_date)
-    if movement_type:
-        query = query.filter(InventoryMovement.movement_type == movement_type)
+    item_name, item_sku, item_stock, item_unit = item.name, item.sku, item.current_stock, item.unit
     
-    movements = query.order_by(desc(InventoryMovement.created_at)).all()
+    movement_types = {
+        'in': 'Поступление',
+        'out': 'Расход',
+        'adjustment': 'Корректировка',
+        'writeoff': 'Списание'
+    }
     
-    filename = f"movements_{item.name.replace(' ', '_')}_{item_id}.{format}"
+    headers = ['Дата', 'Тип операции', 'Количество', 'Цена за единицу', 'Общая стоимость', 'Причина', 'Остаток после', 'Примечания']
     
-    if format == "xlsx":
-        import xlsxwriter
-        import io
-        
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet("Движения")
-        
-        # Стили
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#D7E4BC',
-            'border': 1,
-            'align': 'center'
-        })
-        money_format = workbook.add_format({'num_format': '#,##0.00" ₸"'})
-        
-        # Информация о товаре
-        worksheet.write('A1', 'ДВИЖЕНИЯ ТОВАРА', header_format)
-        worksheet.write('A2', f'Товар: {item.name}')
-        worksheet.write('A3', f'SKU: {item.sku or "N/A"}')
-        worksheet.write('A4', f'Текущий остаток: {item.current_stock} {item.unit}')
+    def iter_movements(export_db: Session):
+        """Движения товара, читаемые серверным курсором порциями"""
+        query = export_db.query(InventoryMovement).filter(InventoryMovement.inventory_id == item_id)
         
-        # Заголовки таблицы движений
-        start_row = 6
-        headers = ['Дата', 'Тип операции', 'Количество', 'Цена за единицу', 'Общая стоимость', 'Причина', 'Остаток после', 'Примечания']
+        if start_date:
+            query = query.filter(InventoryMovement.created_at >= start_date)
+        if end_date:
+            query = query.filter(InventoryMovement.created_at <= end_date)
+        if movement_type:
+            query = query.filter(InventoryMovement.movement_type == movement_type)
         
-        for col, header in enumerate(headers):
-            worksheet.write(start_row, col, header, header_format)
-        
-        # Данные движений
-        for row, movement in enumerate(movements, start_row + 1):
-            movement_types = {
-                'in': 'Поступление',
-                'out': 'Расход',
-                'adjustment': 'Корректировка',
-                'writeoff': 'Списание'
-            }
+        return iter_query(query.order_by(desc(InventoryMovement.created_at)))
+    
+    if format == "xlsx":
+        def build_workbook(export_db: Session, workbook):
+            worksheet = workbook.add_worksheet("Движения")
             
-            worksheet.write(row, 0, movement.created_at.strftime('%d.%m.%Y %H:%M'))
-            worksheet.write(row, 1, movement_types.get(movement.movement_type, movement.movement_type))
-            worksheet.write(row, 2, movement.quantity)
-            worksheet.write(row, 3, movement.unit_cost or 0, money_format)
-            worksheet.write(row, 4, movement.total_cost or 0, money_format)
-            worksheet.write(row, 5, movement.reason or "")
-            worksheet.write(row, 6, movement.stock_after)
-            worksheet.write(row, 7, movement.notes or "")
-        
-        # Автоширина
-        worksheet.set_column('A:A', 15)
-        worksheet.set_column('B:B', 15)
-        worksheet.set_column('C:C', 12)
-        worksheet.set_column('D:E', 15)
-        worksheet.set_column('F:F', 25)
-        worksheet.set_column('G:G', 12)
-        worksheet.set_column('H:H', 30)
-        
-        workbook.close()
-        output.seek(0)
+            # Стили
+            header_format = workbook.add_format({
+                'bold': True,
+                'bg_color': '#D7E4BC',
+                'border': 1,
+                'align': 'center'
+            })
+            money_format = workbook.add_format({'num_format': '#,##0.00" ₸"'})
+            
+            # Автоширина
+            worksheet.set_column('A:A', 15)
+            worksheet.set_column('B:B', 15)
+            worksheet.set_column('C:C', 12)
+            worksheet.set_column('D:E', 15)
+            worksheet.set_column('F:F', 25)
+            worksheet.set_column('G:G', 12)
+            worksheet.set_column('H:H', 30)
+            
+            # Информация о товаре
+            worksheet.write('A1', 'ДВИЖЕНИЯ ТОВАРА', header_format)
+            worksheet.write('A2', f'Товар: {item_name}')
+            worksheet.write('A3', f'SKU: {item_sku or "N/A"}')
+            worksheet.write('A4', f'Текущий остаток: {item_stock} {item_unit}')
+            
+            # Заголовки таблицы движений
+            start_row = 6
+            for col, header in enumerate(headers):
+                worksheet.write(start_row, col, header, header_format)
+            
+            # Данные движений
+            for row, movement in enumerate(iter_movements(export_db), start_row + 1):
+                worksheet.write(row, 0, movement.created_at.strftime('%d.%m.%Y %H:%M'))
+                worksheet.write(row, 1, movement_types.get(movement.movement_type, movement.movement_type))
+                worksheet.write(row, 2, movement.quantity)
+                worksheet.write(row, 3, movement.unit_cost or 0, money_format)
+                worksheet.write(row, 4, movement.total_cost or 0, money_format)
+                worksheet.write(row, 5, movement.reason or "")
+                worksheet.write(row, 6, movement.stock_after)
+                worksheet.write(row, 7, movement.notes or "")
         
-        return Response(
-            content=output.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        chunks = with_session(
+            lambda export_db: xlsx_stream(lambda workbook: build_workbook(export_db, workbook))
+        )
+        return streaming_file_response(chunks, filename, XLSX_MEDIA_TYPE)
+    
+    def produce_csv(export_db: Session):
+        rows = (
+            [
+                movement.created_at.strftime('%d.%m.%Y %H:%M'),
+                movement_types.get(movement.movement_type, movement.movement_type),
+                movement.quantity,
+                movement.unit_cost or 0,
+                movement.total_cost or 0,
+                movement.reason or "",
+                movement.stock_after,
+                movement.notes or ""
+            ]
+            for movement in iter_movements(export_db)
         )
+        return csv_stream(headers, rows)
     
-    return {"message": "CSV export for movements not implemented yet"}
+    return streaming_file_response(with_session(produce_csv), filename, CSV_MEDIA_TYPE)
 
 # Роут для быстрого экспорта товаров в наличии
 @router.get("/quick-export/in-stock")
@@ -829,7 +818,7 @@ async def quick_export_in_stock(
 @router.post("", response_model=InventoryResponse)
 async def create_inventory_item(
     item_data: InventoryCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать новый товар инвентаря"""
@@ -911,7 +900,7 @@ async def create_inventory_item(
 @router.get("/{item_id}", response_model=InventoryResponse)
 async def get_inventory_item(
     item_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить товар инвентаря"""
@@ -936,7 +925,7 @@ async def get_inventory_item(
 async def update_inventory_item(
     item_id: uuid.UUID,
     item_data: InventoryUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить товар инвентаря"""
@@ -1005,7 +994,7 @@ async def update_inventory_item(
 @router.delete("/{item_id}")
 async def delete_inventory_item(
     item_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Удалить товар инвентаря"""
@@ -1057,7 +1046,7 @@ async def delete_inventory_item(
 @router.get("/available-for-orders", response_model=List[Dict[str, Any]])
 async def get_available_inventory_for_orders(
     category: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get inventory items available for room orders"""
@@ -1074,7 +1063,7 @@ async def get_available_inventory_for_orders(
 async def get_inventory_orders_impact_report(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get report on inventory usage through orders"""
@@ -11,11 +11,12 @@ from models.database import get_db
 from models.extended_models import User, UserRole
 from schemas.payroll_extended import *
 from services.payroll_extended_service import PayrollExtendedService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 
 router = APIRouter(prefix="/api/payroll", tags=["Manager Payroll Operations"])
 
-def require_manager_or_admin(current_user: User = Depends(get_current_active_user)):
+def require_manager_or_admin(current_user: Principal = Depends(get_current_principal)):
     """Проверка прав менеджера или админа"""
     if current_user.role not in [UserRole.ADMIN, UserRole.ACCOUNTANT]:
         raise HTTPException(
@@ -30,7 +31,7 @@ def require_manager_or_admin(current_user: User = Depends(get_current_active_use
 async def add_quick_bonus(
     user_id: str,
     bonus_request: QuickBonusRequest,
-    current_user: User = Depends(require_manager_or_admin),
+    current_user: Principal = Depends(require_manager_or_admin),
     db: Session = Depends(get_db)
 ):
     """Быстро добавить премию сотруднику"""
@@ -85,7 +86,7 @@ async def add_quick_bonus(
 async def add_quick_penalty(
     user_id: str,
     penalty_request: QuickPenaltyRequest,
-    current_user: User = Depends(require_manager_or_admin),
+    current_user: Principal = Depends(require_manager_or_admin),
     db: Session = Depends(get_db)
 ):
     """Быстро добавить штраф сотруднику"""
@@ -146,7 +147,7 @@ async def add_quick_penalty(
 async def add_overtime_payment(
     user_id: str,
     overtime_request: QuickOvertimeRequest,
-    current_user: User = Depends(require_manager_or_admin),
+    current_user: Principal = Depends(require_manager_or_admin),
     db: Session = Depends(get_db)
 ):
     """Добавить оплату сверхурочных"""
@@ -188,7 +189,7 @@ async def add_overtime_payment(
 async def add_allowance(
     user_id: str,
     allowance_request: QuickAllowanceRequest,
-    current_user: User = Depends(require_manager_or_admin),
+    current_user: Principal = Depends(require_manager_or_admin),
     db: Session = Depends(get_db)
 ):
     """Добавить надбавку сотруднику"""
@@ -241,7 +242,7 @@ async def add_allowance(
 async def add_deduction(
     user_id: str,
     deduction_request: QuickDeductionRequest,
-    current_user: User = Depends(require_manager_or_admin),
+    current_user: Principal = Depends(require_manager_or_admin),
     db: Session = Depends(get_db)
 ):
     """Добавить вычет сотруднику"""
@@ -9,10 +9,11 @@ import uuid
 from models.database import get_db
 from models.order_payment_models import OrderPayment, OrderPaymentStatus
 from models.extended_models import RoomOrder
-from models.models import User, UserRole
+from models.models import UserRole
 from services.order_payment_service import OrderPaymentService
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 from pydantic import BaseModel, Field
 from pydantic import BaseModel, Field, validator
 from typing import Optional
@@ -85,7 +86,7 @@ class PaymentStatusResponse(BaseModel):
 async def create_order_payment(
     order_id: str,
     payment_data: OrderPaymentCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать платеж для заказа"""
@@ -144,7 +145,7 @@ async def create_order_payment(
 async def process_sale_payment(
     order_id: str,
     payment_data: SalePaymentRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обработать платеж за продажу товаров"""
@@ -209,7 +210,7 @@ async def process_sale_payment(
 @router.get("/{order_id}/payments", response_model=List[OrderPaymentResponse])
 async def get_order_payments(
     order_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить все платежи по заказу"""
@@ -240,7 +241,7 @@ async def get_order_payments(
 @router.get("/{order_id}/payment-status", response_model=PaymentStatusResponse)
 async def get_order_payment_status(
     order_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статус оплаты заказа"""
@@ -272,7 +273,7 @@ async def get_order_payment_status(
 async def complete_order_payment(
     order_id: str,
     payment_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Завершить платеж вручную"""
@@ -325,6 +326,9 @@ async def complete_order_payment(
             }
         )
         
+        if completed_payment.order:
+            OrderPaymentService.sync_report_facts(db, completed_payment.order)
+        
         return OrderPaymentResponse.from_orm(completed_payment)
         
     except ValueError as e:
@@ -338,7 +342,7 @@ async def cancel_order_payment(
     order_id: str,
     payment_id: str,
     reason: Optional[str] = Query(None, min_length=1),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отменить платеж"""
@@ -406,7 +410,7 @@ async def create_order_refund(
     refund_amount: float = Query(..., gt=0),
     reason: str = Query(..., min_length=1),
     refund_method: str = Query(default="cash"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать возврат по заказу"""
@@ -468,7 +472,7 @@ async def create_order_refund(
 async def get_payments_summary(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить сводку по платежам организации"""
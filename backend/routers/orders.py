@@ -3,17 +3,23 @@ from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import desc, and_
 import uuid
 
-from models.database import get_db
+from models.database import get_db, get_async_db
 from models.extended_models import RoomOrder, OrderStatus, Property, Client, Rental
 from schemas.order import RoomOrderCreate, RoomOrderUpdate, RoomOrderResponse
 from models.models import User, UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 from models.extended_models import Task, TaskStatus, TaskType, TaskPriority, Property, User
 from services.order_service import OrderService
+from services.change_feed_service import ChangeFeedService
+from services.workload_index_service import WorkloadIndexService
+from services.report_facts_service import ReportFactsService
+from utils.executor import run_blocking
 from datetime import datetime, timezone, timedelta
 
 router = APIRouter(prefix="/api/orders", tags=["Room Orders"])
@@ -26,40 +32,34 @@ async def get_orders(
     status: Optional[OrderStatus] = None,
     order_type: Optional[str] = None,
     property_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить список заказов в номер"""
     
-    query = db.query(RoomOrder).filter(RoomOrder.organization_id == current_user.organization_id)
-    
-    # Фильтры
-    if status:
-        query = query.filter(RoomOrder.status == status)
-    if order_type:
-        query = query.filter(RoomOrder.order_type == order_type)
-    if property_id:
-        query = query.filter(RoomOrder.property_id == uuid.UUID(property_id))
-    
     # Для сотрудников показываем только их заказы
+    assigned_to = None
     if current_user.role in [UserRole.CLEANER, UserRole.TECHNICAL_STAFF, UserRole.STOREKEEPER]:
-        query = query.filter(RoomOrder.assigned_to == current_user.id)
-    
-    # Подгружаем связанные объекты
-    query = query.options(
-        selectinload(RoomOrder.property),
-        selectinload(RoomOrder.client)
+        assigned_to = current_user.id
+    
+    orders = await OrderService.get_orders_async(
+        db=db,
+        organization_id=current_user.organization_id,
+        skip=skip,
+        limit=limit,
+        status=status,
+        order_type=order_type,
+        property_id=uuid.UUID(property_id) if property_id else None,
+        assigned_to=assigned_to
     )
     
-    orders = query.order_by(desc(RoomOrder.requested_at)).offset(skip).limit(limit).all()
-    
     return orders
 
 
 @router.post("", response_model=RoomOrderResponse)
 async def create_order(
     order_data: RoomOrderCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать заказ с проверкой наличия на складе"""
@@ -109,7 +109,7 @@ async def create_order(
 @router.get("/{order_id}", response_model=RoomOrderResponse)
 async def get_order(
     order_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить информацию о заказе"""
@@ -137,7 +137,7 @@ async def get_order(
 async def update_order(
     order_id: uuid.UUID,
     order_data: RoomOrderUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить заказ"""
@@ -178,7 +178,7 @@ async def update_order(
 async def assign_order(
     order_id: uuid.UUID,
     assigned_to: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Назначить заказ исполнителю"""
@@ -218,7 +218,7 @@ async def assign_order(
 async def complete_order_with_inventory(
     order_id: uuid.UUID,
     completion_notes: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Complete order with automatic inventory deduction"""
@@ -283,7 +283,7 @@ async def complete_order_with_inventory(
 @router.get("/statistics/overview")
 async def get_orders_statistics(
     period_days: int = Query(30, ge=1, le=365),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по заказам"""
@@ -353,7 +353,7 @@ async def get_orders_statistics(
 async def add_order_payment(
     order_id: uuid.UUID,
     payment_data: dict,  # {"amount": float, "method": str, "payer_name": str}
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Добавить платеж за заказ"""
@@ -397,8 +397,11 @@ async def add_order_payment(
             # Обновляем заказ
             order.is_paid = True
             order.updated_at = datetime.now(timezone.utc)
+            ChangeFeedService.order_changed(db, order, "paid")
             db.commit()
             
+            ReportFactsService.sync_days(db, order.organization_id, order.created_at, order.created_at)
+            
             return {
                 "message": "Payment processed successfully",
                 "payment_id": str(payment.id),
@@ -423,7 +426,7 @@ async def add_order_payment(
 @router.get("/{order_id}/payment-status")
 async def get_order_payment_status(
     order_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статус оплаты заказа"""
@@ -473,7 +476,7 @@ async def get_order_payment_status(
 
 @router.get("/executors/workload")
 async def get_executor_workload(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить загруженность исполнителей заказов"""
@@ -504,7 +507,7 @@ async def get_executor_workload(
 
 @router.get("/executors/workload-detailed")
 async def get_detailed_executor_workload(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить детальную информацию о загруженности исполнителей"""
@@ -532,7 +535,7 @@ async def get_detailed_executor_workload(
 @router.post("/{order_id}/auto-reassign")
 async def auto_reassign_order(
     order_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Автоматически переназначить заказ оптимальному исполнителю"""
@@ -569,6 +572,8 @@ async def auto_reassign_order(
             old_executor = db.query(User).filter(User.id == order.assigned_to).first()
         
         # Reassign the order
+        previous_assignee = order.assigned_to
+        previous_status = order.status
         order.assigned_to = best_executor.id
         order.status = OrderStatus.CONFIRMED
         order.updated_at = datetime.now(timezone.utc)
@@ -583,13 +588,25 @@ async def auto_reassign_order(
             )
         ).all()
         
+        previous_task_states = [(task, task.assigned_to, task.status) for task in delivery_tasks]
+        
         for task in delivery_tasks:
             task.assigned_to = best_executor.id
             task.status = TaskStatus.ASSIGNED
             task.updated_at = datetime.now(timezone.utc)
         
+        ChangeFeedService.order_changed(db, order, "assigned", previous_assignee)
+        ChangeFeedService.tasks_changed(db, current_user.organization_id, [
+            (task, "assigned", previous_task_assignee)
+            for task, previous_task_assignee, _ in previous_task_states
+        ])
+        
         db.commit()
         
+        WorkloadIndexService.order_changed(order, previous_assignee, previous_status)
+        for task, previous_task_assignee, previous_task_status in previous_task_states:
+            WorkloadIndexService.task_changed(task, previous_task_assignee, previous_task_status)
+        
         # Send notification to new executor
         OrderService._notify_executor_about_assignment(db, order, best_executor)
         
@@ -635,7 +652,7 @@ async def auto_reassign_order(
 @router.post("/bulk-auto-assign")
 async def bulk_auto_assign_orders(
     filter_criteria: dict = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Массовое автоназначение заказов оптимальным исполнителям"""
@@ -665,7 +682,7 @@ async def bulk_auto_assign_orders(
             if filter_criteria.get('created_after'):
                 query = query.filter(RoomOrder.created_at >= filter_criteria['created_after'])
         
-        unassigned_orders = query.order_by(RoomOrder.created_at).all()
+        unassigned_orders = query.options(selectinload(RoomOrder.property)).order_by(RoomOrder.created_at).all()
         
         if not unassigned_orders:
             return {
@@ -678,12 +695,12 @@ async def bulk_auto_assign_orders(
         assignments = []
         failed_assignments = []
         
+        # Executors for the whole batch from one snapshot of candidates and workloads
+        plan = OrderService.plan_bulk_assignments(db, current_user.organization_id, unassigned_orders)
+        
         for order in unassigned_orders:
             try:
-                # Find best executor for this order
-                best_executor = OrderService._auto_assign_best_executor(
-                    db, current_user.organization_id, order.order_type
-                )
+                best_executor = plan.get(order.id)
                 
                 if best_executor:
                     # Assign the order
@@ -697,7 +714,10 @@ async def bulk_auto_assign_orders(
                     )
                     
                     # Send notification
-                    OrderService._notify_executor_about_assignment(db, order, best_executor)
+                    OrderService._notify_executor_about_assignment(db, order, best_executor, delivery_task)
+                    
+                    # TaskService.create_task already published the delivery task as "created"
+                    ChangeFeedService.order_changed(db, order, "assigned")
                     
                     assignments.append({
                         "order_id": str(order.id),
@@ -726,6 +746,9 @@ async def bulk_auto_assign_orders(
         # Commit all successful assignments
         if assignments:
             db.commit()
+            
+            # Bulk assignment - the workload index will be reloaded from the database
+            WorkloadIndexService.invalidate(current_user.organization_id)
         
         # Log the bulk operation
         AuthService.log_user_action(
@@ -759,7 +782,7 @@ async def bulk_auto_assign_orders(
 @router.get("/assignment-analytics")
 async def get_assignment_analytics(
     period_days: int = Query(7, ge=1, le=90),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить аналитику по назначениям заказов"""
@@ -902,10 +925,11 @@ async def get_assignment_analytics(
 
 @router.post("/optimize-assignments")
 async def optimize_current_assignments(
-    current_user: User = Depends(get_current_active_user),
+    max_load: Optional[int] = Query(None, ge=1, le=500, description="Максимум активных задач и заказов на исполнителя"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
-    """Оптимизировать текущие назначения заказов"""
+    """Оптимизировать текущие назначения заказов (согласованный план по всем заказам)"""
     
     if current_user.role not in [UserRole.ADMIN, UserRole.SYSTEM_OWNER]:
         raise HTTPException(
@@ -914,72 +938,23 @@ async def optimize_current_assignments(
         )
     
     try:
-        # Get current active orders
-        active_orders = db.query(RoomOrder).filter(
-            and_(
-                RoomOrder.organization_id == current_user.organization_id,
-                RoomOrder.status.in_([OrderStatus.CONFIRMED, OrderStatus.IN_PROGRESS]),
-                RoomOrder.assigned_to.isnot(None)
-            )
-        ).all()
+        result = await run_blocking(
+            OrderService.optimize_assignments, db, current_user.organization_id, max_load
+        )
         
-        if not active_orders:
+        if not result["total_active_orders"]:
             return {
                 "message": "No active assigned orders to optimize",
                 "optimizations": []
             }
         
-        optimizations = []
-        
-        for order in active_orders:
-            # Find potentially better executor
-            current_executor = db.query(User).filter(User.id == order.assigned_to).first()
-            if not current_executor:
-                continue
-            
-            # Calculate current executor score
-            current_score = OrderService._calculate_executor_score(
-                db, current_executor, order.order_type, 
-                [UserRole.STOREKEEPER, UserRole.MANAGER, UserRole.TECHNICAL_STAFF]
-            )
-            
-            # Find best available executor
-            best_executor = OrderService._auto_assign_best_executor(
-                db, current_user.organization_id, order.order_type
-            )
-            
-            if best_executor and best_executor.id != current_executor.id:
-                best_score = OrderService._calculate_executor_score(
-                    db, best_executor, order.order_type,
-                    [UserRole.STOREKEEPER, UserRole.MANAGER, UserRole.TECHNICAL_STAFF]
-                )
-                
-                # Only suggest if improvement is significant (>20% better)
-                improvement = ((best_score - current_score) / current_score * 100) if current_score > 0 else 0
-                
-                if improvement > 20:
-                    optimizations.append({
-                        "order_id": str(order.id),
-                        "order_number": order.order_number,
-                        "current_executor": {
-                            "id": str(current_executor.id),
-                            "name": f"{current_executor.first_name} {current_executor.last_name}",
-                            "score": round(current_score, 2)
-                        },
-                        "suggested_executor": {
-                            "id": str(best_executor.id),
-                            "name": f"{best_executor.first_name} {best_executor.last_name}",
-                            "score": round(best_score, 2)
-                        },
-                        "improvement_percentage": round(improvement, 2),
-                        "recommendation": "Consider reassigning for better efficiency"
-                    })
-        
         return {
-            "message": f"Found {len(optimizations)} optimization opportunities",
-            "total_active_orders": len(active_orders),
-            "optimization_count": len(optimizations),
-            "optimizations": sorted(optimizations, key=lambda x: x["improvement_percentage"], reverse=True)
+            "message": f"Found {len(result['optimizations'])} optimization opportunities",
+            "total_active_orders": result["total_active_orders"],
+            "optimization_count": len(result["optimizations"]),
+            "optimizations": result["optimizations"],
+            "projected_workload": result["projected_workload"],
+            "unplaced_count": result["unplaced_count"]
         }
         
     except Exception as e:
@@ -1,5 +1,5 @@
 # backend/routers/organization.py
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
@@ -12,13 +12,16 @@ from models.extended_models import Property, Rental, Client, Task, TaskStatus, R
 from schemas.admin import UserResponse, UserCreate, UserUpdate
 from schemas.auth import UserResponse as AuthUserResponse
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user, require_role
+from services.principal_cache_service import Principal, PrincipalCacheService
+from utils.dependencies import get_current_active_user, require_role, require_principal_role
 
 # Создаем роутер для администраторов организации
 router = APIRouter(prefix="/api/organization", tags=["Organization Management"])
 
 # Зависимость для проверки прав администратора организации
 get_org_admin = require_role(UserRole.ADMIN, UserRole.SYSTEM_OWNER)
+# Для операций, которым достаточно id, роли и организации (без загрузки User)
+get_org_admin_principal = require_principal_role(UserRole.ADMIN, UserRole.SYSTEM_OWNER)
 
 
 @router.get("/info")
@@ -82,7 +85,7 @@ async def get_organization_users(
     role: Optional[UserRole] = None,
     status: Optional[UserStatus] = None,
     search: Optional[str] = None,
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Получить список сотрудников организации"""
@@ -199,7 +202,7 @@ async def create_organization_user(
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_organization_user(
     user_id: uuid.UUID,
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Получить информацию о сотруднике"""
@@ -225,7 +228,7 @@ async def get_organization_user(
 async def update_organization_user(
     user_id: uuid.UUID,
     user_data: UserUpdate,
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить сотрудника"""
@@ -280,6 +283,9 @@ async def update_organization_user(
     db.commit()
     db.refresh(user)
     
+    # Роль и статус кэшируются в снимке пользователя
+    PrincipalCacheService.invalidate_user(user.id)
+    
     # Логируем действие
     AuthService.log_user_action(
         db=db,
@@ -297,7 +303,7 @@ async def update_organization_user(
 @router.delete("/users/{user_id}")
 async def delete_organization_user(
     user_id: uuid.UUID,
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Удалить сотрудника"""
@@ -355,76 +361,32 @@ async def delete_organization_user(
     # Удаляем пользователя
     db.delete(user)
     db.commit()
+    PrincipalCacheService.invalidate_user(user_id)
     
     return {"message": f"User '{user.email}' deleted successfully"}
 
 
 @router.get("/dashboard/statistics")
 async def get_dashboard_statistics(
+    fresh: bool = Query(False, description="Пересчитать сводку, не используя снимок"),
     current_user: User = Depends(get_org_admin),
     db: Session = Depends(get_db)
 ):
     """Получить статистику для дашборда администратора"""
     
-    from services.reports_service import ReportsService
+    from services.dashboard_snapshot_service import DashboardSnapshotService
     
-    # Получаем общую статистику дашборда
-    dashboard_stats = ReportsService.generate_dashboard_summary(
+    # Сводка из предрассчитанного снимка (пересчитывается фоновым сервисом)
+    dashboard_stats, snapshot = DashboardSnapshotService.get_dashboard_summary(
         db=db,
         organization_id=current_user.organization_id,
-        user_role=current_user.role
+        user_role=current_user.role,
+        fresh=fresh
     )
     
-    # Добавляем специфичную для админа информацию
-    today = datetime.now(timezone.utc)
-    
-    # Статистика по сотрудникам
-    staff_stats = {}
-    for role in UserRole:
-        if role != UserRole.SYSTEM_OWNER:
-            count = db.query(User).filter(
-                and_(
-                    User.organization_id == current_user.organization_id,
-                    User.role == role,
-                    User.status == UserStatus.ACTIVE
-                )
-            ).count()
-            staff_stats[role.value] = count
-    
-    # Задачи требующие внимания
-    pending_tasks = db.query(Task).filter(
-        and_(
-            Task.organization_id == current_user.organization_id,
-            Task.status == TaskStatus.PENDING
-        )
-    ).count()
-    
-    overdue_tasks = db.query(Task).filter(
-        and_(
-            Task.organization_id == current_user.organization_id,
-            Task.due_date < today,
-            Task.status.in_([TaskStatus.PENDING, TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-        )
-    ).count()
-    
-    # Заказы требующие внимания
-    pending_orders = db.query(RoomOrder).filter(
-        and_(
-            RoomOrder.organization_id == current_user.organization_id,
-            RoomOrder.status == "pending"
-        )
-    ).count()
-    
     # Добавляем админскую информацию
     dashboard_stats["admin_specific"] = {
-        "staff_by_role": staff_stats,
-        "tasks_attention": {
-            "pending_tasks": pending_tasks,
-            "overdue_tasks": overdue_tasks
-        },
-        "orders_attention": {
-            "pending_orders": pending_orders
-        },
+        **snapshot.data["admin"],
         "organization_health": {
             "subscription_status": current_user.organization.status.value,
             "user_limit_usage": f"{dashboard_stats['organization_stats']['total_staff']}/{current_user.organization.max_users}",
@@ -439,7 +401,7 @@ async def get_dashboard_statistics(
 async def get_user_performance(
     user_id: uuid.UUID,
     period_days: int = Query(30, ge=1, le=365),
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику производительности сотрудника"""
@@ -504,7 +466,7 @@ async def get_user_performance(
 
 @router.get("/users/roles/available")
 async def get_available_roles(
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Получить список доступных ролей для назначения"""
@@ -544,7 +506,7 @@ def _get_role_description(role: UserRole) -> str:
 @router.post("/users/{user_id}/reset-password")
 async def reset_user_password(
     user_id: uuid.UUID,
-    current_user: User = Depends(get_org_admin),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Сбросить пароль сотрудника"""
@@ -595,15 +557,20 @@ async def reset_user_password(
 @router.get("/audit/recent-actions")
 async def get_recent_audit_actions(
     limit: int = Query(50, ge=1, le=500),
-    current_user: User = Depends(get_org_admin),
+    days: int = Query(30, ge=1, le=365),
+    current_user: Principal = Depends(get_org_admin_principal),
     db: Session = Depends(get_db)
 ):
     """Получить последние действия в организации"""
     
     from models.models import UserAction
     
+    # Ограничение по дате отсекает старые месячные секции журнала
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    
     actions = db.query(UserAction).filter(
-        UserAction.organization_id == current_user.organization_id
+        UserAction.organization_id == current_user.organization_id,
+        UserAction.created_at >= since
     ).order_by(desc(UserAction.created_at)).limit(limit).all()
     
     return {
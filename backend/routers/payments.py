@@ -8,7 +8,7 @@ import uuid
 from models.database import get_db
 from models.extended_models import Rental
 from models.payment_models import Payment, PaymentStatus, PaymentType
-from models.models import User, UserRole
+from models.models import UserRole
 from schemas.payment import (
     PaymentCreate, PaymentResponse, PaymentStatusResponse, 
     PaymentHistoryResponse, ProcessPaymentRequest, CheckInPaymentRequest,
@@ -16,8 +16,10 @@ from schemas.payment import (
 )
 from services.payment_service import PaymentService
 from services.rental_service import RentalService
+from services.report_facts_service import ReportFactsService
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 from sqlalchemy import and_
 
 router = APIRouter(prefix="/api/rentals", tags=["Rental Payments"])
@@ -26,7 +28,7 @@ router = APIRouter(prefix="/api/rentals", tags=["Rental Payments"])
 async def process_checkin_payment(
     rental_id: str,
     payment_data: CheckInPaymentRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обработка платежа при заселении"""
@@ -114,7 +116,7 @@ async def process_checkin_payment(
 async def add_payment_to_rental(
     rental_id: str,
     payment_request: ProcessPaymentRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Добавление платежа к аренде"""
@@ -202,6 +204,9 @@ async def add_payment_to_rental(
         db.commit()
         db.refresh(payment)
         
+        if payment_request.auto_complete:
+            ReportFactsService.sync_rental(db, rental)
+        
         print(f"🔍 Payment committed successfully: {payment.id}")
         
         # Логируем действие
@@ -235,7 +240,7 @@ async def add_payment_to_rental(
 async def check_in_with_payment(
     rental_id: str,
     checkin_data: CheckInWithPaymentRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Заселение с поддержкой платежа"""
@@ -343,7 +348,7 @@ async def check_in_with_payment(
 @router.get("/{rental_id}/payments", response_model=PaymentHistoryResponse)
 async def get_rental_payment_history(
     rental_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получение истории платежей по аренде"""
@@ -379,7 +384,7 @@ async def get_rental_payment_history(
 @router.get("/{rental_id}/payment-status", response_model=PaymentStatusResponse)
 async def get_rental_payment_status(
     rental_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получение статуса оплаты аренды"""
@@ -418,7 +423,7 @@ async def get_rental_payment_status(
 async def complete_payment(
     rental_id: str,
     payment_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Завершить платеж вручную"""
@@ -484,7 +489,7 @@ async def cancel_payment(
     rental_id: str,
     payment_id: str,
     reason: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отменить платеж"""
@@ -551,7 +556,7 @@ async def create_refund(
     rental_id: str,
     refund_amount: float,
     reason: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать возврат средств"""
@@ -618,7 +623,7 @@ async def create_refund(
 @router.get("/{rental_id}/payments/summary")
 async def get_payment_summary(
     rental_id: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить краткую сводку по платежам"""
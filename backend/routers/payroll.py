@@ -11,7 +11,8 @@ from models.extended_models import Payroll, PayrollType, User, Task, TaskStatus
 from schemas.payroll import PayrollCreate, PayrollUpdate, PayrollResponse
 from models.models import User, UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 import uuid
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc
@@ -20,7 +21,6 @@ from models.database import get_db
 from schemas.payroll import PayrollCreate, PayrollUpdate, PayrollResponse
 from models.extended_models import Payroll, PayrollType
 from models.models import User, UserRole
-from utils.dependencies import get_current_active_user
 
 
 router = APIRouter(prefix="/api/payroll", tags=["Payroll"])
@@ -35,7 +35,7 @@ async def get_payrolls(
     period_start: Optional[datetime] = None,
     period_end: Optional[datetime] = None,
     is_paid: Optional[bool] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить список зарплатных ведомостей"""
@@ -82,7 +82,7 @@ async def get_payrolls(
 @router.post("/pay", response_model=PayrollResponse)
 async def create_payroll(
     payroll_data: PayrollCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать зарплатную ведомость"""
@@ -174,7 +174,7 @@ async def create_payroll(
 async def update_payroll(
     payroll_id: uuid.UUID,
     payroll_data: PayrollUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить зарплатную ведомость"""
@@ -242,7 +242,7 @@ async def update_payroll(
 async def mark_payroll_paid(
     payroll_id: uuid.UUID,
     payment_method: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отметить зарплату как выплаченную"""
@@ -302,7 +302,7 @@ async def calculate_monthly_payroll(
     year: int = Query(..., ge=2020, le=2030),
     month: int = Query(..., ge=1, le=12),
     user_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Рассчитать зарплату за месяц"""
@@ -458,7 +458,7 @@ async def calculate_monthly_payroll(
 async def get_payroll_statistics(
     year: int = Query(..., ge=2020, le=2030),
     month: Optional[int] = Query(None, ge=1, le=12),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по зарплате"""
@@ -557,7 +557,7 @@ async def export_payroll_data(
     format: str,
     year: int = Query(..., ge=2020, le=2030),
     month: Optional[int] = Query(None, ge=1, le=12),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспорт данных зарплаты"""
@@ -587,81 +587,29 @@ async def export_payroll_data(
         period_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
         filename = f"payroll_{year}.{format}"
     
-    # Получаем данные
-    payrolls = db.query(Payroll).filter(
-        and_(
-            Payroll.organization_id == current_user.organization_id,
-            Payroll.period_start >= period_start,
-            Payroll.period_end <= period_end
-        )
-    ).order_by(Payroll.period_start, Payroll.user_id).all()
-    
-    if format == "xlsx":
-        from services.reports_service import ReportsService
-        excel_data = ReportsService.export_data_to_excel(
-            db=db,
-            organization_id=current_user.organization_id,
-            data_type="payroll",
-            start_date=period_start,
-            end_date=period_end
-        )
-        
-        return Response(
-            content=excel_data,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+    # Выгрузка формируется потоково: строки читаются порциями, файл отдается по мере готовности
+    from services.reports_service import ReportsService
+    from utils.streaming_export import streaming_file_response, XLSX_MEDIA_TYPE, CSV_MEDIA_TYPE
     
-    elif format == "csv":
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Заголовки
-        writer.writerow([
-            'Сотрудник', 'Период начала', 'Период окончания', 'Тип оплаты',
-            'Базовая ставка', 'Часы', 'Задач выполнено', 'К доплате за задачи',
-            'Премия', 'Чаевые', 'Другой доход', 'Вычеты', 'Налоги',
-            'Брутто', 'Нетто', 'Выплачено'
-        ])
-        
-        # Данные
-        for payroll in payrolls:
-            writer.writerow([
-                f"{payroll.user.first_name} {payroll.user.last_name}" if payroll.user else "",
-                payroll.period_start.strftime('%d.%m.%Y'),
-                payroll.period_end.strftime('%d.%m.%Y'),
-                payroll.payroll_type.value,
-                payroll.base_rate or 0,
-                payroll.hours_worked,
-                payroll.tasks_completed,
-                payroll.tasks_payment,
-                payroll.bonus,
-                payroll.tips,
-                payroll.other_income,
-                payroll.deductions,
-                payroll.taxes,
-                payroll.gross_amount,
-                payroll.net_amount,
-                "Да" if payroll.is_paid else "Нет"
-            ])
-        
-        output.seek(0)
-        content = output.getvalue().encode('utf-8-sig')  # BOM для правильного отображения в Excel
-        
-        return Response(
-            content=content,
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+    chunks = ReportsService.stream_data_export(
+        organization_id=current_user.organization_id,
+        data_type="payroll",
+        start_date=period_start,
+        end_date=period_end,
+        format=format
+    )
+    
+    return streaming_file_response(
+        chunks,
+        filename,
+        XLSX_MEDIA_TYPE if format == "xlsx" else CSV_MEDIA_TYPE
+    )
     
 
 @router.get("/payID/{payroll_id}", response_model=PayrollResponse)
 async def get_payroll(
     payroll_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить зарплатную ведомость"""
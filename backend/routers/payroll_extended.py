@@ -27,7 +27,8 @@ from schemas.payroll_extended import (
 from services.payroll_extended_service import PayrollExtendedService
 
 # ИСПРАВЛЕННЫЕ ЗАВИСИМОСТИ
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 # ПРАВИЛЬНОЕ СОЗДАНИЕ РОУТЕРА
 router = APIRouter(prefix="/api/payroll", tags=["Enhanced Payroll"])
 
@@ -36,7 +37,7 @@ router = APIRouter(prefix="/api/payroll", tags=["Enhanced Payroll"])
 @router.post("/templates", response_model=PayrollTemplateResponse)
 async def create_payroll_template(
     template_data: PayrollTemplateCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать шаблон зарплаты для сотрудника
@@ -100,7 +101,7 @@ async def create_payroll_template(
 async def get_payroll_templates(
     user_id: Optional[str] = None,
     status: Optional[PayrollTemplateStatus] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить шаблоны зарплат"""
@@ -121,7 +122,7 @@ async def get_payroll_templates(
 async def update_payroll_template(
     template_id: uuid.UUID,
     template_data: PayrollTemplateUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить шаблон зарплаты"""
@@ -154,7 +155,7 @@ async def update_payroll_template(
 @router.delete("/templates/{template_id}")
 async def deactivate_payroll_template(
     template_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Деактивировать шаблон зарплаты"""
@@ -187,7 +188,8 @@ async def auto_generate_payrolls(
     year: int = Query(..., ge=2020, le=2030),
     month: int = Query(..., ge=1, le=12),
     force_recreate: bool = Query(False, description="Пересоздать существующие зарплаты"),
-    current_user: User = Depends(get_current_active_user),
+    dry_run: bool = Query(False, description="Только рассчитать, без сохранения"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Автоматическое создание зарплат на основе шаблонов
@@ -203,51 +205,25 @@ async def auto_generate_payrolls(
     if current_user.role not in [UserRole.ADMIN, UserRole.ACCOUNTANT]:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
-    if force_recreate:
-        # Удаляем существующие неоплаченные зарплаты за период
-        period_start = datetime(year, month, 1, tzinfo=timezone.utc)
-        if month == 12:
-            period_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
-        else:
-            period_end = datetime(year, month + 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
-        
-        existing_payrolls = db.query(Payroll).filter(
-            and_(
-                Payroll.organization_id == current_user.organization_id,
-                Payroll.period_start == period_start,
-                Payroll.period_end == period_end,
-                Payroll.is_paid == False
-            )
-        ).all()
-        
-        for payroll in existing_payrolls:
-            # Сбрасываем операции как неприменённые
-            for operation in payroll.operations:
-                operation.is_applied = False
-                operation.applied_at = None
-                operation.payroll_id = None
-            db.delete(payroll)
-    
-    payrolls = PayrollExtendedService.auto_generate_monthly_payrolls(
+    result = PayrollExtendedService.generate_monthly_payrolls_bulk(
         db=db,
         organization_id=current_user.organization_id,
         year=year,
-        month=month
+        month=month,
+        dry_run=dry_run,
+        replace_unpaid=force_recreate
     )
     
     return {
-        "message": f"Generated {len(payrolls)} payroll entries",
-        "payrolls_created": len(payrolls),
-        "period": f"{year}-{month:02d}",
-        "details": [
-            {
-                "payroll_id": str(p.id),
-                "user_name": f"{p.user.first_name} {p.user.last_name}",
-                "gross_amount": p.gross_amount,
-                "net_amount": p.net_amount
-            }
-            for p in payrolls
-        ]
+        "message": (
+            f"Preview of {len(result['payrolls'])} payroll entries" if dry_run
+            else f"Generated {result['payrolls_created']} payroll entries"
+        ),
+        "payrolls_created": result["payrolls_created"],
+        "period": result["period"],
+        "dry_run": dry_run,
+        "generation_ms": result["generation_ms"],
+        "details": result["payrolls"]
     }
 
 # ========== ОПЕРАЦИИ С ЗАРПЛАТОЙ ==========
@@ -255,7 +231,7 @@ async def auto_generate_payrolls(
 @router.post("/operations", response_model=PayrollOperationResponse)
 async def add_payroll_operation(
     operation_data: PayrollOperationCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Добавить операцию (премию, штраф, надбавку и т.д.)
@@ -318,7 +294,7 @@ async def get_payroll_operations(
     is_applied: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить операции с зарплатой"""
@@ -341,7 +317,7 @@ async def get_payroll_operations(
 async def cancel_payroll_operation(
     operation_id: uuid.UUID,
     reason: str = Query(..., min_length=1),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отменить операцию с зарплатой (если ещё не применена)"""
@@ -394,7 +370,7 @@ async def add_bonus(
     amount: float = Query(..., gt=0),
     reason: str = Query(..., min_length=1),
     apply_to_current_month: bool = Query(True),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Быстро добавить премию сотруднику"""
@@ -439,7 +415,7 @@ async def add_penalty(
     amount: float = Query(..., gt=0),
     reason: str = Query(..., min_length=1),
     apply_to_current_month: bool = Query(True),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Быстро добавить штраф сотруднику"""
@@ -484,7 +460,7 @@ async def add_overtime(
     hours: float = Query(..., gt=0, le=100),
     hourly_rate: Optional[float] = Query(None, gt=0),
     description: str = Query("Сверхурочная работа"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Добавить сверхурочные часы"""
@@ -551,7 +527,7 @@ async def add_overtime(
 async def get_user_payroll_summary(
     user_id: str,
     months: int = Query(6, ge=1, le=24),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить сводку по зарплате пользователя за несколько месяцев"""
@@ -638,7 +614,7 @@ async def get_user_payroll_summary(
 @router.post("/recalculate/{payroll_id}")
 async def recalculate_payroll(
     payroll_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Пересчитать зарплату с учётом всех операций"""
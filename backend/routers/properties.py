@@ -3,16 +3,18 @@ from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import desc, and_
 import uuid
 
-from models.database import get_db
+from models.database import get_db, get_async_db
 from models.extended_models import Property, PropertyStatus, PropertyType, Task, TaskType, TaskStatus
 from schemas.property import PropertyCreate, PropertyUpdate, PropertyResponse
 from schemas.task import TaskCreate, TaskResponse
 from models.models import User, UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user, require_scope
+from utils.dependencies import get_current_active_user, get_current_principal, require_scope
+from services.principal_cache_service import Principal
 from services.property_service import PropertyService
 from services.task_service import TaskService
 
@@ -26,8 +28,8 @@ async def get_properties(
     status: Optional[PropertyStatus] = None,
     property_type: Optional[PropertyType] = None,
     search: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить список помещений организации"""
     
@@ -38,21 +40,15 @@ async def get_properties(
             detail="Insufficient permissions to view properties"
         )
     
-    query = db.query(Property).filter(Property.organization_id == current_user.organization_id)
-    
-    # Фильтры
-    if status:
-        query = query.filter(Property.status == status)
-    if property_type:
-        query = query.filter(Property.property_type == property_type)
-    if search:
-        query = query.filter(
-            Property.name.ilike(f"%{search}%") |
-            Property.number.ilike(f"%{search}%") |
-            Property.address.ilike(f"%{search}%")
-        )
-    
-    properties = query.order_by(Property.number).offset(skip).limit(limit).all()
+    properties = await PropertyService.get_properties_async(
+        db=db,
+        organization_id=current_user.organization_id,
+        skip=skip,
+        limit=limit,
+        status=status,
+        property_type=property_type,
+        search=search
+    )
     
     return properties
 
@@ -127,10 +123,48 @@ async def create_property(
     return property_obj
 
 
+@router.get("/availability/search")
+async def search_available_properties(
+    start_date: datetime,
+    end_date: datetime,
+    guests: Optional[int] = Query(None, ge=1),
+    property_type: Optional[PropertyType] = None,
+    floor: Optional[int] = None,
+    building: Optional[str] = None,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Найти свободные помещения на период"""
+    
+    if end_date <= start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="End date must be after start date"
+        )
+    
+    properties = PropertyService.search_available(
+        db=db,
+        organization_id=current_user.organization_id,
+        start_date=start_date,
+        end_date=end_date,
+        guests=guests,
+        property_type=property_type,
+        floor=floor,
+        building=building
+    )
+    
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "total": len(properties),
+        "properties": properties
+    }
+
+
 @router.get("/{property_id}", response_model=PropertyResponse)
 async def get_property(
     property_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить информацию о помещении"""
@@ -149,7 +183,7 @@ async def get_property(
 async def update_property(
     property_id: uuid.UUID,
     property_data: PropertyUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить помещение"""
@@ -213,7 +247,7 @@ async def update_property(
 @router.delete("/{property_id}")
 async def delete_property(
     property_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Удалить помещение"""
@@ -271,7 +305,7 @@ async def delete_property(
 async def update_property_status(
     property_id: uuid.UUID,
     new_status: PropertyStatus,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Изменить статус помещения"""
@@ -336,7 +370,7 @@ async def update_property_status(
 async def get_property_tasks(
     property_id: uuid.UUID,
     status: Optional[TaskStatus] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить задачи для помещения"""
@@ -362,7 +396,7 @@ async def get_property_tasks(
 async def create_property_task(
     property_id: uuid.UUID,
     task_data: TaskCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать задачу для помещения"""
@@ -397,7 +431,7 @@ async def check_property_availability(
     property_id: uuid.UUID,
     start_date: datetime,
     end_date: datetime,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Проверить доступность помещения на период"""
@@ -430,7 +464,7 @@ async def check_property_availability(
 async def get_property_statistics(
     property_id: uuid.UUID,
     period_days: int = Query(30, ge=1, le=365),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по помещению"""
@@ -458,7 +492,7 @@ async def get_property_statistics(
 
 @router.post("/bulk-release-from-cleaning")
 async def bulk_release_from_cleaning(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Массово освободить помещения из уборки (если нет активных задач)"""
@@ -3,17 +3,20 @@ from datetime import datetime, timezone
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import desc, and_, or_
 import uuid
 
-from models.database import get_db
+from models.database import get_db, get_async_db
 from models.extended_models import Rental, Property, Client, PropertyStatus, RentalType
 from schemas.rental import RentalCreate, RentalUpdate, RentalResponse
-from models.models import User, UserRole
+from models.models import UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 from services.rental_service import RentalService
 from services.property_service import PropertyService
+from services.report_facts_service import ReportFactsService
 from pydantic import BaseModel, EmailStr, Field, validator
 from schemas.payment import (
     PaymentResponse, ProcessPaymentRequest,
@@ -42,38 +45,29 @@ async def get_rentals(
     rental_type: Optional[RentalType] = None,
     property_id: Optional[str] = None,
     client_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить список аренд"""
     
-    query = db.query(Rental).filter(Rental.organization_id == current_user.organization_id)
-    
-    # Фильтры
-    if is_active is not None:
-        query = query.filter(Rental.is_active == is_active)
-    if rental_type:
-        query = query.filter(Rental.rental_type == rental_type)
-    if property_id:
-        query = query.filter(Rental.property_id == uuid.UUID(property_id))
-    if client_id:
-        query = query.filter(Rental.client_id == uuid.UUID(client_id))
-    
-    # Подгружаем связанные объекты
-    query = query.options(
-        selectinload(Rental.property),
-        selectinload(Rental.client)
+    rentals = await RentalService.get_rentals_async(
+        db=db,
+        organization_id=current_user.organization_id,
+        skip=skip,
+        limit=limit,
+        is_active=is_active,
+        rental_type=rental_type,
+        property_id=uuid.UUID(property_id) if property_id else None,
+        client_id=uuid.UUID(client_id) if client_id else None
     )
     
-    rentals = query.order_by(desc(Rental.created_at)).offset(skip).limit(limit).all()
-    
     return rentals
 
 
 @router.post("", response_model=RentalResponse)
 async def create_rental(
     rental_data: RentalCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать новую аренду"""
@@ -129,7 +123,7 @@ async def create_rental(
 @router.get("/{rental_id}", response_model=RentalResponse)
 async def get_rental(
     rental_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить информацию об аренде"""
@@ -148,7 +142,7 @@ async def get_rental(
 async def update_rental(
     rental_id: uuid.UUID,
     rental_data: RentalUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить аренду"""
@@ -186,7 +180,7 @@ async def update_rental(
 @router.post("/{rental_id}/check-in")
 async def check_in_rental(
     rental_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Заселить клиента"""
@@ -219,7 +213,7 @@ async def check_in_rental(
 @router.post("/{rental_id}/check-out")
 async def check_out_rental(
     rental_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Выселить клиента"""
@@ -258,7 +252,7 @@ async def check_out_rental(
 async def extend_rental_with_payment(
     rental_id: uuid.UUID,
     extension_data: RentalExtensionRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Продлить аренду с оплатой"""
@@ -367,7 +361,7 @@ async def pay_extension_payment(
     rental_id: uuid.UUID,
     payment_id: uuid.UUID,
     payment_data: ProcessPaymentRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Оплатить платеж за продление аренды"""
@@ -411,6 +405,9 @@ async def pay_extension_payment(
         
         db.commit()
         
+        if rental:
+            ReportFactsService.sync_rental(db, rental)
+        
         # Логируем действие
         AuthService.log_user_action(
             db=db,
@@ -443,7 +440,7 @@ async def pay_extension_payment(
 async def cancel_rental(
     rental_id: uuid.UUID,
     reason: str = Query(..., min_length=1),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отменить аренду"""
@@ -16,7 +16,9 @@ from schemas.reports import (
     FinancialSummaryReport, PropertyOccupancyReport, 
     EmployeePerformanceReport, ClientAnalyticsReport
 )
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_active_user, get_current_principal
+from services.principal_cache_service import Principal
+from utils.executor import run_blocking
 from services.auth_service import AuthService
 from services.reports_service import ReportsService
 from models.extended_models import Payroll,Task,TaskStatus
@@ -24,6 +26,7 @@ from models.models import Organization
 from sqlalchemy import and_, desc, or_ 
 
 from services.comprehensive_report_service import ComprehensiveReportService
+from services.report_facts_service import ReportFactsService
 from schemas.comprehensive_report import (
     ComprehensiveReportRequest, ComprehensiveReportResponse,
     AdministrativeExpense, ReportFormat
@@ -38,7 +41,7 @@ router = APIRouter(prefix="/api/reports", tags=["Reports"])
 async def get_financial_summary(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить финансовый отчет"""
@@ -49,7 +52,8 @@ async def get_financial_summary(
             detail="Insufficient permissions to view financial reports"
         )
     
-    report = ReportsService.generate_financial_summary(
+    report = await run_blocking(
+        ReportsService.generate_financial_summary,
         db=db,
         organization_id=current_user.organization_id,
         start_date=start_date,
@@ -76,7 +80,7 @@ async def get_property_occupancy(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
     property_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить отчет по загруженности помещений"""
@@ -89,7 +93,8 @@ async def get_property_occupancy(
     
     property_uuid = uuid.UUID(property_id) if property_id else None
     
-    report = ReportsService.generate_property_occupancy_report(
+    report = await run_blocking(
+        ReportsService.generate_property_occupancy_report,
         db=db,
         organization_id=current_user.organization_id,
         start_date=start_date,
@@ -106,7 +111,7 @@ async def get_employee_performance(
     end_date: datetime = Query(...),
     role: Optional[UserRole] = None,
     user_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить отчет по производительности сотрудников"""
@@ -127,7 +132,8 @@ async def get_employee_performance(
     
     user_uuid = uuid.UUID(user_id) if user_id else None
     
-    report = ReportsService.generate_employee_performance_report(
+    report = await run_blocking(
+        ReportsService.generate_employee_performance_report,
         db=db,
         organization_id=current_user.organization_id,
         start_date=start_date,
@@ -143,7 +149,7 @@ async def get_employee_performance(
 async def get_client_analytics(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить аналитику по клиентам"""
@@ -154,7 +160,8 @@ async def get_client_analytics(
             detail="Insufficient permissions to view client analytics"
         )
     
-    report = ReportsService.generate_client_analytics_report(
+    report = await run_blocking(
+        ReportsService.generate_client_analytics_report,
         db=db,
         organization_id=current_user.organization_id,
         start_date=start_date,
@@ -168,7 +175,7 @@ async def get_client_analytics(
 async def get_my_payroll(
     period_start: Optional[datetime] = None,
     period_end: Optional[datetime] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить свою зарплатную ведомость"""
@@ -220,7 +227,8 @@ async def export_financial_summary(
     
     try:
         # Генерируем отчет
-        report = ReportsService.generate_financial_summary(
+        report = await run_blocking(
+            ReportsService.generate_financial_summary,
             db=db,
             organization_id=current_user.organization_id,
             start_date=start_date,
@@ -324,7 +332,8 @@ async def export_financial_summary(
             organization = db.query(Organization).get(current_user.organization_id)
             organization_name = organization.name if organization else "Неизвестная организация"
 
-            pdf_content = ReportsService.generate_financial_pdf(
+            pdf_content = await run_blocking(
+                ReportsService.generate_financial_pdf,
                 report=report,
                 start_date=start_date,
                 end_date=end_date,
@@ -351,7 +360,7 @@ async def export_property_occupancy(
     end_date: datetime = Query(...),
     property_id: Optional[str] = None,
     format: str = Query("xlsx", regex="^(xlsx|pdf)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать отчет по загруженности помещений"""
@@ -366,7 +375,8 @@ async def export_property_occupancy(
         property_uuid = uuid.UUID(property_id) if property_id else None
         
         # Генерируем отчет
-        report = ReportsService.generate_property_occupancy_report(
+        report = await run_blocking(
+            ReportsService.generate_property_occupancy_report,
             db=db,
             organization_id=current_user.organization_id,
             start_date=start_date,
@@ -433,7 +443,7 @@ async def export_client_analytics(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
     format: str = Query("xlsx", regex="^(xlsx|pdf)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать клиентскую аналитику"""
@@ -446,7 +456,8 @@ async def export_client_analytics(
     
     try:
         # Генерируем отчет
-        report = ReportsService.generate_client_analytics_report(
+        report = await run_blocking(
+            ReportsService.generate_client_analytics_report,
             db=db,
             organization_id=current_user.organization_id,
             start_date=start_date,
@@ -547,7 +558,7 @@ async def export_employee_performance(
     role: Optional[UserRole] = None,
     user_id: Optional[str] = None,
     format: str = Query("xlsx", regex="^(xlsx|pdf)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать отчет по производительности сотрудников"""
@@ -562,7 +573,8 @@ async def export_employee_performance(
         user_uuid = uuid.UUID(user_id) if user_id else None
         
         # Генерируем отчет
-        report = ReportsService.generate_employee_performance_report(
+        report = await run_blocking(
+            ReportsService.generate_employee_performance_report,
             db=db,
             organization_id=current_user.organization_id,
             start_date=start_date,
@@ -625,7 +637,7 @@ async def export_employee_performance(
 async def debug_report_data_sources(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отладочная информация о данных для отчетов"""
@@ -651,7 +663,7 @@ async def debug_employee_earnings(
     user_id: str,
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отладочная информация о заработке конкретного сотрудника"""
@@ -759,7 +771,7 @@ async def export_general_statistics(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
     format: str = Query("xlsx", regex="^(xlsx|pdf)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать общую статистику"""
@@ -772,22 +784,26 @@ async def export_general_statistics(
     
     try:
         # Собираем все данные для общей статистики
-        financial_report = ReportsService.generate_financial_summary(
+        financial_report = await run_blocking(
+            ReportsService.generate_financial_summary,
             db=db, organization_id=current_user.organization_id,
             start_date=start_date, end_date=end_date
         )
         
-        occupancy_report = ReportsService.generate_property_occupancy_report(
+        occupancy_report = await run_blocking(
+            ReportsService.generate_property_occupancy_report,
             db=db, organization_id=current_user.organization_id,
             start_date=start_date, end_date=end_date
         )
         
-        client_report = ReportsService.generate_client_analytics_report(
+        client_report = await run_blocking(
+            ReportsService.generate_client_analytics_report,
             db=db, organization_id=current_user.organization_id,
             start_date=start_date, end_date=end_date
         )
         
-        employee_report = ReportsService.generate_employee_performance_report(
+        employee_report = await run_blocking(
+            ReportsService.generate_employee_performance_report,
             db=db, organization_id=current_user.organization_id,
             start_date=start_date, end_date=end_date
         )
@@ -931,7 +947,7 @@ async def export_comparative_analysis(
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
     format: str = Query("xlsx", regex="^(xlsx|pdf)$"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать сравнительную аналитику"""
@@ -944,7 +960,8 @@ async def export_comparative_analysis(
     
     try:
         # Текущий период
-        current_report = ReportsService.generate_financial_summary(
+        current_report = await run_blocking(
+            ReportsService.generate_financial_summary,
             db=db, organization_id=current_user.organization_id,
             start_date=start_date, end_date=end_date
         )
@@ -954,7 +971,8 @@ async def export_comparative_analysis(
         prev_end_date = start_date - timedelta(days=1)
         prev_start_date = prev_end_date - period_duration
         
-        previous_report = ReportsService.generate_financial_summary(
+        previous_report = await run_blocking(
+            ReportsService.generate_financial_summary,
             db=db, organization_id=current_user.organization_id,
             start_date=prev_start_date, end_date=prev_end_date
         )
@@ -1054,7 +1072,7 @@ async def test_earnings_strategies(
     user_id: str,
     start_date: datetime = Query(...),
     end_date: datetime = Query(...),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Тестирование разных стратегий расчета earnings"""
@@ -1098,7 +1116,7 @@ async def test_earnings_strategies(
 async def cleanup_duplicate_payrolls(
     user_id: str,
     dry_run: bool = Query(True, description="Только показать, что будет удалено"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Очистка дублирующих зарплат (ОСТОРОЖНО!)"""
@@ -1180,10 +1198,63 @@ async def cleanup_duplicate_payrolls(
     
 
 
+@router.post("/facts/rebuild")
+async def rebuild_report_facts(
+    start_date: Optional[datetime] = Query(None, description="Начало диапазона (по умолчанию 400 дней назад)"),
+    end_date: Optional[datetime] = Query(None, description="Конец диапазона (по умолчанию +365 дней)"),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Перестроить материализованные дневные показатели отчетов организации"""
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.SYSTEM_OWNER]:
+        raise HTTPException(status_code=403, detail="Only admins can rebuild report facts")
+    
+    result = await run_blocking(
+        ReportFactsService.rebuild_organization,
+        db,
+        current_user.organization_id,
+        start_date.date() if start_date else None,
+        end_date.date() if end_date else None
+    )
+    
+    AuthService.log_user_action(
+        db=db,
+        user_id=current_user.id,
+        action="report_facts_rebuilt",
+        organization_id=current_user.organization_id,
+        details=result
+    )
+    
+    return result
+
+
+@router.get("/facts/status")
+async def get_report_facts_status(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """Диапазон дат, покрытый материализованными показателями"""
+    
+    if current_user.role not in [UserRole.ADMIN, UserRole.ACCOUNTANT, UserRole.SYSTEM_OWNER]:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    
+    coverage = ReportFactsService.get_coverage(db, current_user.organization_id)
+    if not coverage:
+        return {"built": False}
+    
+    return {
+        "built": True,
+        "covered_from": coverage.covered_from.isoformat(),
+        "covered_to": coverage.covered_to.isoformat(),
+        "rebuilt_at": coverage.rebuilt_at.isoformat() if coverage.rebuilt_at else None
+    }
+
+
 @router.post("/comprehensive/generate", response_model=ComprehensiveReportResponse)
 async def generate_comprehensive_report_v2(
     request: ComprehensiveReportRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Генерировать полный комплексный отчет (v2)"""
@@ -1195,7 +1266,8 @@ async def generate_comprehensive_report_v2(
         )
     
     try:
-        report = ComprehensiveReportService.generate_comprehensive_report(
+        report = await run_blocking(
+            ComprehensiveReportService.generate_comprehensive_report,
             db=db,
             organization_id=current_user.organization_id,
             request=request
@@ -1231,7 +1303,7 @@ async def generate_comprehensive_report_v2(
 @router.post("/comprehensive/export")
 async def export_comprehensive_report_v2(
     request: ComprehensiveReportRequest,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Экспортировать полный отчет в файл (xlsx/xml)"""
@@ -1244,7 +1316,8 @@ async def export_comprehensive_report_v2(
     
     try:
         # Генерируем отчет
-        report = ComprehensiveReportService.generate_comprehensive_report(
+        report = await run_blocking(
+            ComprehensiveReportService.generate_comprehensive_report,
             db=db,
             organization_id=current_user.organization_id,
             request=request
@@ -1252,11 +1325,11 @@ async def export_comprehensive_report_v2(
         
         # Экспортируем в нужном формате
         if request.format == ReportFormat.XLSX:
-            file_content = ComprehensiveReportService.export_to_xlsx(report)
+            file_content = await run_blocking(ComprehensiveReportService.export_to_xlsx, report)
             media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             file_extension = "xlsx"
         elif request.format == ReportFormat.XML:
-            file_content = ComprehensiveReportService.export_to_xml(report)
+            file_content = await run_blocking(ComprehensiveReportService.export_to_xml, report)
             media_type = "application/xml"
             file_extension = "xml"
         else:
@@ -1311,7 +1384,7 @@ async def preview_comprehensive_report_data(
     start_date: datetime = Query(..., description="Дата начала периода"),
     end_date: datetime = Query(..., description="Дата окончания периода"),
     utility_bills_amount: float = Query(0, ge=0, description="Сумма коммунальных услуг"),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Предварительный просмотр данных для комплексного отчета"""
@@ -1333,7 +1406,8 @@ async def preview_comprehensive_report_data(
         )
         
         # Генерируем сокращенную версию отчета
-        report = ComprehensiveReportService.generate_comprehensive_report(
+        report = await run_blocking(
+            ComprehensiveReportService.generate_comprehensive_report,
             db=db,
             organization_id=current_user.organization_id,
             request=preview_request
@@ -1406,7 +1480,7 @@ async def preview_comprehensive_report_data(
 
 @router.get("/comprehensive/templates/expenses")
 async def get_administrative_expense_templates_v2(
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Получить расширенные шаблоны административных расходов"""
     
@@ -1,18 +1,23 @@
 # backend/routers/tasks.py
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import desc, and_, or_
 import uuid
 
-from models.database import get_db
-from models.extended_models import Task, TaskStatus, TaskType, TaskPriority, Property, User
+from models.database import get_db, get_async_db
+from models.extended_models import Task, TaskStatus, TaskType, TaskPriority, Property
 from schemas.task import TaskCreate, TaskUpdate, TaskResponse
-from models.models import User, UserRole
+from models.models import UserRole
 from services.auth_service import AuthService
-from utils.dependencies import get_current_active_user
+from utils.dependencies import get_current_principal
+from services.principal_cache_service import Principal
 from services.task_service import TaskService
+from services.change_feed_service import ChangeFeedService
+from services.assignment_service import AssignmentService
+from services.workload_index_service import WorkloadIndexService
 
 router = APIRouter(prefix="/api/tasks", tags=["Tasks"])
 
@@ -26,41 +31,30 @@ async def get_tasks(
     priority: Optional[TaskPriority] = None,
     property_id: Optional[str] = None,
     assigned_to: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить список задач"""
     
-    query = db.query(Task).filter(Task.organization_id == current_user.organization_id)
-    
     # Фильтры доступа в зависимости от роли
+    assignee_id = None
     if current_user.role in [UserRole.CLEANER, UserRole.TECHNICAL_STAFF, UserRole.STOREKEEPER]:
         # Сотрудники видят только свои задачи
-        query = query.filter(Task.assigned_to == current_user.id)
-    elif current_user.role == UserRole.MANAGER:
-        # Менеджеры видят все задачи, но не могут изменять системные
-        pass
-    
-    # Применяем фильтры
-    if status:
-        query = query.filter(Task.status == status)
-    if task_type:
-        query = query.filter(Task.task_type == task_type)
-    if priority:
-        query = query.filter(Task.priority == priority)
-    if property_id:
-        query = query.filter(Task.property_id == uuid.UUID(property_id))
-    if assigned_to and current_user.role in [UserRole.ADMIN, UserRole.MANAGER, UserRole.SYSTEM_OWNER]:
-        query = query.filter(Task.assigned_to == uuid.UUID(assigned_to))
-    
-    # Подгружаем связанные объекты
-    query = query.options(
-        selectinload(Task.property),
-        selectinload(Task.assignee),
-        selectinload(Task.creator)
-    )
+        assignee_id = current_user.id
+    elif assigned_to and current_user.role in [UserRole.ADMIN, UserRole.MANAGER, UserRole.SYSTEM_OWNER]:
+        assignee_id = uuid.UUID(assigned_to)
     
-    tasks = query.order_by(desc(Task.created_at)).offset(skip).limit(limit).all()
+    tasks = await TaskService.get_tasks_async(
+        db=db,
+        organization_id=current_user.organization_id,
+        skip=skip,
+        limit=limit,
+        status=status,
+        task_type=task_type,
+        priority=priority,
+        property_id=uuid.UUID(property_id) if property_id else None,
+        assigned_to=assignee_id
+    )
     
     return tasks
 
@@ -68,7 +62,7 @@ async def get_tasks(
 @router.post("", response_model=TaskResponse)
 async def create_task(
     task_data: TaskCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать новую задачу"""
@@ -129,7 +123,7 @@ async def create_task(
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить информацию о задаче"""
@@ -162,7 +156,7 @@ async def get_task(
 async def update_task(
     task_id: uuid.UUID,
     task_data: TaskUpdate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Обновить задачу"""
@@ -195,6 +189,7 @@ async def update_task(
     # Обновляем задачу
     update_data = task_data.dict(exclude_unset=True)
     old_status = task.status
+    old_assignee = task.assigned_to
     
     for field, value in update_data.items():
         if field == "assigned_to" and value:
@@ -213,9 +208,13 @@ async def update_task(
             # Обрабатываем оплату
             TaskService._process_task_payment(db, task)
     
+    ChangeFeedService.task_changed(db, task, "updated", old_assignee)
+    
     db.commit()
     db.refresh(task)
     
+    WorkloadIndexService.task_changed(task, old_assignee, old_status)
+    
     # Логируем действие
     AuthService.log_user_action(
         db=db,
@@ -238,7 +237,7 @@ async def update_task(
 async def assign_task(
     task_id: uuid.UUID,
     assigned_to: str,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Назначить задачу исполнителю"""
@@ -277,7 +276,7 @@ async def assign_task(
 @router.post("/{task_id}/start")
 async def start_task(
     task_id: uuid.UUID,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Начать выполнение задачи"""
@@ -309,7 +308,7 @@ async def complete_task(
     completion_notes: Optional[str] = None,
     quality_rating: Optional[int] = Query(None, ge=1, le=5),
     actual_duration: Optional[int] = Query(None, ge=1),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Завершить задачу"""
@@ -346,7 +345,7 @@ async def complete_task(
 async def cancel_task(
     task_id: uuid.UUID,
     reason: str = Query(..., min_length=1),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Отменить задачу"""
@@ -377,12 +376,17 @@ async def cancel_task(
         )
     
     # Отменяем задачу
+    previous_assignee, previous_status = task.assigned_to, task.status
     task.status = TaskStatus.CANCELLED
     task.completion_notes = f"Отменено: {reason}"
     task.updated_at = datetime.now(timezone.utc)
     
+    ChangeFeedService.task_changed(db, task, "cancelled")
+    
     db.commit()
     
+    WorkloadIndexService.task_changed(task, previous_assignee, previous_status)
+    
     # Логируем действие
     AuthService.log_user_action(
         db=db,
@@ -403,31 +407,74 @@ async def cancel_task(
 @router.get("/my/assigned", response_model=List[TaskResponse])
 async def get_my_assigned_tasks(
     status: Optional[TaskStatus] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить свои назначенные задачи"""
     
-    query = db.query(Task).filter(
-        and_(
-            Task.assigned_to == current_user.id,
-            Task.organization_id == current_user.organization_id
-        )
+    tasks = await TaskService.get_assigned_tasks_async(
+        db=db,
+        user_id=current_user.id,
+        organization_id=current_user.organization_id,
+        status=status
     )
     
-    if status:
-        query = query.filter(Task.status == status)
+    return tasks
+
+
+@router.get("/my/work")
+async def get_my_work(
+    request: Request,
+    response: Response,
+    completed_days: int = Query(0, ge=0, le=30, description="Включить завершенные за последние N дней"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Моя работа: активные задачи и заказы с помещением, арендой и гостем
+    
+    Слабый ETag строится из счетчика изменений сотрудника; при совпадении
+    If-None-Match отдается 304 без чтения задач и заказов. Поле cursor -
+    курсор ленты /api/changes для дочитки изменений после загрузки.
+    """
     
-    tasks = query.order_by(Task.priority.desc(), Task.created_at).all()
+    version = await ChangeFeedService.get_user_version_async(db, current_user.id)
     
-    return tasks
+    etag_parts = [str(current_user.id), str(version), str(completed_days)]
+    if completed_days:
+        # Окно завершенных сдвигается со временем - ETag меняется раз в день
+        etag_parts.append(datetime.now(timezone.utc).strftime("%Y%m%d"))
+    etag = f'W/"work-{"-".join(etag_parts)}"'
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    
+    # Курсор читается до данных: изменения после него придут через ленту
+    cursor = await ChangeFeedService.get_cursor_async(db, current_user.organization_id)
+    
+    completed_since = None
+    if completed_days:
+        completed_since = datetime.now(timezone.utc) - timedelta(days=completed_days)
+    
+    work = await TaskService.get_my_work_async(
+        db=db,
+        user_id=current_user.id,
+        organization_id=current_user.organization_id,
+        completed_since=completed_since
+    )
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    
+    return {"version": version, "cursor": cursor, **work}
 
 
 @router.get("/statistics/overview")
 async def get_tasks_statistics(
     period_days: int = Query(30, ge=1, le=365),
     user_id: Optional[str] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить статистику по задачам"""
@@ -455,7 +502,7 @@ async def get_tasks_statistics(
 @router.get("/workload/employees")
 async def get_employees_workload(
     role: Optional[UserRole] = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить загрузку сотрудников"""
@@ -477,7 +524,7 @@ async def get_employees_workload(
 
 @router.get("/urgent", response_model=List[TaskResponse])
 async def get_urgent_tasks(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Получить срочные задачи"""
@@ -493,7 +540,7 @@ async def get_urgent_tasks(
 @router.post("/auto-assign")
 async def auto_assign_tasks(
     task_ids: List[str],
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Автоматически назначить задачи исполнителям"""
@@ -509,85 +556,67 @@ async def auto_assign_tasks(
         "errors": []
     }
     
-    for task_id_str in task_ids:
+    task_uuids = {}
+    for task_id_str in dict.fromkeys(task_ids):
         try:
-            task_id = uuid.UUID(task_id_str)
-            task = db.query(Task).filter(
-                and_(
-                    Task.id == task_id,
-                    Task.organization_id == current_user.organization_id
-                )
-            ).first()
-            
-            if not task:
-                results["errors"].append({
-                    "task_id": task_id_str,
-                    "error": "Task not found"
-                })
-                continue
-            
-            if task.assigned_to:
-                results["errors"].append({
-                    "task_id": task_id_str,
-                    "error": "Task already assigned"
-                })
-                continue
-            
-            # Автоназначение в зависимости от типа задачи
-            if task.task_type == TaskType.CLEANING:
-                assignee = TaskService.get_least_busy_cleaner(db, current_user.organization_id)
-            elif task.task_type == TaskType.MAINTENANCE:
-                # Находим наименее загруженного технического сотрудника
-                tech_staff = db.query(User).filter(
-                    and_(
-                        User.organization_id == current_user.organization_id,
-                        User.role == UserRole.TECHNICAL_STAFF,
-                        User.status == "active"
-                    )
-                ).all()
-                
-                if tech_staff:
-                    # Выбираем наименее загруженного
-                    staff_workload = []
-                    for staff in tech_staff:
-                        active_tasks = db.query(Task).filter(
-                            and_(
-                                Task.assigned_to == staff.id,
-                                Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-                            )
-                        ).count()
-                        staff_workload.append((staff, active_tasks))
-                    
-                    assignee = min(staff_workload, key=lambda x: x[1])[0] if staff_workload else None
-                else:
-                    assignee = None
-            else:
-                assignee = None
-            
-            if assignee:
-                task.assigned_to = assignee.id
-                task.status = TaskStatus.ASSIGNED
-                task.updated_at = datetime.now(timezone.utc)
-                
-                results["assigned"].append({
-                    "task_id": task_id_str,
-                    "assigned_to": str(assignee.id),
-                    "assignee_name": f"{assignee.first_name} {assignee.last_name}"
-                })
-            else:
-                results["errors"].append({
-                    "task_id": task_id_str,
-                    "error": "No suitable assignee found"
-                })
-                
-        except Exception as e:
+            task_uuids[uuid.UUID(task_id_str)] = task_id_str
+        except ValueError as e:
             results["errors"].append({
                 "task_id": task_id_str,
                 "error": str(e)
             })
     
-    if results["assigned"]:
+    # Все задачи пачки одним запросом; строки блокируются до коммита
+    tasks = {
+        task.id: task
+        for task in db.query(Task).filter(
+            and_(
+                Task.id.in_(list(task_uuids)),
+                Task.organization_id == current_user.organization_id
+            )
+        ).with_for_update().all()
+    } if task_uuids else {}
+    
+    to_assign = []
+    for task_id, task_id_str in task_uuids.items():
+        task = tasks.get(task_id)
+        if not task:
+            results["errors"].append({
+                "task_id": task_id_str,
+                "error": "Task not found"
+            })
+        elif task.assigned_to:
+            results["errors"].append({
+                "task_id": task_id_str,
+                "error": "Task already assigned"
+            })
+        else:
+            to_assign.append(task)
+    
+    # Распределение по наименее загруженным с учетом назначений этой же пачки
+    plan, candidates = AssignmentService.plan_tasks(db, current_user.organization_id, to_assign)
+    assigned_tasks = [task for task in to_assign if plan[task.id]]
+    
+    for task in to_assign:
+        assignee = candidates.get(plan[task.id])
+        if assignee:
+            results["assigned"].append({
+                "task_id": task_uuids[task.id],
+                "assigned_to": str(assignee.id),
+                "assignee_name": f"{assignee.first_name} {assignee.last_name}"
+            })
+        else:
+            results["errors"].append({
+                "task_id": task_uuids[task.id],
+                "error": "No suitable assignee found"
+            })
+    
+    if assigned_tasks:
+        AssignmentService.apply_task_assignments(
+            db, current_user.organization_id, assigned_tasks, plan
+        )
         db.commit()
+        WorkloadIndexService.invalidate(current_user.organization_id)
     
     # Логируем действие
     AuthService.log_user_action(
@@ -607,7 +636,7 @@ async def auto_assign_tasks(
 
 @router.post("/maintenance/create-recurring")
 async def create_recurring_maintenance_tasks(
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Создать регулярные задачи технического обслуживания"""
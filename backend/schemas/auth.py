@@ -12,6 +12,7 @@ class TokenData(BaseModel):
     organization_id: Optional[str] = None
     role: Optional[UserRole] = None
     scopes: List[str] = []
+    iat: Optional[int] = None
 
 
 class LoginRequest(BaseModel):
@@ -1,6 +1,6 @@
 from models.extended_models import DocumentType
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field, validator
 import uuid
 
@@ -17,6 +17,12 @@ class DocumentCreate(DocumentBase):
     client_id: Optional[str] = None
 
 
+class BulkDocumentJobCreate(BaseModel):
+    rental_ids: List[uuid.UUID] = Field(..., min_length=1)
+    document_type: DocumentType
+    prerender: bool = False
+
+
 class DocumentUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=255)
     content: Optional[Dict[str, Any]] = None
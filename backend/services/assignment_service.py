@@ -0,0 +1,269 @@
+# backend/services/assignment_service.py
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, case, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+import heapq
+import uuid
+
+from models.extended_models import Task, TaskStatus, TaskType, User, UserRole
+from models.models import UserStatus
+from services.change_feed_service import ChangeFeedService
+from services.workload_index_service import WorkloadIndexService
+
+
+class AssignmentService:
+    """Пакетное распределение задач между сотрудниками
+
+    Кандидаты читаются одним запросом на всю пачку, их текущая загрузка
+    (активные задачи + заказы) берется из WorkloadIndexService - того же
+    индекса, что и у TaskService.get_least_loaded_employee. Задачи раздаются
+    по кучам ролей: каждая задача уходит наименее загруженному сотруднику,
+    после чего его загрузка увеличивается, так что пачка распределяется
+    равномерно. Назначения записываются одним UPDATE.
+
+    solve_min_cost - глобальное распределение пачки по минимальной
+    стоимости (для оптимизации назначений заказов).
+    """
+
+    # Роль исполнителя по типу задачи; остальные задачи автоматически не назначаются
+    TASK_TYPE_ROLES = {
+        TaskType.CLEANING: UserRole.CLEANER,
+        TaskType.MAINTENANCE: UserRole.TECHNICAL_STAFF
+    }
+
+    @staticmethod
+    def load_candidates(
+        db: Session,
+        organization_id: uuid.UUID,
+        roles: Iterable[UserRole],
+        exclude: Optional[List[uuid.UUID]] = None
+    ) -> Dict[uuid.UUID, User]:
+        """Активные сотрудники организации с указанными ролями"""
+
+        query = db.query(User).filter(
+            and_(
+                User.organization_id == organization_id,
+                User.role.in_(list(roles)),
+                User.status == UserStatus.ACTIVE
+            )
+        )
+        if exclude:
+            query = query.filter(User.id.notin_(exclude))
+
+        return {user.id: user for user in query.all()}
+
+    @staticmethod
+    def build_heaps(
+        candidates: Dict[uuid.UUID, User],
+        loads: Dict[uuid.UUID, int]
+    ) -> Dict[UserRole, List[Tuple[int, str, uuid.UUID]]]:
+        heaps = {}
+        for user_id, user in candidates.items():
+            heaps.setdefault(user.role, []).append((loads.get(user_id, 0), str(user_id), user_id))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        return heaps
+
+    @staticmethod
+    def take_least_loaded(heaps: Dict[UserRole, list], role: UserRole) -> Optional[uuid.UUID]:
+        """Наименее загруженный сотрудник роли; его загрузка сразу увеличивается"""
+
+        heap = heaps.get(role)
+        if not heap:
+            return None
+
+        load, key, user_id = heap[0]
+        heapq.heapreplace(heap, (load + 1, key, user_id))
+        return user_id
+
+    @classmethod
+    def plan_tasks(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        tasks: List[Task],
+        exclude: Optional[List[uuid.UUID]] = None
+    ) -> Tuple[Dict[uuid.UUID, Optional[uuid.UUID]], Dict[uuid.UUID, User]]:
+        """
+        Распределить задачи по наименее загруженным сотрудникам
+
+        Returns:
+            ({task_id: user_id или None}, {user_id: User} кандидатов)
+        """
+        roles = {cls.TASK_TYPE_ROLES[task.task_type] for task in tasks if task.task_type in cls.TASK_TYPE_ROLES}
+        if not roles:
+            return {task.id: None for task in tasks}, {}
+
+        candidates = cls.load_candidates(db, organization_id, roles, exclude)
+        heaps = cls.build_heaps(
+            candidates, WorkloadIndexService.get_loads(db, organization_id, list(candidates))
+        )
+
+        plan = {}
+        for task in tasks:
+            role = cls.TASK_TYPE_ROLES.get(task.task_type)
+            plan[task.id] = cls.take_least_loaded(heaps, role) if role else None
+
+        return plan, candidates
+
+    @staticmethod
+    def apply_task_assignments(
+        db: Session,
+        organization_id: uuid.UUID,
+        tasks: List[Task],
+        plan: Dict[uuid.UUID, Optional[uuid.UUID]],
+        action: str = "assigned"
+    ):
+        """
+        Записать назначения одним UPDATE и опубликовать события ленты
+
+        Задачи с None в плане снимаются с исполнителя (PENDING). Вызывается
+        до коммита; после коммита индекс загрузки нужно пометить устаревшим.
+        """
+        tasks = [task for task in tasks if task.id in plan]
+        if not tasks:
+            return
+
+        now = datetime.now(timezone.utc)
+        statuses = {
+            task.id: TaskStatus.ASSIGNED if plan[task.id] else TaskStatus.PENDING
+            for task in tasks
+        }
+
+        # else_ задает тип выражения CASE (uuid/enum), в том числе для NULL
+        db.execute(
+            update(Task)
+            .where(Task.id.in_(list(statuses)))
+            .values(
+                assigned_to=case({task.id: plan[task.id] for task in tasks}, value=Task.id, else_=Task.assigned_to),
+                status=case(statuses, value=Task.id, else_=Task.status),
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        changes = []
+        for task in tasks:
+            previous_assignee = task.assigned_to
+            # Объекты сессии приводятся к записанному состоянию без повторного UPDATE
+            set_committed_value(task, "assigned_to", plan[task.id])
+            set_committed_value(task, "status", statuses[task.id])
+            set_committed_value(task, "updated_at", now)
+            changes.append((task, action if plan[task.id] else "unassigned", previous_assignee))
+
+        ChangeFeedService.tasks_changed(db, organization_id, changes)
+
+    @staticmethod
+    def solve_min_cost(
+        supplies: List[int],
+        class_costs: List[Dict[Hashable, float]],
+        executors: Dict[Any, Tuple[Hashable, float, int, int]],
+        load_step: float
+    ) -> Tuple[List[Dict[Any, int]], List[int]]:
+        """
+        Распределение единиц работы по исполнителям минимальной стоимости
+
+        Работа разбита на классы взаимозаменяемых единиц (supplies[c] штук).
+        Стоимость единицы класса c у исполнителя группы g - class_costs[c][g]
+        (группы вне словаря класса не допускаются) плюс base_cost исполнителя
+        и предельная стоимость загрузки load_step * текущая загрузка, так что
+        загрузка выравнивается. Исполнитель: (группа, base_cost, base_load,
+        capacity) - загрузка не превышает capacity.
+
+        Решается потоком минимальной стоимости последовательными кратчайшими
+        путями. Стоимость пути "класс -> исполнитель -> класс" зависит только
+        от группы исполнителя, поэтому поиск пути идет по графу классов
+        (Беллман-Форд), а исполнитель на выходе берется из кучи группы.
+
+        Returns:
+            ([{executor: единиц} по классам], [нераспределенные единицы по классам])
+        """
+        count = len(supplies)
+        remaining = list(supplies)
+        flow = [{} for _ in range(count)]
+        # Сколько единиц каждого класса стоит у исполнителей группы: {g: {c: n}}
+        group_flow = {}
+
+        loads = {}
+        heaps = {}
+        for executor, (group, base_cost, base_load, capacity) in executors.items():
+            loads[executor] = base_load
+            if capacity > base_load:
+                heaps.setdefault(group, []).append((base_cost + load_step * base_load, str(executor), executor))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+
+        def move(executor, group, source, target):
+            if source is not None:
+                flow[source][executor] -= 1
+                if not flow[source][executor]:
+                    del flow[source][executor]
+                group_flow[group][source] -= 1
+                if not group_flow[group][source]:
+                    del group_flow[group][source]
+            flow[target][executor] = flow[target].get(executor, 0) + 1
+            group_counts = group_flow.setdefault(group, {})
+            group_counts[target] = group_counts.get(target, 0) + 1
+
+        inf = float("inf")
+        epsilon = 1e-9
+
+        while any(remaining):
+            sink = {group: heap[0][0] for group, heap in heaps.items() if heap}
+            if not sink:
+                break
+
+            # Кратчайшие пути до классов: c -> c2 по группе g означает, что
+            # единица c занимает место единицы c2 у исполнителя группы g
+            dist = [0.0 if remaining[c] else inf for c in range(count)]
+            previous = [None] * count
+            for _ in range(count):
+                changed = False
+                for c in range(count):
+                    if dist[c] == inf:
+                        continue
+                    for group, cost in class_costs[c].items():
+                        for c2 in group_flow.get(group, ()):
+                            candidate = dist[c] + cost - class_costs[c2][group]
+                            if candidate < dist[c2] - epsilon:
+                                dist[c2] = candidate
+                                previous[c2] = (c, group)
+                                changed = True
+                if not changed:
+                    break
+
+            best, best_class, best_group = inf, None, None
+            for c in range(count):
+                if dist[c] == inf:
+                    continue
+                for group, cost in class_costs[c].items():
+                    if group in sink and dist[c] + cost + sink[group] < best:
+                        best, best_class, best_group = dist[c] + cost + sink[group], c, group
+            if best_class is None:
+                break
+
+            # Новая единица у наименее нагруженного исполнителя группы
+            heap = heaps[best_group]
+            _, key, executor = heap[0]
+            base_cost, capacity = executors[executor][1], executors[executor][3]
+            loads[executor] += 1
+            if loads[executor] < capacity:
+                heapq.heapreplace(heap, (base_cost + load_step * loads[executor], key, executor))
+            else:
+                heapq.heappop(heap)
+            move(executor, best_group, None, best_class)
+
+            # Замены вдоль пути: класс занимает место следующего у исполнителя группы
+            c = best_class
+            while previous[c] is not None:
+                source, group = previous[c]
+                executor = next(
+                    e for e in flow[c] if executors[e][0] == group
+                )
+                move(executor, group, c, source)
+                c = source
+            remaining[c] -= 1
+
+        return flow, remaining
@@ -0,0 +1,289 @@
+# backend/services/audit_log_service.py
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from models.database import SessionLocal
+from models.models import UserAction, LoginAttempt
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogService:
+    """Асинхронная пакетная запись аудита
+
+    События (действия пользователей и попытки входа) помещаются в
+    ограниченную очередь и записываются фоновым потоком многострочными
+    INSERT пакетами до BATCH_SIZE строк или раз в FLUSH_INTERVAL секунд.
+    Каждое событие получает id при постановке в очередь, а вставка идет с
+    ON CONFLICT DO NOTHING, поэтому повтор пакета после ошибки безопасен
+    (доставка "хотя бы один раз"). При остановке очередь дописывается.
+
+    Поведение при переполнении очереди (AUDIT_BACKPRESSURE):
+    - block: ждать место до ENQUEUE_TIMEOUT, затем записать синхронно;
+    - drop: отбросить событие (учитывается в метриках).
+    """
+
+    QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+    BACKPRESSURE = os.getenv("AUDIT_BACKPRESSURE", "block").lower()
+    ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.05"))
+    MAX_RETRIES = 5
+
+    TABLES = {
+        "user_action": UserAction.__table__,
+        "login_attempt": LoginAttempt.__table__,
+    }
+
+    _queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue(maxsize=QUEUE_SIZE)
+    _pending: Deque[Tuple[str, Dict[str, Any]]] = deque()
+    _worker: Optional[threading.Thread] = None
+    _running = False
+    _stop_event = threading.Event()
+    _metrics_lock = threading.Lock()
+    _metrics: Dict[str, Any] = {
+        "enqueued": 0,
+        "written": 0,
+        "dropped": 0,
+        "sync_writes": 0,
+        "flushes": 0,
+        "failed_flushes": 0,
+        "last_flush_ms": 0.0,
+        "max_flush_ms": 0.0,
+        "total_flush_ms": 0.0,
+        "last_error": None,
+    }
+
+    @classmethod
+    def start(cls):
+        """Запустить фоновый поток записи"""
+        if cls._running:
+            return
+
+        cls._stop_event.clear()
+        cls._running = True
+        cls._worker = threading.Thread(target=cls._run, name="audit-writer", daemon=True)
+        cls._worker.start()
+        logger.info("📝 Audit writer started")
+
+    @classmethod
+    def stop(cls, timeout: float = 30.0):
+        """Остановить поток, дописав все накопленные события"""
+        if not cls._running:
+            return
+
+        cls._stop_event.set()
+        if cls._worker:
+            cls._worker.join(timeout)
+
+        cls._running = False
+        cls._worker = None
+
+        # Поток не успел завершиться или не смог записать - пробуем здесь
+        cls._drain_queue()
+        if cls._pending:
+            cls._flush_pending(final=True)
+
+        logger.info("📝 Audit writer stopped")
+
+    @classmethod
+    def log_user_action(cls, **values):
+        cls._enqueue("user_action", values)
+
+    @classmethod
+    def log_login_attempt(cls, **values):
+        cls._enqueue("login_attempt", values)
+
+    @classmethod
+    def _enqueue(cls, kind: str, values: Dict[str, Any]):
+        row = dict(values)
+        row.setdefault("id", uuid.uuid4())
+        row.setdefault("created_at", datetime.now(timezone.utc))
+
+        if not cls._running:
+            # Без фонового потока (скрипты, тесты) пишем сразу
+            cls._write_sync(kind, row)
+            return
+
+        try:
+            if cls.BACKPRESSURE == "drop":
+                cls._queue.put_nowait((kind, row))
+            else:
+                cls._queue.put((kind, row), timeout=cls.ENQUEUE_TIMEOUT)
+        except queue.Full:
+            if cls.BACKPRESSURE == "drop":
+                cls._inc("dropped")
+                logger.warning(f"Audit queue is full, event dropped: {kind}")
+            else:
+                cls._write_sync(kind, row)
+            return
+
+        cls._inc("enqueued")
+
+    @classmethod
+    def _write_sync(cls, kind: str, row: Dict[str, Any]):
+        try:
+            cls._write_batch([(kind, row)])
+            cls._inc("sync_writes")
+            cls._inc("written")
+        except Exception as e:
+            logger.error(f"Error writing audit event: {e}")
+            cls._set_error(e)
+
+    @classmethod
+    def _insert(cls, db, events: List[Tuple[str, Dict[str, Any]]]):
+        rows_by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        for kind, row in events:
+            rows_by_kind.setdefault(kind, []).append(row)
+
+        for kind, rows in rows_by_kind.items():
+            table = cls.TABLES[kind]
+            # Ключи строк должны совпадать для многострочной вставки
+            columns = set().union(*rows)
+            normalized = [{column: row.get(column) for column in columns} for row in rows]
+            db.execute(insert(table).on_conflict_do_nothing(index_elements=["id", "created_at"]), normalized)
+
+    @classmethod
+    def _write_batch(cls, events: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Записать пакет одной транзакцией
+
+        Событие может ссылаться на пользователя или организацию, удаленные
+        до записи пакета. Тогда пакет пишется построчно, а у таких событий
+        ссылки обнуляются, чтобы одна строка не блокировала весь пакет.
+        """
+        with SessionLocal() as db:
+            try:
+                cls._insert(db, events)
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
+
+            for kind, row in events:
+                try:
+                    with db.begin_nested():
+                        cls._insert(db, [(kind, row)])
+                except IntegrityError:
+                    orphan = {**row, "user_id": None, "organization_id": None}
+                    if kind == "login_attempt":
+                        orphan.pop("user_id")
+                    with db.begin_nested():
+                        cls._insert(db, [(kind, orphan)])
+            db.commit()
+
+    @classmethod
+    def _run(cls):
+        """Цикл фонового потока"""
+        while True:
+            stopping = cls._stop_event.is_set()
+            deadline = time.monotonic() + cls.FLUSH_INTERVAL
+
+            while len(cls._pending) < cls.BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or stopping:
+                    break
+                try:
+                    cls._pending.append(cls._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            cls._drain_queue(limit=cls.BATCH_SIZE - len(cls._pending))
+
+            if cls._pending:
+                cls._flush_pending(final=stopping)
+
+            if stopping and cls._queue.empty() and not cls._pending:
+                return
+
+            if stopping and cls._pending:
+                # Запись не удалась даже после повторов - оставляем stop()
+                return
+
+            if cls._pending:
+                # БД недоступна: пауза перед повтором, очередь тем временем
+                # заполняется и включает backpressure
+                cls._stop_event.wait(cls.FLUSH_INTERVAL)
+
+    @classmethod
+    def _drain_queue(cls, limit: Optional[int] = None):
+        taken = 0
+        while limit is None or taken < limit:
+            try:
+                cls._pending.append(cls._queue.get_nowait())
+                taken += 1
+            except queue.Empty:
+                return
+
+    @classmethod
+    def _flush_pending(cls, final: bool = False):
+        """Записать накопленные события пакетами, повторяя при ошибках"""
+        attempts = cls.MAX_RETRIES if final else 1
+
+        while cls._pending:
+            batch = [cls._pending[i] for i in range(min(cls.BATCH_SIZE, len(cls._pending)))]
+
+            for attempt in range(attempts):
+                started = time.perf_counter()
+                try:
+                    cls._write_batch(batch)
+                except Exception as e:
+                    cls._inc("failed_flushes")
+                    cls._set_error(e)
+                    logger.error(f"Error flushing {len(batch)} audit events: {e}")
+                    if attempt + 1 < attempts:
+                        time.sleep(min(2 ** attempt * 0.1, 2))
+                    continue
+
+                cls._record_flush(len(batch), (time.perf_counter() - started) * 1000)
+                for _ in batch:
+                    cls._pending.popleft()
+                break
+            else:
+                # Пакет остается в _pending и будет повторен при следующем сбросе
+                if final:
+                    logger.error(f"{len(cls._pending)} audit events were not written")
+                return
+
+    @classmethod
+    def _inc(cls, name: str, value: int = 1):
+        with cls._metrics_lock:
+            cls._metrics[name] += value
+
+    @classmethod
+    def _set_error(cls, error: Exception):
+        with cls._metrics_lock:
+            cls._metrics["last_error"] = str(error)
+
+    @classmethod
+    def _record_flush(cls, rows: int, elapsed_ms: float):
+        with cls._metrics_lock:
+            cls._metrics["written"] += rows
+            cls._metrics["flushes"] += 1
+            cls._metrics["last_flush_ms"] = round(elapsed_ms, 2)
+            cls._metrics["max_flush_ms"] = max(cls._metrics["max_flush_ms"], round(elapsed_ms, 2))
+            cls._metrics["total_flush_ms"] += elapsed_ms
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, Any]:
+        """Глубина очереди, счетчики событий и задержка записи пакетов"""
+        with cls._metrics_lock:
+            metrics = dict(cls._metrics)
+
+        flushes = metrics.pop("total_flush_ms")
+        metrics["avg_flush_ms"] = round(flushes / metrics["flushes"], 2) if metrics["flushes"] else 0.0
+        metrics["queue_depth"] = cls._queue.qsize()
+        metrics["pending"] = len(cls._pending)
+        metrics["queue_capacity"] = cls.QUEUE_SIZE
+        metrics["running"] = cls._running
+        metrics["backpressure"] = cls.BACKPRESSURE
+        return metrics
@@ -5,13 +5,15 @@ import secrets
 import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, event
 import os
 
-from models.models import User, Organization, RefreshToken, LoginAttempt, UserAction
+from models.models import User, Organization, RefreshToken
 from models.models import UserRole, UserStatus, OrganizationStatus
 from schemas.auth import TokenData, LoginRequest, UserCreate, OrganizationCreate
+from services.audit_log_service import AuditLogService
 
 
 # Настройки безопасности
@@ -25,6 +27,25 @@ BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 
+# Сессия помечается, когда в ее транзакции уже есть записанные изменения
+# (flush или DML через execute): _commit_pending не должен их потерять
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session, flush_context):
+    session.info["uncommitted_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["uncommitted_writes"] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_writes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("uncommitted_writes", None)
+
+
 class AuthService:
     """Сервис для работы с авторизацией и аутентификацией"""
     
@@ -79,11 +100,22 @@ class AuthService:
                 user_id=user_id,
                 organization_id=organization_id,
                 role=UserRole(role) if role else None,
-                scopes=scopes
+                scopes=scopes,
+                iat=payload.get("iat")
             )
         except JWTError:
             return None
     
+    @staticmethod
+    async def get_user_by_id_async(db: AsyncSession, user_id: uuid.UUID) -> Optional[User]:
+        """Получить пользователя вместе с организацией через асинхронную сессию"""
+        result = await db.execute(
+            select(User)
+            .options(selectinload(User.organization))
+            .where(User.id == user_id)
+        )
+        return result.scalar_one_or_none()
+    
     @staticmethod
     def authenticate_user(
         db: Session, 
@@ -278,9 +310,9 @@ class AuthService:
         user_agent: Optional[str] = None,
         device_fingerprint: Optional[str] = None
     ):
-        """Логирование попытки входа"""
+        """Логирование попытки входа (запись выполняется пакетно в фоне)"""
         
-        login_attempt = LoginAttempt(
+        AuditLogService.log_login_attempt(
             email=email,
             organization_id=organization_id,
             success=success,
@@ -290,8 +322,7 @@ class AuthService:
             device_fingerprint=device_fingerprint
         )
         
-        db.add(login_attempt)
-        db.commit()
+        AuthService._commit_pending(db)
     
     @staticmethod
     def log_user_action(
@@ -307,9 +338,9 @@ class AuthService:
         ip_address: Optional[str] = None,
         user_agent: Optional[str] = None
     ):
-        """Логирование действий пользователя"""
+        """Логирование действий пользователя (запись выполняется пакетно в фоне)"""
         
-        user_action = UserAction(
+        AuditLogService.log_user_action(
             user_id=user_id,
             organization_id=organization_id,
             action=action,
@@ -322,8 +353,18 @@ class AuthService:
             user_agent=user_agent
         )
         
-        db.add(user_action)
-        db.commit()
+        AuthService._commit_pending(db)
+    
+    @staticmethod
+    def _commit_pending(db: Session):
+        """
+        Зафиксировать несохраненные изменения сессии
+        
+        Раньше запись аудита коммитила сессию вызывающего кода, и часть
+        обработчиков полагается на это; пустая транзакция не коммитится.
+        """
+        if db.new or db.dirty or db.deleted or db.info.get("uncommitted_writes"):
+            db.commit()
     
     @staticmethod
     def cleanup_expired_tokens(db: Session):
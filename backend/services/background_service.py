@@ -60,8 +60,18 @@ class BackgroundService:
         # Проверка просроченных задач (каждые 30 минут)
         schedule.every(30).minutes.do(cls._check_overdue_tasks)
         
-        # Обновление статистики (каждые 6 часов)
-        schedule.every(6).hours.do(cls._update_statistics)
+        # Обновление снимков дашборда (каждые DASHBOARD_REFRESH_MINUTES минут)
+        from services.dashboard_snapshot_service import DashboardSnapshotService
+        schedule.every(DashboardSnapshotService.REFRESH_MINUTES).minutes.do(cls._update_statistics)
+        
+        # Перестройка дневных показателей отчетов (каждый день в 03:00)
+        schedule.every().day.at("03:00").do(cls._rebuild_report_facts)
+        
+        # Сверка индекса загрузки исполнителей с БД (каждые 10 минут)
+        schedule.every(10).minutes.do(cls._reconcile_workload_index)
+        
+        # Удаление истекших состояний rate limiter (каждый час)
+        schedule.every().hour.do(cls._cleanup_rate_limits)
         
         logger.info("📅 Scheduled tasks configured")
     
@@ -110,8 +120,16 @@ class BackgroundService:
         try:
             with SessionLocal() as db:
                 from services.init_service import DatabaseInitService
+                from services.partition_service import PartitionService
+                
+                # Секции создаются заранее, истекшие удаляются целиком
+                PartitionService.ensure_partitions(db)
                 cleanup_result = DatabaseInitService.cleanup_old_data(db)
                 logger.info(f"🧹 Weekly cleanup completed: {cleanup_result}")
+                
+                from services.document_render_service import DocumentRenderService
+                removed = DocumentRenderService.cleanup_cache(db)
+                logger.info(f"🧹 Removed {removed} cached PDF files")
         except Exception as e:
             logger.error(f"Error during weekly cleanup: {e}")
     
@@ -144,20 +162,50 @@ class BackgroundService:
     
     @classmethod
     def _update_statistics(cls):
-        """Обновление кешированной статистики"""
+        """Обновление снимков дашборда"""
+        try:
+            from services.dashboard_snapshot_service import DashboardSnapshotService
+            with SessionLocal() as db:
+                refreshed = DashboardSnapshotService.refresh_all(db)
+                logger.info(f"📊 Statistics updated: {refreshed} dashboard snapshots")
+        except Exception as e:
+            logger.error(f"Error updating statistics: {e}")
+    
+    @classmethod
+    def _rebuild_report_facts(cls):
+        """Перестройка материализованных дневных показателей отчетов"""
         try:
             with SessionLocal() as db:
                 from models.models import Organization
+                from services.report_facts_service import ReportFactsService
                 organizations = db.query(Organization).all()
                 
                 for org in organizations:
-                    # Можно обновлять кешированные метрики
-                    # Например, загруженность помещений, финансовые показатели и т.д.
-                    pass
-                
-                logger.info("📊 Statistics updated")
+                    result = ReportFactsService.rebuild_organization(db, org.id)
+                    logger.info(f"📊 Report facts rebuilt for {org.id}: {result['rows_written']} rows in {result['duration_seconds']}s")
         except Exception as e:
-            logger.error(f"Error updating statistics: {e}")
+            logger.error(f"Error rebuilding report facts: {e}")
+    
+    @classmethod
+    def _reconcile_workload_index(cls):
+        """Сверка индекса загрузки исполнителей с БД"""
+        try:
+            from services.workload_index_service import WorkloadIndexService
+            with SessionLocal() as db:
+                for organization_id in WorkloadIndexService.loaded_organizations():
+                    WorkloadIndexService.reconcile(db, organization_id)
+        except Exception as e:
+            logger.error(f"Error reconciling workload index: {e}")
+    
+    @classmethod
+    def _cleanup_rate_limits(cls):
+        """Удаление истекших состояний rate limiter"""
+        try:
+            from utils.rate_limiter import get_rate_limiter
+            deleted_count = get_rate_limiter().cleanup_old_entries()
+            logger.info(f"🧹 Cleaned up {deleted_count} rate limit buckets")
+        except Exception as e:
+            logger.error(f"Error cleaning up rate limits: {e}")
     
     @classmethod
     def execute_task_now(cls, task_name: str) -> Dict[str, Any]:
@@ -173,6 +221,12 @@ class BackgroundService:
                 cls._check_overdue_tasks()
             elif task_name == "update_stats":
                 cls._update_statistics()
+            elif task_name == "rebuild_report_facts":
+                cls._rebuild_report_facts()
+            elif task_name == "reconcile_workload":
+                cls._reconcile_workload_index()
+            elif task_name == "cleanup_rate_limits":
+                cls._cleanup_rate_limits()
             else:
                 return {"success": False, "error": f"Unknown task: {task_name}"}
             
@@ -0,0 +1,397 @@
+# backend/services/change_feed_service.py
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import and_, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+import asyncio
+import json
+import logging
+import os
+import select as select_module
+import threading
+import uuid
+
+from models.database import engine
+from models.extended_models import ChangeEvent, RoomOrder, Task, UserChangeCounter, UserRole
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeedSubscription:
+    """Подписка SSE-соединения: будится при новых событиях организации"""
+
+    def __init__(self, organization_id: uuid.UUID, loop: asyncio.AbstractEventLoop):
+        self.organization_id = str(organization_id)
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+class ChangeFeedService:
+    """Лента изменений задач и заказов по организациям
+
+    Сервисы задач и заказов публикуют события переходов статусов в таблицу
+    change_events в своей транзакции. Курсор ленты - id события: вставки
+    одной организации сериализуются advisory-блокировкой до коммита,
+    поэтому внутри организации id растут в порядке коммитов и чтение
+    "id > since" не пропускает событий.
+
+    Вместе с событием отправляется NOTIFY; поток-слушатель процесса будит
+    SSE-подписчиков организации, и те дочитывают ленту со своего курсора.
+    Счетчики user_change_counters затронутых сотрудников увеличиваются в
+    той же транзакции и служат ETag списка "моя работа".
+    """
+
+    CHANNEL = "change_feed"
+    RETENTION_DAYS = int(os.getenv("CHANGE_FEED_RETENTION_DAYS", "7"))
+    MAX_BATCH = 500
+
+    # Сотрудники видят только изменения своих задач и заказов
+    STAFF_ROLES = {UserRole.CLEANER, UserRole.TECHNICAL_STAFF, UserRole.STOREKEEPER}
+
+    _lock = threading.Lock()
+    _subscribers: Dict[str, Set[ChangeFeedSubscription]] = {}
+    _listener: Optional[threading.Thread] = None
+    _stop_event = threading.Event()
+
+    # ========== ПУБЛИКАЦИЯ ==========
+
+    @classmethod
+    def publish(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        entity_type: str,
+        entity_id: uuid.UUID,
+        action: str,
+        user_ids: Iterable[Optional[uuid.UUID]],
+        payload: Dict[str, Any]
+    ):
+        """Записать событие в текущую транзакцию (видно после коммита)"""
+        cls.publish_many(db, organization_id, [(entity_type, entity_id, action, user_ids, payload)])
+
+    @classmethod
+    def publish_many(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        events: List[Tuple[str, uuid.UUID, str, Iterable[Optional[uuid.UUID]], Dict[str, Any]]]
+    ):
+        """
+        Записать пачку событий организации одной вставкой
+
+        events: [(entity_type, entity_id, action, user_ids, payload)]
+        """
+        if not events:
+            return
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        affected = set()
+        for entity_type, entity_id, action, user_ids, payload in events:
+            user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+            affected.update(user_ids)
+            rows.append({
+                "organization_id": organization_id,
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "action": action,
+                "user_ids": [str(user_id) for user_id in user_ids],
+                "payload": payload,
+                "created_at": now
+            })
+
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+            {"key": f"change_feed:{organization_id}"}
+        )
+
+        event_ids = db.execute(
+            insert(ChangeEvent).values(rows).returning(ChangeEvent.id)
+        ).scalars().all()
+
+        if affected:
+            # Версии списков "моя работа" затронутых сотрудников
+            stmt = pg_insert(UserChangeCounter).values([
+                {"user_id": user_id, "version": 1, "updated_at": now}
+                for user_id in sorted(affected, key=str)
+            ])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"version": UserChangeCounter.version + 1, "updated_at": now}
+            ))
+
+        # NOTIFY доставляется только при коммите транзакции
+        db.execute(
+            text("SELECT pg_notify(:channel, :message)"),
+            {"channel": cls.CHANNEL, "message": json.dumps({"organization_id": str(organization_id), "id": max(event_ids)})}
+        )
+
+    @staticmethod
+    def _task_payload(task: Task) -> Dict[str, Any]:
+        return {
+            "id": str(task.id),
+            "title": task.title,
+            "task_type": task.task_type.value if task.task_type else None,
+            "status": task.status.value if task.status else None,
+            "priority": task.priority.value if task.priority else None,
+            "property_id": str(task.property_id) if task.property_id else None,
+            "assigned_to": str(task.assigned_to) if task.assigned_to else None,
+            "due_date": task.due_date.isoformat() if task.due_date else None,
+            "started_at": task.started_at.isoformat() if task.started_at else None,
+            "completed_at": task.completed_at.isoformat() if task.completed_at else None
+        }
+
+    @staticmethod
+    def _order_payload(order: RoomOrder) -> Dict[str, Any]:
+        return {
+            "id": str(order.id),
+            "order_number": order.order_number,
+            "order_type": order.order_type,
+            "status": order.status.value if order.status else None,
+            "property_id": str(order.property_id) if order.property_id else None,
+            "assigned_to": str(order.assigned_to) if order.assigned_to else None,
+            "completed_at": order.completed_at.isoformat() if order.completed_at else None
+        }
+
+    @classmethod
+    def task_changed(cls, db: Session, task: Task, action: str, previous_assignee: Optional[uuid.UUID] = None):
+        """Событие по задаче; вызывается до коммита транзакции перехода"""
+        db.flush()
+        cls.publish(
+            db, task.organization_id, "task", task.id, action,
+            [task.assigned_to, previous_assignee], cls._task_payload(task)
+        )
+
+    @classmethod
+    def tasks_changed(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        changes: List[Tuple[Task, str, Optional[uuid.UUID]]]
+    ):
+        """События по пачке задач [(task, action, previous_assignee)] одной вставкой"""
+        db.flush()
+        cls.publish_many(db, organization_id, [
+            ("task", task.id, action, [task.assigned_to, previous_assignee], cls._task_payload(task))
+            for task, action, previous_assignee in changes
+        ])
+
+    @classmethod
+    def order_changed(cls, db: Session, order: RoomOrder, action: str, previous_assignee: Optional[uuid.UUID] = None):
+        """Событие по заказу; вызывается до коммита транзакции перехода"""
+        db.flush()
+        cls.publish(
+            db, order.organization_id, "order", order.id, action,
+            [order.assigned_to, previous_assignee], cls._order_payload(order)
+        )
+
+    # ========== ЧТЕНИЕ ==========
+
+    @classmethod
+    def get_changes(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        user_id: uuid.UUID,
+        role: UserRole,
+        since: Optional[int] = None,
+        limit: int = MAX_BATCH
+    ) -> Dict[str, Any]:
+        """
+        Изменения после курсора since, видимые пользователю
+
+        Без since возвращается только текущий курсор: клиент запрашивает
+        его до загрузки полного списка и дальше читает изменения с него.
+        reset=True - события после курсора могли быть удалены по сроку
+        хранения, клиенту нужно перезагрузить список целиком.
+        """
+        current = db.execute(cls._cursor_query(organization_id)).scalar() or 0
+        if since is None:
+            return cls._changes_result(current, None, since, [], limit)
+
+        oldest = db.execute(cls._oldest_query(organization_id)).scalar()
+        if cls._cursor_expired(since, current, oldest):
+            return cls._changes_result(current, oldest, since, [], limit)
+
+        events = db.execute(cls._events_query(organization_id, user_id, role, since, limit)).scalars().all()
+        return cls._changes_result(current, oldest, since, events, limit)
+
+    @classmethod
+    async def get_changes_async(
+        cls,
+        db,
+        organization_id: uuid.UUID,
+        user_id: uuid.UUID,
+        role: UserRole,
+        since: Optional[int] = None,
+        limit: int = MAX_BATCH
+    ) -> Dict[str, Any]:
+        """get_changes для AsyncSession (поток SSE не занимает пул потоков)"""
+        current = (await db.execute(cls._cursor_query(organization_id))).scalar() or 0
+        if since is None:
+            return cls._changes_result(current, None, since, [], limit)
+
+        oldest = (await db.execute(cls._oldest_query(organization_id))).scalar()
+        if cls._cursor_expired(since, current, oldest):
+            return cls._changes_result(current, oldest, since, [], limit)
+
+        result = await db.execute(cls._events_query(organization_id, user_id, role, since, limit))
+        return cls._changes_result(current, oldest, since, result.scalars().all(), limit)
+
+    @staticmethod
+    def _cursor_query(organization_id: uuid.UUID):
+        return select(func.max(ChangeEvent.id)).where(ChangeEvent.organization_id == organization_id)
+
+    @staticmethod
+    def _oldest_query(organization_id: uuid.UUID):
+        return select(func.min(ChangeEvent.id)).where(ChangeEvent.organization_id == organization_id)
+
+    @staticmethod
+    def _cursor_expired(since: int, current: int, oldest: Optional[int]) -> bool:
+        # Курсор - id события организации: если оно старше самого раннего
+        # сохраненного, часть событий после него уже удалена
+        return since > current or (since > 0 and oldest is not None and since < oldest)
+
+    @classmethod
+    def _events_query(cls, organization_id: uuid.UUID, user_id: uuid.UUID, role: UserRole, since: int, limit: int):
+        query = select(ChangeEvent).where(
+            and_(
+                ChangeEvent.organization_id == organization_id,
+                ChangeEvent.id > since
+            )
+        )
+        if role in cls.STAFF_ROLES:
+            query = query.where(ChangeEvent.user_ids.contains([str(user_id)]))
+        return query.order_by(ChangeEvent.id).limit(limit + 1)
+
+    @classmethod
+    def _changes_result(
+        cls,
+        current: int,
+        oldest: Optional[int],
+        since: Optional[int],
+        events: List[ChangeEvent],
+        limit: int
+    ) -> Dict[str, Any]:
+        if since is None:
+            return {"cursor": current, "changes": [], "has_more": False, "reset": False}
+        if cls._cursor_expired(since, current, oldest):
+            return {"cursor": current, "changes": [], "has_more": False, "reset": True}
+
+        has_more = len(events) > limit
+        events = events[:limit]
+
+        # Курсор продвигается и через невидимые пользователю события
+        if has_more:
+            cursor = events[-1].id
+        else:
+            cursor = max(current, events[-1].id) if events else current
+
+        return {
+            "cursor": cursor,
+            "changes": [
+                {
+                    "id": event.id,
+                    "entity_type": event.entity_type,
+                    "entity_id": str(event.entity_id),
+                    "action": event.action,
+                    "data": event.payload,
+                    "created_at": event.created_at.isoformat() if event.created_at else None
+                }
+                for event in events
+            ],
+            "has_more": has_more,
+            "reset": False
+        }
+
+    @staticmethod
+    async def get_user_version_async(db, user_id: uuid.UUID) -> int:
+        """Счетчик изменений сотрудника (AsyncSession); 0 - изменений еще не было"""
+        result = await db.execute(
+            select(UserChangeCounter.version).where(UserChangeCounter.user_id == user_id)
+        )
+        return result.scalar() or 0
+
+    @staticmethod
+    async def get_cursor_async(db, organization_id: uuid.UUID) -> int:
+        result = await db.execute(ChangeFeedService._cursor_query(organization_id))
+        return result.scalar() or 0
+
+    @classmethod
+    def cleanup(cls, db: Session) -> int:
+        """Удалить события старше RETENTION_DAYS"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=cls.RETENTION_DAYS)
+        deleted = db.query(ChangeEvent).filter(ChangeEvent.created_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    # ========== ПОДПИСКИ ==========
+
+    @classmethod
+    def subscribe(cls, organization_id: uuid.UUID) -> ChangeFeedSubscription:
+        subscription = ChangeFeedSubscription(organization_id, asyncio.get_running_loop())
+        with cls._lock:
+            cls._subscribers.setdefault(subscription.organization_id, set()).add(subscription)
+            if cls._listener is None or not cls._listener.is_alive():
+                cls._stop_event.clear()
+                cls._listener = threading.Thread(target=cls._listen, name="change-feed-listener", daemon=True)
+                cls._listener.start()
+        return subscription
+
+    @classmethod
+    def unsubscribe(cls, subscription: ChangeFeedSubscription):
+        with cls._lock:
+            subscribers = cls._subscribers.get(subscription.organization_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del cls._subscribers[subscription.organization_id]
+
+    @classmethod
+    def stop(cls):
+        cls._stop_event.set()
+
+    @classmethod
+    def _dispatch(cls, organization_id: str):
+        with cls._lock:
+            subscribers = list(cls._subscribers.get(organization_id, ()))
+        for subscription in subscribers:
+            subscription.notify()
+
+    @classmethod
+    def _listen(cls):
+        """LISTEN на отдельном соединении; при обрыве - переподключение"""
+        while not cls._stop_event.is_set():
+            try:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    dbapi_connection = connection.connection.dbapi_connection
+                    with dbapi_connection.cursor() as cursor:
+                        cursor.execute(f"LISTEN {cls.CHANNEL}")
+                    logger.info("📡 Change feed listener started")
+
+                    # После переподключения уведомления могли быть пропущены
+                    with cls._lock:
+                        organization_ids = list(cls._subscribers)
+                    for organization_id in organization_ids:
+                        cls._dispatch(organization_id)
+
+                    while not cls._stop_event.is_set():
+                        if select_module.select([dbapi_connection], [], [], 5) == ([], [], []):
+                            continue
+                        dbapi_connection.poll()
+                        organizations = set()
+                        while dbapi_connection.notifies:
+                            notification = dbapi_connection.notifies.pop(0)
+                            try:
+                                organizations.add(json.loads(notification.payload)["organization_id"])
+                            except (ValueError, KeyError):
+                                continue
+                        for organization_id in organizations:
+                            cls._dispatch(organization_id)
+            except Exception as e:
+                logger.warning("Change feed listener error: %s", e)
+                cls._stop_event.wait(5)
@@ -1,8 +1,20 @@
 # backend/services/comprehensive_report_service.py
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, desc, or_
+from sqlalchemy import and_, func, desc, or_, select, text, event, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
 import uuid
 import xlsxwriter
 import io
@@ -11,28 +23,278 @@ from xml.dom import minidom
 
 from models.extended_models import (
     Organization, User, Property, Rental, Task, Payroll, 
-    Inventory, InventoryMovement, PropertyStatus, TaskStatus
+    Inventory, InventoryMovement, PropertyStatus, TaskStatus,
+    DailyPropertyFact, ReportFactCoverage, ReportDataVersion
 )
 from models.acquiring_models import AcquiringSettings
+from models.database import SessionLocal
+from services.occupancy_service import OccupancyService
 from schemas.comprehensive_report import (
     ComprehensiveReportRequest, ComprehensiveReportResponse,
     StaffPayrollDetail, InventoryMovementDetail, PropertyRevenueDetail,
     AdministrativeExpense
 )
 
+logger = logging.getLogger(__name__)
+
+# Таблицы, из которых строится полный отчет: запись в них увеличивает версию
+# данных организации в той же транзакции (ComprehensiveReportService.bump_data_versions)
+REPORT_SOURCE_MODELS = (
+    Organization, User, Property, Rental, Payroll, Inventory, InventoryMovement,
+    AcquiringSettings, DailyPropertyFact, ReportFactCoverage
+)
+# Организация изменения неизвестна - увеличить версии всех организаций
+ALL_ORGANIZATIONS = "*"
+
+
+def _organization_column(model):
+    return model.id if model is Organization else model.organization_id
+
+
+def _criteria_organization(whereclause, column) -> Optional[Any]:
+    """Организация из условия вида organization_id == :value (в том числе внутри AND)"""
+    clauses = whereclause.clauses if isinstance(whereclause, BooleanClauseList) and whereclause.operator is operators.and_ else [whereclause]
+    for clause in clauses:
+        if (
+            isinstance(clause, BinaryExpression) and clause.operator is operators.eq
+            and clause.left.compare(column.expression) and isinstance(clause.right, BindParameter)
+        ):
+            return clause.right.effective_value
+    return None
+
+
+def _add_report_organizations(session, organizations):
+    organizations = {organization_id for organization_id in organizations if organization_id}
+    if organizations:
+        session.info.setdefault("report_organizations", set()).update(organizations)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_report_changes(session, flush_context, instances):
+    # Новая организация еще без id и без отчетов
+    changed = [
+        instance for instance in session.new
+        if isinstance(instance, REPORT_SOURCE_MODELS) and not isinstance(instance, Organization)
+    ]
+    changed += [
+        instance for instance in session.dirty
+        if isinstance(instance, REPORT_SOURCE_MODELS) and session.is_modified(instance)
+    ]
+    changed += [instance for instance in session.deleted if isinstance(instance, REPORT_SOURCE_MODELS)]
+    _add_report_organizations(session, (
+        getattr(instance, _organization_column(type(instance)).key) for instance in changed
+    ))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_report_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or not issubclass(mapper.class_, REPORT_SOURCE_MODELS):
+        return
+
+    session = orm_execute_state.session
+    column = _organization_column(mapper.class_)
+    parameters = orm_execute_state.parameters
+    rows = parameters if isinstance(parameters, list) else [parameters] if parameters else []
+    whereclause = getattr(orm_execute_state.statement, "whereclause", None)
+
+    if rows and all(row.get(column.key) for row in rows):
+        # Пакетная вставка или обновление со значением организации в строках
+        organizations = {row[column.key] for row in rows}
+    elif rows and whereclause is None and all(row.get("id") for row in rows):
+        # Пакетное обновление по первичному ключу
+        organizations = session.execute(
+            select(column).distinct().where(mapper.class_.id.in_([row["id"] for row in rows]))
+        ).scalars().all()
+    elif whereclause is not None:
+        organization_id = _criteria_organization(whereclause, column)
+        organizations = [organization_id] if organization_id else session.execute(
+            select(column).distinct().where(whereclause)
+        ).scalars().all()
+    else:
+        organizations = [ALL_ORGANIZATIONS]
+    _add_report_organizations(session, organizations)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_report_versions(session):
+    # Изменения, которые коммит сбросил бы после этого события
+    session.flush()
+    organizations = session.info.pop("report_organizations", None)
+    if organizations:
+        ComprehensiveReportService.bump_data_versions(session, organizations)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_report_changes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("report_organizations", None)
+
+
 class ComprehensiveReportService:
-    """Сервис для генерации полного комплексного отчета"""
+    """Сервис для генерации полного комплексного отчета
+
+    Разделы отчета (зарплаты, материалы, помещения, административные
+    расходы) строятся групповыми запросами параллельно, каждый на своем
+    соединении. Соединения разделов импортируют снимок транзакции запроса
+    (pg_export_snapshot), поэтому все разделы видят одни и те же данные.
+
+    Готовый отчет кэшируется в процессе по ключу (организация, период,
+    входные параметры, версия данных). Версия организации увеличивается
+    в транзакции, которая пишет в исходные таблицы (события сессии
+    REPORT_SOURCE_MODELS), поэтому после коммита любого изменения ключ
+    новый. Одновременные запросы с одним ключом ждут одно вычисление,
+    поэтому generate, preview и export за один период считаются один раз.
+    """
+
+    CACHE_TTL_SECONDS = float(os.getenv("COMPREHENSIVE_REPORT_CACHE_TTL", "600"))
+    CACHE_MAX_ENTRIES = int(os.getenv("COMPREHENSIVE_REPORT_CACHE_SIZE", "64"))
+
+    _cache_lock = threading.Lock()
+    _cache: "OrderedDict[Tuple, Tuple[float, ComprehensiveReportResponse]]" = OrderedDict()
+    _inflight: Dict[Tuple, Future] = {}
+
+    # Отдельный пул: отчет сам выполняется в blocking_executor и ждет разделы
+    _section_executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("REPORT_SECTION_WORKERS", "4")),
+        thread_name_prefix="report-section"
+    )
+
+    SNAPSHOT_ID = re.compile(r"^[0-9A-Fa-f-]+$")
     
-    @staticmethod
+    @classmethod
     def generate_comprehensive_report(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        request: ComprehensiveReportRequest
+    ) -> ComprehensiveReportResponse:
+        """Полный отчет с детализацией (из кэша, если данные не менялись)"""
+        
+        key = cls._cache_key(db, organization_id, request)
+        
+        with cls._cache_lock:
+            entry = cls._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                cls._cache.move_to_end(key)
+                logger.debug("📦 Полный отчет для организации %s взят из кэша", organization_id)
+                return entry[1]
+            
+            future = cls._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = cls._inflight[key] = Future()
+        
+        if not owner:
+            return future.result()
+        
+        try:
+            report = cls._build_report(db, organization_id, request)
+        except BaseException as e:
+            with cls._cache_lock:
+                cls._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        
+        with cls._cache_lock:
+            cls._inflight.pop(key, None)
+            cls._cache[key] = (time.monotonic() + cls.CACHE_TTL_SECONDS, report)
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls.CACHE_MAX_ENTRIES:
+                cls._cache.popitem(last=False)
+        
+        future.set_result(report)
+        return report
+    
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+    
+    @staticmethod
+    def _cache_key(
+        db: Session,
+        organization_id: uuid.UUID,
+        request: ComprehensiveReportRequest
+    ) -> Tuple:
+        # Формат файла на данные отчета не влияет
+        inputs = json.dumps(
+            request.model_dump(mode="json", exclude={"format", "start_date", "end_date"}),
+            sort_keys=True
+        )
+        return (
+            str(organization_id),
+            request.start_date.isoformat(),
+            request.end_date.isoformat(),
+            hashlib.sha256(inputs.encode("utf-8")).hexdigest(),
+            ComprehensiveReportService.get_data_version(db, organization_id)
+        )
+    
+    @staticmethod
+    def get_data_version(db: Session, organization_id: uuid.UUID) -> int:
+        """Версия исходных данных отчетов организации"""
+        version = db.execute(
+            select(ReportDataVersion.version).where(ReportDataVersion.organization_id == organization_id)
+        ).scalar()
+        return version or 0
+    
+    @staticmethod
+    def bump_data_versions(db: Session, organization_ids) -> None:
+        """
+        Увеличить версии данных организаций в текущей транзакции
+        
+        Вызывается перед коммитом записи в исходные таблицы. Строки версий
+        блокируются до коммита, поэтому отчет, прочитавший новую версию,
+        видит и записанные данные. Удаленные в транзакции организации
+        пропускаются.
+        """
+        now = datetime.now(timezone.utc)
+        organizations = select(Organization.id, literal(1), literal(now)).order_by(Organization.id)
+        if ALL_ORGANIZATIONS not in organization_ids:
+            organizations = organizations.where(Organization.id.in_(list(organization_ids)))
+        
+        stmt = pg_insert(ReportDataVersion).from_select(
+            ["organization_id", "version", "updated_at"], organizations
+        )
+        db.connection().execute(stmt.on_conflict_do_update(
+            index_elements=["organization_id"],
+            set_={"version": ReportDataVersion.version + 1, "updated_at": now}
+        ))
+    
+    @staticmethod
+    def _export_snapshot(db: Session) -> Optional[str]:
+        """Снимок текущей транзакции для соединений разделов"""
+        try:
+            snapshot_id = db.execute(text("SELECT pg_export_snapshot()")).scalar()
+        except Exception as e:
+            # Например, реплика в режиме восстановления - разделы читают без общего снимка
+            db.rollback()
+            logger.warning("Could not export snapshot for report sections: %s", e)
+            return None
+        return snapshot_id if snapshot_id and ComprehensiveReportService.SNAPSHOT_ID.match(snapshot_id) else None
+    
+    @staticmethod
+    def _run_section(snapshot_id: Optional[str], section: Callable[..., Any], *args) -> Any:
+        """Выполнить раздел отчета на отдельном соединении"""
+        with SessionLocal() as db:
+            if snapshot_id:
+                db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                db.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+            return section(db, *args)
+    
+    @classmethod
+    def _build_report(
+        cls,
         db: Session,
         organization_id: uuid.UUID,
         request: ComprehensiveReportRequest
     ) -> ComprehensiveReportResponse:
         """Генерация полного отчета с детализацией"""
         
-        print(f"🏢 Генерация полного отчета для организации {organization_id}")
-        print(f"📅 Период: {request.start_date} - {request.end_date}")
+        logger.debug("🏢 Генерация полного отчета для организации %s", organization_id)
+        logger.debug("📅 Период: %s - %s", request.start_date, request.end_date)
         
         # Получаем информацию об организации
         organization = db.query(Organization).filter(
@@ -46,28 +308,47 @@ class ComprehensiveReportService:
         acquiring_settings = db.query(AcquiringSettings).filter(
             AcquiringSettings.organization_id == organization_id
         ).first()
+        providers_config = acquiring_settings.providers_config if acquiring_settings else None
+        
+        snapshot_id = cls._export_snapshot(db)
+        started = time.perf_counter()
+        
+        sections = {
+            # Детализация зарплат
+            "staff_payroll": (
+                cls._generate_staff_payroll_details,
+                organization_id, request.start_date, request.end_date
+            ),
+            # Товары и материалы
+            "inventory_movements": (
+                cls._generate_inventory_details,
+                organization_id, request.start_date, request.end_date
+            ),
+            # Аренда помещений с эквайрингом
+            "property_revenues": (
+                cls._generate_property_revenue_details,
+                organization_id, request.start_date, request.end_date, providers_config
+            ),
+            # Административные расходы
+            "administrative_expenses": (
+                cls._generate_administrative_expenses,
+                organization_id, request.start_date, request.end_date,
+                request.utility_bills_amount, request.additional_admin_expenses,
+                acquiring_settings is not None, providers_config
+            ),
+        }
+        futures = {
+            name: cls._section_executor.submit(cls._run_section, snapshot_id, *section)
+            for name, section in sections.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
         
-        # Детализация зарплат
-        staff_payroll = ComprehensiveReportService._generate_staff_payroll_details(
-            db, organization_id, request.start_date, request.end_date
-        )
-        
-        # Товары и материалы
-        inventory_movements = ComprehensiveReportService._generate_inventory_details(
-            db, organization_id, request.start_date, request.end_date
-        )
-        
-        # Аренда помещений с эквайрингом
-        property_revenues = ComprehensiveReportService._generate_property_revenue_details(
-            db, organization_id, request.start_date, request.end_date, acquiring_settings
-        )
+        logger.debug("⏱️ Разделы полного отчета построены за %.1f ms", (time.perf_counter() - started) * 1000)
         
-        # Административные расходы
-        administrative_expenses = ComprehensiveReportService._generate_administrative_expenses(
-            db, organization_id, request.start_date, request.end_date, 
-            request.utility_bills_amount, request.additional_admin_expenses,
-            acquiring_settings
-        )
+        staff_payroll = results["staff_payroll"]
+        inventory_movements = results["inventory_movements"]
+        property_revenues = results["property_revenues"]
+        administrative_expenses = results["administrative_expenses"]
         
         # Сводки
         payroll_summary = {
@@ -146,8 +427,12 @@ class ComprehensiveReportService:
     ) -> List[StaffPayrollDetail]:
         """Генерация детализации по зарплатам"""
         
-        # Получаем все зарплаты с пересечением периода
-        payrolls = db.query(Payroll).filter(
+        # Зарплаты с пересечением периода вместе с сотрудником одним запросом
+        rows = db.query(
+            Payroll, User.id.label("user_id"), User.first_name, User.last_name, User.role
+        ).join(
+            User, User.id == Payroll.user_id
+        ).filter(
             and_(
                 Payroll.organization_id == organization_id,
                 Payroll.period_start < end_date,
@@ -157,11 +442,7 @@ class ComprehensiveReportService:
         
         payroll_details = []
         
-        for payroll in payrolls:
-            user = payroll.user
-            if not user:
-                continue
-            
+        for payroll, user_id, first_name, last_name, role in rows:
             # Рассчитываем налоги отдельно (примерные ставки для КЗ)
             income_tax_rate = 0.10  # 10% подоходный налог
             social_tax_rate = 0.095  # 9.5% социальный налог
@@ -178,9 +459,9 @@ class ComprehensiveReportService:
                 social_tax = payroll.taxes * (1 - tax_ratio)
             
             payroll_details.append(StaffPayrollDetail(
-                user_id=str(user.id),
-                name=f"{user.first_name} {user.last_name}",
-                role=user.role.value,
+                user_id=str(user_id),
+                name=f"{first_name} {last_name}",
+                role=role.value,
                 base_salary=payroll.base_rate or 0,
                 task_payments=payroll.tasks_payment,
                 bonuses=payroll.bonus + payroll.tips,
@@ -205,139 +486,121 @@ class ComprehensiveReportService:
     ) -> List[InventoryMovementDetail]:
         """Генерация детализации по товарам и материалам"""
         
-        # Получаем все товары организации
-        inventory_items = db.query(Inventory).filter(
+        is_incoming = InventoryMovement.movement_type == "in"
+        is_outgoing = InventoryMovement.movement_type == "out"
+        
+        # Движения за период, сгруппированные по товару
+        movements = db.query(
+            InventoryMovement.inventory_id,
+            func.coalesce(func.sum(InventoryMovement.quantity).filter(is_incoming), 0).label("incoming_quantity"),
+            func.coalesce(func.sum(InventoryMovement.quantity).filter(is_outgoing), 0).label("outgoing_quantity"),
+            func.coalesce(func.sum(InventoryMovement.total_cost).filter(is_incoming), 0).label("incoming_cost"),
+            func.coalesce(func.sum(InventoryMovement.total_cost).filter(is_outgoing), 0).label("outgoing_cost")
+        ).filter(
+            and_(
+                InventoryMovement.organization_id == organization_id,
+                InventoryMovement.created_at >= start_date,
+                InventoryMovement.created_at <= end_date
+            )
+        ).group_by(InventoryMovement.inventory_id).subquery()
+        
+        # Товары без движений за период в отчет не попадают
+        rows = db.query(
+            Inventory.id, Inventory.name, Inventory.current_stock, Inventory.unit, Inventory.category,
+            movements.c.incoming_quantity, movements.c.outgoing_quantity,
+            movements.c.incoming_cost, movements.c.outgoing_cost
+        ).join(
+            movements, movements.c.inventory_id == Inventory.id
+        ).filter(
             Inventory.organization_id == organization_id
         ).all()
         
         inventory_details = []
         
-        for item in inventory_items:
-            # Движения за период
-            movements = db.query(InventoryMovement).filter(
-                and_(
-                    InventoryMovement.inventory_id == item.id,
-                    InventoryMovement.created_at >= start_date,
-                    InventoryMovement.created_at <= end_date
-                )
-            ).all()
-            
-            if not movements:
-                continue
-            
-            # Входящие движения (поступления)
-            incoming_movements = [m for m in movements if m.movement_type == "in"]
-            outgoing_movements = [m for m in movements if m.movement_type == "out"]
-            
-            incoming_quantity = sum(m.quantity for m in incoming_movements)
-            outgoing_quantity = sum(m.quantity for m in outgoing_movements)
-            
-            incoming_cost = sum(m.total_cost or 0 for m in incoming_movements)
-            outgoing_cost = sum(m.total_cost or 0 for m in outgoing_movements)
-            
+        for row in rows:
             # Прибыль = выручка от продаж - себестоимость
             # Предполагаем, что цена продажи в 1.5 раза больше себестоимости
-            revenue_from_sales = outgoing_cost * 1.5  # Примерная наценка
-            net_profit = revenue_from_sales - outgoing_cost
+            revenue_from_sales = row.outgoing_cost * 1.5  # Примерная наценка
+            net_profit = revenue_from_sales - row.outgoing_cost
             
             inventory_details.append(InventoryMovementDetail(
-                inventory_id=str(item.id),
-                item_name=item.name,
-                incoming_quantity=incoming_quantity,
-                outgoing_quantity=outgoing_quantity,
-                current_stock=item.current_stock,
-                incoming_cost=incoming_cost,
-                outgoing_cost=outgoing_cost,
+                inventory_id=str(row.id),
+                item_name=row.name,
+                incoming_quantity=row.incoming_quantity,
+                outgoing_quantity=row.outgoing_quantity,
+                current_stock=row.current_stock,
+                incoming_cost=row.incoming_cost,
+                outgoing_cost=row.outgoing_cost,
                 net_profit=net_profit,
-                unit=item.unit,
-                category=item.category or "Общее"
+                unit=row.unit,
+                category=row.category or "Общее"
             ))
         
         return sorted(inventory_details, key=lambda x: x.net_profit, reverse=True)
     
+    @staticmethod
+    def _commission_rate(providers_config: Optional[Dict[str, Any]]) -> float:
+        """Комиссия эквайринга: Halyk, иначе минимальная среди включенных провайдеров (по умолчанию 2%)"""
+        
+        default_commission_rate = 2.0
+        
+        if providers_config:
+            halyk_config = providers_config.get("halyk")
+            if halyk_config:
+                return halyk_config.get("commission_rate", 2.0)
+            
+            all_rates = [
+                config.get("commission_rate", 2.0) 
+                for config in providers_config.values()
+                if isinstance(config, dict) and config.get("is_enabled", False)
+            ]
+            if all_rates:
+                return min(all_rates)
+        
+        return default_commission_rate
+    
     @staticmethod
     def _generate_property_revenue_details(
         db: Session,
         organization_id: uuid.UUID,
         start_date: datetime,
         end_date: datetime,
-        acquiring_settings: Optional[Any]
+        providers_config: Optional[Dict[str, Any]]
     ) -> List[PropertyRevenueDetail]:
         """Генерация детализации доходов по помещениям с учетом эквайринга"""
         
-        properties = db.query(Property).filter(
+        properties = db.query(Property.id, Property.name, Property.number).filter(
             and_(
                 Property.organization_id == organization_id,
                 Property.is_active == True
             )
         ).all()
         
-        # Получаем комиссию эквайринга (по умолчанию Halyk с минимальной ставкой)
-        default_commission_rate = 2.0  # 2% по умолчанию
-        
-        if acquiring_settings and acquiring_settings.providers_config:
-            # Ищем Halyk или берем минимальную ставку
-            halyk_config = acquiring_settings.providers_config.get("halyk")
-            if halyk_config:
-                default_commission_rate = halyk_config.get("commission_rate", 2.0)
-            else:
-                # Берем минимальную комиссию среди всех провайдеров
-                all_rates = [
-                    config.get("commission_rate", 2.0) 
-                    for config in acquiring_settings.providers_config.values()
-                    if isinstance(config, dict) and config.get("is_enabled", False)
-                ]
-                if all_rates:
-                    default_commission_rate = min(all_rates)
+        default_commission_rate = ComprehensiveReportService._commission_rate(providers_config)
         
         property_details = []
         period_days = (end_date - start_date).days + 1
         
+        # Выручка и занятые дни всех помещений за один проход
+        property_stats = OccupancyService.calculate_property_stats(
+            db, organization_id, start_date, end_date
+        )
+        
         for prop in properties:
-            # Получаем аренды за период
-            rentals = db.query(Rental).filter(
-                and_(
-                    Rental.property_id == prop.id,
-                    Rental.start_date < end_date,
-                    Rental.end_date > start_date,
-                    Rental.paid_amount > 0
-                )
-            ).all()
-            
-            total_revenue = 0
-            cash_payments = 0
-            card_payments = 0
+            stats = property_stats.get(prop.id, {"occupied_days": 0, "revenue": 0.0})
+            total_revenue = stats["revenue"]
             
-            for rental in rentals:
-                # Пропорциональный доход за период
-                overlap_start = max(rental.start_date.replace(tzinfo=None), start_date.replace(tzinfo=None))
-                overlap_end = min(rental.end_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
-                
-                if overlap_end > overlap_start:
-                    days_in_period = (overlap_end - overlap_start).days + 1
-                    total_rental_days = (rental.end_date - rental.start_date).days + 1
-                    
-                    if total_rental_days > 0:
-                        revenue_per_day = rental.paid_amount / total_rental_days
-                        period_revenue = revenue_per_day * days_in_period
-                        total_revenue += period_revenue
-                        
-                        # Распределяем по типам оплаты (примерно 50/50 если нет точных данных)
-                        # В реальной системе это должно браться из payment_method в таблице payments
-                        estimated_card_payment = period_revenue * 0.6  # 60% картами
-                        estimated_cash_payment = period_revenue * 0.4  # 40% наличными
-                        
-                        card_payments += estimated_card_payment
-                        cash_payments += estimated_cash_payment
+            # Распределяем по типам оплаты (примерно 60/40 если нет точных данных)
+            # В реальной системе это должно браться из payment_method в таблице payments
+            card_payments = total_revenue * 0.6  # 60% картами
+            cash_payments = total_revenue * 0.4  # 40% наличными
             
             # Комиссия эквайринга только с карточных платежей
             acquiring_commission_amount = card_payments * (default_commission_rate / 100)
             net_revenue_after_commission = total_revenue - acquiring_commission_amount
             
             # Загруженность помещения
-            occupied_days = ComprehensiveReportService._calculate_property_occupied_days(
-                db, prop.id, start_date, end_date
-            )
+            occupied_days = stats["occupied_days"]
             occupancy_rate = (occupied_days / period_days * 100) if period_days > 0 else 0
             
             property_details.append(PropertyRevenueDetail(
@@ -357,60 +620,6 @@ class ComprehensiveReportService:
         
         return sorted(property_details, key=lambda x: x.total_revenue, reverse=True)
     
-    @staticmethod
-    def _calculate_property_occupied_days(
-        db: Session,
-        property_id: uuid.UUID,
-        start_date: datetime,
-        end_date: datetime
-    ) -> int:
-        """Расчет занятых дней для помещения"""
-        
-        rentals = db.query(Rental).filter(
-            and_(
-                Rental.property_id == property_id,
-                Rental.start_date < end_date,
-                Rental.end_date > start_date
-            )
-        ).all()
-        
-        if not rentals:
-            return 0
-        
-        occupied_periods = []
-        
-        for rental in rentals:
-            rental_start = rental.start_date.replace(tzinfo=None) if rental.start_date.tzinfo else rental.start_date
-            rental_end = rental.end_date.replace(tzinfo=None) if rental.end_date.tzinfo else rental.end_date
-            period_start = start_date.replace(tzinfo=None) if start_date.tzinfo else start_date
-            period_end = end_date.replace(tzinfo=None) if end_date.tzinfo else end_date
-            
-            overlap_start = max(rental_start, period_start)
-            overlap_end = min(rental_end, period_end)
-            
-            if overlap_end > overlap_start:
-                occupied_periods.append((overlap_start, overlap_end))
-        
-        # Объединяем пересекающиеся периоды
-        if not occupied_periods:
-            return 0
-        
-        occupied_periods.sort(key=lambda x: x[0])
-        merged_periods = []
-        current_start, current_end = occupied_periods[0]
-        
-        for start, end in occupied_periods[1:]:
-            if start <= current_end:
-                current_end = max(current_end, end)
-            else:
-                merged_periods.append((current_start, current_end))
-                current_start, current_end = start, end
-        
-        merged_periods.append((current_start, current_end))
-        
-        total_days = sum((end - start).days + 1 for start, end in merged_periods)
-        return total_days
-    
     @staticmethod
     def _generate_administrative_expenses(
         db: Session,
@@ -419,7 +628,8 @@ class ComprehensiveReportService:
         end_date: datetime,
         utility_bills: float,
         additional_expenses: List[AdministrativeExpense],
-        acquiring_settings: Optional[Any]
+        has_acquiring: bool,
+        providers_config: Optional[Dict[str, Any]]
     ) -> List[AdministrativeExpense]:
         """Генерация административных расходов"""
         
@@ -433,26 +643,26 @@ class ComprehensiveReportService:
                 amount=utility_bills
             ))
         
+        # Оплаты аренд за период - база для комиссий и налогов
+        total_revenue = db.query(func.sum(Rental.paid_amount)).filter(
+            and_(
+                Rental.organization_id == organization_id,
+                Rental.created_at >= start_date,
+                Rental.created_at <= end_date
+            )
+        ).scalar() or 0
+        
         # Банковские комиссии (рассчитываем из эквайринга)
-        if acquiring_settings:
-            # Примерный расчет комиссий за период
-            total_card_revenue = db.query(func.sum(Rental.paid_amount)).filter(
-                and_(
-                    Rental.organization_id == organization_id,
-                    Rental.created_at >= start_date,
-                    Rental.created_at <= end_date
-                )
-            ).scalar() or 0
-            
+        if has_acquiring:
             # Предполагаем, что 60% оплат картами
-            estimated_card_revenue = total_card_revenue * 0.6
+            estimated_card_revenue = total_revenue * 0.6
             
             # Берем минимальную комиссию
             min_commission = 2.0
-            if acquiring_settings.providers_config:
+            if providers_config:
                 rates = [
                     config.get("commission_rate", 2.0)
-                    for config in acquiring_settings.providers_config.values()
+                    for config in providers_config.values()
                     if isinstance(config, dict) and config.get("is_enabled", False)
                 ]
                 if rates:
@@ -467,15 +677,6 @@ class ComprehensiveReportService:
                     amount=bank_commission
                 ))
         
-        # Налоги организации (примерно)
-        total_revenue = db.query(func.sum(Rental.paid_amount)).filter(
-            and_(
-                Rental.organization_id == organization_id,
-                Rental.created_at >= start_date,
-                Rental.created_at <= end_date
-            )
-        ).scalar() or 0
-        
         # КПН (корпоративный подоходный налог) - 20% в КЗ
         corporate_tax = total_revenue * 0.20
         expenses.append(AdministrativeExpense(
@@ -0,0 +1,279 @@
+# backend/services/dashboard_snapshot_service.py
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, select, true
+from sqlalchemy.dialects.postgresql import insert
+import logging
+import os
+import uuid
+
+from models.extended_models import (
+    Property, Rental, Client, Task, RoomOrder, Payroll, User,
+    TaskStatus, OrderStatus, UserRole, DashboardSnapshot
+)
+from models.models import UserStatus
+from services.occupancy_service import OccupancyService
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardSnapshotService:
+    """Предрассчитанные сводки дашборда
+
+    Фоновый сервис периодически пересчитывает сводку каждой организации
+    и сохраняет ее в dashboard_snapshots с увеличением версии. Запросы
+    дашборда отдают сохраненный снимок; устаревший (старше MAX_AGE или
+    рассчитанный в другой день) снимок пересчитывается на месте.
+    """
+
+    REFRESH_MINUTES = int(os.getenv("DASHBOARD_REFRESH_MINUTES", "5"))
+    MAX_AGE = timedelta(minutes=3 * REFRESH_MINUTES)
+
+    @staticmethod
+    def compute_data(
+        db: Session,
+        organization_id: uuid.UUID,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Рассчитать показатели дашборда
+
+        Все счетчики собираются одним запросом: по каждой таблице строится
+        однострочный подзапрос с условиями FILTER, подзапросы соединяются
+        между собой. Отдельно считается только загруженность помещений.
+        """
+        now = now or datetime.now(timezone.utc)
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        today_end = today_start + timedelta(days=1)
+        month_start = today_start.replace(day=1)
+
+        active_task_statuses = [TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS]
+        open_task_statuses = [TaskStatus.PENDING, TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS]
+        staff_roles = [role for role in UserRole if role != UserRole.SYSTEM_OWNER]
+
+        properties = select(
+            func.count(Property.id).label("total_properties")
+        ).where(Property.organization_id == organization_id).subquery()
+
+        rentals = select(
+            func.count(Rental.id).filter(Rental.is_active == True).label("active_rentals"),
+            func.count(Rental.id).filter(
+                and_(Rental.created_at >= today_start, Rental.created_at < today_end)
+            ).label("new_bookings"),
+            func.count(Rental.id).filter(
+                and_(Rental.check_in_time >= today_start, Rental.check_in_time < today_end)
+            ).label("check_ins"),
+            func.count(Rental.id).filter(
+                and_(Rental.check_out_time >= today_start, Rental.check_out_time < today_end)
+            ).label("check_outs"),
+            func.coalesce(
+                func.sum(Rental.paid_amount).filter(Rental.created_at >= month_start), 0
+            ).label("month_revenue"),
+            func.count(Rental.id).filter(Rental.paid_amount < Rental.total_amount).label("unpaid_invoices")
+        ).where(Rental.organization_id == organization_id).subquery()
+
+        clients = select(
+            func.count(Client.id).label("total_clients"),
+            func.count(Client.id).filter(Client.created_at >= month_start).label("new_clients")
+        ).where(Client.organization_id == organization_id).subquery()
+
+        staff = select(
+            func.count(User.id).label("total_staff"),
+            *[
+                func.count(User.id).filter(
+                    and_(User.role == role, User.status == UserStatus.ACTIVE)
+                ).label(f"staff_{role.value}")
+                for role in staff_roles
+            ]
+        ).where(User.organization_id == organization_id).subquery()
+
+        tasks = select(
+            func.count(Task.id).filter(
+                and_(
+                    Task.status == TaskStatus.COMPLETED,
+                    Task.completed_at >= today_start,
+                    Task.completed_at < today_end
+                )
+            ).label("completed_today"),
+            func.count(Task.id).filter(Task.status.in_(active_task_statuses)).label("active_tasks"),
+            func.count(Task.id).filter(Task.status == TaskStatus.PENDING).label("pending_tasks"),
+            func.count(Task.id).filter(
+                and_(Task.due_date < now, Task.status.in_(open_task_statuses))
+            ).label("overdue_tasks")
+        ).where(Task.organization_id == organization_id).subquery()
+
+        orders = select(
+            func.count(RoomOrder.id).filter(RoomOrder.status == OrderStatus.PENDING).label("pending_orders")
+        ).where(RoomOrder.organization_id == organization_id).subquery()
+
+        payrolls = select(
+            func.count(Payroll.id).filter(Payroll.is_paid == False).label("pending_payrolls")
+        ).where(Payroll.organization_id == organization_id).subquery()
+
+        parts = [properties, rentals, clients, staff, tasks, orders, payrolls]
+        joined = parts[0]
+        for part in parts[1:]:
+            joined = joined.join(part, true())
+
+        row = db.execute(
+            select(*[column for part in parts for column in part.c]).select_from(joined)
+        ).one()
+
+        return {
+            "organization_stats": {
+                "total_properties": row.total_properties,
+                "active_rentals": row.active_rentals,
+                "total_clients": row.total_clients,
+                "total_staff": row.total_staff
+            },
+            "today_stats": {
+                "new_bookings": row.new_bookings,
+                "check_ins": row.check_ins,
+                "check_outs": row.check_outs,
+                "completed_tasks": row.completed_today
+            },
+            "month_stats": {
+                "revenue": float(row.month_revenue or 0),
+                "new_clients": row.new_clients,
+                "occupancy_rate": OccupancyService.calculate_occupancy_rate(
+                    db, organization_id, month_start, now
+                )
+            },
+            "executor": {
+                "pending_tasks": row.active_tasks,
+                "completed_today": row.completed_today
+            },
+            "accountant": {
+                "unpaid_invoices": row.unpaid_invoices,
+                "pending_payrolls": row.pending_payrolls
+            },
+            "admin": {
+                "staff_by_role": {
+                    role.value: getattr(row, f"staff_{role.value}") for role in staff_roles
+                },
+                "tasks_attention": {
+                    "pending_tasks": row.pending_tasks,
+                    "overdue_tasks": row.overdue_tasks
+                },
+                "orders_attention": {
+                    "pending_orders": row.pending_orders
+                }
+            }
+        }
+
+    @staticmethod
+    def compose_summary(data: Dict[str, Any], user_role: UserRole) -> Dict[str, Any]:
+        """Сводка в формате generate_dashboard_summary для роли пользователя"""
+
+        summary = {
+            "organization_stats": dict(data["organization_stats"]),
+            "today_stats": dict(data["today_stats"]),
+            "month_stats": dict(data["month_stats"]),
+            "user_specific": {}
+        }
+
+        if user_role in [UserRole.CLEANER, UserRole.TECHNICAL_STAFF]:
+            summary["user_specific"] = dict(data["executor"])
+        elif user_role == UserRole.ACCOUNTANT:
+            summary["user_specific"] = dict(data["accountant"])
+
+        return summary
+
+    @staticmethod
+    def refresh(db: Session, organization_id: uuid.UUID) -> DashboardSnapshot:
+        """Пересчитать и сохранить снимок организации (версия +1)"""
+
+        now = datetime.now(timezone.utc)
+        data = DashboardSnapshotService.compute_data(db, organization_id, now)
+
+        statement = insert(DashboardSnapshot).values(
+            organization_id=organization_id,
+            version=1,
+            data=data,
+            computed_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[DashboardSnapshot.organization_id],
+            set_={
+                "version": DashboardSnapshot.version + 1,
+                "data": statement.excluded.data,
+                "computed_at": statement.excluded.computed_at
+            }
+        ).returning(DashboardSnapshot.version)
+
+        version = db.execute(statement).scalar_one()
+        db.commit()
+
+        return DashboardSnapshot(
+            organization_id=organization_id,
+            version=version,
+            data=data,
+            computed_at=now
+        )
+
+    @staticmethod
+    def refresh_all(db: Session) -> int:
+        """Пересчитать снимки всех организаций"""
+        from models.models import Organization
+
+        refreshed = 0
+        for (organization_id,) in db.query(Organization.id).all():
+            try:
+                DashboardSnapshotService.refresh(db, organization_id)
+                refreshed += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error refreshing dashboard snapshot for {organization_id}: {e}")
+
+        return refreshed
+
+    @staticmethod
+    def _is_current(snapshot: DashboardSnapshot, now: datetime) -> bool:
+        computed_at = snapshot.computed_at
+        if computed_at.tzinfo is None:
+            computed_at = computed_at.replace(tzinfo=timezone.utc)
+
+        # Дневные показатели снимка, рассчитанного вчера, уже неверны
+        return (
+            now - computed_at <= DashboardSnapshotService.MAX_AGE
+            and computed_at.date() == now.date()
+        )
+
+    @staticmethod
+    def get_snapshot(
+        db: Session,
+        organization_id: uuid.UUID,
+        fresh: bool = False
+    ) -> DashboardSnapshot:
+        """
+        Актуальный снимок организации
+
+        fresh=True или отсутствие/устаревание снимка приводит к пересчету.
+        """
+        if not fresh:
+            snapshot = db.query(DashboardSnapshot).filter(
+                DashboardSnapshot.organization_id == organization_id
+            ).first()
+
+            if snapshot and DashboardSnapshotService._is_current(snapshot, datetime.now(timezone.utc)):
+                return snapshot
+
+        return DashboardSnapshotService.refresh(db, organization_id)
+
+    @staticmethod
+    def get_dashboard_summary(
+        db: Session,
+        organization_id: uuid.UUID,
+        user_role: UserRole,
+        fresh: bool = False
+    ) -> Tuple[Dict[str, Any], DashboardSnapshot]:
+        """Сводка для роли пользователя и снимок, из которого она получена"""
+
+        snapshot = DashboardSnapshotService.get_snapshot(db, organization_id, fresh)
+        summary = DashboardSnapshotService.compose_summary(snapshot.data, user_role)
+        summary["snapshot"] = {
+            "version": snapshot.version,
+            "computed_at": snapshot.computed_at.isoformat()
+        }
+        return summary, snapshot
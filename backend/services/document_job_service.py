@@ -0,0 +1,252 @@
+# backend/services/document_job_service.py
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+import logging
+import os
+import time
+import uuid
+
+from models.database import SessionLocal
+from models.extended_models import Document, DocumentJob, DocumentType
+from services.document_render_service import DocumentRenderService
+from services.document_service import DocumentService, render_pdf_snapshot
+from utils.executor import get_process_executor
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentJobService:
+    """Массовая генерация документов фоновым заданием
+
+    Задание сохраняется в document_jobs и выполняется в отдельном потоке:
+    аренды обрабатываются пачками по CHUNK_SIZE (одна транзакция на пачку),
+    после каждой пачки в задании обновляются прогресс и результаты.
+    При prerender=True PDF созданных документов рендерятся пулом процессов
+    сразу в кэш DocumentRenderService.
+
+    Очередь живет в памяти процесса, поэтому при старте recover_jobs
+    снова ставит в очередь невыполненные задания, а задания, прерванные
+    остановкой процесса, помечает неуспешными.
+    """
+
+    CHUNK_SIZE = int(os.getenv("DOCUMENT_JOB_CHUNK_SIZE", "200"))
+    MAX_RENTALS = int(os.getenv("DOCUMENT_JOB_MAX_RENTALS", "10000"))
+
+    # Задания выполняются по очереди и не занимают общий пул потоков
+    _executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("DOCUMENT_JOB_WORKERS", "1")),
+        thread_name_prefix="document-job"
+    )
+
+    # Задания в статусе running, начатые раньше, выполнялись прежним процессом
+    _process_started_at = datetime.now(timezone.utc)
+
+    @classmethod
+    def create_job(
+        cls,
+        db: Session,
+        rental_ids: List[uuid.UUID],
+        document_type: DocumentType,
+        created_by: uuid.UUID,
+        organization_id: uuid.UUID,
+        prerender: bool = False
+    ) -> DocumentJob:
+        """Создать задание и поставить его в очередь выполнения"""
+
+        # Повторы id не дают повторных документов
+        unique_ids = list(dict.fromkeys(str(rental_id) for rental_id in rental_ids))
+
+        job = DocumentJob(
+            id=uuid.uuid4(),
+            organization_id=organization_id,
+            created_by=created_by,
+            document_type=document_type,
+            rental_ids=unique_ids,
+            prerender=prerender,
+            status="pending",
+            total=len(unique_ids),
+            results=[]
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        cls._executor.submit(cls.run_job, job.id)
+        return job
+
+    @staticmethod
+    def get_job(db: Session, job_id: uuid.UUID, organization_id: uuid.UUID) -> Optional[DocumentJob]:
+        return db.query(DocumentJob).filter(
+            and_(
+                DocumentJob.id == job_id,
+                DocumentJob.organization_id == organization_id
+            )
+        ).first()
+
+    @staticmethod
+    def to_dict(job: DocumentJob, include_results: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": str(job.id),
+            "document_type": job.document_type.value,
+            "status": job.status,
+            "prerender": job.prerender,
+            "total": job.total,
+            "processed": job.processed,
+            "succeeded": job.succeeded,
+            "failed": job.failed,
+            "rendered": job.rendered,
+            "progress": round(job.processed / job.total * 100, 1) if job.total else 100.0,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
+        if include_results:
+            data["results"] = job.results or []
+        return data
+
+    @classmethod
+    def run_job(cls, job_id: uuid.UUID):
+        """Выполнить задание (в потоке document-job)"""
+
+        with SessionLocal() as db:
+            # Задание забирает только один исполнитель, даже если его поставили
+            # в очередь несколько процессов
+            claimed = db.query(DocumentJob).filter(
+                and_(
+                    DocumentJob.id == job_id,
+                    DocumentJob.status == "pending"
+                )
+            ).update(
+                {"status": "running", "started_at": datetime.now(timezone.utc)},
+                synchronize_session=False
+            )
+            db.commit()
+            if not claimed:
+                return
+
+            job = db.query(DocumentJob).filter(DocumentJob.id == job_id).first()
+
+            started = time.perf_counter()
+            try:
+                document_ids = cls._generate(db, job)
+                if job.prerender and document_ids:
+                    cls._prerender(db, job, document_ids)
+
+                job.status = "completed"
+            except Exception as e:
+                db.rollback()
+                logger.exception("Document job %s failed", job_id)
+                job.status = "failed"
+                job.error = str(e)
+
+            job.finished_at = datetime.now(timezone.utc)
+            db.commit()
+
+            logger.info(
+                "📄 Document job %s %s: %s/%s documents, %s rendered in %.1f s",
+                job_id, job.status, job.succeeded, job.total, job.rendered, time.perf_counter() - started
+            )
+
+    @classmethod
+    def recover_jobs(cls, db: Session) -> Dict[str, int]:
+        """Восстановить очередь после перезапуска
+
+        Ожидающие задания снова ставятся в очередь, а задания, которые
+        выполнял остановленный процесс, завершаются со статусом failed:
+        созданные ими документы уже зафиксированы, и повтор дал бы дубликаты.
+        """
+
+        orphaned = db.query(DocumentJob).filter(
+            and_(
+                DocumentJob.status == "running",
+                DocumentJob.started_at < cls._process_started_at
+            )
+        ).update(
+            {
+                "status": "failed",
+                "error": "Interrupted by application restart",
+                "finished_at": datetime.now(timezone.utc)
+            },
+            synchronize_session=False
+        )
+        db.commit()
+
+        pending_ids = [
+            job_id for (job_id,) in db.query(DocumentJob.id).filter(
+                DocumentJob.status == "pending"
+            ).order_by(DocumentJob.created_at).all()
+        ]
+        for job_id in pending_ids:
+            cls._executor.submit(cls.run_job, job_id)
+
+        if orphaned or pending_ids:
+            logger.info(
+                "📄 Document jobs recovered: %s requeued, %s interrupted marked failed",
+                len(pending_ids), orphaned
+            )
+        return {"requeued": len(pending_ids), "failed": orphaned}
+
+    @classmethod
+    def _generate(cls, db: Session, job: DocumentJob) -> List[uuid.UUID]:
+        rental_ids = [uuid.UUID(rental_id) for rental_id in job.rental_ids]
+        results = list(job.results or [])
+        document_ids = []
+
+        for offset in range(0, len(rental_ids), cls.CHUNK_SIZE):
+            chunk = rental_ids[offset:offset + cls.CHUNK_SIZE]
+            try:
+                chunk_results = DocumentService.generate_documents_chunk(
+                    db, chunk, job.document_type, job.created_by, job.organization_id
+                )
+            except Exception as e:
+                db.rollback()
+                logger.warning("Document job %s: chunk at %s failed: %s", job.id, offset, e)
+                chunk_results = {
+                    "success": [],
+                    "errors": [{"rental_id": str(rental_id), "error": str(e)} for rental_id in chunk]
+                }
+
+            results.extend(chunk_results["success"])
+            results.extend(chunk_results["errors"])
+            document_ids.extend(uuid.UUID(item["document_id"]) for item in chunk_results["success"])
+
+            # Документы пачки и прогресс фиксируются одной транзакцией
+            job.processed = min(offset + len(chunk), job.total)
+            job.succeeded += len(chunk_results["success"])
+            job.failed += len(chunk_results["errors"])
+            job.results = list(results)
+            db.commit()
+
+        return document_ids
+
+    @classmethod
+    def _prerender(cls, db: Session, job: DocumentJob, document_ids: List[uuid.UUID]):
+        """Отрендерить PDF созданных документов в кэш пулом процессов"""
+
+        organization = DocumentService.get_organization_details(db, job.organization_id)
+        executor = get_process_executor()
+
+        for offset in range(0, len(document_ids), cls.CHUNK_SIZE):
+            documents = db.query(Document).filter(
+                Document.id.in_(document_ids[offset:offset + cls.CHUNK_SIZE])
+            ).all()
+
+            pending = []
+            for document in documents:
+                snapshot = DocumentService.build_render_snapshot(db, document, organization)
+                path = DocumentRenderService.cache_path(
+                    snapshot["organization_id"], DocumentRenderService.cache_key(snapshot)
+                )
+                if not os.path.exists(path):
+                    pending.append((path, snapshot))
+
+            rendered = executor.map(render_pdf_snapshot, [snapshot for _, snapshot in pending])
+            for (path, _), pdf_content in zip(pending, rendered):
+                DocumentRenderService._write_atomic(path, pdf_content)
+
+            job.rendered += len(documents)
+            db.commit()
@@ -0,0 +1,131 @@
+# backend/services/document_render_service.py
+from datetime import datetime, timedelta
+from typing import Dict, Tuple, Any
+from sqlalchemy.orm import Session
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from models.extended_models import Document
+from services.document_service import DocumentService, render_pdf_snapshot
+from utils.executor import run_blocking, run_in_process
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRenderService:
+    """Рендеринг PDF документов в пуле процессов с кэшем на диске
+
+    Ключ кэша - хэш снимка документа (содержимое, номер, реквизиты
+    организации) и версии шаблонов, поэтому одинаковые данные не
+    рендерятся повторно, а изменение документа дает новый файл.
+    Подписанный документ рендерится один раз: путь к файлу сохраняется
+    в document.file_path и дальше отдается без построения снимка.
+    """
+
+    # Увеличивать при изменении _generate_*_pdf, чтобы сбросить кэш
+    TEMPLATE_VERSION = "1"
+
+    CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", os.path.join(os.getcwd(), "storage", "pdf_cache"))
+    CACHE_MAX_AGE_DAYS = int(os.getenv("DOCUMENT_CACHE_MAX_AGE_DAYS", "30"))
+
+    # Один рендер на ключ при одновременных запросах
+    _render_locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    def cache_key(cls, snapshot: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"template_version": cls.TEMPLATE_VERSION, **snapshot},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def cache_path(cls, organization_id: str, key: str) -> str:
+        return os.path.join(os.path.abspath(cls.CACHE_DIR), organization_id, f"{key}.pdf")
+
+    @staticmethod
+    def file_etag(path: str) -> str:
+        """ETag файла: ключ кэша для файлов кэша, иначе размер и время изменения"""
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext == ".pdf" and len(name) == 64:
+            return f'"{name}"'
+        stat = os.stat(path)
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    @staticmethod
+    def _write_atomic(path: str, content: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    async def get_pdf(cls, db: Session, document: Document) -> Tuple[str, str]:
+        """Путь к PDF документа и его ETag; при промахе кэша - рендер в пуле процессов"""
+
+        if document.is_signed and document.file_path and os.path.exists(document.file_path):
+            return document.file_path, cls.file_etag(document.file_path)
+
+        snapshot = DocumentService.build_render_snapshot(db, document)
+        key = cls.cache_key(snapshot)
+        path = cls.cache_path(snapshot["organization_id"], key)
+
+        if not os.path.exists(path):
+            lock = cls._render_locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                if not os.path.exists(path):
+                    started = time.perf_counter()
+                    pdf_content = await run_in_process(render_pdf_snapshot, snapshot)
+                    await run_blocking(cls._write_atomic, path, pdf_content)
+                    logger.info(
+                        "📄 Rendered document %s (%s bytes) in %.1f ms",
+                        document.id, len(pdf_content), (time.perf_counter() - started) * 1000
+                    )
+            cls._render_locks.pop(key, None)
+        else:
+            # Время доступа для очистки давно не используемых файлов
+            os.utime(path)
+
+        if document.is_signed and document.file_path != path:
+            document.file_path = path
+            db.commit()
+
+        return path, f'"{key}"'
+
+    @classmethod
+    def cleanup_cache(cls, db: Session) -> int:
+        """Удалить файлы кэша, не использовавшиеся дольше CACHE_MAX_AGE_DAYS
+
+        Файлы подписанных документов (document.file_path) отдаются без
+        обновления времени доступа, поэтому они не удаляются вовсе.
+        """
+        if not os.path.isdir(cls.CACHE_DIR):
+            return 0
+
+        cache_dir = os.path.abspath(cls.CACHE_DIR)
+        pinned = {
+            os.path.abspath(file_path)
+            for (file_path,) in db.query(Document.file_path).filter(
+                Document.file_path.like(f"{cache_dir}%")
+            ).all()
+        }
+
+        cutoff = (datetime.now() - timedelta(days=cls.CACHE_MAX_AGE_DAYS)).timestamp()
+        removed = 0
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if path in pinned:
+                    continue
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
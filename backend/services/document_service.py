@@ -1,8 +1,9 @@
 # backend/services/document_service.py
 from datetime import datetime, timezone , timedelta
 from typing import Optional, Dict, Any, List
-from sqlalchemy.orm import Session
-from sqlalchemy import and_ , desc
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_ , desc, select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
 from sqlalchemy.orm.exc import NoResultFound
@@ -12,6 +13,7 @@ import uuid
 import os
 import json
 import io
+from types import SimpleNamespace
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
@@ -21,7 +23,9 @@ from reportlab.lib import colors
 from reportlab.platypus.frames import Frame
 from reportlab.platypus.doctemplate import PageTemplate, BaseDocTemplate
 
-from models.extended_models import Document, DocumentType, Rental, Client, Property, Organization
+from models.extended_models import (
+    Document, DocumentType, DocumentNumberCounter, Rental, Client, Property, Organization
+)
 from schemas.document import DocumentCreate, DocumentUpdate
 from schemas.property import PropertyType
 from schemas.rental import RentalType
@@ -116,14 +120,9 @@ class DocumentService:
         db.commit()
     
     @staticmethod
-    def generate_rental_contract(
-        db: Session,
-        rental: Rental,
-        created_by: uuid.UUID
-    ) -> Document:
-        """Сгенерировать договор аренды"""
+    def _contract_fields(rental: Rental) -> Dict[str, Any]:
+        """Тип, заголовок, содержимое и шаблон договора аренды"""
         
-        # Подготавливаем данные для договора
         contract_data = {
             "rental_id": str(rental.id),
             "property_name": rental.property.name,
@@ -141,45 +140,17 @@ class DocumentService:
             "created_date": datetime.now(timezone.utc).isoformat()
         }
         
-        # Создаем документ
-        document_create = DocumentCreate(
-            document_type=DocumentType.CONTRACT,
-            title=f"Договор аренды #{rental.property.number}",
-            content=contract_data,
-            rental_id=str(rental.id),
-            client_id=str(rental.client_id),
-            template_used="rental_contract_v1"
-        )
-        
-        document = DocumentService.create_document(
-            db=db,
-            document_data=document_create,
-            created_by=created_by,
-            organization_id=rental.organization_id
-        )
-        
-        return document
+        return {
+            "document_type": DocumentType.CONTRACT,
+            "title": f"Договор аренды #{rental.property.number}",
+            "content": contract_data,
+            "template_used": "rental_contract_v1"
+        }
     
     @staticmethod
-    def generate_work_act(
-        db: Session,
-        rental: Rental,
-        created_by: uuid.UUID
-    ) -> Document:
-        """Сгенерировать акт выполненных работ"""
+    def _work_act_fields(rental: Rental, tasks: List[Any]) -> Dict[str, Any]:
+        """Тип, заголовок, содержимое и шаблон акта по выполненным задачам"""
         
-        # Находим связанные задачи
-        from models.extended_models import Task, TaskStatus
-        tasks = db.query(Task).filter(
-            and_(
-                Task.property_id == rental.property_id,
-                Task.status == TaskStatus.COMPLETED,
-                Task.created_at >= rental.start_date,
-                Task.created_at <= rental.end_date
-            )
-        ).all()
-        
-        # Подготавливаем данные для акта
         work_items = []
         total_work_cost = 0
         
@@ -205,33 +176,16 @@ class DocumentService:
             "created_date": datetime.now(timezone.utc).isoformat()
         }
         
-        # Создаем документ
-        document_create = DocumentCreate(
-            document_type=DocumentType.ACT_OF_WORK,
-            title=f"Акт выполненных работ #{rental.property.number}",
-            content=act_data,
-            rental_id=str(rental.id),
-            client_id=str(rental.client_id),
-            template_used="work_act_v1"
-        )
-        
-        document = DocumentService.create_document(
-            db=db,
-            document_data=document_create,
-            created_by=created_by,
-            organization_id=rental.organization_id
-        )
-        
-        return document
+        return {
+            "document_type": DocumentType.ACT_OF_WORK,
+            "title": f"Акт выполненных работ #{rental.property.number}",
+            "content": act_data,
+            "template_used": "work_act_v1"
+        }
     
     @staticmethod
-    def generate_invoice(
-        db: Session,
-        rental: Rental,
-        created_by: uuid.UUID,
-        invoice_items: List[Dict[str, Any]] = None
-    ) -> Document:
-        """Сгенерировать счет-фактуру"""
+    def _invoice_fields(rental: Rental, invoice_items: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Тип, заголовок, содержимое и шаблон счета-фактуры"""
         
         if not invoice_items:
             # Создаем базовые позиции счета
@@ -262,50 +216,150 @@ class DocumentService:
             "created_date": datetime.now(timezone.utc).isoformat()
         }
         
-        # Создаем документ
+        return {
+            "document_type": DocumentType.INVOICE,
+            "title": f"Счет-фактура #{rental.property.number}",
+            "content": invoice_data,
+            "template_used": "invoice_v1"
+        }
+    
+    @staticmethod
+    def _create_rental_document(
+        db: Session,
+        rental: Rental,
+        created_by: uuid.UUID,
+        fields: Dict[str, Any]
+    ) -> Document:
         document_create = DocumentCreate(
-            document_type=DocumentType.INVOICE,
-            title=f"Счет-фактура #{rental.property.number}",
-            content=invoice_data,
+            **fields,
             rental_id=str(rental.id),
-            client_id=str(rental.client_id),
-            template_used="invoice_v1"
+            client_id=str(rental.client_id)
         )
         
-        document = DocumentService.create_document(
+        return DocumentService.create_document(
             db=db,
             document_data=document_create,
             created_by=created_by,
             organization_id=rental.organization_id
         )
+    
+    @staticmethod
+    def generate_rental_contract(
+        db: Session,
+        rental: Rental,
+        created_by: uuid.UUID
+    ) -> Document:
+        """Сгенерировать договор аренды"""
         
-        return document
+        return DocumentService._create_rental_document(
+            db, rental, created_by, DocumentService._contract_fields(rental)
+        )
+    
+    @staticmethod
+    def generate_work_act(
+        db: Session,
+        rental: Rental,
+        created_by: uuid.UUID
+    ) -> Document:
+        """Сгенерировать акт выполненных работ"""
+        
+        # Находим связанные задачи
+        from models.extended_models import Task, TaskStatus
+        tasks = db.query(Task).filter(
+            and_(
+                Task.property_id == rental.property_id,
+                Task.status == TaskStatus.COMPLETED,
+                Task.created_at >= rental.start_date,
+                Task.created_at <= rental.end_date
+            )
+        ).all()
+        
+        return DocumentService._create_rental_document(
+            db, rental, created_by, DocumentService._work_act_fields(rental, tasks)
+        )
+    
+    @staticmethod
+    def generate_invoice(
+        db: Session,
+        rental: Rental,
+        created_by: uuid.UUID,
+        invoice_items: List[Dict[str, Any]] = None
+    ) -> Document:
+        """Сгенерировать счет-фактуру"""
+        
+        return DocumentService._create_rental_document(
+            db, rental, created_by, DocumentService._invoice_fields(rental, invoice_items)
+        )
+    
+    @staticmethod
+    def build_render_snapshot(
+        db: Session,
+        document: Document,
+        organization: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Данные для рендеринга PDF без ORM-объектов
+
+        Снимок передается в процесс рендеринга и определяет ключ кэша PDF.
+        Реквизиты организации можно передать заранее (массовый рендер).
+        """
+        if organization is None:
+            organization = DocumentService.get_organization_details(db, document.organization_id)
+        
+        issued_at = document.created_at or datetime.now(timezone.utc)
+        
+        return {
+            "organization_id": str(document.organization_id),
+            "document_type": document.document_type.value,
+            "document_number": document.document_number,
+            "title": document.title,
+            "content": document.content or {},
+            "issued_at": issued_at.strftime('%d.%m.%Y'),
+            "organization": organization
+        }
+    
+    @staticmethod
+    def get_organization_details(db: Session, organization_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        """Реквизиты организации для печатных форм"""
+        organization = db.query(
+            Organization.name, Organization.address, Organization.phone, Organization.email
+        ).filter(Organization.id == organization_id).first()
+        return organization._asdict() if organization else None
     
     @staticmethod
     def generate_pdf(db: Session, document: Document) -> bytes:
         """Генерировать PDF документа"""
+        return render_pdf_snapshot(DocumentService.build_render_snapshot(db, document))
+    
+    @staticmethod
+    def render_snapshot(snapshot: Dict[str, Any]) -> bytes:
+        """Генерировать PDF по снимку документа (см. build_render_snapshot)"""
         
         buffer = io.BytesIO()
+        document = SimpleNamespace(
+            document_number=snapshot["document_number"],
+            title=snapshot["title"],
+            content=snapshot["content"],
+            issued_at=snapshot["issued_at"]
+        )
+        organization = SimpleNamespace(**snapshot["organization"]) if snapshot["organization"] else None
+        document_type = DocumentType(snapshot["document_type"])
         
-        if document.document_type == DocumentType.CONTRACT:
-            pdf_content = DocumentService._generate_contract_pdf(db, document, buffer)
-        elif document.document_type == DocumentType.ACT_OF_WORK:
-            pdf_content = DocumentService._generate_act_pdf(db, document, buffer)
-        elif document.document_type == DocumentType.INVOICE:
-            pdf_content = DocumentService._generate_invoice_pdf(db, document, buffer)
-        elif document.document_type == DocumentType.RECEIPT:
-            pdf_content = DocumentService._generate_receipt_pdf(db, document, buffer)
+        if document_type == DocumentType.CONTRACT:
+            pdf_content = DocumentService._generate_contract_pdf(document, organization, buffer)
+        elif document_type == DocumentType.ACT_OF_WORK:
+            pdf_content = DocumentService._generate_act_pdf(document, buffer)
+        elif document_type == DocumentType.INVOICE:
+            pdf_content = DocumentService._generate_invoice_pdf(document, buffer)
+        elif document_type == DocumentType.RECEIPT:
+            pdf_content = DocumentService._generate_receipt_pdf(document, buffer)
         else:
-            pdf_content = DocumentService._generate_generic_pdf(db, document, buffer)
-        
-        # Сохраняем путь к файлу в документе если нужно
-        # document.file_path = f"/documents/{document.id}.pdf"
-        # db.commit()
+            pdf_content = DocumentService._generate_generic_pdf(document, buffer)
         
         return pdf_content
     
     @staticmethod
-    def _generate_contract_pdf(db: Session, document: Document, buffer: io.BytesIO) -> bytes:
+    def _generate_contract_pdf(document, organization, buffer: io.BytesIO) -> bytes:
         """Генерировать PDF договора аренды"""
         
         doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
@@ -328,11 +382,6 @@ class DocumentService:
         story.append(Paragraph(f"№ {document.document_number}", styles['Normal']))
         story.append(Spacer(1, 20))
         
-        # Получаем организацию
-        organization = db.query(Organization).filter(
-            Organization.id == document.organization_id
-        ).first()
-        
         content = document.content or {}
         
         # Информация о сторонах
@@ -414,14 +463,14 @@ class DocumentService:
         
         # Дата создания
         story.append(Spacer(1, 20))
-        story.append(Paragraph(f"Дата составления: {datetime.now().strftime('%d.%m.%Y')}", styles['Normal']))
+        story.append(Paragraph(f"Дата составления: {document.issued_at}", styles['Normal']))
         
         doc.build(story)
         buffer.seek(0)
         return buffer.getvalue()
     
     @staticmethod
-    def _generate_act_pdf(db: Session, document: Document, buffer: io.BytesIO) -> bytes:
+    def _generate_act_pdf(document, buffer: io.BytesIO) -> bytes:
         """Генерировать PDF акта выполненных работ"""
         
         doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
@@ -513,14 +562,14 @@ class DocumentService:
         
         story.append(Paragraph(signature_text, styles['Normal']))
         story.append(Spacer(1, 20))
-        story.append(Paragraph(f"Дата составления: {datetime.now().strftime('%d.%m.%Y')}", styles['Normal']))
+        story.append(Paragraph(f"Дата составления: {document.issued_at}", styles['Normal']))
         
         doc.build(story)
         buffer.seek(0)
         return buffer.getvalue()
     
     @staticmethod
-    def _generate_invoice_pdf(db: Session, document: Document, buffer: io.BytesIO) -> bytes:
+    def _generate_invoice_pdf(document, buffer: io.BytesIO) -> bytes:
         """Генерировать PDF счета-фактуры"""
         
         doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
@@ -607,14 +656,14 @@ class DocumentService:
         # Подпись
         story.append(Paragraph("Выставил: ___________________", styles['Normal']))
         story.append(Spacer(1, 20))
-        story.append(Paragraph(f"Дата: {datetime.now().strftime('%d.%m.%Y')}", styles['Normal']))
+        story.append(Paragraph(f"Дата: {document.issued_at}", styles['Normal']))
         
         doc.build(story)
         buffer.seek(0)
         return buffer.getvalue()
     
     @staticmethod
-    def _generate_receipt_pdf(db: Session, document: Document, buffer: io.BytesIO) -> bytes:
+    def _generate_receipt_pdf(document, buffer: io.BytesIO) -> bytes:
         """Генерировать PDF квитанции"""
         
         doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -631,7 +680,7 @@ class DocumentService:
         Получено от: {content.get('client_name', 'Не указан')}<br/>
         За услуги: {content.get('service_description', 'Аренда помещения')}<br/>
         Сумма: {content.get('amount', 0):,.2f} тенге<br/>
-        Дата: {content.get('payment_date', datetime.now().strftime('%d.%m.%Y'))}
+        Дата: {content.get('payment_date', document.issued_at)}
         """
         
         story.append(Paragraph(receipt_text, styles['Normal']))
@@ -641,7 +690,7 @@ class DocumentService:
         return buffer.getvalue()
     
     @staticmethod
-    def _generate_generic_pdf(db: Session, document: Document, buffer: io.BytesIO) -> bytes:
+    def _generate_generic_pdf(document, buffer: io.BytesIO) -> bytes:
         """Генерировать общий PDF документ"""
         
         doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -697,44 +746,77 @@ class DocumentService:
         
         return response
     
+    # Префиксы номеров для разных типов документов
+    NUMBER_PREFIXES = {
+        DocumentType.CONTRACT: "DOG",
+        DocumentType.INVOICE: "SF",
+        DocumentType.ACT_OF_WORK: "AKT",
+        DocumentType.RECEIPT: "KVT",
+        DocumentType.ESF: "ESF"
+    }
+    
     @staticmethod
-    def _generate_document_number(
-        db: Session, 
-        organization_id: uuid.UUID, 
-        document_type: DocumentType
-    ) -> str:
-        """Генерировать номер документа"""
+    def reserve_document_numbers(
+        db: Session,
+        organization_id: uuid.UUID,
+        document_type: DocumentType,
+        count: int
+    ) -> List[str]:
+        """
+        Зарезервировать count подряд идущих номеров за сегодня
         
-        # Префиксы для разных типов документов
-        prefixes = {
-            DocumentType.CONTRACT: "DOG",
-            DocumentType.INVOICE: "SF",
-            DocumentType.ACT_OF_WORK: "AKT",
-            DocumentType.RECEIPT: "KVT",
-            DocumentType.ESF: "ESF"
-        }
+        Счетчик на (организация, тип, день) увеличивается одним
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING, поэтому параллельные
+        генерации не получают одинаковых номеров. Строка счетчика
+        блокируется до конца транзакции вызывающего. Первый счетчик дня
+        продолжает нумерацию уже созданных сегодня документов.
+        """
+        if count <= 0:
+            return []
         
-        prefix = prefixes.get(document_type, "DOC")
+        prefix = DocumentService.NUMBER_PREFIXES.get(document_type, "DOC")
         
-        # Получаем текущую дату
         today = datetime.now(timezone.utc)
         date_part = today.strftime("%y%m%d")
-        
-        # Считаем документы данного типа за сегодня
         today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
         today_end = today_start + timedelta(days=1)
         
-        count = db.query(Document).filter(
+        issued_today = select(func.count(Document.id)).where(
             and_(
                 Document.organization_id == organization_id,
                 Document.document_type == document_type,
                 Document.created_at >= today_start,
                 Document.created_at < today_end
             )
-        ).count()
+        ).scalar_subquery()
         
-        # Формируем номер: PREFIX-YYMMDD-NNNN
-        return f"{prefix}-{date_part}-{count + 1:04d}"
+        stmt = pg_insert(DocumentNumberCounter).values(
+            organization_id=organization_id,
+            document_type=document_type,
+            day=today.date(),
+            last_value=issued_today + count
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["organization_id", "document_type", "day"],
+            set_={"last_value": DocumentNumberCounter.last_value + count}
+        ).returning(DocumentNumberCounter.last_value)
+        
+        last_value = db.execute(stmt).scalar_one()
+        
+        # Формируем номера: PREFIX-YYMMDD-NNNN
+        return [
+            f"{prefix}-{date_part}-{number:04d}"
+            for number in range(last_value - count + 1, last_value + 1)
+        ]
+    
+    @staticmethod
+    def _generate_document_number(
+        db: Session, 
+        organization_id: uuid.UUID, 
+        document_type: DocumentType
+    ) -> str:
+        """Генерировать номер документа"""
+        return DocumentService.reserve_document_numbers(db, organization_id, document_type, 1)[0]
     
     @staticmethod
     def create_esf_document(
@@ -955,70 +1037,121 @@ class DocumentService:
         
         return sorted(history, key=lambda x: x["timestamp"])
     
+    BULK_DOCUMENT_TYPES = (DocumentType.CONTRACT, DocumentType.ACT_OF_WORK, DocumentType.INVOICE)
+    
+    @staticmethod
+    def _completed_tasks_by_property(db: Session, rentals: List[Rental]) -> Dict[uuid.UUID, List[Any]]:
+        """Выполненные задачи по помещениям аренд за общий период - одним запросом"""
+        from models.extended_models import Task, TaskStatus
+        
+        if not rentals:
+            return {}
+        
+        tasks = db.query(Task).filter(
+            and_(
+                Task.property_id.in_({rental.property_id for rental in rentals}),
+                Task.status == TaskStatus.COMPLETED,
+                Task.created_at >= min(rental.start_date for rental in rentals),
+                Task.created_at <= max(rental.end_date for rental in rentals)
+            )
+        ).all()
+        
+        by_property: Dict[uuid.UUID, List[Any]] = {}
+        for task in tasks:
+            by_property.setdefault(task.property_id, []).append(task)
+        return by_property
+    
     @staticmethod
-    def bulk_generate_documents(
+    def generate_documents_chunk(
         db: Session,
         rental_ids: List[uuid.UUID],
         document_type: DocumentType,
         created_by: uuid.UUID,
         organization_id: uuid.UUID
     ) -> Dict[str, Any]:
-        """Массовая генерация документов"""
+        """
+        Сгенерировать документы для пачки аренд без фиксации транзакции
         
-        results = {
-            "success": [],
-            "errors": [],
-            "total": len(rental_ids)
-        }
+        Аренды с помещениями и клиентами загружаются одним запросом, номера
+        резервируются одним блоком, документы вставляются одним INSERT.
+        """
+        results = {"success": [], "errors": []}
+        
+        if document_type not in DocumentService.BULK_DOCUMENT_TYPES:
+            results["errors"] = [
+                {"rental_id": str(rental_id), "error": f"Неподдерживаемый тип документа: {document_type.value}"}
+                for rental_id in rental_ids
+            ]
+            return results
         
+        rentals = db.query(Rental).options(
+            selectinload(Rental.property),
+            selectinload(Rental.client)
+        ).filter(
+            and_(
+                Rental.id.in_(rental_ids),
+                Rental.organization_id == organization_id
+            )
+        ).all()
+        rentals_by_id = {rental.id: rental for rental in rentals}
+        
+        tasks_by_property = (
+            DocumentService._completed_tasks_by_property(db, rentals)
+            if document_type == DocumentType.ACT_OF_WORK else {}
+        )
+        
+        rows = []
         for rental_id in rental_ids:
+            rental = rentals_by_id.get(rental_id)
+            if not rental:
+                results["errors"].append({"rental_id": str(rental_id), "error": "Аренда не найдена"})
+                continue
+            
             try:
-                rental = db.query(Rental).filter(
-                    and_(
-                        Rental.id == rental_id,
-                        Rental.organization_id == organization_id
-                    )
-                ).first()
-                
-                if not rental:
-                    results["errors"].append({
-                        "rental_id": str(rental_id),
-                        "error": "Аренда не найдена"
-                    })
-                    continue
-                
-                # Генерируем документ в зависимости от типа
                 if document_type == DocumentType.CONTRACT:
-                    document = DocumentService.generate_rental_contract(
-                        db, rental, created_by
-                    )
+                    fields = DocumentService._contract_fields(rental)
                 elif document_type == DocumentType.ACT_OF_WORK:
-                    document = DocumentService.generate_work_act(
-                        db, rental, created_by
-                    )
-                elif document_type == DocumentType.INVOICE:
-                    document = DocumentService.generate_invoice(
-                        db, rental, created_by
-                    )
+                    tasks = [
+                        task for task in tasks_by_property.get(rental.property_id, [])
+                        if rental.start_date <= task.created_at <= rental.end_date
+                    ]
+                    fields = DocumentService._work_act_fields(rental, tasks)
                 else:
-                    results["errors"].append({
-                        "rental_id": str(rental_id),
-                        "error": f"Неподдерживаемый тип документа: {document_type.value}"
-                    })
-                    continue
-                
-                results["success"].append({
-                    "rental_id": str(rental_id),
-                    "document_id": str(document.id),
-                    "document_number": document.document_number
-                })
-                
+                    fields = DocumentService._invoice_fields(rental)
             except Exception as e:
-                results["errors"].append({
-                    "rental_id": str(rental_id),
-                    "error": str(e)
-                })
+                results["errors"].append({"rental_id": str(rental_id), "error": str(e)})
+                continue
+            
+            rows.append({
+                **fields,
+                "id": uuid.uuid4(),
+                "organization_id": organization_id,
+                "created_by": created_by,
+                "rental_id": rental.id,
+                "client_id": rental.client_id,
+                "is_signed": False
+            })
+        
+        if not rows:
+            return results
+        
+        numbers = DocumentService.reserve_document_numbers(db, organization_id, document_type, len(rows))
+        now = datetime.now(timezone.utc)
+        for row, number in zip(rows, numbers):
+            row["document_number"] = number
+            row["created_at"] = now
+            row["updated_at"] = now
         
+        db.execute(insert(Document), rows)
+        
+        results["success"] = [
+            {
+                "rental_id": str(row["rental_id"]),
+                "document_id": str(row["id"]),
+                "document_number": row["document_number"]
+            }
+            for row in rows
+        ]
         return results
     
     @staticmethod
@@ -1117,4 +1250,9 @@ class DocumentService:
         limit = search_params.get("limit", 100)
         offset = search_params.get("offset", 0)
         
-        return query.offset(offset).limit(limit).all()
\ No newline at end of file
+        return query.offset(offset).limit(limit).all()
+
+
+def render_pdf_snapshot(snapshot: Dict[str, Any]) -> bytes:
+    """Точка входа для пула процессов рендеринга (функция уровня модуля)"""
+    return DocumentService.render_snapshot(snapshot)
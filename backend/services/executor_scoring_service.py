@@ -0,0 +1,141 @@
+# backend/services/executor_scoring_service.py
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func
+import uuid
+
+from models.extended_models import RoomOrder, OrderStatus, Task, TaskStatus, User
+
+
+class ExecutorScoringService:
+    """Пакетный расчет загрузки и показателей исполнителей
+
+    Вместо нескольких COUNT-запросов на каждого кандидата показатели всех
+    кандидатов считаются двумя агрегатными запросами (заказы и задачи),
+    сгруппированными по assigned_to, с условиями FILTER для каждой метрики.
+    """
+
+    ACTIVE_ORDER_STATUSES = [OrderStatus.CONFIRMED, OrderStatus.IN_PROGRESS]
+    ACTIVE_TASK_STATUSES = [TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS]
+
+    @staticmethod
+    def _empty_features() -> Dict[str, Any]:
+        return {
+            "active_orders": 0,
+            "active_tasks": 0,
+            "completed_orders": 0,
+            "completed_tasks": 0,
+            "recent_activity": 0,
+            "avg_quality": None
+        }
+
+    @staticmethod
+    def get_executor_features(
+        db: Session,
+        executor_ids: List[uuid.UUID],
+        now: Optional[datetime] = None
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """
+        Загрузка, выполненная работа за неделю, активность за час и
+        средняя оценка качества для всех кандидатов
+
+        Returns:
+            Словарь {executor_id: показатели}; для каждого переданного id
+            есть запись, даже если у него нет заказов и задач
+        """
+        features = {executor_id: ExecutorScoringService._empty_features() for executor_id in executor_ids}
+        if not executor_ids:
+            return features
+
+        now = now or datetime.now(timezone.utc)
+        last_week = now - timedelta(days=7)
+        last_hour = now - timedelta(hours=1)
+
+        order_rows = db.query(
+            RoomOrder.assigned_to,
+            func.count(RoomOrder.id).filter(
+                RoomOrder.status.in_(ExecutorScoringService.ACTIVE_ORDER_STATUSES)
+            ).label("active_orders"),
+            func.count(RoomOrder.id).filter(
+                and_(
+                    RoomOrder.status == OrderStatus.DELIVERED,
+                    RoomOrder.completed_at >= last_week
+                )
+            ).label("completed_orders")
+        ).filter(
+            RoomOrder.assigned_to.in_(executor_ids)
+        ).group_by(RoomOrder.assigned_to).all()
+
+        for row in order_rows:
+            features[row.assigned_to]["active_orders"] = row.active_orders or 0
+            features[row.assigned_to]["completed_orders"] = row.completed_orders or 0
+
+        task_rows = db.query(
+            Task.assigned_to,
+            func.count(Task.id).filter(
+                Task.status.in_(ExecutorScoringService.ACTIVE_TASK_STATUSES)
+            ).label("active_tasks"),
+            func.count(Task.id).filter(
+                and_(
+                    Task.status == TaskStatus.COMPLETED,
+                    Task.completed_at >= last_week
+                )
+            ).label("completed_tasks"),
+            func.count(Task.id).filter(
+                and_(
+                    Task.status == TaskStatus.IN_PROGRESS,
+                    Task.started_at >= last_hour
+                )
+            ).label("recent_activity"),
+            func.avg(Task.quality_rating).filter(
+                and_(
+                    Task.status == TaskStatus.COMPLETED,
+                    Task.quality_rating.isnot(None),
+                    Task.completed_at >= last_week
+                )
+            ).label("avg_quality")
+        ).filter(
+            Task.assigned_to.in_(executor_ids)
+        ).group_by(Task.assigned_to).all()
+
+        for row in task_rows:
+            features[row.assigned_to]["active_tasks"] = row.active_tasks or 0
+            features[row.assigned_to]["completed_tasks"] = row.completed_tasks or 0
+            features[row.assigned_to]["recent_activity"] = row.recent_activity or 0
+            features[row.assigned_to]["avg_quality"] = row.avg_quality
+
+        return features
+
+    @staticmethod
+    def get_active_task_counts(db: Session, executor_ids: List[uuid.UUID]) -> Dict[uuid.UUID, int]:
+        """Количество активных задач каждого сотрудника одним запросом"""
+
+        counts = {executor_id: 0 for executor_id in executor_ids}
+        if not executor_ids:
+            return counts
+
+        rows = db.query(
+            Task.assigned_to,
+            func.count(Task.id)
+        ).filter(
+            and_(
+                Task.assigned_to.in_(executor_ids),
+                Task.status.in_(ExecutorScoringService.ACTIVE_TASK_STATUSES)
+            )
+        ).group_by(Task.assigned_to).all()
+
+        for assigned_to, active_tasks in rows:
+            counts[assigned_to] = active_tasks
+
+        return counts
+
+    @staticmethod
+    def pick_least_busy(db: Session, candidates: List[User]) -> Optional[User]:
+        """Сотрудник с минимальным числом активных задач (первый при равенстве)"""
+
+        if not candidates:
+            return None
+
+        counts = ExecutorScoringService.get_active_task_counts(db, [c.id for c in candidates])
+        return min(candidates, key=lambda candidate: counts[candidate.id])
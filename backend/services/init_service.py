@@ -8,12 +8,15 @@ import os
 from models.database import engine, Base
 from models.models import Organization, User, UserRole, UserStatus, OrganizationStatus
 from services.auth_service import AuthService
+from services.partition_service import PartitionService
 from schemas.auth import SystemInitRequest, OrganizationCreate, UserCreate
 
 
 class DatabaseInitService:
     """Сервис для инициализации базы данных"""
     
+    MIGRATION_LOCK_KEY = 7310001
+    
     @staticmethod
     def create_tables():
         """Создание всех таблиц"""
@@ -239,8 +242,32 @@ class DatabaseInitService:
     @staticmethod
     def run_database_migrations(db: Session):
         """Выполнение миграций и настройка БД (вызывается после создания таблиц)"""
+        from models.migrations import MIGRATIONS
+        from models.models import SchemaMigration
+        
         try:
-            # Дополнительные настройки после создания таблиц
+            applied = {version for (version,) in db.query(SchemaMigration.version).all()}
+            db.commit()
+            
+            for version, description, apply in MIGRATIONS:
+                if version in applied:
+                    continue
+                
+                # Блокировка до конца транзакции, чтобы несколько воркеров
+                # не применяли одну миграцию одновременно
+                db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": DatabaseInitService.MIGRATION_LOCK_KEY})
+                if db.get(SchemaMigration, version):
+                    db.commit()
+                    continue
+                
+                apply(db)
+                db.add(SchemaMigration(version=version, description=description))
+                db.commit()
+                print(f"✅ Migration {version} applied")
+            
+            # Секции на текущий и следующие месяцы для секционированных таблиц
+            PartitionService.ensure_partitions(db)
+            
             print("✅ Database migrations completed successfully")
             
         except Exception as e:
@@ -255,34 +282,19 @@ class DatabaseInitService:
             # Очищаем истекшие refresh токены
             deleted_tokens = AuthService.cleanup_expired_tokens(db)
             
-            # Очищаем старые логи входа (старше 90 дней)
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=90)
-            
-            deleted_login_attempts = db.execute(
-                text("""
-                DELETE FROM audit.login_attempts 
-                WHERE created_at < :cutoff_date
-                """),
-                {"cutoff_date": cutoff_date}
-            ).rowcount
-            
-            # Очищаем старые действия пользователей (старше 365 дней)
-            cutoff_date_actions = datetime.now(timezone.utc) - timedelta(days=365)
-            
-            deleted_actions = db.execute(
-                text("""
-                DELETE FROM audit.user_actions 
-                WHERE created_at < :cutoff_date
-                """),
-                {"cutoff_date": cutoff_date_actions}
-            ).rowcount
-            
+            # Старые логи входа и действия удаляются целыми месячными секциями
+            # (сроки хранения - в PartitionService.TABLES)
             db.commit()
+            dropped_partitions = PartitionService.drop_expired_partitions(db)
+            
+            # События ленты изменений нужны только для дочитки после переподключения
+            from services.change_feed_service import ChangeFeedService
+            deleted_change_events = ChangeFeedService.cleanup(db)
             
             return {
                 "deleted_tokens": deleted_tokens,
-                "deleted_login_attempts": deleted_login_attempts,
-                "deleted_actions": deleted_actions
+                "dropped_partitions": dropped_partitions,
+                "deleted_change_events": deleted_change_events
             }
             
         except Exception as e:
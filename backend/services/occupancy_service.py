@@ -0,0 +1,164 @@
+# backend/services/occupancy_service.py
+from datetime import datetime
+from itertools import groupby
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+import uuid
+
+from models.extended_models import Property, Rental
+from services.report_facts_service import ReportFactsService
+
+
+class OccupancyService:
+    """Единый движок расчета загруженности и выручки помещений
+
+    Все аренды организации, пересекающиеся с периодом, загружаются одним
+    запросом, отсортированными по (property_id, start_date). Затем за один
+    проход интервалы каждого помещения объединяются, а выручка
+    распределяется пропорционально дням пересечения. Занятые дни - ночи
+    аренды в днях UTC (ReportFactsService.rental_days), как в дневных
+    показателях, поэтому результат не зависит от того, покрыт ли период
+    дневными показателями.
+    """
+
+    @staticmethod
+    def calculate_property_stats(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime,
+        property_ids: Optional[List[uuid.UUID]] = None
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """
+        Занятые дни и пропорциональная выручка для всех помещений за период
+
+        Returns:
+            Словарь {property_id: {"occupied_days": int, "revenue": float}}
+            только для помещений, у которых есть аренды в периоде
+        """
+
+        # Если период покрыт материализованными показателями - агрегируем их
+        fact_stats = ReportFactsService.get_property_stats(
+            db, organization_id, start_date, end_date, property_ids
+        )
+        if fact_stats is not None:
+            return fact_stats
+
+        # Календарные дни UTC - то же соглашение, что и в дневных показателях
+        start_day = ReportFactsService._to_day(start_date)
+        end_day = ReportFactsService._to_day(end_date)
+        window_start, window_end = ReportFactsService.day_window(start_date, end_date)
+
+        query = db.query(
+            Rental.property_id,
+            Rental.start_date,
+            Rental.end_date,
+            Rental.paid_amount
+        ).filter(
+            and_(
+                Rental.organization_id == organization_id,
+                Rental.start_date < window_end,
+                Rental.end_date >= window_start
+            )
+        )
+
+        if property_ids is not None:
+            if not property_ids:
+                return {}
+            query = query.filter(Rental.property_id.in_(property_ids))
+
+        rows = query.order_by(Rental.property_id, Rental.start_date).all()
+
+        stats = {}
+
+        for property_id, rentals in groupby(rows, key=lambda row: row.property_id):
+            occupied_days = 0
+            revenue = 0.0
+            current_start = None
+            current_end = None
+
+            for rental in rentals:
+                rental_start, rental_end = ReportFactsService.rental_days(rental.start_date, rental.end_date)
+                overlap_start = max(rental_start, start_day)
+                overlap_end = min(rental_end, end_day)
+
+                if overlap_end < overlap_start:
+                    continue
+
+                # Выручка аренды делится поровну между ее ночами
+                if rental.paid_amount and rental.paid_amount > 0:
+                    total_rental_days = (rental_end - rental_start).days + 1
+                    days_in_period = (overlap_end - overlap_start).days + 1
+                    revenue += rental.paid_amount / total_rental_days * days_in_period
+
+                # Объединение интервалов дней: строки уже отсортированы по началу
+                if current_start is None:
+                    current_start, current_end = overlap_start, overlap_end
+                elif overlap_start <= current_end:
+                    current_end = max(current_end, overlap_end)
+                else:
+                    occupied_days += (current_end - current_start).days + 1
+                    current_start, current_end = overlap_start, overlap_end
+
+            # День выезда не занят: аренда могла закончиться в первый день периода
+            if current_start is None:
+                continue
+            occupied_days += (current_end - current_start).days + 1
+
+            stats[property_id] = {
+                "occupied_days": occupied_days,
+                "revenue": revenue
+            }
+
+        return stats
+
+    @staticmethod
+    def get_active_properties(
+        db: Session,
+        organization_id: uuid.UUID,
+        property_id: Optional[uuid.UUID] = None
+    ) -> List[Property]:
+        """Активные помещения организации"""
+
+        query = db.query(Property).filter(
+            and_(
+                Property.organization_id == organization_id,
+                Property.is_active == True
+            )
+        )
+
+        if property_id:
+            query = query.filter(Property.id == property_id)
+
+        return query.all()
+
+    @staticmethod
+    def calculate_occupancy_rate(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime
+    ) -> float:
+        """Загруженность активных помещений организации в процентах"""
+
+        properties = OccupancyService.get_active_properties(db, organization_id)
+        if not properties:
+            return 0.0
+
+        total_days = (end_date - start_date).days + 1
+        if total_days <= 0:
+            return 0.0
+
+        stats = OccupancyService.calculate_property_stats(
+            db, organization_id, start_date, end_date
+        )
+
+        # Занятые дни помещения не могут превышать длину периода
+        total_occupied_days = sum(
+            min(stats[prop.id]["occupied_days"], total_days)
+            for prop in properties if prop.id in stats
+        )
+
+        occupancy_rate = total_occupied_days / (total_days * len(properties)) * 100
+        return round(min(occupancy_rate, 100.0), 2)
@@ -8,6 +8,9 @@ import json
 
 from models.order_payment_models import OrderPayment, OrderPaymentStatus, OrderPaymentMethod
 from models.extended_models import RoomOrder, OrderStatus
+from services.change_feed_service import ChangeFeedService
+from services.report_facts_service import ReportFactsService
+from services.workload_index_service import WorkloadIndexService
 
 class OrderPaymentService:
     """Сервис для обработки платежей по заказам"""
@@ -60,6 +63,9 @@ class OrderPaymentService:
         db.commit()
         db.refresh(payment)
         
+        if auto_complete:
+            OrderPaymentService.sync_report_facts(db, order)
+        
         return payment
     
     @staticmethod
@@ -83,6 +89,7 @@ class OrderPaymentService:
         if order:
             order.is_paid = True
             order.updated_at = datetime.now(timezone.utc)
+            ChangeFeedService.order_changed(db, order, "paid")
         
         return payment
     
@@ -139,15 +146,27 @@ class OrderPaymentService:
         order.updated_at = datetime.now(timezone.utc)
         
         # Если заказ еще не завершен - завершаем его
+        previous_status = order.status
         if order.status != OrderStatus.DELIVERED:
             order.status = OrderStatus.DELIVERED
             order.completed_at = datetime.now(timezone.utc)
         
+        ChangeFeedService.order_changed(db, order, "completed" if previous_status != order.status else "paid")
+        
         db.commit()
         db.refresh(payment)
         
+        WorkloadIndexService.order_changed(order, order.assigned_to, previous_status)
+        OrderPaymentService.sync_report_facts(db, order)
+        
         return payment
     
+    @staticmethod
+    def sync_report_facts(db: Session, order: RoomOrder):
+        """Пересчитать показатели дня заказа (вызывается после коммита оплаты)"""
+        
+        ReportFactsService.sync_days(db, order.organization_id, order.created_at, order.created_at)
+    
     @staticmethod
     def get_order_payments(
         db: Session,
@@ -1,8 +1,12 @@
 # backend/services/order_service.py - ПОЛНАЯ ВЕРСИЯ С АВТОНАЗНАЧЕНИЕМ
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, desc
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, desc, select
+import logging
+import os
+import time
 import uuid
 
 from models.extended_models import (
@@ -10,11 +14,65 @@ from models.extended_models import (
     Task, TaskType, TaskStatus, TaskPriority
 )
 from schemas.order import RoomOrderCreate, RoomOrderUpdate, OrderItemBase
+from services.report_facts_service import ReportFactsService
+from services.executor_scoring_service import ExecutorScoringService
+from services.workload_index_service import WorkloadIndexService
+from services.change_feed_service import ChangeFeedService
+from services.assignment_service import AssignmentService
 from models.models import UserRole
 
+logger = logging.getLogger(__name__)
+
 class OrderService:
     """Enhanced order service with comprehensive auto-assignment and inventory management"""
     
+    # Role priorities for different order types
+    EXECUTOR_ROLE_PRIORITIES = {
+        'product_sale': [UserRole.STOREKEEPER, UserRole.MANAGER, UserRole.TECHNICAL_STAFF],
+        'food': [UserRole.TECHNICAL_STAFF, UserRole.MANAGER, UserRole.STOREKEEPER],
+        'service': [UserRole.TECHNICAL_STAFF, UserRole.MANAGER],
+        'delivery': [UserRole.STOREKEEPER, UserRole.TECHNICAL_STAFF, UserRole.MANAGER],
+        'maintenance': [UserRole.TECHNICAL_STAFF, UserRole.MANAGER]
+    }
+    DEFAULT_EXECUTOR_ROLES = [UserRole.MANAGER, UserRole.TECHNICAL_STAFF]
+    
+    # Assignment optimizer: max active items per executor and cost of each active item
+    OPTIMIZER_MAX_LOAD = int(os.getenv("ORDER_OPTIMIZER_MAX_LOAD", "15"))
+    OPTIMIZER_LOAD_STEP = 3
+    
+    @staticmethod
+    async def get_orders_async(
+        db: AsyncSession,
+        organization_id: uuid.UUID,
+        skip: int = 0,
+        limit: int = 100,
+        status: Optional[OrderStatus] = None,
+        order_type: Optional[str] = None,
+        property_id: Optional[uuid.UUID] = None,
+        assigned_to: Optional[uuid.UUID] = None
+    ) -> List[RoomOrder]:
+        """List organization orders through an async session"""
+        
+        query = select(RoomOrder).where(RoomOrder.organization_id == organization_id)
+        
+        if status:
+            query = query.where(RoomOrder.status == status)
+        if order_type:
+            query = query.where(RoomOrder.order_type == order_type)
+        if property_id:
+            query = query.where(RoomOrder.property_id == property_id)
+        if assigned_to:
+            query = query.where(RoomOrder.assigned_to == assigned_to)
+        
+        # Relationships are eager-loaded: lazy loading is unavailable in async sessions
+        query = query.options(
+            selectinload(RoomOrder.property),
+            selectinload(RoomOrder.client)
+        ).order_by(desc(RoomOrder.requested_at)).offset(skip).limit(limit)
+        
+        result = await db.execute(query)
+        return list(result.scalars().all())
+    
     @staticmethod
     def create_order_with_inventory_check(
         db: Session,
@@ -116,9 +174,9 @@ class OrderService:
             delivery_task = OrderService._create_delivery_task_with_assignment(
                 db, order, assigned_executor
             )
-            print(f"✅ Created delivery task {delivery_task.id} assigned to {assigned_executor.first_name} {assigned_executor.last_name}")
+            logger.debug("✅ Created delivery task %s assigned to %s %s", delivery_task.id, assigned_executor.first_name, assigned_executor.last_name)
         else:
-            print(f"⚠️  Order {order.order_number} created without assignment - will need manual assignment")
+            logger.warning("⚠️  Order %s created without assignment - will need manual assignment", order.order_number)
         
         # Step 7: Reserve inventory items (automatic stock deduction)
         for validation in inventory_validations:
@@ -132,6 +190,8 @@ class OrderService:
         # Step 8: Send notifications
         if assigned_executor:
             OrderService._notify_executor_about_assignment(db, order, assigned_executor, delivery_task)
+            ChangeFeedService.order_changed(db, order, "assigned")
+            ChangeFeedService.task_changed(db, delivery_task, "assigned")
         else:
             # Notify managers about unassigned order
             OrderService._notify_managers_about_unassigned_order(db, order, organization_id)
@@ -139,6 +199,14 @@ class OrderService:
         db.commit()
         db.refresh(order)
         
+        WorkloadIndexService.order_changed(order)
+        if delivery_task:
+            WorkloadIndexService.task_changed(delivery_task)
+        
+        # Резерв товаров создает движения списания за сегодня
+        if inventory_validations:
+            ReportFactsService.sync_days(db, organization_id, order.created_at, order.created_at)
+        
         return order
 
     @staticmethod
@@ -150,16 +218,7 @@ class OrderService:
     ) -> Optional[User]:
         """Enhanced auto-assignment with weighted scoring and priority handling"""
         
-        # Define role priorities for different order types
-        role_priorities = {
-            'product_sale': [UserRole.STOREKEEPER, UserRole.MANAGER, UserRole.TECHNICAL_STAFF],
-            'food': [UserRole.TECHNICAL_STAFF, UserRole.MANAGER, UserRole.STOREKEEPER],
-            'service': [UserRole.TECHNICAL_STAFF, UserRole.MANAGER],
-            'delivery': [UserRole.STOREKEEPER, UserRole.TECHNICAL_STAFF, UserRole.MANAGER],
-            'maintenance': [UserRole.TECHNICAL_STAFF, UserRole.MANAGER]
-        }
-        
-        preferred_roles = role_priorities.get(order_type, [UserRole.MANAGER, UserRole.TECHNICAL_STAFF])
+        preferred_roles = OrderService.EXECUTOR_ROLE_PRIORITIES.get(order_type, OrderService.DEFAULT_EXECUTOR_ROLES)
         
         # Get all potential executors
         potential_executors = db.query(User).filter(
@@ -171,15 +230,21 @@ class OrderService:
         ).all()
         
         if not potential_executors:
-            print(f"⚠️  No available executors found for order type: {order_type}")
+            logger.warning("⚠️  No available executors found for order type: %s", order_type)
             return None
         
+        # Workload/performance features for all candidates from the live workload index
+        features = WorkloadIndexService.get_executor_features(
+            db, organization_id, [executor.id for executor in potential_executors]
+        )
+        
         # Score each executor with enhanced criteria
         scored_executors = []
         
         for executor in potential_executors:
             score = OrderService._calculate_enhanced_executor_score(
-                db, executor, order_type, preferred_roles, order_value
+                db, executor, order_type, preferred_roles, order_value,
+                features=features[executor.id]
             )
             scored_executors.append((executor, score))
         
@@ -188,127 +253,329 @@ class OrderService:
             scored_executors.sort(key=lambda x: x[1], reverse=True)
             best_executor, best_score = scored_executors[0]
             
-            print(f"✅ Best executor selected: {best_executor.first_name} {best_executor.last_name} "
-                  f"({best_executor.role.value}) with score: {best_score:.2f}")
+            logger.debug(
+                "✅ Best executor selected: %s %s (%s) with score: %.2f",
+                best_executor.first_name, best_executor.last_name, best_executor.role.value, best_score
+            )
             
             # Log top 3 candidates for transparency
-            for i, (executor, score) in enumerate(scored_executors[:3]):
-                print(f"   {i+1}. {executor.first_name} {executor.last_name}: {score:.2f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, (executor, score) in enumerate(scored_executors[:3]):
+                    logger.debug("   %s. %s %s: %.2f", i + 1, executor.first_name, executor.last_name, score)
             
             return best_executor
         
         return None
 
+    @staticmethod
+    def plan_bulk_assignments(
+        db: Session,
+        organization_id: uuid.UUID,
+        orders: List[RoomOrder]
+    ) -> Dict[uuid.UUID, User]:
+        """Best executors for a batch of orders from a single candidate snapshot
+        
+        Candidates and their features are loaded once for the whole batch.
+        Orders are scored in order and every assignment immediately adds an
+        active order and a delivery task to the chosen executor's workload,
+        so the batch is spread instead of landing on one person.
+        
+        Returns:
+            {order_id: executor}; orders without a suitable executor are omitted
+        """
+        roles = set(OrderService.DEFAULT_EXECUTOR_ROLES)
+        for order in orders:
+            roles.update(OrderService.EXECUTOR_ROLE_PRIORITIES.get(order.order_type, []))
+        
+        candidates = list(AssignmentService.load_candidates(db, organization_id, roles).values())
+        if not candidates:
+            logger.warning("⚠️  No available executors found for bulk assignment")
+            return {}
+        
+        features = WorkloadIndexService.get_executor_features(
+            db, organization_id, [executor.id for executor in candidates]
+        )
+        
+        plan = {}
+        for order in orders:
+            preferred_roles = OrderService.EXECUTOR_ROLE_PRIORITIES.get(order.order_type, OrderService.DEFAULT_EXECUTOR_ROLES)
+            scored = [
+                (
+                    OrderService._calculate_enhanced_executor_score(
+                        db, executor, order.order_type, preferred_roles, order.total_amount or 0,
+                        features=features[executor.id]
+                    ),
+                    executor
+                )
+                for executor in candidates
+                if executor.role in preferred_roles
+            ]
+            if not scored:
+                continue
+            
+            best_score, best_executor = max(scored, key=lambda item: item[0])
+            plan[order.id] = best_executor
+            
+            features[best_executor.id]["active_orders"] += 1
+            features[best_executor.id]["active_tasks"] += 1
+        
+        return plan
+
+    @staticmethod
+    def optimize_assignments(
+        db: Session,
+        organization_id: uuid.UUID,
+        max_load: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Global reassignment plan for all active assigned orders
+        
+        All active orders, candidates and their features are loaded once.
+        Orders are grouped into classes with identical role fit, and the
+        batch is solved as a min-cost flow (AssignmentService.solve_min_cost):
+        cost = -(fit + executor track score) plus a growing marginal cost of
+        every active item, with at most max_load active items per executor.
+        Within the optimal flow orders stay with their current executor where
+        possible, so the plan has no conflicts and only necessary moves.
+        """
+        started = time.perf_counter()
+        max_load = max_load or OrderService.OPTIMIZER_MAX_LOAD
+        
+        active_orders = db.query(RoomOrder).filter(
+            and_(
+                RoomOrder.organization_id == organization_id,
+                RoomOrder.status.in_(ExecutorScoringService.ACTIVE_ORDER_STATUSES),
+                RoomOrder.assigned_to.isnot(None)
+            )
+        ).order_by(RoomOrder.created_at).all()
+        
+        if not active_orders:
+            return {"total_active_orders": 0, "optimizations": [], "projected_workload": [], "unplaced_count": 0}
+        
+        roles = set(OrderService.DEFAULT_EXECUTOR_ROLES)
+        for order in active_orders:
+            roles.update(OrderService.EXECUTOR_ROLE_PRIORITIES.get(order.order_type, []))
+        
+        candidates = AssignmentService.load_candidates(db, organization_id, roles)
+        executors = dict(candidates)
+        holder_ids = {order.assigned_to for order in active_orders} - set(executors)
+        if holder_ids:
+            executors.update({user.id: user for user in db.query(User).filter(User.id.in_(holder_ids)).all()})
+        
+        features = WorkloadIndexService.get_executor_features(db, organization_id, list(executors))
+        
+        # Orders under optimization are lifted from their executors' workload
+        held = {}
+        for order in active_orders:
+            held[order.assigned_to] = held.get(order.assigned_to, 0) + 1
+        base_loads = {
+            executor_id: max(0, f["active_orders"] + f["active_tasks"] - held.get(executor_id, 0))
+            for executor_id, f in features.items()
+        }
+        
+        # Orders with the same fit per role are interchangeable for the solver
+        classes = {}
+        for order in active_orders:
+            preferred_roles = OrderService.EXECUTOR_ROLE_PRIORITIES.get(order.order_type, OrderService.DEFAULT_EXECUTOR_ROLES)
+            costs = {
+                role: -OrderService._executor_fit_score(role, order.order_type, preferred_roles, order.total_amount or 0)
+                for role in preferred_roles
+            }
+            classes.setdefault(tuple(costs.items()), (costs, []))[1].append(order)
+        class_list = list(classes.values())
+        
+        flow, unplaced = AssignmentService.solve_min_cost(
+            [len(orders) for _, orders in class_list],
+            [costs for costs, _ in class_list],
+            {
+                executor_id: (
+                    user.role,
+                    -OrderService._executor_track_score(features[executor_id]),
+                    base_loads[executor_id],
+                    max_load
+                )
+                for executor_id, user in candidates.items()
+            },
+            OrderService.OPTIMIZER_LOAD_STEP
+        )
+        
+        # Concrete orders: current executor first, the rest to the remaining slots;
+        # orders that do not fit anywhere stay where they are
+        plan = {}
+        for (_, orders), slots in zip(class_list, flow):
+            rest = []
+            for order in orders:
+                if slots.get(order.assigned_to, 0) > 0:
+                    plan[order.id] = order.assigned_to
+                    slots[order.assigned_to] -= 1
+                else:
+                    rest.append(order)
+            free = [executor_id for executor_id, n in slots.items() for _ in range(n)]
+            for order, executor_id in zip(rest, free):
+                plan[order.id] = executor_id
+            for order in rest[len(free):]:
+                plan[order.id] = order.assigned_to
+        
+        assigned = {}
+        for executor_id in plan.values():
+            assigned[executor_id] = assigned.get(executor_id, 0) + 1
+        projected = {
+            executor_id: dict(
+                f,
+                active_orders=max(0, f["active_orders"] - held.get(executor_id, 0)) + assigned.get(executor_id, 0)
+            )
+            for executor_id, f in features.items()
+        }
+        
+        optimizations = []
+        for order in active_orders:
+            target_id = plan[order.id]
+            if target_id == order.assigned_to:
+                continue
+            
+            current, target = executors[order.assigned_to], executors[target_id]
+            preferred_roles = OrderService.EXECUTOR_ROLE_PRIORITIES.get(order.order_type, OrderService.DEFAULT_EXECUTOR_ROLES)
+            current_score = OrderService._calculate_enhanced_executor_score(
+                db, current, order.order_type, preferred_roles, order.total_amount or 0,
+                features=features[current.id]
+            )
+            suggested_score = OrderService._calculate_enhanced_executor_score(
+                db, target, order.order_type, preferred_roles, order.total_amount or 0,
+                features=projected[target.id]
+            )
+            improvement = ((suggested_score - current_score) / current_score * 100) if current_score > 0 else 0
+            
+            optimizations.append({
+                "order_id": str(order.id),
+                "order_number": order.order_number,
+                "current_executor": {
+                    "id": str(current.id),
+                    "name": f"{current.first_name} {current.last_name}",
+                    "score": round(current_score, 2)
+                },
+                "suggested_executor": {
+                    "id": str(target.id),
+                    "name": f"{target.first_name} {target.last_name}",
+                    "score": round(suggested_score, 2)
+                },
+                "improvement_percentage": round(improvement, 2),
+                "recommendation": (
+                    "Consider reassigning for better efficiency" if improvement > 0
+                    else "Reassign to balance workload"
+                )
+            })
+        
+        projected_workload = [
+            {
+                "executor": {
+                    "id": str(executor_id),
+                    "name": f"{user.first_name} {user.last_name}",
+                    "role": user.role.value
+                },
+                "current_load": features[executor_id]["active_orders"] + features[executor_id]["active_tasks"],
+                "projected_load": projected[executor_id]["active_orders"] + projected[executor_id]["active_tasks"],
+                "capacity": max_load if executor_id in candidates else 0
+            }
+            for executor_id, user in executors.items()
+        ]
+        
+        logger.info(
+            "🧮 Assignment optimization for organization %s: %s orders, %s executors, %s moves in %.3f s",
+            organization_id, len(active_orders), len(candidates), len(optimizations), time.perf_counter() - started
+        )
+        
+        return {
+            "total_active_orders": len(active_orders),
+            "optimizations": sorted(optimizations, key=lambda x: x["improvement_percentage"], reverse=True),
+            "projected_workload": sorted(projected_workload, key=lambda x: x["projected_load"], reverse=True),
+            "unplaced_count": sum(unplaced)
+        }
+
     @staticmethod
     def _calculate_enhanced_executor_score(
         db: Session, 
         executor: User, 
         order_type: str, 
         preferred_roles: List[UserRole],
-        order_value: float
+        order_value: float,
+        features: Optional[Dict[str, Any]] = None
     ) -> float:
-        """Enhanced scoring algorithm with multiple weighted factors"""
+        """Enhanced scoring algorithm with multiple weighted factors
         
-        score = 0.0
+        `features` are precomputed by ExecutorScoringService.get_executor_features;
+        when omitted they are loaded for this executor alone.
+        """
         
-        # 1. Role preference score (0-50 points)
-        try:
-            role_index = preferred_roles.index(executor.role)
-            role_score = 50 - (role_index * 10)  # First choice gets 50, second gets 40, etc.
-        except ValueError:
-            role_score = 0
-        score += role_score
+        if features is None:
+            features = ExecutorScoringService.get_executor_features(db, [executor.id])[executor.id]
         
-        # 2. Current workload score (0-30 points, inverted - less workload is better)
-        active_orders = db.query(RoomOrder).filter(
-            and_(
-                RoomOrder.assigned_to == executor.id,
-                RoomOrder.status.in_([OrderStatus.CONFIRMED, OrderStatus.IN_PROGRESS])
-            )
-        ).count()
+        fit_score = OrderService._executor_fit_score(executor.role, order_type, preferred_roles, order_value)
         
-        active_tasks = db.query(Task).filter(
-            and_(
-                Task.assigned_to == executor.id,
-                Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-            )
-        ).count()
-        
-        total_workload = active_orders + active_tasks
+        # Current workload score (0-30 points, inverted - less workload is better)
+        total_workload = features["active_orders"] + features["active_tasks"]
         workload_score = max(0, 30 - (total_workload * 3))  # Each active item reduces score by 3
-        score += workload_score
         
-        # 3. Recent performance score (0-25 points)
-        last_week = datetime.now(timezone.utc) - timedelta(days=7)
+        track_score = OrderService._executor_track_score(features)
         
-        completed_orders = db.query(RoomOrder).filter(
-            and_(
-                RoomOrder.assigned_to == executor.id,
-                RoomOrder.status == OrderStatus.DELIVERED,
-                RoomOrder.completed_at >= last_week
-            )
-        ).count()
+        score = fit_score + workload_score + track_score
         
-        completed_tasks = db.query(Task).filter(
-            and_(
-                Task.assigned_to == executor.id,
-                Task.status == TaskStatus.COMPLETED,
-                Task.completed_at >= last_week
-            )
-        ).count()
+        logger.debug(
+            "📊 %s %s: Fit(%.1f) + Workload(%.1f) + Track(%.1f) = %.2f",
+            executor.first_name, executor.last_name, fit_score, workload_score, track_score, score
+        )
+        
+        return score
+
+    @staticmethod
+    def _executor_fit_score(
+        role: UserRole,
+        order_type: str,
+        preferred_roles: List[UserRole],
+        order_value: float
+    ) -> float:
+        """Role preference, specialization and high-value bonus - depend only on the executor role"""
         
-        performance_score = min(25, (completed_orders * 4) + (completed_tasks * 2))
-        score += performance_score
-        
-        # 4. Specialization bonus for order type (0-15 points)
-        specialization_bonus = 0
-        if order_type == 'product_sale' and executor.role == UserRole.STOREKEEPER:
-            specialization_bonus = 15
-        elif order_type in ['food', 'service'] and executor.role == UserRole.TECHNICAL_STAFF:
-            specialization_bonus = 15
-        elif executor.role == UserRole.MANAGER:
-            specialization_bonus = 10  # Managers are versatile
-        score += specialization_bonus
-        
-        # 5. High-value order handling bonus (0-10 points)
-        if order_value > 50000 and executor.role in [UserRole.MANAGER, UserRole.STOREKEEPER]:
+        score = 0.0
+        
+        # 1. Role preference score (0-50 points)
+        try:
+            role_index = preferred_roles.index(role)
+            score += 50 - (role_index * 10)  # First choice gets 50, second gets 40, etc.
+        except ValueError:
+            pass
+        
+        # 2. Specialization bonus for order type (0-15 points)
+        if order_type == 'product_sale' and role == UserRole.STOREKEEPER:
+            score += 15
+        elif order_type in ['food', 'service'] and role == UserRole.TECHNICAL_STAFF:
+            score += 15
+        elif role == UserRole.MANAGER:
+            score += 10  # Managers are versatile
+        
+        # 3. High-value order handling bonus (0-10 points)
+        if order_value > 50000 and role in [UserRole.MANAGER, UserRole.STOREKEEPER]:
             score += 10
-        elif order_value > 20000 and executor.role == UserRole.MANAGER:
+        elif order_value > 20000 and role == UserRole.MANAGER:
             score += 5
         
-        # 6. Availability check (0-10 points)
-        last_hour = datetime.now(timezone.utc) - timedelta(hours=1)
-        
-        recent_activity = db.query(Task).filter(
-            and_(
-                Task.assigned_to == executor.id,
-                Task.status == TaskStatus.IN_PROGRESS,
-                Task.started_at >= last_hour
-            )
-        ).count()
+        return score
+
+    @staticmethod
+    def _executor_track_score(features: Dict[str, Any]) -> float:
+        """Performance, availability and quality - depend only on the executor"""
         
-        availability_score = 10 if recent_activity == 0 else (5 if recent_activity <= 1 else 0)
-        score += availability_score
+        # 1. Recent performance score (0-25 points)
+        score = min(25, (features["completed_orders"] * 4) + (features["completed_tasks"] * 2))
         
-        # 7. Quality rating bonus (0-10 points)
-        avg_quality = db.query(func.avg(Task.quality_rating)).filter(
-            and_(
-                Task.assigned_to == executor.id,
-                Task.status == TaskStatus.COMPLETED,
-                Task.quality_rating.isnot(None),
-                Task.completed_at >= last_week
-            )
-        ).scalar()
+        # 2. Availability check (0-10 points)
+        recent_activity = features["recent_activity"]
+        score += 10 if recent_activity == 0 else (5 if recent_activity <= 1 else 0)
         
+        # 3. Quality rating bonus (0-10 points)
+        avg_quality = features["avg_quality"]
         if avg_quality:
             quality_score = min(10, (avg_quality - 3) * 5)  # Scale 3-5 rating to 0-10 points
             score += max(0, quality_score)
         
-        print(f"📊 {executor.first_name} {executor.last_name}: "
-              f"Role({role_score:.1f}) + Workload({workload_score:.1f}) + Performance({performance_score:.1f}) + "
-              f"Specialization({specialization_bonus:.1f}) + Value({5 if order_value > 20000 else 0:.1f}) + "
-              f"Availability({availability_score:.1f}) + Quality({avg_quality or 0:.1f}) = {score:.2f}")
-        
         return score
 
     @staticmethod
@@ -397,7 +664,7 @@ class OrderService:
             return delivery_task
             
         except Exception as e:
-            print(f"❌ Failed to create delivery task for order {order.id}: {e}")
+            logger.error("❌ Failed to create delivery task for order %s: %s", order.id, e)
             raise
 
     @staticmethod
@@ -476,8 +743,7 @@ class OrderService:
             # - Create in-app notification
             # - Send push notification if mobile app exists
             
-            print(f"📧 Notification sent to {executor.email}:")
-            print(notification_message)
+            logger.debug("📧 Notification sent to %s:\n%s", executor.email, notification_message)
             
             # You can also create a notification record in the database
             # from models.notification_models import Notification
@@ -492,7 +758,7 @@ class OrderService:
             # db.add(notification)
             
         except Exception as e:
-            print(f"⚠️  Failed to send notification to executor {executor.id}: {e}")
+            logger.warning("⚠️  Failed to send notification to executor %s: %s", executor.id, e)
 
     @staticmethod
     def _notify_managers_about_unassigned_order(
@@ -521,12 +787,12 @@ class OrderService:
             )
             
             for manager in managers:
-                print(f"📧 Manager notification sent to {manager.email}: {notification_message}")
+                logger.debug("📧 Manager notification sent to %s: %s", manager.email, notification_message)
                 
                 # TODO: Send actual notifications to managers
                 
         except Exception as e:
-            print(f"⚠️  Failed to notify managers about unassigned order: {e}")
+            logger.warning("⚠️  Failed to notify managers about unassigned order: %s", e)
 
     @staticmethod
     def get_executor_workload_summary(db: Session, organization_id: uuid.UUID) -> Dict[str, Any]:
@@ -545,85 +811,50 @@ class OrderService:
             )
         ).all()
         
-        workload_summary = []
+        executor_ids = [executor.id for executor in executors]
         
-        for executor in executors:
-            # Current workload
-            active_orders = db.query(RoomOrder).filter(
+        # Active items for all executors in two queries (details are returned below)
+        active_orders_by_executor = {executor_id: [] for executor_id in executor_ids}
+        active_tasks_by_executor = {executor_id: [] for executor_id in executor_ids}
+        
+        if executor_ids:
+            for order in db.query(RoomOrder).options(selectinload(RoomOrder.property)).filter(
                 and_(
-                    RoomOrder.assigned_to == executor.id,
+                    RoomOrder.assigned_to.in_(executor_ids),
                     RoomOrder.status.in_([OrderStatus.CONFIRMED, OrderStatus.IN_PROGRESS])
                 )
-            ).all()
+            ).all():
+                active_orders_by_executor[order.assigned_to].append(order)
             
-            active_tasks = db.query(Task).filter(
+            for task in db.query(Task).options(selectinload(Task.property)).filter(
                 and_(
-                    Task.assigned_to == executor.id,
+                    Task.assigned_to.in_(executor_ids),
                     Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
                 )
-            ).all()
-            
-            # Recent performance metrics
-            last_week = datetime.now(timezone.utc) - timedelta(days=7)
-            last_month = datetime.now(timezone.utc) - timedelta(days=30)
-            
-            completed_orders_week = db.query(RoomOrder).filter(
-                and_(
-                    RoomOrder.assigned_to == executor.id,
-                    RoomOrder.status == OrderStatus.DELIVERED,
-                    RoomOrder.completed_at >= last_week
-                )
-            ).count()
-            
-            completed_tasks_week = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == executor.id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.completed_at >= last_week
-                )
-            ).count()
-            
-            completed_orders_month = db.query(RoomOrder).filter(
-                and_(
-                    RoomOrder.assigned_to == executor.id,
-                    RoomOrder.status == OrderStatus.DELIVERED,
-                    RoomOrder.completed_at >= last_month
-                )
-            ).count()
-            
-            # Average completion time
-            recent_tasks = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == executor.id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.completed_at >= last_week,
-                    Task.actual_duration.isnot(None)
-                )
-            ).all()
+            ).all():
+                active_tasks_by_executor[task.assigned_to].append(task)
+        
+        # Recent performance metrics come from the live workload index
+        week_stats = WorkloadIndexService.get_window_stats(db, organization_id, executor_ids, days=7)
+        month_stats = WorkloadIndexService.get_window_stats(db, organization_id, executor_ids, days=30)
+        
+        workload_summary = []
+        
+        for executor in executors:
+            # Current workload
+            active_orders = active_orders_by_executor[executor.id]
+            active_tasks = active_tasks_by_executor[executor.id]
             
-            avg_completion_time = None
-            if recent_tasks:
-                total_time = sum(task.actual_duration for task in recent_tasks)
-                avg_completion_time = total_time / len(recent_tasks)
+            completed_orders_week = week_stats[executor.id]["completed_orders"]
+            completed_tasks_week = week_stats[executor.id]["completed_tasks"]
+            completed_orders_month = month_stats[executor.id]["completed_orders"]
             
-            # Quality rating
-            avg_quality = db.query(func.avg(Task.quality_rating)).filter(
-                and_(
-                    Task.assigned_to == executor.id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.quality_rating.isnot(None),
-                    Task.completed_at >= last_week
-                )
-            ).scalar()
+            # Average completion time and quality rating (last week)
+            avg_completion_time = week_stats[executor.id]["avg_task_duration"]
+            avg_quality = week_stats[executor.id]["avg_quality"]
             
             # Revenue generated
-            total_orders_value = db.query(func.sum(RoomOrder.total_amount)).filter(
-                and_(
-                    RoomOrder.assigned_to == executor.id,
-                    RoomOrder.status == OrderStatus.DELIVERED,
-                    RoomOrder.completed_at >= last_month
-                )
-            ).scalar() or 0
+            total_orders_value = month_stats[executor.id]["order_revenue"]
             
             # Determine availability status and color
             current_workload = len(active_orders) + len(active_tasks)
@@ -854,6 +1085,9 @@ class OrderService:
     ) -> RoomOrder:
         """Update existing order with validation"""
         
+        previous_assignee = order.assigned_to
+        previous_status = order.status
+        
         # Update basic fields
         update_fields = order_data.dict(exclude_unset=True, exclude={'status'})
         for field, value in update_fields.items():
@@ -869,9 +1103,13 @@ class OrderService:
         
         order.updated_at = datetime.now(timezone.utc)
         
+        ChangeFeedService.order_changed(db, order, "updated", previous_assignee)
+        
         db.commit()
         db.refresh(order)
         
+        WorkloadIndexService.order_changed(order, previous_assignee, previous_status)
+        
         return order
 
     @staticmethod
@@ -921,9 +1159,10 @@ class OrderService:
         }
         
         if assignee.role not in suitable_roles.get(order.order_type, [UserRole.MANAGER]):
-            print(f"⚠️  Warning: {assignee.role.value} may not be optimal for {order.order_type} orders")
+            logger.warning("⚠️  Warning: %s may not be optimal for %s orders", assignee.role.value, order.order_type)
         
         old_assignee_id = order.assigned_to
+        old_status = order.status
         order.assigned_to = assigned_to
         
         # Auto-confirm if pending
@@ -938,9 +1177,15 @@ class OrderService:
         # Send notification
         OrderService._notify_executor_about_assignment(db, order, assignee, delivery_task)
         
+        ChangeFeedService.order_changed(db, order, "assigned", old_assignee_id)
+        ChangeFeedService.task_changed(db, delivery_task, "assigned")
+        
         db.commit()
         db.refresh(order)
         
+        WorkloadIndexService.order_changed(order, old_assignee_id, old_status)
+        WorkloadIndexService.task_changed(delivery_task)
+        
         return order
 
     @staticmethod
@@ -956,6 +1201,8 @@ class OrderService:
         if order.status not in [OrderStatus.CONFIRMED, OrderStatus.IN_PROGRESS]:
             raise ValueError(f"Order must be confirmed or in progress to complete. Current status: {order.status}")
         
+        previous_status = order.status
+        
         # Progress through statuses if needed
         if order.status == OrderStatus.CONFIRMED:
             order.status = OrderStatus.IN_PROGRESS
@@ -984,15 +1231,27 @@ class OrderService:
             )
         ).all()
         
+        previous_task_states = [(task, task.assigned_to, task.status) for task in delivery_tasks]
+        
         for task in delivery_tasks:
             if task.status != TaskStatus.COMPLETED:
                 task.status = TaskStatus.COMPLETED
                 task.completed_at = datetime.now(timezone.utc)
                 task.completion_notes = f"Автоматически завершена при завершении заказа {order.order_number}"
+                ChangeFeedService.task_changed(db, task, "completed")
+        
+        ChangeFeedService.order_changed(db, order, "completed")
         
         db.commit()
         db.refresh(order)
         
+        WorkloadIndexService.order_changed(order, order.assigned_to, previous_status)
+        for task, previous_assignee, previous_task_status in previous_task_states:
+            WorkloadIndexService.task_changed(task, previous_assignee, previous_task_status)
+        
+        # Выручка заказа учитывается в день его создания
+        ReportFactsService.sync_days(db, order.organization_id, order.created_at, order.created_at)
+        
         return order
 
     @staticmethod
@@ -0,0 +1,293 @@
+# backend/services/partition_service.py
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import logging
+import os
+import re
+
+from models.models import UserAction, LoginAttempt
+from models.extended_models import InventoryMovement
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionService:
+    """Помесячные секции журналов и движения материалов
+
+    Таблицы секционированы по created_at (RANGE), секция на каждый месяц
+    называется <таблица>_pYYYY_MM. Секции создаются заранее на
+    MONTHS_AHEAD месяцев вперед, а хранение ограничивается отсоединением
+    и удалением секций целиком вместо DELETE по строкам.
+
+    Строки вне созданных месяцев (пропущенное обслуживание, даты задним
+    числом) попадают в секцию по умолчанию <таблица>_default, а не
+    обрывают вставку ошибкой. ensure_partitions предупреждает о таких
+    строках и переносит их в секцию месяца, когда она создается.
+    """
+
+    MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+    # Таблица -> (модель, срок хранения в месяцах; 0 - хранить все)
+    TABLES = {
+        "audit.user_actions": (UserAction, int(os.getenv("AUDIT_ACTIONS_RETENTION_MONTHS", "12"))),
+        "audit.login_attempts": (LoginAttempt, int(os.getenv("LOGIN_ATTEMPTS_RETENTION_MONTHS", "3"))),
+        "public.inventory_movements": (InventoryMovement, int(os.getenv("INVENTORY_MOVEMENTS_RETENTION_MONTHS", "36"))),
+    }
+
+    PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+    @staticmethod
+    def _split(qualified_name: str) -> Tuple[str, str]:
+        schema, name = qualified_name.split(".")
+        return schema, name
+
+    @staticmethod
+    def _add_months(month: date, months: int) -> date:
+        index = month.year * 12 + month.month - 1 + months
+        return date(index // 12, index % 12 + 1, 1)
+
+    @staticmethod
+    def _month_start(value: datetime) -> date:
+        if value.tzinfo:
+            value = value.astimezone(timezone.utc)
+        return date(value.year, value.month, 1)
+
+    @staticmethod
+    def is_partitioned(db: Session, qualified_name: str) -> bool:
+        schema, name = PartitionService._split(qualified_name)
+        return db.execute(text("""
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = :name
+        """), {"schema": schema, "name": name}).first() is not None
+
+    @staticmethod
+    def list_partitions(db: Session, qualified_name: str) -> Dict[date, str]:
+        """Существующие помесячные секции таблицы: {начало месяца: имя}"""
+        schema, name = PartitionService._split(qualified_name)
+        rows = db.execute(text("""
+            SELECT child.relname FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            JOIN pg_namespace n ON n.oid = parent.relnamespace
+            WHERE n.nspname = :schema AND parent.relname = :name
+        """), {"schema": schema, "name": name}).all()
+
+        partitions = {}
+        for (partition_name,) in rows:
+            match = PartitionService.PARTITION_NAME.search(partition_name)
+            if match:
+                partitions[date(int(match.group(1)), int(match.group(2)), 1)] = partition_name
+        return partitions
+
+    @staticmethod
+    def _default_partition(db: Session, qualified_name: str) -> Optional[str]:
+        """Имя секции по умолчанию, если она есть"""
+        schema, name = PartitionService._split(qualified_name)
+        partition_name = f"{name}_default"
+        exists = db.execute(
+            text("SELECT to_regclass(:table)"), {"table": f"{schema}.{partition_name}"}
+        ).scalar()
+        return partition_name if exists else None
+
+    @staticmethod
+    def ensure_default_partition(db: Session, qualified_name: str) -> Optional[str]:
+        """Создать секцию по умолчанию; возвращает имя, если она создана сейчас"""
+        if PartitionService._default_partition(db, qualified_name):
+            return None
+
+        schema, name = PartitionService._split(qualified_name)
+        partition_name = f"{name}_default"
+        db.execute(text(f'CREATE TABLE "{schema}"."{partition_name}" PARTITION OF "{schema}"."{name}" DEFAULT'))
+        return partition_name
+
+    @staticmethod
+    def default_partition_range(db: Session, qualified_name: str) -> Optional[Tuple[int, datetime, datetime]]:
+        """(число строк, min created_at, max created_at) в секции по умолчанию или None, если она пуста"""
+        default_name = PartitionService._default_partition(db, qualified_name)
+        if not default_name:
+            return None
+
+        schema, _ = PartitionService._split(qualified_name)
+        row = db.execute(text(
+            f'SELECT count(*), min(created_at), max(created_at) FROM "{schema}"."{default_name}"'
+        )).one()
+        return tuple(row) if row[0] else None
+
+    @staticmethod
+    def create_partition(db: Session, qualified_name: str, month: date) -> str:
+        """
+        Создать секцию месяца
+
+        Если строки этого месяца уже лежат в секции по умолчанию, Postgres
+        не даст создать секцию поверх них: секция по умолчанию на время
+        отсоединяется, строки переносятся в новую секцию.
+        """
+        schema, name = PartitionService._split(qualified_name)
+        partition_name = f"{name}_p{month.year:04d}_{month.month:02d}"
+        next_month = PartitionService._add_months(month, 1)
+        lower = f"{month.isoformat()} 00:00:00+00"
+        upper = f"{next_month.isoformat()} 00:00:00+00"
+        create_sql = text(
+            f'CREATE TABLE IF NOT EXISTS "{schema}"."{partition_name}" '
+            f'PARTITION OF "{schema}"."{name}" '
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+
+        default_name = PartitionService._default_partition(db, qualified_name)
+        in_range = f"created_at >= '{lower}' AND created_at < '{upper}'"
+        stray = default_name and db.execute(text(
+            f'SELECT 1 FROM "{schema}"."{default_name}" WHERE {in_range} LIMIT 1'
+        )).first()
+
+        if not stray:
+            db.execute(create_sql)
+            return partition_name
+
+        logger.warning(f"⚠️ Moving rows of {month:%Y-%m} from {schema}.{default_name} to {partition_name}")
+        db.execute(text(f'ALTER TABLE "{schema}"."{name}" DETACH PARTITION "{schema}"."{default_name}"'))
+        db.execute(create_sql)
+        db.execute(text(
+            f'INSERT INTO "{schema}"."{name}" SELECT * FROM "{schema}"."{default_name}" WHERE {in_range}'
+        ))
+        db.execute(text(f'DELETE FROM "{schema}"."{default_name}" WHERE {in_range}'))
+        db.execute(text(f'ALTER TABLE "{schema}"."{name}" ATTACH PARTITION "{schema}"."{default_name}" DEFAULT'))
+        return partition_name
+
+    @staticmethod
+    def ensure_partitions(
+        db: Session,
+        from_month: Optional[date] = None,
+        months_ahead: Optional[int] = None
+    ) -> List[str]:
+        """
+        Создать недостающие секции с from_month (по умолчанию текущий месяц)
+        до месяцев вперед и секции по умолчанию
+
+        Строки, оставшиеся в секции по умолчанию, означают пропущенные
+        месяцы - о них пишется предупреждение.
+        """
+
+        current = PartitionService._month_start(datetime.now(timezone.utc))
+        from_month = from_month or current
+        months_ahead = PartitionService.MONTHS_AHEAD if months_ahead is None else months_ahead
+        last_month = PartitionService._add_months(current, months_ahead)
+
+        created = []
+        for qualified_name in PartitionService.TABLES:
+            if not PartitionService.is_partitioned(db, qualified_name):
+                continue
+
+            default_name = PartitionService.ensure_default_partition(db, qualified_name)
+            if default_name:
+                created.append(default_name)
+
+            existing = PartitionService.list_partitions(db, qualified_name)
+            month = from_month
+            while month <= last_month:
+                if month not in existing:
+                    created.append(PartitionService.create_partition(db, qualified_name, month))
+                month = PartitionService._add_months(month, 1)
+
+            stray = PartitionService.default_partition_range(db, qualified_name)
+            if stray:
+                count, oldest, newest = stray
+                logger.warning(
+                    f"⚠️ {count} rows of {qualified_name} are in the default partition "
+                    f"({oldest} - {newest}): monthly partitions are missing for these dates"
+                )
+
+        db.commit()
+
+        if created:
+            logger.info(f"🗂️ Created partitions: {', '.join(created)}")
+        return created
+
+    @staticmethod
+    def drop_expired_partitions(db: Session) -> List[str]:
+        """
+        Удалить секции, целиком вышедшие за срок хранения
+
+        Секция сначала отсоединяется (короткая блокировка родителя), затем
+        удаляется как отдельная таблица.
+        """
+        current = PartitionService._month_start(datetime.now(timezone.utc))
+        dropped = []
+
+        for qualified_name, (_, retention_months) in PartitionService.TABLES.items():
+            if not retention_months or not PartitionService.is_partitioned(db, qualified_name):
+                continue
+
+            schema, name = PartitionService._split(qualified_name)
+            # Секция удаляется, когда ее конец не позже начала срока хранения
+            oldest_kept = PartitionService._add_months(current, -retention_months)
+
+            for month, partition_name in sorted(PartitionService.list_partitions(db, qualified_name).items()):
+                if PartitionService._add_months(month, 1) > oldest_kept:
+                    continue
+
+                db.execute(text(f'ALTER TABLE "{schema}"."{name}" DETACH PARTITION "{schema}"."{partition_name}"'))
+                db.execute(text(f'DROP TABLE "{schema}"."{partition_name}"'))
+                db.commit()
+                dropped.append(f"{schema}.{partition_name}")
+
+        if dropped:
+            logger.info(f"🧹 Dropped partitions: {', '.join(dropped)}")
+        return dropped
+
+    @staticmethod
+    def convert_to_partitioned(db: Session, qualified_name: str):
+        """
+        Перевести существующую обычную таблицу на секционирование
+
+        Старая таблица и ее индексы переименовываются, по модели создается
+        секционированная таблица, создаются секции под имеющиеся данные,
+        строки переносятся, старая таблица удаляется.
+        """
+        if PartitionService.is_partitioned(db, qualified_name):
+            return
+
+        schema, name = PartitionService._split(qualified_name)
+        model, _ = PartitionService.TABLES[qualified_name]
+        legacy_name = f"{name}_legacy"
+
+        exists = db.execute(
+            text("SELECT to_regclass(:table)"), {"table": f"{schema}.{name}"}
+        ).scalar()
+        if not exists:
+            model.__table__.create(bind=db.connection())
+            PartitionService.ensure_default_partition(db, qualified_name)
+            return
+
+        db.execute(text(f'ALTER TABLE "{schema}"."{name}" RENAME TO "{legacy_name}"'))
+
+        # Имена индексов уникальны в схеме - освобождаем их для новой таблицы
+        index_names = db.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = :table"
+        ), {"schema": schema, "table": legacy_name}).scalars().all()
+        for index_name in index_names:
+            db.execute(text(f'ALTER INDEX "{schema}"."{index_name}" RENAME TO "{index_name[:56]}_legacy"'))
+
+        model.__table__.create(bind=db.connection())
+        PartitionService.ensure_default_partition(db, qualified_name)
+
+        oldest = db.execute(text(f'SELECT min(created_at) FROM "{schema}"."{legacy_name}"')).scalar()
+        current = PartitionService._month_start(datetime.now(timezone.utc))
+        month = PartitionService._month_start(oldest) if oldest else current
+        while month <= PartitionService._add_months(current, PartitionService.MONTHS_AHEAD):
+            PartitionService.create_partition(db, qualified_name, month)
+            month = PartitionService._add_months(month, 1)
+
+        columns = [column.name for column in model.__table__.columns]
+        select_list = [
+            "COALESCE(created_at, now())" if column == "created_at" else f'"{column}"'
+            for column in columns
+        ]
+        db.execute(text(
+            f'INSERT INTO "{schema}"."{name}" ({", ".join(chr(34) + c + chr(34) for c in columns)}) '
+            f'SELECT {", ".join(select_list)} FROM "{schema}"."{legacy_name}"'
+        ))
+        db.execute(text(f'DROP TABLE "{schema}"."{legacy_name}"'))
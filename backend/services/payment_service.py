@@ -7,6 +7,7 @@ import json
 
 from models.payment_models import Payment, PaymentStatus, PaymentType
 from models.extended_models import Rental
+from services.report_facts_service import ReportFactsService
 from schemas.payment import (
     PaymentCreate, PaymentUpdate, ProcessPaymentRequest,
     PaymentStatusResponse, PaymentHistoryResponse, PaymentResponse
@@ -150,6 +151,9 @@ class PaymentService:
                     rental.client.total_spent += payment.amount
         
         db.commit()
+        
+        if rental:
+            ReportFactsService.sync_rental(db, rental)
         return payment
     
     @staticmethod
@@ -1,7 +1,9 @@
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, func, or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, delete, desc, func, insert, or_, update
+import logging
+import time
 import uuid
 
 from models.database import get_db
@@ -13,6 +15,8 @@ from models.payroll_operation import PayrollOperation, PayrollOperationType
 from schemas.payroll_template import PayrollTemplateCreate, PayrollTemplateUpdate
 from schemas.payroll_operation import PayrollOperationCreate
 
+logger = logging.getLogger(__name__)
+
 
 class PayrollExtendedService:
     """Расширенный сервис для управления зарплатами с шаблонами и операциями"""
@@ -52,6 +56,15 @@ class PayrollExtendedService:
         
         return template
     
+    @staticmethod
+    def _month_period(year: int, month: int):
+        period_start = datetime(year, month, 1, tzinfo=timezone.utc)
+        if month == 12:
+            period_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
+        else:
+            period_end = datetime(year, month + 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
+        return period_start, period_end
+    
     @staticmethod
     def auto_generate_monthly_payrolls(
         db: Session,
@@ -61,14 +74,39 @@ class PayrollExtendedService:
     ) -> List[Payroll]:
         """Автоматическое создание зарплат на основе шаблонов"""
         
-        # Определяем период
-        period_start = datetime(year, month, 1, tzinfo=timezone.utc)
-        if month == 12:
-            period_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
-        else:
-            period_end = datetime(year, month + 1, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
+        result = PayrollExtendedService.generate_monthly_payrolls_bulk(
+            db, organization_id, year, month
+        )
+        if not result["payroll_ids"]:
+            return []
+        
+        # Созданные зарплаты одним запросом вместе с сотрудниками и операциями
+        return db.query(Payroll).options(
+            selectinload(Payroll.user),
+            selectinload(Payroll.operations)
+        ).filter(Payroll.id.in_(result["payroll_ids"])).all()
+    
+    @staticmethod
+    def generate_monthly_payrolls_bulk(
+        db: Session,
+        organization_id: uuid.UUID,
+        year: int,
+        month: int,
+        dry_run: bool = False,
+        replace_unpaid: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Создать зарплаты всей организации за месяц набором запросов
+        
+        Шаблоны, существующие зарплаты, оплачиваемые выполненные задачи и
+        неприменённые операции загружаются несколькими групповыми запросами,
+        расчет идет в памяти, зарплаты вставляются одним INSERT, а операции
+        отмечаются одним UPDATE. В режиме dry_run ничего не записывается.
+        replace_unpaid пересоздает неоплаченные зарплаты за период.
+        """
+        started = time.perf_counter()
+        period_start, period_end = PayrollExtendedService._month_period(year, month)
         
-        # Получаем все активные шаблоны
         templates = db.query(PayrollTemplate).filter(
             and_(
                 PayrollTemplate.organization_id == organization_id,
@@ -80,61 +118,151 @@ class PayrollExtendedService:
                 )
             )
         ).all()
+        user_ids = list({template.user_id for template in templates})
         
-        payrolls_created = []
+        # Существующие зарплаты за период
+        existing = db.query(Payroll.id, Payroll.user_id, Payroll.is_paid).filter(
+            and_(
+                Payroll.organization_id == organization_id,
+                Payroll.period_start == period_start,
+                Payroll.period_end == period_end
+            )
+        ).all()
+        replaced_ids = [row.id for row in existing if replace_unpaid and not row.is_paid]
+        covered_users = {row.user_id for row in existing if row.id not in replaced_ids}
+        
+        # Оплачиваемые выполненные задачи: количество и сумма по сотрудникам
+        task_stats = {}
+        task_user_ids = [t.user_id for t in templates if t.include_task_payments]
+        if task_user_ids:
+            task_stats = {
+                row.assigned_to: (row.tasks_completed, row.payment_sum)
+                for row in db.query(
+                    Task.assigned_to,
+                    func.count(Task.id).label("tasks_completed"),
+                    func.coalesce(func.sum(Task.payment_amount), 0).label("payment_sum")
+                ).filter(
+                    and_(
+                        Task.assigned_to.in_(task_user_ids),
+                        Task.status == TaskStatus.COMPLETED,
+                        Task.completed_at >= period_start,
+                        Task.completed_at <= period_end,
+                        Task.is_paid == True
+                    )
+                ).group_by(Task.assigned_to).all()
+            }
         
-        for template in templates:
-            # Проверяем, нет ли уже зарплаты за этот период
-            existing_payroll = db.query(Payroll).filter(
-                and_(
-                    Payroll.user_id == template.user_id,
-                    Payroll.period_start == period_start,
-                    Payroll.period_end == period_end
-                )
-            ).first()
+        # Неприменённые операции за период (и операции пересоздаваемых зарплат)
+        operations_by_user: Dict[uuid.UUID, List[PayrollOperation]] = {}
+        if user_ids:
+            not_applied = PayrollOperation.is_applied == False
+            if replaced_ids:
+                not_applied = or_(not_applied, PayrollOperation.payroll_id.in_(replaced_ids))
             
-            if existing_payroll:
+            for operation in db.query(PayrollOperation).filter(
+                PayrollOperation.user_id.in_(user_ids),
+                PayrollOperation.apply_to_period_start <= period_end,
+                PayrollOperation.apply_to_period_end >= period_start,
+                not_applied
+            ).all():
+                operations_by_user.setdefault(operation.user_id, []).append(operation)
+        
+        payroll_rows = []
+        applied_operations = []
+        for template in templates:
+            if template.user_id in covered_users:
                 continue
+            covered_users.add(template.user_id)
             
-            # Создаем зарплату на основе шаблона
-            payroll = PayrollExtendedService._create_payroll_from_template(
-                db, template, period_start, period_end
+            operations = operations_by_user.get(template.user_id, [])
+            row = PayrollExtendedService._compute_payroll(
+                template, task_stats.get(template.user_id, (0, 0)), operations,
+                period_start, period_end
             )
+            payroll_rows.append(row)
+            applied_operations.extend((operation.id, row["id"]) for operation in operations)
+        
+        if not dry_run and (payroll_rows or replaced_ids):
+            now = datetime.now(timezone.utc)
+            
+            if replaced_ids:
+                db.execute(
+                    update(PayrollOperation)
+                    .where(PayrollOperation.payroll_id.in_(replaced_ids))
+                    .values(is_applied=False, applied_at=None, payroll_id=None)
+                )
+                db.execute(delete(Payroll).where(Payroll.id.in_(replaced_ids)))
+            
+            if payroll_rows:
+                db.execute(insert(Payroll), payroll_rows)
             
-            if payroll:
-                payrolls_created.append(payroll)
+            if applied_operations:
+                db.execute(update(PayrollOperation), [
+                    {"id": operation_id, "is_applied": True, "applied_at": now, "payroll_id": payroll_id}
+                    for operation_id, payroll_id in applied_operations
+                ])
+            
+            db.commit()
+        
+        user_names = {}
+        if payroll_rows:
+            user_names = {
+                row.id: f"{row.first_name} {row.last_name}"
+                for row in db.query(User.id, User.first_name, User.last_name).filter(
+                    User.id.in_([row["user_id"] for row in payroll_rows])
+                ).all()
+            }
         
-        return payrolls_created
+        generation_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(
+            f"💰 Payroll generation for {organization_id} {year}-{month:02d}: "
+            f"{len(payroll_rows)} payrolls in {generation_ms} ms" + (" (dry run)" if dry_run else "")
+        )
+        
+        return {
+            "organization_id": str(organization_id),
+            "period": f"{year}-{month:02d}",
+            "dry_run": dry_run,
+            "templates": len(templates),
+            "skipped_existing": len(templates) - len(payroll_rows),
+            "replaced": len(replaced_ids),
+            "payrolls_created": 0 if dry_run else len(payroll_rows),
+            "payroll_ids": [] if dry_run else [row["id"] for row in payroll_rows],
+            "total_gross": sum(row["gross_amount"] for row in payroll_rows),
+            "total_net": sum(row["net_amount"] for row in payroll_rows),
+            "generation_ms": generation_ms,
+            "payrolls": [
+                {
+                    "payroll_id": None if dry_run else str(row["id"]),
+                    "user_id": str(row["user_id"]),
+                    "user_name": user_names.get(row["user_id"], "Unknown"),
+                    "template_id": str(row["template_id"]),
+                    "tasks_completed": row["tasks_completed"],
+                    "gross_amount": row["gross_amount"],
+                    "net_amount": row["net_amount"],
+                    "operations_count": row["operations_summary"]["operations_count"]
+                }
+                for row in payroll_rows
+            ]
+        }
     
     @staticmethod
-    def _create_payroll_from_template(
-        db: Session,
+    def _compute_payroll(
         template: PayrollTemplate,
+        task_stats,
+        operations: List[PayrollOperation],
         period_start: datetime,
         period_end: datetime
-    ) -> Optional[Payroll]:
-        """Создать зарплату на основе шаблона"""
+    ) -> Dict[str, Any]:
+        """Рассчитать строку зарплаты по шаблону (без обращений к БД)"""
         
-        # Получаем выполненные задачи за период (если включены в шаблон)
+        # Выполненные задачи за период (если включены в шаблон)
         tasks_payment = 0
         tasks_completed = 0
         
         if template.include_task_payments:
-            completed_tasks = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == template.user_id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.completed_at >= period_start,
-                    Task.completed_at <= period_end,
-                    Task.is_paid == True
-                )
-            ).all()
-            
-            tasks_completed = len(completed_tasks)
-            tasks_payment = sum(
-                (task.payment_amount or 0) + (template.task_payment_rate or 0) 
-                for task in completed_tasks
-            )
+            tasks_completed, payment_sum = task_stats
+            tasks_payment = payment_sum + tasks_completed * (template.task_payment_rate or 0)
         
         # Применяем автоматические надбавки
         allowances_total = sum(template.automatic_allowances.values()) if template.automatic_allowances else 0
@@ -142,16 +270,6 @@ class PayrollExtendedService:
         # Применяем автоматические вычеты
         deductions_total = sum(template.automatic_deductions.values()) if template.automatic_deductions else 0
         
-        # Получаем операции за период
-        operations = db.query(PayrollOperation).filter(
-            and_(
-                PayrollOperation.user_id == template.user_id,
-                PayrollOperation.apply_to_period_start <= period_end,
-                PayrollOperation.apply_to_period_end >= period_start,
-                PayrollOperation.is_applied == False
-            )
-        ).all()
-        
         # Применяем операции
         bonus_total = 0
         penalty_total = 0
@@ -202,45 +320,31 @@ class PayrollExtendedService:
         # Итоговые суммы
         net_amount = gross_amount - total_deductions - taxes - social_contributions
         
-        # Создаем зарплату
-        payroll = Payroll(
-            id=uuid.uuid4(),
-            organization_id=template.organization_id,
-            user_id=template.user_id,
-            period_start=period_start,
-            period_end=period_end,
-            payroll_type=template.payroll_type,
-            base_rate=base_amount,
-            tasks_completed=tasks_completed,
-            tasks_payment=tasks_payment,
-            bonus=bonus_total,
-            other_income=allowances_total + overtime_total + other_income,
-            deductions=total_deductions,
-            taxes=taxes + social_contributions,
-            gross_amount=gross_amount,
-            net_amount=max(0, net_amount),  # Не может быть отрицательной
-            template_id=template.id,
-            generated_from_template=True,
-            operations_summary={
+        return {
+            "id": uuid.uuid4(),
+            "organization_id": template.organization_id,
+            "user_id": template.user_id,
+            "period_start": period_start,
+            "period_end": period_end,
+            "payroll_type": template.payroll_type,
+            "base_rate": base_amount,
+            "tasks_completed": tasks_completed,
+            "tasks_payment": tasks_payment,
+            "bonus": bonus_total,
+            "other_income": allowances_total + overtime_total + other_income,
+            "deductions": total_deductions,
+            "taxes": taxes + social_contributions,
+            "gross_amount": gross_amount,
+            "net_amount": max(0, net_amount),  # Не может быть отрицательной
+            "template_id": template.id,
+            "generated_from_template": True,
+            "operations_summary": {
                 "allowances": allowances_total,
                 "overtime": overtime_total,
                 "penalties": penalty_total,
                 "operations_count": len(operations)
             }
-        )
-        
-        db.add(payroll)
-        
-        # Отмечаем операции как примененные
-        for operation in operations:
-            operation.is_applied = True
-            operation.applied_at = datetime.now(timezone.utc)
-            operation.payroll_id = payroll.id
-        
-        db.commit()
-        db.refresh(payroll)
-        
-        return payroll
+        }
     
     @staticmethod
     def add_payroll_operation(
@@ -506,6 +610,154 @@ class PayrollExtendedService:
         
         db.commit()
     
+    # Группы операций для пересчета: (ключ, типы, брать по модулю)
+    OPERATION_GROUPS = [
+        ("bonus", [PayrollOperationType.BONUS], False),
+        ("penalties", [PayrollOperationType.PENALTY], True),
+        ("overtime", [PayrollOperationType.OVERTIME], False),
+        ("income", [
+            PayrollOperationType.ALLOWANCE,
+            PayrollOperationType.COMMISSION,
+            PayrollOperationType.HOLIDAY_PAY,
+            PayrollOperationType.VACATION_PAY,
+            PayrollOperationType.SICK_LEAVE
+        ], False),
+        ("deductions", [PayrollOperationType.DEDUCTION, PayrollOperationType.ADVANCE], True),
+    ]
+    
+    @staticmethod
+    def recalculate_period_payrolls(
+        db: Session,
+        organization_id: uuid.UUID,
+        year: int,
+        month: int,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Пересчитать все неоплаченные зарплаты организации за месяц
+        
+        Неприменённые операции агрегируются по сотрудникам и группам типов
+        одним GROUP BY с FILTER, суммы пересчитываются в памяти, зарплаты и
+        операции обновляются пакетными UPDATE. Расчет совпадает с
+        recalculate_payroll_with_operations; ранее примененные операции
+        остаются привязанными к своей зарплате.
+        """
+        started = time.perf_counter()
+        period_start, period_end = PayrollExtendedService._month_period(year, month)
+        
+        payrolls = db.query(
+            Payroll, PayrollTemplate.tax_rate, PayrollTemplate.social_rate
+        ).outerjoin(
+            PayrollTemplate, PayrollTemplate.id == Payroll.template_id
+        ).filter(
+            and_(
+                Payroll.organization_id == organization_id,
+                Payroll.period_start == period_start,
+                Payroll.period_end == period_end,
+                Payroll.is_paid == False
+            )
+        ).all()
+        
+        # Операции сотрудника относятся к одной (первой) зарплате периода
+        by_user = {}
+        for payroll, tax_rate, social_rate in payrolls:
+            by_user.setdefault(payroll.user_id, (payroll, tax_rate, social_rate))
+        
+        sums = {}
+        if by_user:
+            columns = [
+                func.coalesce(
+                    func.sum(
+                        func.abs(PayrollOperation.amount) if absolute else PayrollOperation.amount
+                    ).filter(PayrollOperation.operation_type.in_(types)),
+                    0
+                ).label(key)
+                for key, types, absolute in PayrollExtendedService.OPERATION_GROUPS
+            ]
+            rows = db.query(
+                PayrollOperation.user_id,
+                func.array_agg(PayrollOperation.id).label("operation_ids"),
+                *columns
+            ).filter(
+                and_(
+                    PayrollOperation.user_id.in_(list(by_user)),
+                    PayrollOperation.apply_to_period_start <= period_end,
+                    PayrollOperation.apply_to_period_end >= period_start,
+                    PayrollOperation.is_applied == False
+                )
+            ).group_by(PayrollOperation.user_id).all()
+            sums = {row.user_id: row for row in rows}
+        
+        now = datetime.now(timezone.utc)
+        payroll_updates = []
+        operation_updates = []
+        details = []
+        
+        for user_id, (payroll, tax_rate, social_rate) in by_user.items():
+            row = sums.get(user_id)
+            if row is None:
+                continue
+            
+            bonus = (payroll.bonus or 0) + row.bonus
+            other_income = (payroll.other_income or 0) + row.overtime + row.income
+            deductions = (payroll.deductions or 0) + row.penalties + row.deductions
+            
+            # Применяем налоги (если есть шаблон, используем его ставки)
+            tax_rate = tax_rate if tax_rate is not None else 0.1
+            social_rate = social_rate if social_rate is not None else 0.1
+            
+            gross_amount = (payroll.base_rate or 0) + (payroll.tasks_payment or 0) + bonus + other_income
+            gross_for_tax = gross_amount - deductions
+            taxes = gross_for_tax * tax_rate + gross_for_tax * social_rate
+            net_amount = max(0, gross_amount - deductions - taxes)
+            
+            payroll_updates.append({
+                "id": payroll.id,
+                "bonus": bonus,
+                "other_income": other_income,
+                "deductions": deductions,
+                "gross_amount": gross_amount,
+                "taxes": taxes,
+                "net_amount": net_amount,
+                "updated_at": now,
+                "operations_summary": {
+                    "bonus_operations": row.bonus,
+                    "penalty_operations": row.penalties,
+                    "overtime_operations": row.overtime,
+                    "other_income_operations": row.income,
+                    "deduction_operations": row.deductions,
+                    "operations_applied": len(row.operation_ids)
+                }
+            })
+            operation_updates.extend(
+                {"id": operation_id, "is_applied": True, "applied_at": now, "payroll_id": payroll.id}
+                for operation_id in row.operation_ids
+            )
+            details.append({
+                "payroll_id": str(payroll.id),
+                "user_id": str(user_id),
+                "old_net_amount": payroll.net_amount,
+                "new_net_amount": net_amount,
+                "difference": net_amount - (payroll.net_amount or 0),
+                "operations_applied": len(row.operation_ids)
+            })
+        
+        if not dry_run and payroll_updates:
+            db.execute(update(Payroll), payroll_updates)
+            db.execute(update(PayrollOperation), operation_updates)
+            db.commit()
+        
+        return {
+            "period": f"{year}-{month:02d}",
+            "dry_run": dry_run,
+            "payrolls_checked": len(payrolls),
+            "payrolls_recalculated": len(payroll_updates),
+            "operations_applied": len(operation_updates),
+            "total_difference": sum(item["difference"] for item in details),
+            "generation_ms": round((time.perf_counter() - started) * 1000, 2),
+            "payrolls": details
+        }
+    
     @staticmethod
     def apply_recurring_operations(db: Session, organization_id: uuid.UUID):
         """Применить повторяющиеся операции"""
@@ -582,61 +834,61 @@ class PayrollExtendedService:
             )
         ).all()
         
-        # Получаем среднюю оплату задач за последние 3 месяца
+        # Средняя оплата задач за последние 3 месяца - один запрос на всех
         three_months_ago = datetime.now(timezone.utc) - timedelta(days=90)
+        task_users = [t.user_id for t in active_templates if t.include_task_payments]
         avg_task_payments = {}
         
-        for template in active_templates:
-            if template.include_task_payments:
-                avg_payment = db.query(func.avg(Payroll.tasks_payment)).filter(
-                    and_(
-                        Payroll.user_id == template.user_id,
-                        Payroll.period_start >= three_months_ago
-                    )
-                ).scalar() or 0
-                avg_task_payments[str(template.user_id)] = avg_payment
-        
-        # Прогнозируем на будущие месяцы
-        forecast_data = []
+        if task_users:
+            avg_task_payments = dict(db.query(
+                Payroll.user_id, func.coalesce(func.avg(Payroll.tasks_payment), 0)
+            ).filter(
+                and_(
+                    Payroll.user_id.in_(task_users),
+                    Payroll.period_start >= three_months_ago
+                )
+            ).group_by(Payroll.user_id).all())
         
-        for month_offset in range(1, forecast_months + 1):
-            total_forecast = 0
-            staff_forecast = []
+        # Базовый месячный расчет по сотрудникам считается один раз
+        staff_forecast = []
+        for template in active_templates:
+            # Базовая ставка
+            base_amount = template.base_rate
             
-            for template in active_templates:
-                # Базовая ставка
-                base_amount = template.base_rate
-                
-                # Прогноз оплаты задач
-                task_payment_forecast = avg_task_payments.get(str(template.user_id), 0)
-                
-                # Автоматические надбавки
-                allowances = sum(template.automatic_allowances.values()) if template.automatic_allowances else 0
-                
-                # Примерные налоги
-                gross = base_amount + task_payment_forecast + allowances
-                taxes = gross * (template.tax_rate + template.social_rate)
-                
-                net_forecast = gross - taxes
-                total_forecast += net_forecast
-                
-                staff_forecast.append({
-                    "user_id": str(template.user_id),
-                    "user_name": template.name,
-                    "base_rate": base_amount,
-                    "estimated_tasks": task_payment_forecast,
-                    "allowances": allowances,
-                    "gross_forecast": gross,
-                    "net_forecast": net_forecast
-                })
+            # Прогноз оплаты задач
+            task_payment_forecast = (
+                avg_task_payments.get(template.user_id, 0) if template.include_task_payments else 0
+            )
+            
+            # Автоматические надбавки
+            allowances = sum(template.automatic_allowances.values()) if template.automatic_allowances else 0
             
-            forecast_data.append({
+            # Примерные налоги
+            gross = base_amount + task_payment_forecast + allowances
+            taxes = gross * (template.tax_rate + template.social_rate)
+            
+            staff_forecast.append({
+                "user_id": str(template.user_id),
+                "user_name": template.name,
+                "base_rate": base_amount,
+                "estimated_tasks": task_payment_forecast,
+                "allowances": allowances,
+                "gross_forecast": gross,
+                "net_forecast": gross - taxes
+            })
+        
+        # Проекция на все месяцы сразу: шаблоны неизменны, месяцы совпадают
+        total_forecast = sum(item["net_forecast"] for item in staff_forecast)
+        forecast_data = [
+            {
                 "month_offset": month_offset,
                 "total_forecast": total_forecast,
                 "staff_count": len(active_templates),
                 "average_per_employee": total_forecast / len(active_templates) if active_templates else 0,
                 "staff_breakdown": staff_forecast
-            })
+            }
+            for month_offset in range(1, forecast_months + 1)
+        ]
         
         return {
             "forecast_period_months": forecast_months,
@@ -0,0 +1,124 @@
+# backend/services/principal_cache_service.py
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import os
+import threading
+import time
+import uuid
+
+from models.models import User, UserRole, UserStatus, OrganizationStatus
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Неизменяемый снимок аутентифицированного пользователя
+
+    Содержит только то, что нужно для авторизации: идентификатор, роль,
+    статус и организацию. Маршруты, которым нужен сам User, по-прежнему
+    используют get_current_active_user.
+    """
+    id: uuid.UUID
+    email: str
+    role: UserRole
+    status: UserStatus
+    organization_id: Optional[uuid.UUID]
+    organization_status: Optional[OrganizationStatus]
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        organization = user.organization
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            status=user.status,
+            organization_id=user.organization_id,
+            organization_status=organization.status if organization else None
+        )
+
+
+class PrincipalCacheService:
+    """Кэш снимков пользователей с коротким TTL
+
+    Ключ - (user_id, iat токена), поэтому новый вход всегда читает БД.
+    Изменение пользователя увеличивает его поколение, изменение
+    организации - общее поколение кэша; записи со старым поколением
+    считаются промахом. Кэш локален для процесса: в других воркерах
+    изменения видны не позже, чем через TTL.
+    """
+
+    TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+    _lock = threading.Lock()
+    _entries: "OrderedDict[Tuple[str, Optional[int]], Tuple[float, Tuple[int, int], Principal]]" = OrderedDict()
+    _user_generations: Dict[str, int] = {}
+    _epoch = 0
+
+    @classmethod
+    def generation(cls, user_id: str) -> Tuple[int, int]:
+        """Поколение, которое нужно запомнить до чтения пользователя из БД"""
+        with cls._lock:
+            return cls._epoch, cls._user_generations.get(str(user_id), 0)
+
+    @classmethod
+    def get(cls, user_id: str, iat: Optional[int]) -> Optional[Principal]:
+        key = (str(user_id), iat)
+        now = time.monotonic()
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, generation, principal = entry
+            current = (cls._epoch, cls._user_generations.get(key[0], 0))
+            if expires_at <= now or generation != current:
+                del cls._entries[key]
+                return None
+
+            cls._entries.move_to_end(key)
+            return principal
+
+    @classmethod
+    def put(cls, user_id: str, iat: Optional[int], principal: Principal, generation: Tuple[int, int]):
+        """
+        Сохранить снимок, если с момента чтения из БД не было инвалидаций
+        """
+        key = (str(user_id), iat)
+
+        with cls._lock:
+            if generation != (cls._epoch, cls._user_generations.get(key[0], 0)):
+                return
+
+            cls._entries[key] = (time.monotonic() + cls.TTL_SECONDS, generation, principal)
+            cls._entries.move_to_end(key)
+
+            while len(cls._entries) > cls.MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate_user(cls, user_id: uuid.UUID):
+        """Сбросить снимки пользователя (смена роли, статуса, удаление)"""
+        with cls._lock:
+            key = str(user_id)
+            cls._user_generations[key] = cls._user_generations.get(key, 0) + 1
+
+    @classmethod
+    def invalidate_organization(cls, organization_id: uuid.UUID):
+        """
+        Сбросить снимки после изменения организации
+
+        Изменения организаций редки, поэтому сбрасывается весь кэш.
+        """
+        with cls._lock:
+            cls._epoch += 1
+            cls._entries.clear()
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._epoch += 1
+            cls._entries.clear()
+            cls._user_generations.clear()
@@ -1,12 +1,14 @@
 # backend/services/property_service.py
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, desc, select
+from sqlalchemy.dialects.postgresql import TSTZRANGE
 import uuid
 
 from models.extended_models import (
-    Property, PropertyStatus, Rental, Task, TaskType, TaskStatus, 
+    Property, PropertyStatus, PropertyType, Rental, Task, TaskType, TaskStatus, 
     RoomOrder, InventoryMovement
 )
 from schemas.property import PropertyCreate, PropertyUpdate
@@ -15,6 +17,38 @@ from schemas.property import PropertyCreate, PropertyUpdate
 class PropertyService:
     """Сервис для управления помещениями"""
     
+    # Помещения, выведенные из работы; занятость и уборка - текущие состояния,
+    # на будущий период помещение с ними может быть свободно
+    OUT_OF_SERVICE_STATUSES = [PropertyStatus.MAINTENANCE, PropertyStatus.SUSPENDED, PropertyStatus.OUT_OF_ORDER]
+    
+    @staticmethod
+    async def get_properties_async(
+        db: AsyncSession,
+        organization_id: uuid.UUID,
+        skip: int = 0,
+        limit: int = 100,
+        status: Optional[PropertyStatus] = None,
+        property_type: Optional[str] = None,
+        search: Optional[str] = None
+    ) -> List[Property]:
+        """Список помещений организации через асинхронную сессию"""
+        
+        query = select(Property).where(Property.organization_id == organization_id)
+        
+        if status:
+            query = query.where(Property.status == status)
+        if property_type:
+            query = query.where(Property.property_type == property_type)
+        if search:
+            query = query.where(
+                Property.name.ilike(f"%{search}%") |
+                Property.number.ilike(f"%{search}%") |
+                Property.address.ilike(f"%{search}%")
+            )
+        
+        result = await db.execute(query.order_by(Property.number).offset(skip).limit(limit))
+        return list(result.scalars().all())
+    
     @staticmethod
     def get_property_by_id(db: Session, property_id: uuid.UUID, organization_id: uuid.UUID) -> Optional[Property]:
         """Получить помещение по ID с проверкой принадлежности к организации"""
@@ -35,15 +69,11 @@ class PropertyService:
         """Проверить доступность помещения на период"""
         
         # Проверяем пересечения с существующими арендами
-        conflicts = db.query(Rental).filter(
+        conflicts = db.query(Rental).options(selectinload(Rental.client)).filter(
             and_(
                 Rental.property_id == property_id,
                 Rental.is_active == True,
-                or_(
-                    and_(Rental.start_date <= start_date, Rental.end_date > start_date),
-                    and_(Rental.start_date < end_date, Rental.end_date >= end_date),
-                    and_(Rental.start_date >= start_date, Rental.end_date <= end_date)
-                )
+                Rental.period.overlaps(PropertyService._period(start_date, end_date))
             )
         ).all()
         
@@ -53,7 +83,7 @@ class PropertyService:
         is_available = (
             len(conflicts) == 0 and 
             property_obj and 
-            property_obj.status in [PropertyStatus.AVAILABLE, PropertyStatus.CLEANING] and
+            property_obj.status not in PropertyService.OUT_OF_SERVICE_STATUSES and
             property_obj.is_active
         )
         
@@ -70,6 +100,75 @@ class PropertyService:
             ]
         }
     
+    @staticmethod
+    def _period(start_date: datetime, end_date: datetime):
+        """Полуоткрытый интервал [start_date, end_date) для сравнения с Rental.period"""
+        return func.tstzrange(start_date, end_date, '[)', type_=TSTZRANGE)
+    
+    @staticmethod
+    def search_available(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime,
+        guests: Optional[int] = None,
+        property_type: Optional[PropertyType] = None,
+        floor: Optional[int] = None,
+        building: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Свободные помещения организации на период одним запросом
+        
+        Занятые помещения определяются по пересечению Rental.period с
+        запрошенным интервалом (частичный GiST-индекс по активным арендам).
+        Текущий статус помещения учитывается только для выведенных из работы
+        (OUT_OF_SERVICE_STATUSES), остальные фильтры применяются к помещениям.
+        """
+        
+        busy_properties = select(Rental.property_id).where(
+            and_(
+                Rental.organization_id == organization_id,
+                Rental.is_active == True,
+                Rental.period.overlaps(PropertyService._period(start_date, end_date))
+            )
+        )
+        
+        query = db.query(Property).filter(
+            and_(
+                Property.organization_id == organization_id,
+                Property.is_active == True,
+                Property.status.notin_(PropertyService.OUT_OF_SERVICE_STATUSES),
+                Property.id.notin_(busy_properties)
+            )
+        )
+        
+        if guests:
+            query = query.filter(Property.max_occupancy >= guests)
+        if property_type:
+            query = query.filter(Property.property_type == property_type)
+        if floor is not None:
+            query = query.filter(Property.floor == floor)
+        if building:
+            query = query.filter(Property.building == building)
+        
+        properties = query.order_by(Property.floor, Property.number).all()
+        
+        return [
+            {
+                "property_id": str(property_obj.id),
+                "name": property_obj.name,
+                "number": property_obj.number,
+                "floor": property_obj.floor,
+                "building": property_obj.building,
+                "property_type": property_obj.property_type.value,
+                "max_occupancy": property_obj.max_occupancy,
+                "rooms_count": property_obj.rooms_count,
+                "status": property_obj.status.value,
+                "suggested_rates": PropertyService.get_suggested_rates(property_obj, start_date, end_date)
+            }
+            for property_obj in properties
+        ]
+    
     @staticmethod
     def get_suggested_rates(property_obj: Property, start_date: datetime, end_date: datetime) -> Dict[str, float]:
         """Получить рекомендуемые тарифы с учетом сезонности"""
@@ -1,8 +1,9 @@
 # backend/services/rental_service.py
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, desc, select
 import uuid
 
 from models.extended_models import (
@@ -10,6 +11,8 @@ from models.extended_models import (
 )
 from schemas.rental import RentalCreate, RentalUpdate
 from services.task_service import TaskService
+from services.occupancy_service import OccupancyService
+from services.report_facts_service import ReportFactsService
 from schemas.payment import (
     PaymentResponse, ProcessPaymentRequest,
 )
@@ -20,6 +23,39 @@ class RentalService:
 
     """Сервис для управления арендой"""
     
+    @staticmethod
+    async def get_rentals_async(
+        db: AsyncSession,
+        organization_id: uuid.UUID,
+        skip: int = 0,
+        limit: int = 100,
+        is_active: Optional[bool] = None,
+        rental_type: Optional[RentalType] = None,
+        property_id: Optional[uuid.UUID] = None,
+        client_id: Optional[uuid.UUID] = None
+    ) -> List[Rental]:
+        """Список аренд организации через асинхронную сессию"""
+        
+        query = select(Rental).where(Rental.organization_id == organization_id)
+        
+        if is_active is not None:
+            query = query.where(Rental.is_active == is_active)
+        if rental_type:
+            query = query.where(Rental.rental_type == rental_type)
+        if property_id:
+            query = query.where(Rental.property_id == property_id)
+        if client_id:
+            query = query.where(Rental.client_id == client_id)
+        
+        # Связанные объекты загружаются сразу: lazy load в async-сессии недоступен
+        query = query.options(
+            selectinload(Rental.property),
+            selectinload(Rental.client)
+        ).order_by(desc(Rental.created_at)).offset(skip).limit(limit)
+        
+        result = await db.execute(query)
+        return list(result.scalars().all())
+    
     @staticmethod
     def get_rental_by_id(db: Session, rental_id: uuid.UUID, organization_id: uuid.UUID) -> Optional[Rental]:
         """Получить аренду по ID с проверкой принадлежности к организации"""
@@ -65,6 +101,8 @@ class RentalService:
         db.commit()
         db.refresh(rental)
         
+        ReportFactsService.sync_rental(db, rental)
+        
         return rental
     
     @staticmethod
@@ -77,6 +115,8 @@ class RentalService:
         
         # Сохраняем старые значения для сравнения
         old_total = rental.total_amount
+        old_start = rental.start_date
+        old_end = rental.end_date
         
         # Обновляем поля
         update_data = rental_data.dict(exclude_unset=True)
@@ -93,6 +133,8 @@ class RentalService:
         db.commit()
         db.refresh(rental)
         
+        ReportFactsService.sync_rental(db, rental, old_start, old_end)
+        
         return rental
     
     @staticmethod
@@ -154,6 +196,8 @@ class RentalService:
         db.commit()
         db.refresh(rental)
         
+        ReportFactsService.sync_rental(db, rental)
+        
         return rental
     
     @staticmethod
@@ -192,6 +236,7 @@ class RentalService:
         db.flush()  # Получаем ID платежа, но не коммитим пока
         
         # Обновляем аренду
+        previous_end = rental.end_date
         rental.end_date = new_end_date
         rental.total_amount += additional_amount
         rental.updated_at = datetime.now(timezone.utc)
@@ -207,6 +252,8 @@ class RentalService:
         db.commit()
         db.refresh(rental)
         
+        ReportFactsService.sync_rental(db, rental, previous_end=previous_end)
+        
         # Отправляем уведомление о продлении и необходимости доплаты
         RentalService._send_extension_notification_with_payment(
             rental, new_end_date, additional_amount, extension_payment.id
@@ -264,6 +311,10 @@ class RentalService:
             payment.rental.paid_amount += payment.amount
         
         db.commit()
+        
+        if payment.rental:
+            ReportFactsService.sync_rental(db, payment.rental)
+        
         return payment
 
     @staticmethod
@@ -290,6 +341,8 @@ class RentalService:
             rental.client.total_rentals -= 1
         
         db.commit()
+        
+        ReportFactsService.sync_rental(db, rental)
     
     @staticmethod
     def _send_extension_notification(rental: Rental, new_end_date: datetime, amount: float):
@@ -417,37 +470,6 @@ class RentalService:
         end_date: datetime
     ) -> float:
         """Вычислить коэффициент загруженности"""
-        
-        # Получаем все помещения организации
-        total_properties = db.query(Property).filter(
-            Property.organization_id == organization_id
-        ).count()
-        
-        if total_properties == 0:
-            return 0
-        
-        # Всего дней в периоде
-        total_days = (end_date - start_date).days
-        
-        # Занятые дни
-        occupied_days = 0
-        
-        rentals = db.query(Rental).filter(
-            and_(
-                Rental.organization_id == organization_id,
-                or_(
-                    and_(Rental.start_date <= start_date, Rental.end_date > start_date),
-                    and_(Rental.start_date < end_date, Rental.end_date >= end_date),
-                    and_(Rental.start_date >= start_date, Rental.end_date <= end_date)
-                )
-            )
-        ).all()
-        
-        for rental in rentals:
-            overlap_start = max(rental.start_date, start_date)
-            overlap_end = min(rental.end_date, end_date)
-            if overlap_end > overlap_start:
-                occupied_days += (overlap_end - overlap_start).days
-        
-        # Коэффициент загруженности в процентах
-        return (occupied_days / (total_days * total_properties)) * 100 if total_days > 0 else 0
\ No newline at end of file
+        return OccupancyService.calculate_occupancy_rate(
+            db, organization_id, start_date, end_date
+        )
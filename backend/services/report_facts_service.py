@@ -0,0 +1,394 @@
+# backend/services/report_facts_service.py
+from datetime import datetime, date, time, timezone, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, case, insert
+import logging
+import uuid
+
+from models.extended_models import (
+    Rental, RoomOrder, Task, InventoryMovement,
+    DailyPropertyFact, ReportFactCoverage
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReportFactsService:
+    """Материализованные дневные показатели помещений для отчетов
+
+    Таблица daily_property_facts хранит по каждому помещению и дню флаг
+    занятости, пропорциональную выручку от аренды, выручку от заказов и
+    стоимость списанных материалов. Строки пересчитываются по диапазонам
+    дней при изменении аренды, завершении заказа и движении материалов,
+    а полная перестройка выполняется фоновым сервисом.
+    """
+
+    DEFAULT_HISTORY_DAYS = 400
+    DEFAULT_FUTURE_DAYS = 365
+    REBUILD_CHUNK_DAYS = 31
+
+    @staticmethod
+    def _to_day(value) -> date:
+        """Дата дня (UTC) для datetime или date"""
+        if isinstance(value, datetime):
+            if value.tzinfo:
+                value = value.astimezone(timezone.utc)
+            return value.date()
+        return value
+
+    @staticmethod
+    def _day_start(day: date) -> datetime:
+        return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+    @staticmethod
+    def day_window(start, end) -> tuple:
+        """
+        Границы периода отчета в целых днях UTC: [начало первого дня, начало дня после последнего)
+
+        Отчеты по дневным показателям и расчет по сырым таблицам используют
+        одно соглашение: день периода учитывается целиком, если в него
+        попадает хотя бы часть периода.
+        """
+        return (
+            ReportFactsService._day_start(ReportFactsService._to_day(start)),
+            ReportFactsService._day_start(ReportFactsService._to_day(end) + timedelta(days=1))
+        )
+
+    @staticmethod
+    def rental_days(start_date, end_date) -> tuple:
+        """
+        Первый и последний занятый день аренды (UTC)
+
+        Считаются ночи: [день заезда, день выезда), день выезда не занят.
+        Аренда в пределах одного дня занимает этот день.
+        """
+        first_day = ReportFactsService._to_day(start_date)
+        last_day = ReportFactsService._to_day(end_date) - timedelta(days=1)
+        return first_day, max(first_day, last_day)
+
+    @staticmethod
+    def _compute_facts(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_day: date,
+        end_day: date
+    ) -> Dict[tuple, Dict[str, Any]]:
+        """Рассчитать показатели по сырым таблицам для диапазона дней"""
+
+        window_start = ReportFactsService._day_start(start_day)
+        window_end = ReportFactsService._day_start(end_day + timedelta(days=1))
+
+        facts = {}
+
+        def fact_for(property_id, day):
+            key = (property_id, day)
+            if key not in facts:
+                facts[key] = {
+                    "occupied": False,
+                    "rental_revenue": 0.0,
+                    "order_revenue": 0.0,
+                    "material_cost": 0.0
+                }
+            return facts[key]
+
+        # Аренды: занятость и выручка, равномерно распределенная по ночам аренды
+        rentals = db.query(
+            Rental.property_id,
+            Rental.start_date,
+            Rental.end_date,
+            Rental.paid_amount
+        ).filter(
+            and_(
+                Rental.organization_id == organization_id,
+                Rental.start_date < window_end,
+                Rental.end_date >= window_start
+            )
+        ).all()
+
+        for rental in rentals:
+            rental_start, rental_end = ReportFactsService.rental_days(rental.start_date, rental.end_date)
+            rental_days = (rental_end - rental_start).days + 1
+            revenue_per_day = (rental.paid_amount or 0) / rental_days
+
+            day = max(rental_start, start_day)
+            last_day = min(rental_end, end_day)
+            while day <= last_day:
+                fact = fact_for(rental.property_id, day)
+                fact["occupied"] = True
+                fact["rental_revenue"] += revenue_per_day
+                day += timedelta(days=1)
+
+        # Оплаченные заказы в номер
+        orders = db.query(
+            RoomOrder.property_id,
+            RoomOrder.created_at,
+            RoomOrder.total_amount
+        ).filter(
+            and_(
+                RoomOrder.organization_id == organization_id,
+                RoomOrder.is_paid == True,
+                RoomOrder.created_at >= window_start,
+                RoomOrder.created_at < window_end
+            )
+        ).all()
+
+        for order in orders:
+            fact = fact_for(order.property_id, ReportFactsService._to_day(order.created_at))
+            fact["order_revenue"] += order.total_amount or 0
+
+        # Списание материалов (помещение определяется через задачу, если она есть)
+        movements = db.query(
+            Task.property_id,
+            InventoryMovement.created_at,
+            InventoryMovement.total_cost
+        ).outerjoin(
+            Task, Task.id == InventoryMovement.task_id
+        ).filter(
+            and_(
+                InventoryMovement.organization_id == organization_id,
+                InventoryMovement.movement_type == "out",
+                InventoryMovement.total_cost > 0,
+                InventoryMovement.created_at >= window_start,
+                InventoryMovement.created_at < window_end
+            )
+        ).all()
+
+        for movement in movements:
+            fact = fact_for(movement.property_id, ReportFactsService._to_day(movement.created_at))
+            fact["material_cost"] += movement.total_cost or 0
+
+        return facts
+
+    @staticmethod
+    def refresh_days(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_day: date,
+        end_day: date
+    ) -> int:
+        """Пересчитать показатели организации за диапазон дней (без коммита)"""
+
+        if end_day < start_day:
+            return 0
+
+        facts = ReportFactsService._compute_facts(db, organization_id, start_day, end_day)
+
+        db.query(DailyPropertyFact).filter(
+            and_(
+                DailyPropertyFact.organization_id == organization_id,
+                DailyPropertyFact.day >= start_day,
+                DailyPropertyFact.day <= end_day
+            )
+        ).delete(synchronize_session=False)
+
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "organization_id": organization_id,
+                "property_id": property_id,
+                "day": day,
+                **values
+            }
+            for (property_id, day), values in facts.items()
+        ]
+
+        if rows:
+            db.execute(insert(DailyPropertyFact), rows)
+
+        return len(rows)
+
+    @staticmethod
+    def get_coverage(db: Session, organization_id: uuid.UUID) -> Optional[ReportFactCoverage]:
+        return db.query(ReportFactCoverage).filter(
+            ReportFactCoverage.organization_id == organization_id
+        ).first()
+
+    @staticmethod
+    def rebuild_organization(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Полная перестройка показателей организации по месячным порциям"""
+
+        today = datetime.now(timezone.utc).date()
+        start_day = start_day or today - timedelta(days=ReportFactsService.DEFAULT_HISTORY_DAYS)
+        end_day = end_day or today + timedelta(days=ReportFactsService.DEFAULT_FUTURE_DAYS)
+
+        started = datetime.now(timezone.utc)
+        rows_written = 0
+
+        chunk_start = start_day
+        while chunk_start <= end_day:
+            chunk_end = min(chunk_start + timedelta(days=ReportFactsService.REBUILD_CHUNK_DAYS - 1), end_day)
+            rows_written += ReportFactsService.refresh_days(db, organization_id, chunk_start, chunk_end)
+            db.commit()
+            chunk_start = chunk_end + timedelta(days=1)
+
+        coverage = ReportFactsService.get_coverage(db, organization_id)
+        if coverage:
+            # Расширяем покрытие, если новый диапазон примыкает к старому
+            if start_day <= coverage.covered_to + timedelta(days=1) and end_day >= coverage.covered_from - timedelta(days=1):
+                coverage.covered_from = min(coverage.covered_from, start_day)
+                coverage.covered_to = max(coverage.covered_to, end_day)
+            else:
+                coverage.covered_from = start_day
+                coverage.covered_to = end_day
+            coverage.rebuilt_at = datetime.now(timezone.utc)
+        else:
+            db.add(ReportFactCoverage(
+                organization_id=organization_id,
+                covered_from=start_day,
+                covered_to=end_day,
+                rebuilt_at=datetime.now(timezone.utc)
+            ))
+
+        db.commit()
+
+        return {
+            "organization_id": str(organization_id),
+            "covered_from": start_day.isoformat(),
+            "covered_to": end_day.isoformat(),
+            "rows_written": rows_written,
+            "duration_seconds": round((datetime.now(timezone.utc) - started).total_seconds(), 3)
+        }
+
+    @staticmethod
+    def sync_days(
+        db: Session,
+        organization_id: uuid.UUID,
+        start,
+        end
+    ):
+        """Инкрементальное обновление после коммита бизнес-операции
+
+        Пересчитываются только дни внутри покрытого диапазона. Ошибки
+        логируются и не влияют на основную операцию.
+        """
+        try:
+            coverage = ReportFactsService.get_coverage(db, organization_id)
+            if not coverage:
+                return
+
+            start_day = max(ReportFactsService._to_day(start), coverage.covered_from)
+            end_day = min(ReportFactsService._to_day(end), coverage.covered_to)
+            if end_day < start_day:
+                return
+
+            ReportFactsService.refresh_days(db, organization_id, start_day, end_day)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Failed to refresh report facts for organization {organization_id}: {e}")
+
+    @staticmethod
+    def sync_rental(
+        db: Session,
+        rental: Rental,
+        previous_start: Optional[datetime] = None,
+        previous_end: Optional[datetime] = None
+    ):
+        """Обновить показатели по всем дням аренды (включая прежние даты)"""
+        start = min(d for d in [rental.start_date, previous_start] if d is not None)
+        end = max(d for d in [rental.end_date, previous_end] if d is not None)
+        ReportFactsService.sync_days(db, rental.organization_id, start, end)
+
+    @staticmethod
+    def _covered_days(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Optional[tuple]:
+        """Диапазон дней отчета, если он полностью покрыт показателями"""
+        start_day = ReportFactsService._to_day(start_date)
+        end_day = ReportFactsService._to_day(end_date)
+
+        coverage = ReportFactsService.get_coverage(db, organization_id)
+        if not coverage or start_day < coverage.covered_from or end_day > coverage.covered_to:
+            return None
+
+        return start_day, end_day
+
+    @staticmethod
+    def get_property_stats(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime,
+        property_ids: Optional[List[uuid.UUID]] = None
+    ) -> Optional[Dict[uuid.UUID, Dict[str, Any]]]:
+        """
+        Занятые дни и выручка по помещениям из дневных показателей
+
+        Returns:
+            None, если период не покрыт показателями
+        """
+        days = ReportFactsService._covered_days(db, organization_id, start_date, end_date)
+        if days is None:
+            return None
+
+        query = db.query(
+            DailyPropertyFact.property_id,
+            func.count(case((DailyPropertyFact.occupied == True, 1))).label("occupied_days"),
+            func.coalesce(func.sum(DailyPropertyFact.rental_revenue), 0).label("revenue")
+        ).filter(
+            and_(
+                DailyPropertyFact.organization_id == organization_id,
+                DailyPropertyFact.property_id.isnot(None),
+                DailyPropertyFact.day >= days[0],
+                DailyPropertyFact.day <= days[1]
+            )
+        )
+
+        if property_ids is not None:
+            if not property_ids:
+                return {}
+            query = query.filter(DailyPropertyFact.property_id.in_(property_ids))
+
+        rows = query.group_by(DailyPropertyFact.property_id).all()
+
+        return {
+            row.property_id: {
+                "occupied_days": int(row.occupied_days or 0),
+                "revenue": float(row.revenue or 0)
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def get_period_totals(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Optional[Dict[str, float]]:
+        """
+        Итоги организации за период из дневных показателей
+
+        Returns:
+            None, если период не покрыт показателями
+        """
+        days = ReportFactsService._covered_days(db, organization_id, start_date, end_date)
+        if days is None:
+            return None
+
+        totals = db.query(
+            func.coalesce(func.sum(DailyPropertyFact.rental_revenue), 0),
+            func.coalesce(func.sum(DailyPropertyFact.order_revenue), 0),
+            func.coalesce(func.sum(DailyPropertyFact.material_cost), 0)
+        ).filter(
+            and_(
+                DailyPropertyFact.organization_id == organization_id,
+                DailyPropertyFact.day >= days[0],
+                DailyPropertyFact.day <= days[1]
+            )
+        ).first()
+
+        return {
+            "rental_revenue": float(totals[0] or 0),
+            "order_revenue": float(totals[1] or 0),
+            "material_cost": float(totals[2] or 0)
+        }
@@ -1,8 +1,8 @@
 # backend/services/reports_service.py - ПОЛНАЯ ИСПРАВЛЕННАЯ ВЕРСИЯ
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc, text
+from typing import List, Dict, Any, Optional, Iterator
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, or_, func, desc, text, select, case, cast, literal, Float, DateTime
 import uuid
 import io
 import io
@@ -24,6 +24,7 @@ from reportlab.platypus import (
     Image,
 )
 from collections import defaultdict
+import logging
 
 
 # Регистрируем Unicode-шрифт, поддерживающий кириллицу
@@ -31,10 +32,16 @@ pdfmetrics.registerFont(UnicodeCIDFont('STSong-Light'))
 
 styles = getSampleStyleSheet()
 
+logger = logging.getLogger(__name__)
+
 from models.extended_models import (
     Property, Rental, Client, Task, RoomOrder, Payroll, User, Organization,
     PropertyStatus, TaskStatus, OrderStatus, PayrollType, UserRole
 )
+from services.occupancy_service import OccupancyService
+from services.dashboard_snapshot_service import DashboardSnapshotService
+from services.report_facts_service import ReportFactsService
+from utils.streaming_export import iter_query, csv_stream, xlsx_stream, with_session
 from schemas.reports import (
     FinancialSummaryReport, PropertyOccupancyReport, 
     EmployeePerformanceReport, ClientAnalyticsReport
@@ -182,8 +189,8 @@ class ReportsService:
     ) -> Dict[str, Any]:
         """Отладка данных зарплат"""
         
-        print(f"🔍 Отладка зарплат для организации {organization_id}")
-        print(f"📅 Отчетный период: {start_date} - {end_date}")
+        logger.debug("🔍 Отладка зарплат для организации %s", organization_id)
+        logger.debug("📅 Отчетный период: %s - %s", start_date, end_date)
         
         # Получаем все зарплаты в организации
         all_payrolls = db.query(Payroll).filter(
@@ -252,8 +259,8 @@ class ReportsService:
         debug_info["period_analysis"]["overlapping_payrolls"] = overlapping_count
         debug_info["period_analysis"]["total_expense_in_period"] = total_expense
         
-        print(f"📊 Найдено {overlapping_count} пересекающихся зарплат")
-        print(f"💰 Общие расходы за период: {total_expense}")
+        logger.debug("📊 Найдено %s пересекающихся зарплат", overlapping_count)
+        logger.debug("💰 Общие расходы за период: %s", total_expense)
         
         return debug_info
     
@@ -266,57 +273,43 @@ class ReportsService:
     ) -> FinancialSummaryReport:
         """УНИФИЦИРОВАННАЯ генерация финансового отчета"""
         
-        print(f"🔍 Генерация унифицированного финансового отчета для организации {organization_id}")
-        print(f"📅 Период: {start_date} - {end_date}")
+        logger.debug("🔍 Генерация унифицированного финансового отчета для организации %s", organization_id)
+        logger.debug("📅 Период: %s - %s", start_date, end_date)
         
-        # ИСПРАВЛЕНО: Используем тот же метод расчета выручки, что и в отчете по помещениям
-        rental_revenue = 0
+        # Материализованные дневные показатели (если период ими покрыт)
+        fact_totals = ReportFactsService.get_period_totals(
+            db, organization_id, start_date, end_date
+        )
         
-        # Получаем все аренды, которые пересекаются с отчетным периодом
-        rentals = db.query(Rental).filter(
-            and_(
-                Rental.organization_id == organization_id,
-                Rental.start_date < end_date,  # Аренда пересекается с периодом
-                Rental.end_date > start_date,
-                Rental.paid_amount > 0
+        # ИСПРАВЛЕНО: Используем тот же метод расчета выручки, что и в отчете по помещениям
+        if fact_totals is not None:
+            rental_revenue = fact_totals["rental_revenue"]
+        else:
+            rental_revenue = ReportsService.get_unified_revenue_for_period(
+                db, organization_id, start_date, end_date
             )
-        ).all()
-        
-        print(f"🏠 Найдено аренд с пересечением периода: {len(rentals)}")
-        
-        for rental in rentals:
-            # Пропорциональный расчет дохода (как в отчете по помещениям)
-            overlap_start = max(rental.start_date.replace(tzinfo=None), start_date.replace(tzinfo=None))
-            overlap_end = min(rental.end_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
-            
-            if overlap_end > overlap_start:
-                days_in_period = (overlap_end - overlap_start).days + 1
-                total_rental_days = (rental.end_date - rental.start_date).days + 1
-                
-                if total_rental_days > 0:
-                    revenue_per_day = rental.paid_amount / total_rental_days
-                    period_revenue = revenue_per_day * days_in_period
-                    rental_revenue += period_revenue
-                    
-                    print(f"  💰 Аренда {rental.id}: {rental.paid_amount} ₸ за {total_rental_days} дней, в периоде {days_in_period} дней = {period_revenue:.2f} ₸")
         
-        print(f"💰 Итого выручка от аренды: {rental_revenue}")
+        logger.debug("💰 Итого выручка от аренды: %s", rental_revenue)
         
         # ИСПРАВЛЕНО: Заказы в номер - используем тот же принцип пересечения
-        orders_revenue_query = db.query(func.sum(RoomOrder.total_amount)).filter(
-            and_(
-                RoomOrder.organization_id == organization_id,
-                RoomOrder.is_paid == True,
-                RoomOrder.created_at >= start_date,
-                RoomOrder.created_at <= end_date
+        if fact_totals is not None:
+            orders_revenue = fact_totals["order_revenue"]
+        else:
+            window_start, window_end = ReportFactsService.day_window(start_date, end_date)
+            orders_revenue_query = db.query(func.sum(RoomOrder.total_amount)).filter(
+                and_(
+                    RoomOrder.organization_id == organization_id,
+                    RoomOrder.is_paid == True,
+                    RoomOrder.created_at >= window_start,
+                    RoomOrder.created_at < window_end
+                )
             )
-        )
-        orders_revenue = orders_revenue_query.scalar() or 0.0
+            orders_revenue = orders_revenue_query.scalar() or 0.0
         
-        print(f"🛎️ Выручка от заказов: {orders_revenue}")
+        logger.debug("🛎️ Выручка от заказов: %s", orders_revenue)
         
         total_revenue = rental_revenue + orders_revenue
-        print(f"💵 Общая выручка: {total_revenue}")
+        logger.debug("💵 Общая выручка: %s", total_revenue)
         
         # ИСПРАВЛЕНО: Расходы на персонал - правильный расчет с пересечением периодов
         all_payrolls = db.query(Payroll).filter(
@@ -327,7 +320,7 @@ class ReportsService:
         ).all()
         
         staff_expenses = 0
-        print(f"💼 Всего зарплат в организации: {len(all_payrolls)}")
+        logger.debug("💼 Всего зарплат в организации: %s", len(all_payrolls))
         
         for payroll in all_payrolls:
             # Убираем часовой пояс для сравнения
@@ -354,34 +347,25 @@ class ReportsService:
                         expense_for_period = payroll.net_amount * proportion
                         staff_expenses += expense_for_period
                         
-                        print(f"💰 Зарплата {payroll.id}: {payroll.net_amount} ₸ (пропорция: {proportion:.2f}, добавлено: {expense_for_period:.2f})")
+                        logger.debug("💰 Зарплата %s: %s ₸ (пропорция: %.2f, добавлено: %.2f)", payroll.id, payroll.net_amount, proportion, expense_for_period)
         
-        print(f"👥 Расходы на персонал: {staff_expenses}")
+        logger.debug("👥 Расходы на персонал: %s", staff_expenses)
         
         # ИСПРАВЛЕНО: Расходы на материалы
-        try:
-            from models.extended_models import InventoryMovement
-            material_expenses_query = db.query(func.sum(InventoryMovement.total_cost)).filter(
-                and_(
-                    InventoryMovement.organization_id == organization_id,
-                    InventoryMovement.movement_type == "out",
-                    InventoryMovement.created_at >= start_date,
-                    InventoryMovement.created_at <= end_date,
-                    InventoryMovement.total_cost > 0
-                )
+        if fact_totals is not None:
+            material_expenses = fact_totals["material_cost"]
+        else:
+            material_expenses = ReportsService._get_material_expenses(
+                db, organization_id, start_date, end_date
             )
-            material_expenses = material_expenses_query.scalar() or 0.0
-        except Exception as e:
-            print(f"⚠️ Ошибка при получении расходов на материалы: {e}")
-            material_expenses = 0.0
         
-        print(f"📦 Расходы на материалы: {material_expenses}")
+        logger.debug("📦 Расходы на материалы: %s", material_expenses)
         
         total_expenses = staff_expenses + material_expenses
         net_profit = total_revenue - total_expenses
         
-        print(f"📊 Общие расходы: {total_expenses}")
-        print(f"💡 Чистая прибыль: {net_profit}")
+        logger.debug("📊 Общие расходы: %s", total_expenses)
+        logger.debug("💡 Чистая прибыль: %s", net_profit)
         
         # ИСПРАВЛЕНО: Используем унифицированный расчет загруженности
         occupancy_rate = ReportsService._calculate_unified_occupancy_rate(
@@ -407,8 +391,8 @@ class ReportsService:
             )
         ).count()
         
-        print(f"🏢 Помещений: {properties_count}, Активных аренд: {active_rentals}")
-        print(f"📈 Загруженность: {occupancy_rate}%")
+        logger.debug("🏢 Помещений: %s, Активных аренд: %s", properties_count, active_rentals)
+        logger.debug("📈 Загруженность: %s%%", occupancy_rate)
         
         return FinancialSummaryReport(
             period_start=start_date,
@@ -425,6 +409,30 @@ class ReportsService:
             active_rentals=active_rentals
         )
 
+    @staticmethod
+    def _get_material_expenses(
+        db: Session,
+        organization_id: uuid.UUID,
+        start_date: datetime,
+        end_date: datetime
+    ) -> float:
+        """Расходы на списанные материалы за период"""
+        try:
+            from models.extended_models import InventoryMovement
+            material_expenses_query = db.query(func.sum(InventoryMovement.total_cost)).filter(
+                and_(
+                    InventoryMovement.organization_id == organization_id,
+                    InventoryMovement.movement_type == "out",
+                    InventoryMovement.created_at >= start_date,
+                    InventoryMovement.created_at <= end_date,
+                    InventoryMovement.total_cost > 0
+                )
+            )
+            return material_expenses_query.scalar() or 0.0
+        except Exception as e:
+            logger.warning("⚠️ Ошибка при получении расходов на материалы: %s", e)
+            return 0.0
+
     @staticmethod
     def _calculate_unified_occupancy_rate(
         db: Session,
@@ -434,31 +442,23 @@ class ReportsService:
     ) -> float:
         """ЕДИНЫЙ метод расчета загруженности для всех отчетов"""
         
-        print(f"📊 Расчет унифицированной загруженности помещений")
-        print(f"📅 Период: {start_date} - {end_date}")
+        properties = OccupancyService.get_active_properties(db, organization_id)
+        period_days = (end_date - start_date).days + 1
+        
+        if not properties or period_days <= 0:
+            return 0.0
         
-        # Получаем отчет по загруженности помещений (используем существующий проверенный метод)
-        occupancy_reports = ReportsService.generate_property_occupancy_report(
+        stats = OccupancyService.calculate_property_stats(
             db, organization_id, start_date, end_date
         )
         
-        if not occupancy_reports:
-            print("⚠️ Нет данных по помещениям")
-            return 0.0
-        
         # Взвешенное среднее по общему количеству дней
-        total_days = sum(report.total_days for report in occupancy_reports)
-        total_occupied_days = sum(report.occupied_days for report in occupancy_reports)
-        
-        print(f"🎯 Общих дней: {total_days}, занятых дней: {total_occupied_days}")
-        
-        if total_days == 0:
-            return 0.0
-        
-        unified_occupancy_rate = round((total_occupied_days / total_days) * 100, 2)
-        print(f"📈 Унифицированная загруженность: {unified_occupancy_rate}%")
+        total_days = period_days * len(properties)
+        total_occupied_days = sum(
+            stats[prop.id]["occupied_days"] for prop in properties if prop.id in stats
+        )
         
-        return unified_occupancy_rate
+        return round((total_occupied_days / total_days) * 100, 2)
 
     @staticmethod
     def get_unified_revenue_for_period(
@@ -469,34 +469,12 @@ class ReportsService:
     ) -> float:
         """ЕДИНЫЙ метод расчета выручки для всех отчетов"""
         
-        total_revenue = 0
-        
-        # Получаем все аренды, которые пересекаются с отчетным периодом
-        rentals = db.query(Rental).filter(
-            and_(
-                Rental.organization_id == organization_id,
-                Rental.start_date < end_date,
-                Rental.end_date > start_date,
-                Rental.paid_amount > 0
-            )
-        ).all()
-        
-        for rental in rentals:
-            # Пропорциональный расчет дохода по пересечению
-            overlap_start = max(rental.start_date.replace(tzinfo=None), start_date.replace(tzinfo=None))
-            overlap_end = min(rental.end_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
-            
-            if overlap_end > overlap_start:
-                days_in_period = (overlap_end - overlap_start).days + 1
-                total_rental_days = (rental.end_date - rental.start_date).days + 1
-                
-                if total_rental_days > 0:
-                    revenue_per_day = rental.paid_amount / total_rental_days
-                    total_revenue += revenue_per_day * days_in_period
+        stats = OccupancyService.calculate_property_stats(
+            db, organization_id, start_date, end_date
+        )
         
-        return total_revenue
+        return sum(entry["revenue"] for entry in stats.values())
 
-    # Обновляем отчет по помещениям, чтобы использовать ту же логику
     @staticmethod
     def generate_property_occupancy_report(
         db: Session,
@@ -507,31 +485,22 @@ class ReportsService:
     ) -> List[PropertyOccupancyReport]:
         """Отчет по загруженности с унифицированной логикой"""
         
-        query = db.query(Property).filter(
-            and_(
-                Property.organization_id == organization_id,
-                Property.is_active == True
-            )
-        )
+        properties = OccupancyService.get_active_properties(db, organization_id, property_id)
+        if not properties:
+            return []
         
-        if property_id:
-            query = query.filter(Property.id == property_id)
+        # Один запрос по всем арендам периода вместо двух запросов на помещение
+        stats = OccupancyService.calculate_property_stats(
+            db, organization_id, start_date, end_date,
+            property_ids=[property_id] if property_id else None
+        )
         
-        properties = query.all()
         reports = []
-        
         period_days = (end_date - start_date).days + 1
         
         for prop in properties:
-            # Используем тот же метод расчета выручки
-            property_revenue = ReportsService._get_property_revenue_for_period(
-                db, prop.id, organization_id, start_date, end_date
-            )
-            
-            # Расчет занятых дней (без изменений)
-            occupied_days = ReportsService._get_property_occupied_days(
-                db, prop.id, start_date, end_date
-            )
+            property_stats = stats.get(prop.id, {"occupied_days": 0, "revenue": 0.0})
+            occupied_days = property_stats["occupied_days"]
             
             occupancy_rate = (occupied_days / period_days * 100) if period_days > 0 else 0
             occupancy_rate = min(occupancy_rate, 100.0)  # Ограничиваем 100%
@@ -543,47 +512,11 @@ class ReportsService:
                 total_days=period_days,
                 occupied_days=occupied_days,
                 occupancy_rate=round(occupancy_rate, 2),
-                revenue=round(property_revenue, 2)
+                revenue=round(property_stats["revenue"], 2)
             ))
         
         return sorted(reports, key=lambda x: x.occupancy_rate, reverse=True)
 
-    @staticmethod
-    def _get_property_revenue_for_period(
-        db: Session,
-        property_id: uuid.UUID,
-        organization_id: uuid.UUID,
-        start_date: datetime,
-        end_date: datetime
-    ) -> float:
-        """Получить выручку помещения за период"""
-        
-        rentals = db.query(Rental).filter(
-            and_(
-                Rental.property_id == property_id,
-                Rental.organization_id == organization_id,
-                Rental.start_date < end_date,
-                Rental.end_date > start_date,
-                Rental.paid_amount > 0
-            )
-        ).all()
-        
-        total_revenue = 0
-        
-        for rental in rentals:
-            overlap_start = max(rental.start_date.replace(tzinfo=None), start_date.replace(tzinfo=None))
-            overlap_end = min(rental.end_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
-            
-            if overlap_end > overlap_start:
-                days_in_period = (overlap_end - overlap_start).days + 1
-                total_rental_days = (rental.end_date - rental.start_date).days + 1
-                
-                if total_rental_days > 0:
-                    revenue_per_day = rental.paid_amount / total_rental_days
-                    total_revenue += revenue_per_day * days_in_period
-        
-        return total_revenue
-
     @staticmethod
     def generate_employee_performance_report(
         db: Session,
@@ -593,119 +526,138 @@ class ReportsService:
         role: Optional[UserRole] = None,
         user_id: Optional[uuid.UUID] = None
     ) -> List[EmployeePerformanceReport]:
-        """УЛУЧШЕННАЯ генерация отчета с обработкой дублирующих зарплат"""
-        
-        print(f"👥 Генерация отчета по производительности сотрудников")
-        print(f"📅 Период отчета: {start_date} - {end_date}")
+        """
+        Отчет по производительности сотрудников одним запросом
         
-        query = db.query(User).filter(User.organization_id == organization_id)
+        Показатели задач считаются групповыми агрегатами по tasks, заработок
+        по зарплатам - оконным запросом с дедупликацией по месяцам
+        (подробнее в _payroll_earnings_query).
+        """
         
+        employees_filter = [User.organization_id == organization_id]
         if role:
-            query = query.filter(User.role == role)
-        
+            employees_filter.append(User.role == role)
         if user_id:
-            query = query.filter(User.id == user_id)
+            employees_filter.append(User.id == user_id)
+        employee_ids = select(User.id).where(*employees_filter)
+        
+        # Выполненные задачи за период по исполнителям
+        task_stats = db.query(
+            Task.assigned_to.label("user_id"),
+            func.count(Task.id).label("tasks_completed"),
+            func.avg(cast(Task.actual_duration, Float)).label("avg_completion_time"),
+            func.avg(cast(Task.quality_rating, Float)).label("avg_quality"),
+            func.sum(Task.payment_amount).filter(Task.is_paid == True).label("task_earnings")
+        ).filter(
+            and_(
+                Task.assigned_to.in_(employee_ids),
+                Task.status == TaskStatus.COMPLETED,
+                Task.completed_at >= start_date,
+                Task.completed_at <= end_date
+            )
+        ).group_by(Task.assigned_to).subquery()
         
-        employees = query.all()
-        print(f"👤 Найдено сотрудников: {len(employees)}")
+        payroll_stats = ReportsService._payroll_earnings_query(
+            db, employee_ids, organization_id, start_date, end_date
+        )
         
-        reports = []
+        rows = db.query(
+            User.id,
+            User.first_name,
+            User.last_name,
+            User.role,
+            func.coalesce(task_stats.c.tasks_completed, 0).label("tasks_completed"),
+            task_stats.c.avg_completion_time,
+            task_stats.c.avg_quality,
+            func.coalesce(task_stats.c.task_earnings, 0).label("task_earnings"),
+            func.coalesce(payroll_stats.c.earnings, 0).label("payroll_earnings")
+        ).outerjoin(
+            task_stats, task_stats.c.user_id == User.id
+        ).outerjoin(
+            payroll_stats, payroll_stats.c.user_id == User.id
+        ).filter(*employees_filter).all()
         
-        for employee in employees:
-            print(f"\n🔍 Анализ сотрудника: {employee.first_name} {employee.last_name}")
-            
-            # Выполненные задачи за период
-            completed_tasks = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == employee.id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.completed_at >= start_date,
-                    Task.completed_at <= end_date
-                )
-            ).all()
-            
-            print(f"✅ Выполненных задач: {len(completed_tasks)}")
-            
-            # Среднее время выполнения
-            avg_completion_time = None
-            if completed_tasks:
-                completion_times = [
-                    task.actual_duration for task in completed_tasks
-                    if task.actual_duration is not None
-                ]
-                if completion_times:
-                    avg_completion_time = sum(completion_times) / len(completion_times)
-            
-            # Средний рейтинг качества
-            quality_ratings = [
-                task.quality_rating for task in completed_tasks
-                if task.quality_rating is not None
-            ]
-            avg_quality = sum(quality_ratings) / len(quality_ratings) if quality_ratings else None
-            
-            # УЛУЧШЕННЫЙ РАСЧЕТ ЗАРАБОТКА
-            total_earnings = ReportsService._calculate_smart_earnings(
-                db, employee.id, organization_id, start_date, end_date
-            )
+        reports = []
+        for row in rows:
+            total_earnings = float(row.payroll_earnings)
             
             # Дополнительные выплаты за задачи
-            task_earnings = sum(task.payment_amount or 0 for task in completed_tasks if task.is_paid)
-            if task_earnings > 0:
-                total_earnings += task_earnings
-                print(f"🎯 Дополнительные выплаты за задачи: {task_earnings}₸")
-            
-            print(f"💎 ИТОГО заработок сотрудника {employee.first_name}: {total_earnings:.2f}₸")
+            if row.task_earnings > 0:
+                total_earnings += row.task_earnings
             
             reports.append(EmployeePerformanceReport(
-                user_id=str(employee.id),
-                user_name=f"{employee.first_name} {employee.last_name}",
-                role=employee.role.value,
-                tasks_completed=len(completed_tasks),
-                average_completion_time=avg_completion_time,
-                quality_rating=round(avg_quality, 2) if avg_quality else None,
+                user_id=str(row.id),
+                user_name=f"{row.first_name} {row.last_name}",
+                role=row.role.value,
+                tasks_completed=row.tasks_completed,
+                average_completion_time=row.avg_completion_time,
+                quality_rating=round(row.avg_quality, 2) if row.avg_quality else None,
                 earnings=round(total_earnings, 2)
             ))
         
-        print(f"\n📊 Сформирован отчет по {len(reports)} сотрудникам")
         return sorted(reports, key=lambda x: x.earnings, reverse=True)
 
 
     @staticmethod
-    def _calculate_smart_earnings(
+    def _payroll_earnings_query(
         db: Session,
-        user_id: uuid.UUID,
+        employee_ids,
         organization_id: uuid.UUID,
         start_date: datetime,
         end_date: datetime
-    ) -> float:
+    ):
         """
-        Умный расчет заработка с обработкой дублирующих и перекрывающихся зарплат
-        """
-        
-        print(f"💰 Умный расчет заработка для периода: {start_date} - {end_date}")
+        Подзапрос (user_id, earnings): умный заработок по выплаченным зарплатам
         
-        # Получаем все выплаченные зарплаты с пересечением
-        payrolls = db.query(Payroll).filter(
+        Стратегия дедупликации в SQL: если у сотрудника не
+        больше двух зарплат, пересекающих период, суммируются все; иначе в
+        каждом месяце начала периода берется одна зарплата (наибольшая, затем
+        самая новая). Каждая берется пропорционально дням пересечения, как в
+        _calculate_payroll_proportion (даты без часового пояса).
+        """
+        ranked = db.query(
+            Payroll.user_id,
+            Payroll.period_start,
+            Payroll.period_end,
+            Payroll.net_amount,
+            func.count().over(partition_by=Payroll.user_id).label("payroll_count"),
+            func.row_number().over(
+                partition_by=(Payroll.user_id, func.date_trunc("month", Payroll.period_start)),
+                order_by=(desc(Payroll.net_amount), Payroll.created_at.desc().nulls_last(), Payroll.period_start)
+            ).label("month_rank")
+        ).filter(
             and_(
-                Payroll.user_id == user_id,
+                Payroll.user_id.in_(employee_ids),
                 Payroll.organization_id == organization_id,
                 Payroll.is_paid == True,
                 Payroll.period_start < end_date,
                 Payroll.period_end > start_date
             )
-        ).order_by(Payroll.period_start, desc(Payroll.net_amount)).all()
+        ).subquery()
         
-        print(f"💼 Найдено зарплатных записей: {len(payrolls)}")
+        report_start = literal(start_date.replace(tzinfo=None), DateTime())
+        report_end = literal(end_date.replace(tzinfo=None), DateTime())
+        overlap_start = func.greatest(ranked.c.period_start, report_start)
+        overlap_end = func.least(ranked.c.period_end, report_end)
         
-        if not payrolls:
-            return 0.0
+        def whole_days(interval):
+            return func.floor(func.extract("epoch", interval) / 86400)
         
-        # СТРАТЕГИЯ 1: Простое суммирование без учета перекрытий (если зарплат мало)
-        if len(payrolls) <= 2:
-            return ReportsService._simple_earnings_calculation(payrolls, start_date, end_date)
+        overlap_days = cast(whole_days(overlap_end - overlap_start) + 1, Float)
+        total_days = cast(whole_days(ranked.c.period_end - ranked.c.period_start) + 1, Float)
+        
+        earnings = case(
+            (overlap_end <= overlap_start, 0.0),
+            (total_days <= 0, 0.0),
+            else_=ranked.c.net_amount * func.least(1.0, overlap_days / total_days)
+        )
         
-        # СТРАТЕГИЯ 2: Группировка по месяцам (для многочисленных записей)
-        return ReportsService._monthly_grouped_earnings_calculation(payrolls, start_date, end_date)
+        return db.query(
+            ranked.c.user_id,
+            func.sum(earnings).label("earnings")
+        ).filter(
+            or_(ranked.c.payroll_count <= 2, ranked.c.month_rank == 1)
+        ).group_by(ranked.c.user_id).subquery()
 
 
     @staticmethod
@@ -713,7 +665,7 @@ class ReportsService:
         """Простой расчет для небольшого количества зарплат"""
         
         total_earnings = 0
-        print(f"📊 Простой расчет для {len(payrolls)} зарплат")
+        logger.debug("📊 Простой расчет для %s зарплат", len(payrolls))
         
         for payroll in payrolls:
             earnings = ReportsService._calculate_payroll_proportion(payroll, start_date, end_date)
@@ -726,7 +678,7 @@ class ReportsService:
     def _monthly_grouped_earnings_calculation(payrolls: List[Payroll], start_date: datetime, end_date: datetime) -> float:
         """Расчет с группировкой по месяцам для избежания дублей"""
         
-        print(f"📊 Группированный расчет для {len(payrolls)} зарплат")
+        logger.debug("📊 Группированный расчет для %s зарплат", len(payrolls))
         
         # Группируем зарплаты по месяцам
         monthly_groups = {}
@@ -740,23 +692,23 @@ class ReportsService:
             
             monthly_groups[month_key].append(payroll)
         
-        print(f"📅 Найдено месячных групп: {len(monthly_groups)}")
+        logger.debug("📅 Найдено месячных групп: %s", len(monthly_groups))
         
         total_earnings = 0
         
         for month_key, month_payrolls in monthly_groups.items():
-            print(f"\n📅 Месяц {month_key}: {len(month_payrolls)} зарплат")
+            logger.debug("📅 Месяц %s: %s зарплат", month_key, len(month_payrolls))
             
             if len(month_payrolls) == 1:
                 # Одна зарплата за месяц - простой расчет
                 payroll = month_payrolls[0]
                 earnings = ReportsService._calculate_payroll_proportion(payroll, start_date, end_date)
                 total_earnings += earnings
-                print(f"  💰 Единственная зарплата: {payroll.net_amount}₸ → {earnings:.2f}₸")
+                logger.debug("  💰 Единственная зарплата: %s₸ → %.2f₸", payroll.net_amount, earnings)
                 
             else:
                 # Несколько зарплат за месяц - берем самую большую или последнюю по дате создания
-                print(f"  ⚠️ Найдено {len(month_payrolls)} зарплат за месяц - применяем логику дедубликации")
+                logger.debug("  ⚠️ Найдено %s зарплат за месяц - применяем логику дедубликации", len(month_payrolls))
                 
                 # Сортируем: сначала по сумме (больше), потом по дате создания (новее)
                 sorted_payrolls = sorted(
@@ -770,7 +722,7 @@ class ReportsService:
                 earnings = ReportsService._calculate_payroll_proportion(selected_payroll, start_date, end_date)
                 total_earnings += earnings
                 
-                print(f"  ❌ Пропущено {len(month_payrolls) - 1} дублирующих зарплат")
+                logger.debug("  ❌ Пропущено %s дублирующих зарплат", len(month_payrolls) - 1)
         
         return total_earnings
 
@@ -930,7 +882,9 @@ class ReportsService:
         # Постоянные клиенты (более одной аренды)
         returning_clients_query = db.query(Client.id).filter(
             Client.organization_id == organization_id
-        ).join(Rental).group_by(Client.id).having(func.count(Rental.id) > 1)
+        ).join(Rental).filter(
+            Rental.organization_id == organization_id
+        ).group_by(Client.id).having(func.count(Rental.id) > 1)
         
         returning_clients = returning_clients_query.count()
         
@@ -968,6 +922,7 @@ class ReportsService:
         ).join(Rental).filter(
             and_(
                 Client.organization_id == organization_id,
+                Rental.organization_id == organization_id,
                 Rental.created_at >= start_date,
                 Rental.created_at <= end_date
             )
@@ -1110,132 +1065,10 @@ class ReportsService:
         organization_id: uuid.UUID,
         user_role: UserRole
     ) -> Dict[str, Any]:
-        """Генерация сводки для дашборда"""
-        
-        today = datetime.now(timezone.utc)
-        month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        summary = {
-            "organization_stats": {},
-            "today_stats": {},
-            "month_stats": {},
-            "user_specific": {}
-        }
-        
-        # Статистика организации
-        summary["organization_stats"] = {
-            "total_properties": db.query(Property).filter(
-                Property.organization_id == organization_id
-            ).count(),
-            "active_rentals": db.query(Rental).filter(
-                and_(
-                    Rental.organization_id == organization_id,
-                    Rental.is_active == True
-                )
-            ).count(),
-            "total_clients": db.query(Client).filter(
-                Client.organization_id == organization_id
-            ).count(),
-            "total_staff": db.query(User).filter(
-                User.organization_id == organization_id
-            ).count()
-        }
-        
-        # Статистика за сегодня
-        today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        summary["today_stats"] = {
-            "new_bookings": db.query(Rental).filter(
-                and_(
-                    Rental.organization_id == organization_id,
-                    Rental.created_at >= today_start,
-                    Rental.created_at < today_end
-                )
-            ).count(),
-            "check_ins": db.query(Rental).filter(
-                and_(
-                    Rental.organization_id == organization_id,
-                    Rental.check_in_time >= today_start,
-                    Rental.check_in_time < today_end
-                )
-            ).count(),
-            "check_outs": db.query(Rental).filter(
-                and_(
-                    Rental.organization_id == organization_id,
-                    Rental.check_out_time >= today_start,
-                    Rental.check_out_time < today_end
-                )
-            ).count(),
-            "completed_tasks": db.query(Task).filter(
-                and_(
-                    Task.organization_id == organization_id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.completed_at >= today_start,
-                    Task.completed_at < today_end
-                )
-            ).count()
-        }
-        
-        # Статистика за месяц
-        summary["month_stats"] = {
-            "revenue": db.query(func.sum(Rental.paid_amount)).filter(
-                and_(
-                    Rental.organization_id == organization_id,
-                    Rental.created_at >= month_start
-                )
-            ).scalar() or 0,
-            "new_clients": db.query(Client).filter(
-                and_(
-                    Client.organization_id == organization_id,
-                    Client.created_at >= month_start
-                )
-            ).count(),
-            "occupancy_rate": ReportsService._calculate_occupancy_rate(
-                db, organization_id, month_start, today
-            )
-        }
-        
-        # Специфичная для роли информация
-        if user_role in [UserRole.CLEANER, UserRole.TECHNICAL_STAFF]:
-            # Для исполнителей - их задачи
-            user_tasks = db.query(Task).filter(
-                and_(
-                    Task.organization_id == organization_id,
-                    Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-                )
-            ).count()
-            
-            summary["user_specific"] = {
-                "pending_tasks": user_tasks,
-                "completed_today": db.query(Task).filter(
-                    and_(
-                        Task.organization_id == organization_id,
-                        Task.status == TaskStatus.COMPLETED,
-                        Task.completed_at >= today_start,
-                        Task.completed_at < today_end
-                    )
-                ).count()
-            }
-        
-        elif user_role == UserRole.ACCOUNTANT:
-            # Для бухгалтера - финансовая информация
-            summary["user_specific"] = {
-                "unpaid_invoices": db.query(Rental).filter(
-                    and_(
-                        Rental.organization_id == organization_id,
-                        Rental.paid_amount < Rental.total_amount
-                    )
-                ).count(),
-                "pending_payrolls": db.query(Payroll).filter(
-                    and_(
-                        Payroll.organization_id == organization_id,
-                        Payroll.is_paid == False
-                    )
-                ).count()
-            }
+        """Генерация сводки для дашборда (без сохранения снимка)"""
         
-        return summary
+        data = DashboardSnapshotService.compute_data(db, organization_id)
+        return DashboardSnapshotService.compose_summary(data, user_role)
     
     @staticmethod
     def _calculate_occupancy_rate(
@@ -1244,123 +1077,10 @@ class ReportsService:
         start_date: datetime,
         end_date: datetime
     ) -> float:
-        """ИСПРАВЛЕННОЕ вычисление коэффициента загруженности помещений"""
-        
-        print(f"📊 Расчет загруженности помещений")
-        print(f"📅 Период: {start_date} - {end_date}")
-        
-        # Получаем активные помещения
-        active_properties = db.query(Property).filter(
-            and_(
-                Property.organization_id == organization_id,
-                Property.is_active == True
-            )
-        ).all()
-        
-        total_properties = len(active_properties)
-        print(f"🏢 Активных помещений: {total_properties}")
-        
-        if total_properties == 0:
-            return 0.0
-        
-        # Общее количество дней в периоде
-        total_days = (end_date - start_date).days + 1  # +1 чтобы включить последний день
-        if total_days <= 0:
-            return 0.0
-        
-        print(f"📅 Дней в периоде: {total_days}")
-        
-        # Общее количество доступных дней (помещения × дни)
-        total_available_days = total_properties * total_days
-        print(f"🎯 Общее количество доступных дней: {total_available_days}")
-        
-        # Считаем занятые дни для каждого помещения
-        total_occupied_days = 0
-        
-        for prop in active_properties:
-            print(f"🔍 Анализ помещения: {prop.name}")
-            
-            # Получаем аренды для этого помещения, которые пересекаются с периодом
-            rentals = db.query(Rental).filter(
-                and_(
-                    Rental.property_id == prop.id,
-                    Rental.organization_id == organization_id,
-                    # Аренда пересекается с отчетным периодом
-                    Rental.start_date < end_date,
-                    Rental.end_date > start_date
-                )
-            ).all()
-            
-            print(f"📝 Найдено аренд для помещения: {len(rentals)}")
-            
-            property_occupied_days = 0
-            rental_periods = []
-            
-            for rental in rentals:
-                # Убираем часовой пояс для вычислений
-                rental_start = rental.start_date.replace(tzinfo=None) if rental.start_date.tzinfo else rental.start_date
-                rental_end = rental.end_date.replace(tzinfo=None) if rental.end_date.tzinfo else rental.end_date
-                period_start = start_date.replace(tzinfo=None) if start_date.tzinfo else start_date
-                period_end = end_date.replace(tzinfo=None) if end_date.tzinfo else end_date
-                
-                # Пересечение аренды с отчетным периодом
-                overlap_start = max(rental_start, period_start)
-                overlap_end = min(rental_end, period_end)
-                
-                if overlap_end > overlap_start:
-                    overlap_days = (overlap_end - overlap_start).days + 1
-                    rental_periods.append((overlap_start, overlap_end, overlap_days))
-                    print(f"  ⏰ Аренда {rental.id}: {overlap_start} - {overlap_end} ({overlap_days} дней)")
-            
-            # ИСПРАВЛЕНО: Объединяем пересекающиеся периоды аренды 
-            # чтобы избежать двойного подсчета одних и тех же дней
-            if rental_periods:
-                # Сортируем периоды по дате начала
-                rental_periods.sort(key=lambda x: x[0])
-                
-                merged_periods = []
-                current_start, current_end, _ = rental_periods[0]
-                
-                for start, end, _ in rental_periods[1:]:
-                    if start <= current_end:
-                        # Периоды пересекаются или соприкасаются - объединяем
-                        current_end = max(current_end, end)
-                    else:
-                        # Новый период - сохраняем предыдущий и начинаем новый
-                        merged_periods.append((current_start, current_end))
-                        current_start, current_end = start, end
-                
-                # Добавляем последний период
-                merged_periods.append((current_start, current_end))
-                
-                # Подсчитываем общее количество занятых дней
-                for start, end in merged_periods:
-                    period_days = (end - start).days + 1
-                    property_occupied_days += period_days
-                    print(f"  📊 Объединенный период: {start} - {end} ({period_days} дней)")
-            
-            # Проверяем, что не превышаем максимум дней для помещения
-            max_days_for_property = total_days
-            if property_occupied_days > max_days_for_property:
-                print(f"⚠️ Занятых дней ({property_occupied_days}) больше максимума ({max_days_for_property}), обрезаем")
-                property_occupied_days = max_days_for_property
-            
-            total_occupied_days += property_occupied_days
-            print(f"  🎯 Итого занятых дней для помещения: {property_occupied_days}")
-        
-        print(f"📈 Общее количество занятых дней: {total_occupied_days}")
-        print(f"📈 Общее количество доступных дней: {total_available_days}")
-        
-        # Коэффициент загруженности в процентах
-        occupancy_rate = (total_occupied_days / total_available_days) * 100
-        
-        # Ограничиваем максимум 100%
-        if occupancy_rate > 100:
-            print(f"⚠️ Загруженность превышает 100% ({occupancy_rate:.2f}%), ограничиваем до 100%")
-            occupancy_rate = 100.0
-        
-        print(f"🎯 Итоговая загруженность: {occupancy_rate:.2f}%")
-        return round(occupancy_rate, 2)
+        """Вычисление коэффициента загруженности помещений"""
+        return OccupancyService.calculate_occupancy_rate(
+            db, organization_id, start_date, end_date
+        )
     
     @staticmethod
     def generate_financial_pdf(
@@ -1467,145 +1187,134 @@ class ReportsService:
         return buffer.getvalue()
 
     @staticmethod
-    def export_data_to_excel(
+    def _get_export_rows(
         db: Session,
         organization_id: uuid.UUID,
         data_type: str,
         start_date: datetime,
         end_date: datetime
-    ) -> bytes:
-        """Экспорт данных в Excel"""
+    ):
+        """
+        Источник строк для экспорта данных
         
-        output = io.BytesIO()
+        Строки читаются серверным курсором порциями, связанные объекты
+        подгружаются одним запросом на порцию.
+        
+        Returns:
+            (название листа, заголовки, генератор строк)
+        """
         
         if data_type == "rentals":
-            # Экспорт аренд
-            rentals = db.query(Rental).filter(
+            query = db.query(Rental).options(
+                selectinload(Rental.property),
+                selectinload(Rental.client)
+            ).filter(
                 and_(
                     Rental.organization_id == organization_id,
                     Rental.created_at >= start_date,
                     Rental.created_at <= end_date
                 )
-            ).all()
+            ).order_by(Rental.created_at)
             
-            import xlsxwriter
-            workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet("Аренды")
-            
-            # Заголовки
             headers = [
                 'ID', 'Помещение', 'Клиент', 'Тип аренды', 'Дата начала', 
                 'Дата окончания', 'Сумма', 'Оплачено', 'Статус'
             ]
             
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
-            
-            # Данные
-            for row, rental in enumerate(rentals, 1):
-                worksheet.write(row, 0, str(rental.id))
-                worksheet.write(row, 1, rental.property.name if rental.property else "")
-                worksheet.write(row, 2, f"{rental.client.first_name} {rental.client.last_name}" if rental.client else "")
-                worksheet.write(row, 3, rental.rental_type.value)
-                worksheet.write(row, 4, rental.start_date.strftime('%d.%m.%Y'))
-                worksheet.write(row, 5, rental.end_date.strftime('%d.%m.%Y'))
-                worksheet.write(row, 6, rental.total_amount)
-                worksheet.write(row, 7, rental.paid_amount)
-                worksheet.write(row, 8, "Активна" if rental.is_active else "Завершена")
+            rows = (
+                [
+                    str(rental.id),
+                    rental.property.name if rental.property else "",
+                    f"{rental.client.first_name} {rental.client.last_name}" if rental.client else "",
+                    rental.rental_type.value,
+                    rental.start_date.strftime('%d.%m.%Y'),
+                    rental.end_date.strftime('%d.%m.%Y'),
+                    rental.total_amount,
+                    rental.paid_amount,
+                    "Активна" if rental.is_active else "Завершена"
+                ]
+                for rental in iter_query(query)
+            )
             
-            workbook.close()
+            return "Аренды", headers, rows
         
-        elif data_type == "tasks":
-            # Экспорт задач
-            tasks = db.query(Task).filter(
+        if data_type == "tasks":
+            query = db.query(Task).options(
+                selectinload(Task.assignee)
+            ).filter(
                 and_(
                     Task.organization_id == organization_id,
                     Task.created_at >= start_date,
                     Task.created_at <= end_date
                 )
-            ).all()
-            
-            import xlsxwriter
-            workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet("Задачи")
+            ).order_by(Task.created_at)
             
-            # Заголовки
             headers = [
                 'ID', 'Название', 'Тип', 'Приоритет', 'Статус', 'Исполнитель',
                 'Создано', 'Завершено', 'Оплата', 'Рейтинг'
             ]
             
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
-            
-            # Данные
-            for row, task in enumerate(tasks, 1):
-                worksheet.write(row, 0, str(task.id))
-                worksheet.write(row, 1, task.title)
-                worksheet.write(row, 2, task.task_type.value)
-                worksheet.write(row, 3, task.priority.value)
-                worksheet.write(row, 4, task.status.value)
-                worksheet.write(row, 5, f"{task.assignee.first_name} {task.assignee.last_name}" if task.assignee else "")
-                worksheet.write(row, 6, task.created_at.strftime('%d.%m.%Y %H:%M'))
-                worksheet.write(row, 7, task.completed_at.strftime('%d.%m.%Y %H:%M') if task.completed_at else "")
-                worksheet.write(row, 8, task.payment_amount or 0)
-                worksheet.write(row, 9, task.quality_rating or "")
+            rows = (
+                [
+                    str(task.id),
+                    task.title,
+                    task.task_type.value,
+                    task.priority.value,
+                    task.status.value,
+                    f"{task.assignee.first_name} {task.assignee.last_name}" if task.assignee else "",
+                    task.created_at.strftime('%d.%m.%Y %H:%M'),
+                    task.completed_at.strftime('%d.%m.%Y %H:%M') if task.completed_at else "",
+                    task.payment_amount or 0,
+                    task.quality_rating or ""
+                ]
+                for task in iter_query(query)
+            )
             
-            workbook.close()
+            return "Задачи", headers, rows
         
-        elif data_type == "clients":
-            # Экспорт клиентов
-            clients = db.query(Client).filter(
+        if data_type == "clients":
+            query = db.query(Client).filter(
                 and_(
                     Client.organization_id == organization_id,
                     Client.created_at >= start_date,
                     Client.created_at <= end_date
                 )
-            ).all()
-            
-            import xlsxwriter
-            workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet("Клиенты")
+            ).order_by(Client.created_at)
             
-            # Заголовки
             headers = [
                 'ID', 'Имя', 'Фамилия', 'Телефон', 'Email', 'Источник',
                 'Всего аренд', 'Общие траты', 'Дата регистрации', 'Последний визит'
             ]
             
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
-            
-            # Данные
-            for row, client in enumerate(clients, 1):
-                worksheet.write(row, 0, str(client.id))
-                worksheet.write(row, 1, client.first_name)
-                worksheet.write(row, 2, client.last_name)
-                worksheet.write(row, 3, client.phone or "")
-                worksheet.write(row, 4, client.email or "")
-                worksheet.write(row, 5, client.source or "")
-                worksheet.write(row, 6, client.total_rentals)
-                worksheet.write(row, 7, client.total_spent)
-                worksheet.write(row, 8, client.created_at.strftime('%d.%m.%Y'))
-                worksheet.write(row, 9, client.last_visit.strftime('%d.%m.%Y') if client.last_visit else "")
+            rows = (
+                [
+                    str(client.id),
+                    client.first_name,
+                    client.last_name,
+                    client.phone or "",
+                    client.email or "",
+                    client.source or "",
+                    client.total_rentals,
+                    client.total_spent,
+                    client.created_at.strftime('%d.%m.%Y'),
+                    client.last_visit.strftime('%d.%m.%Y') if client.last_visit else ""
+                ]
+                for client in iter_query(query)
+            )
             
-            workbook.close()
+            return "Клиенты", headers, rows
         
-        elif data_type == "payroll":
-            # Экспорт зарплат
-            payrolls = db.query(Payroll).filter(
+        if data_type == "payroll":
+            query = db.query(Payroll).options(
+                selectinload(Payroll.user)
+            ).filter(
                 and_(
                     Payroll.organization_id == organization_id,
                     Payroll.period_start >= start_date,
                     Payroll.period_end <= end_date
                 )
-            ).all()
+            ).order_by(Payroll.period_start, Payroll.user_id)
             
-            import xlsxwriter
-            workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet("Зарплаты")
-            
-            # Заголовки
             headers = [
                 'Сотрудник', 'Период начала', 'Период окончания', 'Тип оплаты',
                 'Базовая ставка', 'Часы', 'Задач выполнено', 'К доплате за задачи',
@@ -1613,32 +1322,81 @@ class ReportsService:
                 'Брутто', 'Нетто', 'Выплачено'
             ]
             
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
+            rows = (
+                [
+                    f"{payroll.user.first_name} {payroll.user.last_name}" if payroll.user else "",
+                    payroll.period_start.strftime('%d.%m.%Y'),
+                    payroll.period_end.strftime('%d.%m.%Y'),
+                    payroll.payroll_type.value,
+                    payroll.base_rate or 0,
+                    payroll.hours_worked,
+                    payroll.tasks_completed,
+                    payroll.tasks_payment,
+                    payroll.bonus,
+                    payroll.tips,
+                    payroll.other_income,
+                    payroll.deductions,
+                    payroll.taxes,
+                    payroll.gross_amount,
+                    payroll.net_amount,
+                    "Да" if payroll.is_paid else "Нет"
+                ]
+                for payroll in iter_query(query)
+            )
             
-            # Данные
-            for row, payroll in enumerate(payrolls, 1):
-                worksheet.write(row, 0, f"{payroll.user.first_name} {payroll.user.last_name}" if payroll.user else "")
-                worksheet.write(row, 1, payroll.period_start.strftime('%d.%m.%Y'))
-                worksheet.write(row, 2, payroll.period_end.strftime('%d.%m.%Y'))
-                worksheet.write(row, 3, payroll.payroll_type.value)
-                worksheet.write(row, 4, payroll.base_rate or 0)
-                worksheet.write(row, 5, payroll.hours_worked)
-                worksheet.write(row, 6, payroll.tasks_completed)
-                worksheet.write(row, 7, payroll.tasks_payment)
-                worksheet.write(row, 8, payroll.bonus)
-                worksheet.write(row, 9, payroll.tips)
-                worksheet.write(row, 10, payroll.other_income)
-                worksheet.write(row, 11, payroll.deductions)
-                worksheet.write(row, 12, payroll.taxes)
-                worksheet.write(row, 13, payroll.gross_amount)
-                worksheet.write(row, 14, payroll.net_amount)
-                worksheet.write(row, 15, "Да" if payroll.is_paid else "Нет")
+            return "Зарплаты", headers, rows
+        
+        raise ValueError(f"Unsupported export data type: {data_type}")
+    
+    @staticmethod
+    def _write_export_sheet(workbook, sheet_name: str, headers: List[str], rows):
+        """Записать строки экспорта на лист (построчно, совместимо с constant_memory)"""
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, headers)
+        for row, values in enumerate(rows, 1):
+            worksheet.write_row(row, 0, values)
+    
+    @staticmethod
+    def export_data_to_excel(
+        db: Session,
+        organization_id: uuid.UUID,
+        data_type: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> bytes:
+        """Экспорт данных в Excel (целиком в памяти; для больших выгрузок - stream_data_export)"""
+        
+        sheet_name, headers, rows = ReportsService._get_export_rows(
+            db, organization_id, data_type, start_date, end_date
+        )
+        
+        return b"".join(xlsx_stream(
+            lambda workbook: ReportsService._write_export_sheet(workbook, sheet_name, headers, rows)
+        ))
+    
+    @staticmethod
+    def stream_data_export(
+        organization_id: uuid.UUID,
+        data_type: str,
+        start_date: datetime,
+        end_date: datetime,
+        format: str = "xlsx"
+    ) -> Iterator[bytes]:
+        """Потоковый экспорт данных в xlsx или csv с ограниченным потреблением памяти"""
+        
+        def produce(db: Session) -> Iterator[bytes]:
+            sheet_name, headers, rows = ReportsService._get_export_rows(
+                db, organization_id, data_type, start_date, end_date
+            )
             
-            workbook.close()
+            if format == "csv":
+                yield from csv_stream(headers, rows, delimiter=',')
+            else:
+                yield from xlsx_stream(
+                    lambda workbook: ReportsService._write_export_sheet(workbook, sheet_name, headers, rows)
+                )
         
-        output.seek(0)
-        return output.getvalue()
+        return with_session(produce)
     
     @staticmethod
     def generate_monthly_summary_report(
@@ -1728,6 +1486,7 @@ class ReportsService:
         ).join(Rental).filter(
             and_(
                 Client.organization_id == organization_id,
+                Rental.organization_id == organization_id,
                 Rental.created_at >= start_date,
                 Rental.created_at < end_date
             )
@@ -1838,15 +1597,13 @@ class ReportsService:
             property_filter = report_config.get("property_filter")
             
             if property_filter and property_filter.get("property_ids"):
-                property_ids = [uuid.UUID(pid) for pid in property_filter["property_ids"]]
-                properties_report = []
-                
-                for prop_id in property_ids:
-                    occupancy = ReportsService.generate_property_occupancy_report(
-                        db, organization_id, start_date, end_date, prop_id
+                property_ids = {str(uuid.UUID(pid)) for pid in property_filter["property_ids"]}
+                properties_report = [
+                    occupancy for occupancy in ReportsService.generate_property_occupancy_report(
+                        db, organization_id, start_date, end_date
                     )
-                    if occupancy:
-                        properties_report.extend(occupancy)
+                    if occupancy.property_id in property_ids
+                ]
             else:
                 properties_report = ReportsService.generate_property_occupancy_report(
                     db, organization_id, start_date, end_date
@@ -2112,83 +1869,3 @@ class ReportsService:
             recommendations.append("Показатели стабильны - продолжайте мониторинг ключевых метрик")
         
         return recommendations
-    
-    @staticmethod
-    def _get_property_occupied_days(
-        db: Session,
-        property_id: uuid.UUID,
-        start_date: datetime,
-        end_date: datetime
-    ) -> int:
-        """
-        Подсчет количества дней, когда помещение было занято в указанном периоде
-        
-        Args:
-            db: Сессия базы данных
-            property_id: ID помещения
-            start_date: Начало периода
-            end_date: Конец периода
-            
-        Returns:
-            Количество занятых дней
-        """
-        
-        # Получаем все аренды для этого помещения, которые пересекаются с отчетным периодом
-        rentals = db.query(Rental).filter(
-            and_(
-                Rental.property_id == property_id,
-                # Аренда пересекается с отчетным периодом
-                Rental.start_date < end_date,
-                Rental.end_date > start_date
-            )
-        ).all()
-        
-        if not rentals:
-            return 0
-        
-        # Собираем все периоды занятости
-        occupied_periods = []
-        
-        for rental in rentals:
-            # Убираем часовой пояс для вычислений
-            rental_start = rental.start_date.replace(tzinfo=None) if rental.start_date.tzinfo else rental.start_date
-            rental_end = rental.end_date.replace(tzinfo=None) if rental.end_date.tzinfo else rental.end_date
-            period_start = start_date.replace(tzinfo=None) if start_date.tzinfo else start_date
-            period_end = end_date.replace(tzinfo=None) if end_date.tzinfo else end_date
-            
-            # Пересечение аренды с отчетным периодом
-            overlap_start = max(rental_start, period_start)
-            overlap_end = min(rental_end, period_end)
-            
-            if overlap_end > overlap_start:
-                occupied_periods.append((overlap_start, overlap_end))
-        
-        if not occupied_periods:
-            return 0
-        
-        # Объединяем пересекающиеся периоды чтобы избежать двойного подсчета
-        # Сортируем периоды по дате начала
-        occupied_periods.sort(key=lambda x: x[0])
-        
-        merged_periods = []
-        current_start, current_end = occupied_periods[0]
-        
-        for start, end in occupied_periods[1:]:
-            if start <= current_end:
-                # Периоды пересекаются или соприкасаются - объединяем
-                current_end = max(current_end, end)
-            else:
-                # Новый период - сохраняем предыдущий и начинаем новый
-                merged_periods.append((current_start, current_end))
-                current_start, current_end = start, end
-        
-        # Добавляем последний период
-        merged_periods.append((current_start, current_end))
-        
-        # Подсчитываем общее количество занятых дней
-        total_occupied_days = 0
-        for start, end in merged_periods:
-            days = (end - start).days + 1  # +1 чтобы включить последний день
-            total_occupied_days += days
-        
-        return total_occupied_days
\ No newline at end of file
@@ -1,20 +1,241 @@
 # backend/services/task_service.py
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy.orm import Session, selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, desc, select
 import uuid
 
 
 from models.extended_models import (
-    Task, TaskType, TaskStatus, TaskPriority, Property, User, UserRole, Payroll,PropertyStatus
+    Task, TaskType, TaskStatus, TaskPriority, Property, User, UserRole, Payroll,PropertyStatus,
+    Rental, RoomOrder, OrderStatus
 )
 from models.models import UserRole
 from schemas.task import TaskCreate, TaskUpdate
 from schemas.property import PropertyResponse
+from services.executor_scoring_service import ExecutorScoringService
+from services.workload_index_service import WorkloadIndexService
+from services.change_feed_service import ChangeFeedService
+from services.assignment_service import AssignmentService
 
 class TaskService:
     """Сервис для управления задачами"""
+    @staticmethod
+    async def get_tasks_async(
+        db: AsyncSession,
+        organization_id: uuid.UUID,
+        skip: int = 0,
+        limit: int = 100,
+        status: Optional[TaskStatus] = None,
+        task_type: Optional[TaskType] = None,
+        priority: Optional[TaskPriority] = None,
+        property_id: Optional[uuid.UUID] = None,
+        assigned_to: Optional[uuid.UUID] = None
+    ) -> List[Task]:
+        """Список задач организации через асинхронную сессию"""
+        
+        query = select(Task).where(Task.organization_id == organization_id)
+        
+        if status:
+            query = query.where(Task.status == status)
+        if task_type:
+            query = query.where(Task.task_type == task_type)
+        if priority:
+            query = query.where(Task.priority == priority)
+        if property_id:
+            query = query.where(Task.property_id == property_id)
+        if assigned_to:
+            query = query.where(Task.assigned_to == assigned_to)
+        
+        # Связанные объекты загружаются сразу: lazy load в async-сессии недоступен
+        query = query.options(
+            selectinload(Task.property),
+            selectinload(Task.assignee),
+            selectinload(Task.creator)
+        ).order_by(desc(Task.created_at)).offset(skip).limit(limit)
+        
+        result = await db.execute(query)
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def get_assigned_tasks_async(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        organization_id: uuid.UUID,
+        status: Optional[TaskStatus] = None
+    ) -> List[Task]:
+        """Задачи, назначенные сотруднику, через асинхронную сессию"""
+        
+        query = select(Task).where(
+            and_(
+                Task.assigned_to == user_id,
+                Task.organization_id == organization_id
+            )
+        )
+        
+        if status:
+            query = query.where(Task.status == status)
+        
+        query = query.options(
+            selectinload(Task.property),
+            selectinload(Task.assignee),
+            selectinload(Task.creator)
+        ).order_by(Task.priority.desc(), Task.created_at)
+        
+        result = await db.execute(query)
+        return list(result.scalars().all())
+    
+    ACTIVE_TASK_STATUSES = [TaskStatus.PENDING, TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS]
+    ACTIVE_ORDER_STATUSES = [OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.IN_PROGRESS]
+    
+    @staticmethod
+    def _iso(value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
+    
+    @staticmethod
+    def _property_summary(prop: Optional[Property]) -> Optional[Dict[str, Any]]:
+        if not prop:
+            return None
+        return {
+            "id": str(prop.id),
+            "name": prop.name,
+            "number": prop.number,
+            "floor": prop.floor,
+            "building": prop.building,
+            "status": prop.status.value if prop.status else None
+        }
+    
+    @staticmethod
+    def _rental_summary(rental: Optional[Rental]) -> Optional[Dict[str, Any]]:
+        if not rental:
+            return None
+        client = rental.client
+        return {
+            "id": str(rental.id),
+            "start_date": TaskService._iso(rental.start_date),
+            "end_date": TaskService._iso(rental.end_date),
+            "check_in_time": TaskService._iso(rental.check_in_time),
+            "check_out_time": TaskService._iso(rental.check_out_time),
+            "guest_count": rental.guest_count,
+            "guest": {
+                "id": str(client.id),
+                "name": f"{client.first_name} {client.last_name}",
+                "phone": client.phone
+            } if client else None
+        }
+    
+    @staticmethod
+    async def get_my_work_async(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        organization_id: uuid.UUID,
+        completed_since: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Активные задачи и заказы сотрудника с помещением, арендой и гостем
+        
+        Три запроса на весь список: задачи с помещениями, текущие или
+        ближайшие аренды этих помещений с гостями, заказы с помещениями,
+        арендами и клиентами. completed_since добавляет завершенные позже.
+        """
+        now = datetime.now(timezone.utc)
+        
+        task_filter = Task.status.in_(TaskService.ACTIVE_TASK_STATUSES)
+        order_filter = RoomOrder.status.in_(TaskService.ACTIVE_ORDER_STATUSES)
+        if completed_since:
+            task_filter = or_(task_filter, Task.completed_at >= completed_since)
+            order_filter = or_(order_filter, RoomOrder.completed_at >= completed_since)
+        
+        tasks = (await db.execute(
+            select(Task).options(joinedload(Task.property)).where(
+                and_(
+                    Task.assigned_to == user_id,
+                    Task.organization_id == organization_id,
+                    task_filter
+                )
+            ).order_by(Task.priority.desc(), Task.due_date.asc().nullslast(), Task.created_at)
+        )).scalars().all()
+        
+        # Текущая или ближайшая аренда помещения каждой задачи
+        property_ids = {task.property_id for task in tasks if task.property_id}
+        rentals_by_property: Dict[uuid.UUID, Rental] = {}
+        if property_ids:
+            rentals = (await db.execute(
+                select(Rental).options(joinedload(Rental.client)).where(
+                    and_(
+                        Rental.organization_id == organization_id,
+                        Rental.property_id.in_(property_ids),
+                        Rental.is_active == True,
+                        Rental.end_date >= now
+                    )
+                ).order_by(Rental.property_id, Rental.start_date)
+            )).scalars().all()
+            for rental in rentals:
+                rentals_by_property.setdefault(rental.property_id, rental)
+        
+        orders = (await db.execute(
+            select(RoomOrder).options(
+                joinedload(RoomOrder.property),
+                joinedload(RoomOrder.client),
+                joinedload(RoomOrder.rental).joinedload(Rental.client)
+            ).where(
+                and_(
+                    RoomOrder.assigned_to == user_id,
+                    RoomOrder.organization_id == organization_id,
+                    order_filter
+                )
+            ).order_by(RoomOrder.scheduled_for.asc().nullslast(), RoomOrder.requested_at)
+        )).scalars().all()
+        
+        return {
+            "tasks": [
+                {
+                    "id": str(task.id),
+                    "title": task.title,
+                    "description": task.description,
+                    "task_type": task.task_type.value,
+                    "status": task.status.value,
+                    "priority": task.priority.value if task.priority else None,
+                    "estimated_duration": task.estimated_duration,
+                    "payment_amount": task.payment_amount,
+                    "due_date": TaskService._iso(task.due_date),
+                    "started_at": TaskService._iso(task.started_at),
+                    "completed_at": TaskService._iso(task.completed_at),
+                    "created_at": TaskService._iso(task.created_at),
+                    "updated_at": TaskService._iso(task.updated_at),
+                    "property": TaskService._property_summary(task.property),
+                    "rental": TaskService._rental_summary(rentals_by_property.get(task.property_id))
+                }
+                for task in tasks
+            ],
+            "orders": [
+                {
+                    "id": str(order.id),
+                    "order_number": order.order_number,
+                    "order_type": order.order_type,
+                    "title": order.title,
+                    "description": order.description,
+                    "status": order.status.value if order.status else None,
+                    "items": order.items or [],
+                    "special_instructions": order.special_instructions,
+                    "total_amount": order.total_amount,
+                    "payment_to_executor": order.payment_to_executor,
+                    "requested_at": TaskService._iso(order.requested_at),
+                    "scheduled_for": TaskService._iso(order.scheduled_for),
+                    "completed_at": TaskService._iso(order.completed_at),
+                    "property": TaskService._property_summary(order.property),
+                    "rental": TaskService._rental_summary(order.rental),
+                    "client": {
+                        "id": str(order.client.id),
+                        "name": f"{order.client.first_name} {order.client.last_name}",
+                        "phone": order.client.phone
+                    } if order.client else None
+                }
+                for order in orders
+            ]
+        }
+    
     @staticmethod
     def create_task(
         db: Session,
@@ -51,9 +272,13 @@ class TaskService:
                 task.status = TaskStatus.ASSIGNED
 
         db.add(task)
+        if task.assigned_to:
+            ChangeFeedService.task_changed(db, task, "created")
         db.commit()
         db.refresh(task)
 
+        WorkloadIndexService.task_changed(task)
+
         return task
 
     @staticmethod
@@ -119,34 +344,44 @@ class TaskService:
     @staticmethod
     def get_least_busy_cleaner(db: Session, organization_id: uuid.UUID) -> Optional[User]:
         """Найти уборщика с наименьшей загрузкой"""
+        return TaskService.get_least_loaded_employee(db, organization_id, UserRole.CLEANER)
+    
+    @staticmethod
+    def get_least_loaded_employee(
+        db: Session,
+        organization_id: uuid.UUID,
+        role: UserRole,
+        exclude: Optional[List[uuid.UUID]] = None
+    ) -> Optional[User]:
+        """Найти активного сотрудника роли с наименьшей загрузкой"""
         
-        # Получаем всех активных уборщиков организации
-        cleaners = db.query(User).filter(
+        # Быстрый путь: индекс загрузки в памяти
+        user_id = WorkloadIndexService.least_loaded(db, organization_id, role, exclude)
+        if user_id:
+            employee = db.query(User).filter(
+                and_(
+                    User.id == user_id,
+                    User.role == role,
+                    User.status == "active"
+                )
+            ).first()
+            if employee:
+                return employee
+            # Индекс разошелся с БД (сотрудник изменен) - перечитаем его позже
+            WorkloadIndexService.invalidate(organization_id)
+        
+        # Запасной путь: один сгруппированный запрос по всем сотрудникам роли
+        query = db.query(User).filter(
             and_(
                 User.organization_id == organization_id,
-                User.role == UserRole.CLEANER,
+                User.role == role,
                 User.status == "active"
             )
-        ).all()
-        
-        if not cleaners:
-            return None
-        
-        # Считаем активные задачи для каждого уборщика
-        cleaner_workload = []
-        
-        for cleaner in cleaners:
-            active_tasks = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == cleaner.id,
-                    Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-                )
-            ).count()
-            
-            cleaner_workload.append((cleaner, active_tasks))
+        )
+        if exclude:
+            query = query.filter(User.id.notin_(exclude))
         
-        # Возвращаем уборщика с минимальным количеством активных задач
-        return min(cleaner_workload, key=lambda x: x[1])[0]
+        return ExecutorScoringService.pick_least_busy(db, query.all())
     
     @staticmethod
     def assign_task(
@@ -178,15 +413,21 @@ class TaskService:
         if not assignee:
             raise ValueError("Assignee not found or not in the same organization")
         
+        previous_assignee, previous_status = task.assigned_to, task.status
+        
         task.assigned_to = assigned_to
         if task.status == TaskStatus.PENDING:
             task.status = TaskStatus.ASSIGNED
         
         task.updated_at = datetime.now(timezone.utc)
         
+        ChangeFeedService.task_changed(db, task, "assigned", previous_assignee)
+        
         db.commit()
         db.refresh(task)
         
+        WorkloadIndexService.task_changed(task, previous_assignee, previous_status)
+        
         return task
     
     @staticmethod
@@ -212,13 +453,18 @@ class TaskService:
         if task.status not in [TaskStatus.ASSIGNED, TaskStatus.PENDING]:
             raise ValueError("Task cannot be started in current status")
         
+        previous_status = task.status
         task.status = TaskStatus.IN_PROGRESS
         task.started_at = datetime.now(timezone.utc)
         task.updated_at = datetime.now(timezone.utc)
         
+        ChangeFeedService.task_changed(db, task, "started")
+        
         db.commit()
         db.refresh(task)
         
+        WorkloadIndexService.task_changed(task, task.assigned_to, previous_status)
+        
         return task
     
     @staticmethod
@@ -252,6 +498,7 @@ class TaskService:
             duration_delta = datetime.now(timezone.utc) - task.started_at
             actual_duration = int(duration_delta.total_seconds() / 60)  # в минутах
         
+        previous_status = task.status
         task.status = TaskStatus.COMPLETED
         task.completed_at = datetime.now(timezone.utc)
         task.completion_notes = completion_notes
@@ -262,9 +509,13 @@ class TaskService:
         # Обрабатываем оплату задачи
         TaskService._process_task_payment(db, task)
         
+        ChangeFeedService.task_changed(db, task, "completed")
+        
         db.commit()
         db.refresh(task)
         
+        WorkloadIndexService.task_changed(task, task.assigned_to, previous_status)
+        
         return task
     
     @staticmethod
@@ -445,34 +696,15 @@ class TaskService:
         employees = query.all()
         workload_data = []
         
+        # Активные и завершенные за 30 дней задачи берем из индекса загрузки
+        month_stats = WorkloadIndexService.get_window_stats(
+            db, organization_id, [employee.id for employee in employees], days=30
+        )
+        
         for employee in employees:
-            # Активные задачи
-            active_tasks = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == employee.id,
-                    Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-                )
-            ).count()
-            
-            # Завершенные задачи за последние 30 дней
-            last_month = datetime.now(timezone.utc) - timedelta(days=30)
-            completed_tasks = db.query(Task).filter(
-                and_(
-                    Task.assigned_to == employee.id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.completed_at >= last_month
-                )
-            ).count()
-            
-            # Средний рейтинг качества
-            avg_quality = db.query(func.avg(Task.quality_rating)).filter(
-                and_(
-                    Task.assigned_to == employee.id,
-                    Task.status == TaskStatus.COMPLETED,
-                    Task.quality_rating.isnot(None),
-                    Task.completed_at >= last_month
-                )
-            ).scalar()
+            active_tasks = month_stats[employee.id]["active_tasks"]
+            completed_tasks = month_stats[employee.id]["completed_tasks"]
+            avg_quality = month_stats[employee.id]["avg_quality"]
             
             workload_data.append({
                 "user_id": str(employee.id),
@@ -531,55 +763,25 @@ class TaskService:
         if not active_tasks:
             return
         
-        # Группируем задачи по типам
-        cleaning_tasks = [t for t in active_tasks if t.task_type == TaskType.CLEANING]
-        maintenance_tasks = [t for t in active_tasks if t.task_type == TaskType.MAINTENANCE]
-        other_tasks = [t for t in active_tasks if t.task_type not in [TaskType.CLEANING, TaskType.MAINTENANCE]]
-        
-        # Перераспределяем задачи уборки
-        for task in cleaning_tasks:
-            new_assignee = TaskService.get_least_busy_cleaner(db, organization_id)
-            if new_assignee and new_assignee.id != unavailable_user_id:
-                task.assigned_to = new_assignee.id
-                task.status = TaskStatus.ASSIGNED
-                task.updated_at = datetime.now(timezone.utc)
+        # Уборка и обслуживание распределяются между наименее загруженными
+        # сотрудниками роли, остальные задачи снимаются с исполнителя.
+        # plan_tasks берет загрузку из индекса и увеличивает ее после каждого выбора
+        plan, _ = AssignmentService.plan_tasks(
+            db, organization_id, active_tasks, exclude=[unavailable_user_id]
+        )
         
-        # Перераспределяем задачи обслуживания
-        for task in maintenance_tasks:
-            # Находим технического сотрудника с минимальной загрузкой
-            tech_staff = db.query(User).filter(
-                and_(
-                    User.organization_id == organization_id,
-                    User.role == UserRole.TECHNICAL_STAFF,
-                    User.status == "active",
-                    User.id != unavailable_user_id
-                )
-            ).all()
-            
-            if tech_staff:
-                # Находим наименее загруженного
-                staff_workload = []
-                for staff in tech_staff:
-                    active_count = db.query(Task).filter(
-                        and_(
-                            Task.assigned_to == staff.id,
-                            Task.status.in_([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS])
-                        )
-                    ).count()
-                    staff_workload.append((staff, active_count))
-                
-                new_assignee = min(staff_workload, key=lambda x: x[1])[0]
-                task.assigned_to = new_assignee.id
-                task.status = TaskStatus.ASSIGNED
-                task.updated_at = datetime.now(timezone.utc)
+        # Без свободного сотрудника роли задача остается за прежним исполнителем
+        for task in active_tasks:
+            if task.task_type in AssignmentService.TASK_TYPE_ROLES and not plan[task.id]:
+                del plan[task.id]
         
-        # Остальные задачи помечаем как неназначенные
-        for task in other_tasks:
-            task.assigned_to = None
-            task.status = TaskStatus.PENDING
-            task.updated_at = datetime.now(timezone.utc)
+        changed = [(task, task.assigned_to, task.status) for task in active_tasks if task.id in plan]
+        AssignmentService.apply_task_assignments(db, organization_id, active_tasks, plan, action="reassigned")
         
         db.commit()
+        
+        for task, previous_assignee, previous_status in changed:
+            WorkloadIndexService.task_changed(task, previous_assignee, previous_status)
     
     @staticmethod
     def create_recurring_tasks(db: Session, organization_id: uuid.UUID):
@@ -0,0 +1,464 @@
+# backend/services/workload_index_service.py
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func
+import heapq
+import logging
+import os
+import threading
+import uuid
+
+from models.extended_models import RoomOrder, OrderStatus, Task, TaskStatus, User, UserRole
+from models.models import UserStatus
+from services.executor_scoring_service import ExecutorScoringService
+
+logger = logging.getLogger(__name__)
+
+
+class WorkloadIndexService:
+    """Живой индекс загрузки исполнителей в памяти процесса
+
+    Для каждой организации хранятся активные задачи и заказы сотрудников,
+    выполненная работа за последние 30 дней (с оценками качества) и кучи
+    по ролям для поиска наименее загруженного сотрудника за O(log n).
+    Индекс обновляется переходами статусов задач и заказов после коммита
+    и сверяется с БД при устаревании (WORKLOAD_INDEX_MAX_AGE секунд) и
+    фоновым сервисом.
+    """
+
+    MAX_AGE_SECONDS = int(os.getenv("WORKLOAD_INDEX_MAX_AGE", "300"))
+    HISTORY_DAYS = 30
+
+    _lock = threading.RLock()
+    _organizations: Dict[uuid.UUID, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _new_entry(role: UserRole, is_active: bool) -> Dict[str, Any]:
+        return {
+            "role": role,
+            "is_active": is_active,
+            "active_tasks": 0,
+            "active_orders": 0,
+            "in_progress": {},
+            "task_completions": deque(),
+            "order_completions": deque(),
+            "version": 0
+        }
+
+    @staticmethod
+    def _aware(value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+    @classmethod
+    def _push(cls, state: Dict[str, Any], user_id: uuid.UUID, entry: Dict[str, Any]):
+        """Добавить актуальную загрузку сотрудника в кучу его роли"""
+        entry["version"] += 1
+        if not entry["is_active"]:
+            return
+
+        heap = state["heaps"].setdefault(entry["role"], [])
+        heapq.heappush(
+            heap,
+            (entry["active_tasks"] + entry["active_orders"], str(user_id), entry["version"], user_id)
+        )
+
+        # Периодически удаляем устаревшие записи кучи
+        if len(heap) > 4 * len(state["executors"]) + 16:
+            cls._rebuild_heap(state, entry["role"])
+
+    @staticmethod
+    def _rebuild_heap(state: Dict[str, Any], role: UserRole):
+        heap = [
+            (entry["active_tasks"] + entry["active_orders"], str(user_id), entry["version"], user_id)
+            for user_id, entry in state["executors"].items()
+            if entry["role"] == role and entry["is_active"]
+        ]
+        heapq.heapify(heap)
+        state["heaps"][role] = heap
+
+    @classmethod
+    def _load_organization(cls, db: Session, organization_id: uuid.UUID) -> Dict[str, Any]:
+        """Построить состояние организации по данным БД"""
+
+        now = datetime.now(timezone.utc)
+        history_start = now - timedelta(days=cls.HISTORY_DAYS)
+
+        users = db.query(User.id, User.role, User.status).filter(
+            User.organization_id == organization_id
+        ).all()
+
+        executors = {
+            user.id: cls._new_entry(user.role, user.status == UserStatus.ACTIVE)
+            for user in users
+        }
+        user_ids = list(executors.keys())
+
+        if user_ids:
+            active_tasks = db.query(
+                Task.id, Task.assigned_to, Task.status, Task.started_at
+            ).filter(
+                and_(
+                    Task.assigned_to.in_(user_ids),
+                    Task.status.in_(ExecutorScoringService.ACTIVE_TASK_STATUSES)
+                )
+            ).all()
+
+            for task in active_tasks:
+                entry = executors[task.assigned_to]
+                entry["active_tasks"] += 1
+                if task.status == TaskStatus.IN_PROGRESS and task.started_at:
+                    entry["in_progress"][task.id] = cls._aware(task.started_at)
+
+            active_orders = db.query(
+                RoomOrder.assigned_to, func.count(RoomOrder.id)
+            ).filter(
+                and_(
+                    RoomOrder.assigned_to.in_(user_ids),
+                    RoomOrder.status.in_(ExecutorScoringService.ACTIVE_ORDER_STATUSES)
+                )
+            ).group_by(RoomOrder.assigned_to).all()
+
+            for assigned_to, count in active_orders:
+                executors[assigned_to]["active_orders"] = count
+
+            completed_tasks = db.query(
+                Task.assigned_to, Task.completed_at, Task.quality_rating, Task.actual_duration
+            ).filter(
+                and_(
+                    Task.assigned_to.in_(user_ids),
+                    Task.status == TaskStatus.COMPLETED,
+                    Task.completed_at >= history_start
+                )
+            ).order_by(Task.completed_at).all()
+
+            for task in completed_tasks:
+                executors[task.assigned_to]["task_completions"].append(
+                    (cls._aware(task.completed_at), task.quality_rating, task.actual_duration)
+                )
+
+            delivered_orders = db.query(
+                RoomOrder.assigned_to, RoomOrder.completed_at, RoomOrder.total_amount
+            ).filter(
+                and_(
+                    RoomOrder.assigned_to.in_(user_ids),
+                    RoomOrder.status == OrderStatus.DELIVERED,
+                    RoomOrder.completed_at >= history_start
+                )
+            ).order_by(RoomOrder.completed_at).all()
+
+            for order in delivered_orders:
+                executors[order.assigned_to]["order_completions"].append(
+                    (cls._aware(order.completed_at), order.total_amount or 0)
+                )
+
+        state = {
+            "executors": executors,
+            "heaps": {},
+            "loaded_at": now,
+            "stale": False
+        }
+        for role in {entry["role"] for entry in executors.values()}:
+            cls._rebuild_heap(state, role)
+
+        return state
+
+    @classmethod
+    def _get_state(cls, db: Session, organization_id: uuid.UUID) -> Dict[str, Any]:
+        """Состояние организации; загружается заново, если устарело"""
+
+        with cls._lock:
+            state = cls._organizations.get(organization_id)
+            if state and not state["stale"]:
+                age = (datetime.now(timezone.utc) - state["loaded_at"]).total_seconds()
+                if age < cls.MAX_AGE_SECONDS:
+                    return state
+
+        state = cls._load_organization(db, organization_id)
+
+        with cls._lock:
+            cls._organizations[organization_id] = state
+
+        return state
+
+    @classmethod
+    def reconcile(cls, db: Session, organization_id: uuid.UUID) -> Dict[str, Any]:
+        """Сверить индекс организации с БД и вернуть число расхождений"""
+
+        with cls._lock:
+            previous = cls._organizations.get(organization_id)
+
+        state = cls._load_organization(db, organization_id)
+
+        drifted = 0
+        if previous:
+            for user_id, entry in state["executors"].items():
+                old = previous["executors"].get(user_id)
+                if (not old or old["active_tasks"] != entry["active_tasks"]
+                        or old["active_orders"] != entry["active_orders"]):
+                    drifted += 1
+
+        with cls._lock:
+            cls._organizations[organization_id] = state
+
+        if drifted:
+            logger.info(f"Workload index for organization {organization_id} reconciled: {drifted} executors drifted")
+
+        return {"organization_id": str(organization_id), "executors": len(state["executors"]), "drifted": drifted}
+
+    @classmethod
+    def loaded_organizations(cls) -> List[uuid.UUID]:
+        with cls._lock:
+            return list(cls._organizations.keys())
+
+    @classmethod
+    def invalidate(cls, organization_id: uuid.UUID):
+        """Пометить индекс организации устаревшим (после массовых изменений)"""
+        with cls._lock:
+            state = cls._organizations.get(organization_id)
+            if state:
+                state["stale"] = True
+
+    @classmethod
+    def get_loads(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        user_ids: List[uuid.UUID]
+    ) -> Dict[uuid.UUID, int]:
+        """Активные задачи + заказы сотрудников (загрузка для AssignmentService)"""
+
+        state = cls._get_state(db, organization_id)
+        with cls._lock:
+            missing = any(user_id not in state["executors"] for user_id in user_ids)
+        if missing:
+            # Сотрудник добавлен после построения индекса
+            cls.invalidate(organization_id)
+            state = cls._get_state(db, organization_id)
+
+        with cls._lock:
+            loads = {}
+            for user_id in user_ids:
+                entry = state["executors"].get(user_id)
+                loads[user_id] = entry["active_tasks"] + entry["active_orders"] if entry else 0
+            return loads
+
+    @classmethod
+    def least_loaded(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        role: UserRole,
+        exclude: Optional[List[uuid.UUID]] = None
+    ) -> Optional[uuid.UUID]:
+        """Наименее загруженный активный сотрудник роли (активные задачи + заказы)"""
+
+        state = cls._get_state(db, organization_id)
+        exclude = set(exclude or [])
+
+        with cls._lock:
+            heap = state["heaps"].get(role)
+            if not heap:
+                return None
+
+            skipped = []
+            result = None
+
+            while heap:
+                load, _, version, user_id = heap[0]
+                entry = state["executors"].get(user_id)
+                if not entry or entry["version"] != version or not entry["is_active"]:
+                    heapq.heappop(heap)
+                    continue
+                if user_id in exclude:
+                    skipped.append(heapq.heappop(heap))
+                    continue
+                result = user_id
+                break
+
+            for item in skipped:
+                heapq.heappush(heap, item)
+
+            return result
+
+    @classmethod
+    def get_window_stats(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        user_ids: List[uuid.UUID],
+        days: int
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """
+        Активная загрузка и выполненная работа сотрудников за последние days дней
+
+        Returns:
+            {user_id: {active_tasks, active_orders, completed_tasks,
+            completed_orders, avg_quality, avg_task_duration, order_revenue}}
+        """
+        state = cls._get_state(db, organization_id)
+        since = datetime.now(timezone.utc) - timedelta(days=min(days, cls.HISTORY_DAYS))
+
+        stats = {}
+        with cls._lock:
+            for user_id in user_ids:
+                entry = state["executors"].get(user_id) or cls._new_entry(None, False)
+
+                tasks = [c for c in entry["task_completions"] if c[0] and c[0] >= since]
+                orders = [c for c in entry["order_completions"] if c[0] and c[0] >= since]
+                ratings = [c[1] for c in tasks if c[1] is not None]
+                durations = [c[2] for c in tasks if c[2] is not None]
+
+                stats[user_id] = {
+                    "active_tasks": entry["active_tasks"],
+                    "active_orders": entry["active_orders"],
+                    "completed_tasks": len(tasks),
+                    "completed_orders": len(orders),
+                    "avg_quality": sum(ratings) / len(ratings) if ratings else None,
+                    "avg_task_duration": sum(durations) / len(durations) if durations else None,
+                    "order_revenue": sum(c[1] for c in orders)
+                }
+
+        return stats
+
+    @classmethod
+    def get_executor_features(
+        cls,
+        db: Session,
+        organization_id: uuid.UUID,
+        executor_ids: List[uuid.UUID]
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """Показатели для скоринга в формате ExecutorScoringService.get_executor_features"""
+
+        stats = cls.get_window_stats(db, organization_id, executor_ids, days=7)
+        state = cls._get_state(db, organization_id)
+        last_hour = datetime.now(timezone.utc) - timedelta(hours=1)
+
+        features = {}
+        with cls._lock:
+            for executor_id in executor_ids:
+                entry = state["executors"].get(executor_id)
+                in_progress = entry["in_progress"].values() if entry else []
+                features[executor_id] = {
+                    "active_orders": stats[executor_id]["active_orders"],
+                    "active_tasks": stats[executor_id]["active_tasks"],
+                    "completed_orders": stats[executor_id]["completed_orders"],
+                    "completed_tasks": stats[executor_id]["completed_tasks"],
+                    "recent_activity": sum(1 for started_at in in_progress if started_at >= last_hour),
+                    "avg_quality": stats[executor_id]["avg_quality"]
+                }
+
+        return features
+
+    @classmethod
+    def _apply_change(
+        cls,
+        organization_id: uuid.UUID,
+        counter: str,
+        active_statuses: List,
+        item_id: uuid.UUID,
+        previous_assignee: Optional[uuid.UUID],
+        previous_status,
+        assignee: Optional[uuid.UUID],
+        status,
+        started_at: Optional[datetime] = None,
+        completion: Optional[tuple] = None,
+        completions: Optional[str] = None
+    ):
+        with cls._lock:
+            state = cls._organizations.get(organization_id)
+            if not state or state["stale"]:
+                return
+
+            def entry_for(user_id):
+                entry = state["executors"].get(user_id)
+                if entry is None:
+                    # Новый сотрудник - индекс перечитается при следующем обращении
+                    state["stale"] = True
+                return entry
+
+            if previous_assignee and previous_status in active_statuses:
+                entry = entry_for(previous_assignee)
+                if entry:
+                    entry[counter] = max(0, entry[counter] - 1)
+                    entry["in_progress"].pop(item_id, None)
+                    cls._push(state, previous_assignee, entry)
+
+            if assignee and status in active_statuses:
+                entry = entry_for(assignee)
+                if entry:
+                    entry[counter] += 1
+                    if started_at is not None:
+                        entry["in_progress"][item_id] = cls._aware(started_at)
+                    cls._push(state, assignee, entry)
+
+            if assignee and completion is not None:
+                entry = entry_for(assignee)
+                if entry:
+                    entry[completions].append(completion)
+                    history_start = datetime.now(timezone.utc) - timedelta(days=cls.HISTORY_DAYS)
+                    while entry[completions] and entry[completions][0][0] < history_start:
+                        entry[completions].popleft()
+
+    @classmethod
+    def task_changed(
+        cls,
+        task: Task,
+        previous_assignee: Optional[uuid.UUID] = None,
+        previous_status: Optional[TaskStatus] = None
+    ):
+        """Учесть переход задачи (вызывается после коммита)"""
+
+        completion = None
+        if task.status == TaskStatus.COMPLETED and previous_status != TaskStatus.COMPLETED:
+            completion = (
+                cls._aware(task.completed_at) or datetime.now(timezone.utc),
+                task.quality_rating,
+                task.actual_duration
+            )
+
+        cls._apply_change(
+            task.organization_id,
+            "active_tasks",
+            ExecutorScoringService.ACTIVE_TASK_STATUSES,
+            task.id,
+            previous_assignee,
+            previous_status,
+            task.assigned_to,
+            task.status,
+            started_at=task.started_at if task.status == TaskStatus.IN_PROGRESS else None,
+            completion=completion,
+            completions="task_completions"
+        )
+
+    @classmethod
+    def order_changed(
+        cls,
+        order: RoomOrder,
+        previous_assignee: Optional[uuid.UUID] = None,
+        previous_status: Optional[OrderStatus] = None
+    ):
+        """Учесть переход заказа (вызывается после коммита)"""
+
+        completion = None
+        if order.status == OrderStatus.DELIVERED and previous_status != OrderStatus.DELIVERED:
+            completion = (
+                cls._aware(order.completed_at) or datetime.now(timezone.utc),
+                order.total_amount or 0
+            )
+
+        cls._apply_change(
+            order.organization_id,
+            "active_orders",
+            ExecutorScoringService.ACTIVE_ORDER_STATUSES,
+            order.id,
+            previous_assignee,
+            previous_status,
+            order.assigned_to,
+            order.status,
+            completion=completion,
+            completions="order_completions"
+        )
@@ -0,0 +1,74 @@
+# backend/tests/conftest.py
+from contextlib import contextmanager
+import os
+import sys
+
+import pytest
+
+# Тесты запускаются из backend/ или из корня репозитория: модули приложения
+# импортируются так же, как в uvicorn main:app
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Тесты на Postgres (планы запросов, бенчмарки) запускаются только с
+# TEST_DATABASE_URL; движки приложения создаются при импорте models.database,
+# поэтому адрес подменяется до импорта моделей
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    """Схема тестовой базы, созданная так же, как при старте приложения"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from models.database import SessionLocal, engine
+    # Регистрируют все таблицы в Base.metadata
+    from models import (  # noqa: F401
+        acquiring_models, extended_models, models, order_payment_models,
+        payment_models, payroll_operation, payroll_template
+    )
+    from services.init_service import DatabaseInitService
+
+    assert DatabaseInitService.create_tables()
+    with SessionLocal() as db:
+        DatabaseInitService.run_database_migrations(db)
+
+    return engine
+
+
+@contextmanager
+def _rolled_back_session(engine):
+    """Сессия внутри транзакции, откатываемой по выходу
+
+    commit() сервисов фиксирует только точку сохранения, поэтому данные
+    не видны другим тестам.
+    """
+    from sqlalchemy.orm import Session
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint")
+    try:
+        yield db
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def pg_db(pg_engine):
+    with _rolled_back_session(pg_engine) as db:
+        yield db
+
+
+@pytest.fixture(scope="module")
+def pg_module_db(pg_engine):
+    """Сессия на модуль: общий набор данных заполняется один раз"""
+    with _rolled_back_session(pg_engine) as db:
+        yield db
@@ -0,0 +1,108 @@
+# backend/tests/fakes.py
+from datetime import datetime, timezone
+
+
+class FakeQuery:
+    """Цепочка Query, возвращающая заранее заданные строки (фильтры не применяются)"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def __getattr__(self, name):
+        if name in ("filter", "outerjoin", "join", "order_by", "group_by", "options"):
+            return lambda *args, **kwargs: self
+        raise AttributeError(name)
+
+    def all(self):
+        return list(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeSession:
+    """Сессия, отвечающая на db.query(Model.column, ...) строками по модели первой колонки"""
+
+    def __init__(self, rows_by_model):
+        self.rows_by_model = rows_by_model
+
+    def query(self, *entities):
+        model = getattr(entities[0], "class_", entities[0])
+        return FakeQuery(self.rows_by_model.get(model, []))
+
+
+class FakeClock:
+    """Управляемые часы для GCRA: время меняется только через advance()"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeRateLimitBackend:
+    """
+    Хранилище лимитов в памяти с семантикой UPSERT PostgresRateLimitBackend
+
+    Повторяет HIT_SQL по шагам (TAT сдвигается только для разрешенного
+    запроса), записывает проверенные ключи и может имитировать
+    недоступность хранилища (unavailable = True).
+    """
+
+    def __init__(self, clock=None):
+        from utils.rate_limiter import PostgresRateLimitBackend
+
+        self.clock = clock or FakeClock()
+        self.rows = {}
+        self.keys = []
+        self.unavailable = False
+        self._sql = PostgresRateLimitBackend(self.clock)
+
+    def hit_sync(self, key: str, max_requests: int, window_seconds: float):
+        from types import SimpleNamespace
+
+        if self.unavailable:
+            raise ConnectionError("rate limit storage is unavailable")
+
+        now = self.clock()
+        params = self._sql._params(key, max_requests, window_seconds, now)
+        self.keys.append(key)
+
+        if key not in self.rows:
+            row = SimpleNamespace(tat=params["now"] + params["increment"], allowed=True)
+        else:
+            tat = max(self.rows[key], params["now"]) + params["increment"]
+            allowed = tat - params["window"] <= params["now"]
+            row = SimpleNamespace(tat=tat if allowed else self.rows[key], allowed=allowed)
+
+        self.rows[key] = row.tat
+        return self._sql._result(row, now, max_requests, window_seconds)
+
+    async def hit(self, key: str, max_requests: int, window_seconds: float):
+        return self.hit_sync(key, max_requests, window_seconds)
+
+    def cleanup(self) -> int:
+        expired = [key for key, tat in self.rows.items() if tat < self.clock()]
+        for key in expired:
+            del self.rows[key]
+        return len(expired)
+
+
+def workload_state(loads):
+    """Загруженное состояние WorkloadIndexService: {user_id: (роль, активные задачи)}"""
+    from services.workload_index_service import WorkloadIndexService
+
+    executors = {}
+    for user_id, (role, active_tasks) in loads.items():
+        entry = WorkloadIndexService._new_entry(role, True)
+        entry["active_tasks"] = active_tasks
+        executors[user_id] = entry
+
+    state = {"executors": executors, "heaps": {}, "loaded_at": datetime.now(timezone.utc), "stale": False}
+    for role in {role for role, _ in loads.values()}:
+        WorkloadIndexService._rebuild_heap(state, role)
+    return state
@@ -0,0 +1,365 @@
+# backend/tests/seed.py
+"""Массовое заполнение тестовой базы (бенчмарки и планы запросов)
+
+Строки вставляются пачками через insert() без создания ORM-объектов;
+функции возвращают идентификаторы созданных записей.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+import random
+import time
+import uuid
+
+from sqlalchemy import event, insert, text
+from sqlalchemy.orm import Session
+
+from models.extended_models import (
+    Client, Inventory, InventoryMovement, OrderStatus, Payroll, PayrollType, Property, PropertyStatus,
+    PropertyType, Rental, RentalType, RoomOrder, Task, TaskStatus, TaskType
+)
+from models.models import Organization, OrganizationStatus, User, UserRole, UserStatus
+from models.payroll_operation import PayrollOperation, PayrollOperationType
+from models.payroll_template import PayrollTemplate, PayrollTemplateStatus
+
+BATCH_SIZE = 10000
+BASE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _insert(db: Session, model, rows: List[dict]) -> List[uuid.UUID]:
+    for row in rows:
+        row.setdefault("id", uuid.uuid4())
+    for offset in range(0, len(rows), BATCH_SIZE):
+        db.execute(insert(model), rows[offset:offset + BATCH_SIZE])
+    return [row["id"] for row in rows]
+
+
+def organization(db: Session, slug: Optional[str] = None) -> uuid.UUID:
+    slug = slug or f"org-{uuid.uuid4().hex[:12]}"
+    return _insert(db, Organization, [{"name": slug, "slug": slug, "status": OrganizationStatus.ACTIVE}])[0]
+
+
+def users(db: Session, organization_id: uuid.UUID, count: int, role: UserRole = UserRole.CLEANER) -> List[uuid.UUID]:
+    return _insert(db, User, [
+        {
+            "organization_id": organization_id,
+            "email": f"user{index}-{uuid.uuid4().hex[:8]}@example.com",
+            "password_hash": "x",
+            "first_name": "Test",
+            "last_name": f"User {index}",
+            "role": role,
+            "status": UserStatus.ACTIVE
+        }
+        for index in range(count)
+    ])
+
+
+def properties(
+    db: Session,
+    organization_id: uuid.UUID,
+    count: int,
+    status: PropertyStatus = PropertyStatus.AVAILABLE
+) -> List[uuid.UUID]:
+    return _insert(db, Property, [
+        {
+            "organization_id": organization_id,
+            "name": f"Room {index}",
+            "number": f"{index:05d}-{uuid.uuid4().hex[:6]}",
+            "floor": index % 10,
+            "property_type": PropertyType.ROOM,
+            "max_occupancy": 2,
+            "daily_rate": 100.0,
+            "status": status
+        }
+        for index in range(count)
+    ])
+
+
+def clients(db: Session, organization_id: uuid.UUID, count: int) -> List[uuid.UUID]:
+    return _insert(db, Client, [
+        {"organization_id": organization_id, "first_name": "Client", "last_name": str(index)}
+        for index in range(count)
+    ])
+
+
+def rentals(
+    db: Session,
+    organization_id: uuid.UUID,
+    property_ids: List[uuid.UUID],
+    client_ids: List[uuid.UUID],
+    count: int,
+    days: int = 730,
+    active_share: float = 0.9,
+    seed: int = 0
+) -> List[uuid.UUID]:
+    """Аренды длительностью 1-7 дней, случайно разбросанные по days дням от BASE_TIME"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        start = BASE_TIME + timedelta(days=rng.randrange(days), hours=14)
+        nights = rng.randint(1, 7)
+        rows.append({
+            "organization_id": organization_id,
+            "property_id": rng.choice(property_ids),
+            "client_id": rng.choice(client_ids),
+            "rental_type": RentalType.DAILY,
+            "start_date": start,
+            "end_date": start + timedelta(days=nights, hours=-2),
+            "rate": 100.0,
+            "total_amount": 100.0 * nights,
+            "paid_amount": 100.0 * nights,
+            "is_active": rng.random() < active_share,
+            "created_at": start - timedelta(days=rng.randint(0, 30))
+        })
+    return _insert(db, Rental, rows)
+
+
+def tasks(
+    db: Session,
+    organization_id: uuid.UUID,
+    assignee_ids: List[uuid.UUID],
+    count: int,
+    days: int = 365,
+    seed: int = 0
+) -> List[uuid.UUID]:
+    """Задачи уборки; примерно 80% завершены (часть с оплатой и оценкой), остальные открыты"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        created = BASE_TIME + timedelta(days=rng.randrange(days), minutes=rng.randrange(1440))
+        completed = rng.random() < 0.8
+        rows.append({
+            "organization_id": organization_id,
+            "assigned_to": rng.choice(assignee_ids),
+            "title": "Cleaning",
+            "task_type": TaskType.CLEANING,
+            "status": TaskStatus.COMPLETED if completed else rng.choice([TaskStatus.ASSIGNED, TaskStatus.IN_PROGRESS]),
+            "payment_amount": float(rng.randint(5, 50)),
+            "is_paid": completed and rng.random() < 0.5,
+            "actual_duration": rng.randint(10, 120) if completed and rng.random() < 0.8 else None,
+            "quality_rating": rng.randint(1, 5) if completed and rng.random() < 0.6 else None,
+            "created_at": created,
+            "due_date": created + timedelta(days=1),
+            "completed_at": created + timedelta(hours=rng.randint(1, 48)) if completed else None
+        })
+    return _insert(db, Task, rows)
+
+
+def orders(
+    db: Session,
+    organization_id: uuid.UUID,
+    property_ids: List[uuid.UUID],
+    assignee_ids: List[uuid.UUID],
+    count: int,
+    days: int = 365,
+    seed: int = 0
+) -> List[uuid.UUID]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        created = BASE_TIME + timedelta(days=rng.randrange(days), minutes=rng.randrange(1440))
+        rows.append({
+            "organization_id": organization_id,
+            "property_id": rng.choice(property_ids),
+            "assigned_to": rng.choice(assignee_ids),
+            "order_number": f"ORD-{uuid.uuid4().hex[:10]}",
+            "title": "Order",
+            "order_type": "food",
+            "status": rng.choice(list(OrderStatus)),
+            "total_amount": float(rng.randint(10, 100)),
+            "is_paid": rng.random() < 0.5,
+            "created_at": created
+        })
+    return _insert(db, RoomOrder, rows)
+
+
+def inventory(db: Session, organization_id: uuid.UUID, count: int) -> List[uuid.UUID]:
+    return _insert(db, Inventory, [
+        {
+            "organization_id": organization_id,
+            "name": f"Item {index}",
+            "sku": f"SKU-{index:05d}",
+            "unit": "pcs",
+            "current_stock": 100.0,
+            "cost_per_unit": 2.5
+        }
+        for index in range(count)
+    ])
+
+
+def movements(
+    db: Session,
+    organization_id: uuid.UUID,
+    inventory_ids: List[uuid.UUID],
+    user_ids: List[uuid.UUID],
+    count: int,
+    days: int = 365,
+    seed: int = 0
+) -> List[uuid.UUID]:
+    """Приход, расход, корректировки и списания, случайно разбросанные по days дням от BASE_TIME"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        quantity = float(rng.randint(1, 20))
+        rows.append({
+            "organization_id": organization_id,
+            "inventory_id": rng.choice(inventory_ids),
+            "user_id": rng.choice(user_ids),
+            "movement_type": rng.choice(["in", "out", "out", "adjustment", "writeoff"]),
+            "quantity": quantity,
+            "unit_cost": 2.5,
+            "total_cost": quantity * 2.5,
+            "stock_after": 100.0,
+            "created_at": BASE_TIME + timedelta(days=rng.randrange(days), minutes=rng.randrange(1440))
+        })
+    return _insert(db, InventoryMovement, rows)
+
+
+def payrolls(
+    db: Session,
+    organization_id: uuid.UUID,
+    user_ids: List[uuid.UUID],
+    per_user: int,
+    seed: int = 0
+) -> List[uuid.UUID]:
+    """Зарплаты за случайные месяцы 2024 года, включая пересекающиеся и дубли месяца"""
+    rng = random.Random(seed)
+    rows = []
+    for user_id in user_ids:
+        for _ in range(rng.randint(0, per_user)):
+            period_start = datetime(2024, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23))
+            amount = round(rng.uniform(100, 2000), 2)
+            rows.append({
+                "organization_id": organization_id,
+                "user_id": user_id,
+                "period_start": period_start,
+                "period_end": period_start + timedelta(days=rng.randint(7, 45), hours=rng.randint(0, 23)),
+                "payroll_type": PayrollType.MONTHLY_SALARY,
+                "gross_amount": amount,
+                "net_amount": amount,
+                "is_paid": rng.random() < 0.8,
+                "created_at": BASE_TIME + timedelta(seconds=rng.randrange(10 ** 7))
+            })
+    return _insert(db, Payroll, rows)
+
+
+def payroll_templates(db: Session, organization_id: uuid.UUID, user_ids: List[uuid.UUID], seed: int = 0) -> List[uuid.UUID]:
+    """Шаблон на сотрудника; часть с оплатой задач, надбавками и неактивные"""
+    rng = random.Random(seed)
+    return _insert(db, PayrollTemplate, [
+        {
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "name": "Monthly",
+            "status": PayrollTemplateStatus.ACTIVE if rng.random() < 0.9 else PayrollTemplateStatus.INACTIVE,
+            "payroll_type": PayrollType.MONTHLY_SALARY,
+            "base_rate": float(rng.randint(1000, 5000)),
+            "automatic_allowances": {"transport": float(rng.randint(0, 200))} if rng.random() < 0.5 else {},
+            "automatic_deductions": {"uniform": float(rng.randint(0, 100))} if rng.random() < 0.3 else {},
+            "include_task_payments": rng.random() < 0.7,
+            "task_payment_rate": float(rng.randint(0, 10)),
+            "tax_rate": 0.1,
+            "social_rate": 0.1,
+            "effective_from": BASE_TIME - timedelta(days=30)
+        }
+        for user_id in user_ids
+    ])
+
+
+def payroll_operations(
+    db: Session,
+    organization_id: uuid.UUID,
+    user_ids: List[uuid.UUID],
+    created_by: uuid.UUID,
+    count: int,
+    seed: int = 0
+) -> List[uuid.UUID]:
+    """Бонусы, штрафы и прочие операции на случайные месяцы 2024 года; часть уже применена"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        month = rng.randint(1, 12)
+        start = datetime(2024, month, 1)
+        rows.append({
+            "organization_id": organization_id,
+            "user_id": rng.choice(user_ids),
+            "created_by": created_by,
+            "operation_type": rng.choice(list(PayrollOperationType)),
+            "amount": float(rng.randint(-300, 500)),
+            "title": "Operation",
+            "apply_to_period_start": start,
+            "apply_to_period_end": start + timedelta(days=27),
+            "is_applied": rng.random() < 0.1
+        })
+    return _insert(db, PayrollOperation, rows)
+
+
+def analyze(db: Session):
+    """Обновить статистику после заполнения, чтобы планировщик видел объемы"""
+    db.flush()
+    db.execute(text("ANALYZE"))
+
+
+def explain(db: Session, statement) -> Dict[str, Any]:
+    """План выражения (ORM Query или Select) в формате JSON"""
+    if hasattr(statement, "statement"):
+        statement = statement.statement
+    compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    return db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()[0]["Plan"]
+
+
+def statement_plans(db: Session, function, *args, **kwargs) -> List[Tuple[str, Dict[str, Any]]]:
+    """Вызвать function и получить планы всех выполненных ею SELECT
+
+    Выражения перехватываются на уровне курсора с уже подставленными
+    параметрами, поэтому план строится для реального SQL сервиса.
+    """
+    connection = db.connection()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        function(db, *args, **kwargs)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    return [
+        (statement, connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()[0]["Plan"])
+        for statement, parameters in statements
+    ]
+
+
+def plan_nodes(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def scanned_indexes(plan: Dict[str, Any]) -> Set[str]:
+    return {node["Index Name"] for node in plan_nodes(plan) if "Index Name" in node}
+
+
+def seq_scanned_tables(plan: Dict[str, Any]) -> Set[str]:
+    return {node["Relation Name"] for node in plan_nodes(plan) if node["Node Type"] == "Seq Scan"}
+
+
+def partition_parents(db: Session) -> Dict[str, str]:
+    """Секции таблиц и их индексов -> имя родительской таблицы или индекса"""
+    return dict(db.execute(text(
+        "SELECT child.relname, parent.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+    )).all())
+
+
+def timed(function, *args, repeat: int = 5, **kwargs) -> float:
+    """Лучшее время вызова из repeat попыток, секунды"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best
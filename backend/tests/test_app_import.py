@@ -0,0 +1,25 @@
+# backend/tests/test_app_import.py
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_main_imports():
+    """Приложение импортируется: main.py пробрасывает ошибки импорта роутеров"""
+    result = subprocess.run(
+        [sys.executable, "-c", "import main; assert main.app.routes"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+def test_acquiring_router_registered():
+    from routers import acquiring
+
+    paths = {route.path for route in acquiring.router.routes}
+    assert "/api/acquiring/debug/user-info" in paths
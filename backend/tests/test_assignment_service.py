@@ -0,0 +1,209 @@
+# backend/tests/test_assignment_service.py
+from unittest.mock import MagicMock
+import random
+import time
+import uuid
+
+import pytest
+
+from fakes import workload_state
+from models.extended_models import Task, TaskStatus, TaskType, User, UserRole
+from services.assignment_service import AssignmentService
+from services.change_feed_service import ChangeFeedService
+from services.task_service import TaskService
+from services.workload_index_service import WorkloadIndexService
+
+
+def _index_state(monkeypatch, organization_id, loads):
+    state = workload_state(loads)
+    monkeypatch.setitem(WorkloadIndexService._organizations, organization_id, state)
+    return state
+
+
+def _task(organization_id, assigned_to, task_type=TaskType.CLEANING, status=TaskStatus.ASSIGNED):
+    return Task(id=uuid.uuid4(), organization_id=organization_id, assigned_to=assigned_to, task_type=task_type, status=status)
+
+
+def test_plan_tasks_takes_loads_from_workload_index(monkeypatch):
+    organization_id = uuid.uuid4()
+    cleaners = [uuid.uuid4() for _ in range(3)]
+    technician = uuid.uuid4()
+    _index_state(monkeypatch, organization_id, {
+        cleaners[0]: (UserRole.CLEANER, 4),
+        cleaners[1]: (UserRole.CLEANER, 1),
+        cleaners[2]: (UserRole.CLEANER, 2),
+        technician: (UserRole.TECHNICAL_STAFF, 7)
+    })
+    candidates = {user_id: User(id=user_id, role=UserRole.CLEANER) for user_id in cleaners}
+    candidates[technician] = User(id=technician, role=UserRole.TECHNICAL_STAFF)
+    monkeypatch.setattr(AssignmentService, "load_candidates", staticmethod(lambda *args, **kwargs: candidates))
+
+    tasks = [_task(organization_id, None, status=TaskStatus.PENDING) for _ in range(5)]
+    tasks.append(_task(organization_id, None, TaskType.MAINTENANCE, TaskStatus.PENDING))
+    tasks.append(_task(organization_id, None, TaskType.LAUNDRY, TaskStatus.PENDING))
+    plan, _ = AssignmentService.plan_tasks(None, organization_id, tasks)
+
+    picked = [plan[task.id] for task in tasks[:5]]
+    # Загрузка 4/1/2: сначала добираются менее загруженные, затем по очереди
+    assert picked.count(cleaners[1]) == 3
+    assert picked.count(cleaners[2]) == 2
+    assert plan[tasks[5].id] == technician
+    assert plan[tasks[6].id] is None
+
+
+def test_reassign_plans_in_bulk_and_commits_once(monkeypatch):
+    organization_id = uuid.uuid4()
+    unavailable = uuid.uuid4()
+    cleaners = [uuid.uuid4() for _ in range(3)]
+    state = _index_state(monkeypatch, organization_id, {
+        unavailable: (UserRole.CLEANER, 7),
+        cleaners[0]: (UserRole.CLEANER, 0),
+        cleaners[1]: (UserRole.CLEANER, 2),
+        cleaners[2]: (UserRole.CLEANER, 3)
+    })
+
+    tasks = [_task(organization_id, unavailable) for _ in range(6)]
+    tasks.append(_task(organization_id, unavailable, TaskType.LAUNDRY))
+    # Обслуживание без свободного техника остается за прежним исполнителем
+    tasks.append(_task(organization_id, unavailable, TaskType.MAINTENANCE))
+    db = MagicMock()
+    db.query.return_value.filter.return_value.all.return_value = tasks
+
+    candidates = {user_id: User(id=user_id, role=UserRole.CLEANER) for user_id in cleaners}
+    excluded, published = [], []
+
+    def load_candidates(db, organization_id, roles, exclude=None):
+        excluded.append(exclude)
+        return candidates
+
+    monkeypatch.setattr(AssignmentService, "load_candidates", staticmethod(load_candidates))
+    monkeypatch.setattr(
+        ChangeFeedService, "tasks_changed",
+        classmethod(lambda cls, db, organization_id, changes: published.extend(action for _, action, _ in changes))
+    )
+
+    TaskService.reassign_tasks_on_employee_unavailable(db, unavailable, organization_id)
+
+    assert excluded == [[unavailable]]
+    assert published == ["reassigned"] * 6 + ["unassigned"]
+    assert tasks[6].assigned_to is None and tasks[6].status == TaskStatus.PENDING
+    assert tasks[7].assigned_to == unavailable
+    # Один UPDATE и один коммит на всю пачку
+    assert db.execute.call_count == 1
+    assert db.commit.call_count == 1
+    # Загрузка 0/2/3 выравнивается, индекс учитывает переходы после коммита
+    loads = {user_id: state["executors"][user_id]["active_tasks"] for user_id in cleaners}
+    assert sorted(loads.values()) == [3, 4, 4]
+    assert state["executors"][unavailable]["active_tasks"] == 0
+
+
+def test_take_least_loaded_spreads_picks_by_load():
+    users = {uuid.UUID(int=index): User(id=uuid.UUID(int=index), role=UserRole.CLEANER) for index in range(1, 4)}
+    technician = uuid.UUID(int=9)
+    users[technician] = User(id=technician, role=UserRole.TECHNICAL_STAFF)
+    loads = {uuid.UUID(int=1): 3, uuid.UUID(int=2): 0, uuid.UUID(int=3): 1}
+    heaps = AssignmentService.build_heaps(users, loads)
+
+    picks = [AssignmentService.take_least_loaded(heaps, UserRole.CLEANER) for _ in range(6)]
+    # Меньшая загрузка первой, при равной - по id; каждый выбор увеличивает загрузку
+    assert [pick.int for pick in picks] == [2, 2, 3, 2, 3, 1]
+    assert sorted(load for load, _, _ in heaps[UserRole.CLEANER]) == [3, 3, 4]
+
+    assert AssignmentService.take_least_loaded(heaps, UserRole.TECHNICAL_STAFF) == technician
+    assert AssignmentService.take_least_loaded(heaps, UserRole.STOREKEEPER) is None
+
+
+def _flow_cost(flow, class_costs, executors, load_step):
+    """Стоимость распределения по модели solve_min_cost"""
+    cost = 0.0
+    for executor, (group, base_cost, base_load, _) in executors.items():
+        units = sum(class_flow.get(executor, 0) for class_flow in flow)
+        cost += units * base_cost + load_step * sum(base_load + k for k in range(units))
+    for class_flow, costs in zip(flow, class_costs):
+        for executor, units in class_flow.items():
+            cost += units * costs[executors[executor][0]]
+    return cost
+
+
+def _brute_force(supplies, class_costs, executors, load_step):
+    """Перебор всех распределений единиц: (максимум размещенных, минимальная стоимость)"""
+    units = [c for c, supply in enumerate(supplies) for _ in range(supply)]
+    best = (-1, 0.0)
+
+    def search(index, flow, loads):
+        nonlocal best
+        if index == len(units):
+            placed = sum(loads.values()) - sum(executor[2] for executor in executors.values())
+            cost = _flow_cost(flow, class_costs, executors, load_step)
+            if placed > best[0] or (placed == best[0] and cost < best[1] - 1e-9):
+                best = (placed, cost)
+            return
+
+        c = units[index]
+        search(index + 1, flow, loads)
+        for executor, (group, _, _, capacity) in executors.items():
+            if group in class_costs[c] and loads[executor] < capacity:
+                loads[executor] += 1
+                flow[c][executor] = flow[c].get(executor, 0) + 1
+                search(index + 1, flow, loads)
+                flow[c][executor] -= 1
+                loads[executor] -= 1
+
+    search(0, [{} for _ in supplies], {executor: spec[2] for executor, spec in executors.items()})
+    return best
+
+
+def test_solve_min_cost_matches_brute_force():
+    rng = random.Random(11)
+    groups = ["a", "b", "c"]
+
+    for _ in range(300):
+        supplies = [rng.randint(0, 3) for _ in range(rng.randint(1, 3))]
+        class_costs = [
+            {group: rng.randint(-5, 5) for group in rng.sample(groups, rng.randint(1, 3))}
+            for _ in supplies
+        ]
+        executors = {}
+        for index in range(rng.randint(1, 4)):
+            base_load = rng.randint(0, 2)
+            executors[f"e{index}"] = (rng.choice(groups), rng.randint(-3, 3), base_load, base_load + rng.randint(0, 3))
+        load_step = rng.choice([0, 0.5, 1, 2])
+
+        flow, remaining = AssignmentService.solve_min_cost(supplies, class_costs, executors, load_step)
+
+        loads = {executor: spec[2] for executor, spec in executors.items()}
+        for c, class_flow in enumerate(flow):
+            assert sum(class_flow.values()) + remaining[c] == supplies[c]
+            for executor, units in class_flow.items():
+                assert units > 0 and executors[executor][0] in class_costs[c]
+                loads[executor] += units
+        assert all(loads[executor] <= spec[3] for executor, spec in executors.items())
+
+        placed, cost = _brute_force(supplies, class_costs, executors, load_step)
+        assert sum(supplies) - sum(remaining) == placed
+        assert _flow_cost(flow, class_costs, executors, load_step) == pytest.approx(cost)
+
+
+def test_solve_min_cost_1k_units_100_executors_benchmark():
+    """Масштаб /orders/optimize-assignments: 1000 заказов на 100 исполнителей"""
+    rng = random.Random(3)
+    roles = list(UserRole)[:4]
+    class_costs = [{role: -rng.uniform(0, 100) for role in rng.sample(roles, rng.randint(1, 3))} for _ in range(20)]
+    supplies = [50] * len(class_costs)
+    executors = {
+        uuid.UUID(int=index): (rng.choice(roles), -rng.uniform(0, 50), rng.randint(0, 5), 15)
+        for index in range(100)
+    }
+
+    started = time.perf_counter()
+    flow, remaining = AssignmentService.solve_min_cost(supplies, class_costs, executors, 10.0)
+    elapsed = time.perf_counter() - started
+    print(f"\nsolve_min_cost, 1000 units x 100 executors: {elapsed * 1000:.0f} ms")
+
+    assigned = {}
+    for class_flow in flow:
+        for executor, units in class_flow.items():
+            assigned[executor] = assigned.get(executor, 0) + units
+    assert sum(assigned.values()) + sum(remaining) == 1000
+    assert all(executors[executor][2] + units <= 15 for executor, units in assigned.items())
+    assert elapsed < 2.0
@@ -0,0 +1,148 @@
+# backend/tests/test_async_path.py
+import asyncio
+import time
+import uuid
+
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import delete, select
+
+from models.extended_models import Property
+from models.models import Organization, User, UserRole, UserStatus
+from schemas.auth import TokenData
+from services.auth_service import AuthService
+from services.principal_cache_service import PrincipalCacheService
+from utils import dependencies
+from utils.executor import run_blocking
+import seed
+
+
+class _RecordingAsyncSession:
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        self.events.append("open")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.events.append("close")
+
+
+def test_get_current_user_does_not_hold_async_session(monkeypatch):
+    """Пользователь читается в короткой сессии, закрытой до передачи обработчику"""
+    events = []
+    user = User(
+        id=uuid.uuid4(), email="user@example.com", role=UserRole.CLEANER,
+        status=UserStatus.ACTIVE, organization=None
+    )
+
+    async def load_user(db, user_id):
+        events.append("load")
+        return user
+
+    monkeypatch.setattr(AuthService, "verify_token", staticmethod(lambda token: TokenData(user_id=str(user.id), iat=1)))
+    monkeypatch.setattr(AuthService, "get_user_by_id_async", staticmethod(load_user))
+    monkeypatch.setattr(dependencies, "AsyncSessionLocal", lambda: _RecordingAsyncSession(events))
+    monkeypatch.setattr(PrincipalCacheService, "put", classmethod(lambda cls, *args: events.append("cache")))
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")
+    assert asyncio.run(dependencies.get_current_user(credentials)) is user
+    assert events == ["open", "load", "close", "cache"]
+
+
+async def _max_loop_stall(requests) -> float:
+    """Наибольшая задержка event loop, пока выполняются запросы"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def ping():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0)
+            stalls.append(time.perf_counter() - started)
+
+    pinger = asyncio.create_task(ping())
+    await asyncio.sleep(0)
+    await asyncio.gather(*requests)
+    done.set()
+    await pinger
+    return max(stalls)
+
+
+def test_blocking_report_work_benchmark():
+    """Тяжелые отчеты в пуле потоков не останавливают остальные запросы"""
+    report_seconds = 0.05
+    reports = 8
+
+    async def report_on_loop():
+        time.sleep(report_seconds)
+
+    async def report_in_pool():
+        await run_blocking(time.sleep, report_seconds)
+
+    async def measure(handler):
+        started = time.perf_counter()
+        stall = await _max_loop_stall([handler() for _ in range(reports)])
+        return stall, time.perf_counter() - started
+
+    before_stall, before_elapsed = asyncio.run(measure(report_on_loop))
+    after_stall, after_elapsed = asyncio.run(measure(report_in_pool))
+    print(
+        f"\n{reports} reports x {report_seconds * 1000:.0f} ms: "
+        f"on loop {before_elapsed * 1000:.0f} ms (max stall {before_stall * 1000:.0f} ms), "
+        f"in pool {after_elapsed * 1000:.0f} ms (max stall {after_stall * 1000:.1f} ms)"
+    )
+
+    assert before_stall >= report_seconds
+    assert after_stall < report_seconds
+    assert after_elapsed < before_elapsed
+
+
+def test_async_session_benchmark(pg_engine):
+    """Списки помещений: синхронная сессия в async-обработчике и AsyncSession"""
+    from models.database import AsyncSessionLocal, SessionLocal, async_engine
+
+    with SessionLocal() as db:
+        organization_id = seed.organization(db)
+        seed.properties(db, organization_id, 200)
+        db.commit()
+
+    requests = 50
+    query = select(Property).where(Property.organization_id == organization_id).order_by(Property.number).limit(100)
+
+    async def list_sync():
+        with SessionLocal() as db:
+            return db.execute(query).scalars().all()
+
+    async def list_async():
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(query)).scalars().all()
+
+    async def measure(handler):
+        await asyncio.gather(*[handler() for _ in range(5)])  # прогрев пула соединений
+        started = time.perf_counter()
+        stall = await _max_loop_stall([handler() for _ in range(requests)])
+        return stall, time.perf_counter() - started
+
+    async def measure_async():
+        try:
+            return await measure(list_async)
+        finally:
+            await async_engine.dispose()
+
+    try:
+        before_stall, before_elapsed = asyncio.run(measure(list_sync))
+        after_stall, after_elapsed = asyncio.run(measure_async())
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(Organization).where(Organization.id == organization_id))
+            db.commit()
+
+    print(
+        f"\n{requests} concurrent property lists: "
+        f"sync session {requests / before_elapsed:.0f} req/s (max stall {before_stall * 1000:.1f} ms), "
+        f"async session {requests / after_elapsed:.0f} req/s (max stall {after_stall * 1000:.1f} ms)"
+    )
+
+    # Синхронные запросы выполняются подряд, не отдавая управление event loop
+    assert after_stall < before_stall
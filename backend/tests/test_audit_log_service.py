@@ -0,0 +1,160 @@
+# backend/tests/test_audit_log_service.py
+from collections import deque
+import queue
+import threading
+import time
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from models.models import UserAction
+from services.audit_log_service import AuditLogService
+
+
+@pytest.fixture
+def audit(monkeypatch):
+    """Чистое состояние писателя; записанные пакеты собираются в writes"""
+    writes = []
+
+    monkeypatch.setattr(AuditLogService, "_queue", queue.Queue(maxsize=AuditLogService.QUEUE_SIZE))
+    monkeypatch.setattr(AuditLogService, "_pending", deque())
+    monkeypatch.setattr(AuditLogService, "_stop_event", threading.Event())
+    monkeypatch.setattr(AuditLogService, "_metrics", {**dict.fromkeys(AuditLogService._metrics, 0), "last_error": None})
+    monkeypatch.setattr(AuditLogService, "_running", False)
+    monkeypatch.setattr(AuditLogService, "_worker", None)
+    monkeypatch.setattr(AuditLogService, "FLUSH_INTERVAL", 0.01)
+    monkeypatch.setattr(AuditLogService, "_write_batch", classmethod(lambda cls, events: writes.append(list(events))))
+
+    yield writes
+
+    AuditLogService.stop()
+
+
+def _log(count, action="test_action"):
+    for index in range(count):
+        AuditLogService.log_user_action(action=action, success=True, details={"index": index})
+
+
+def _written_ids(writes):
+    return [row["id"] for batch in writes for _, row in batch]
+
+
+def test_events_are_written_in_batches(audit, monkeypatch):
+    monkeypatch.setattr(AuditLogService, "BATCH_SIZE", 500)
+    AuditLogService.start()
+    _log(1200)
+    AuditLogService.stop()
+
+    assert len(_written_ids(audit)) == 1200
+    assert len(set(_written_ids(audit))) == 1200
+    assert all(len(batch) <= 500 for batch in audit)
+    assert len(audit) < 1200 / 10
+
+    metrics = AuditLogService.get_metrics()
+    assert metrics["enqueued"] == metrics["written"] == 1200
+    assert metrics["queue_depth"] == metrics["pending"] == 0
+
+
+def test_failed_batches_are_retried_until_written(audit, monkeypatch):
+    """Доставка хотя бы один раз: пакет остается в очереди, пока не записан"""
+    failures = [RuntimeError("database is unavailable")] * 3
+
+    def write_batch(cls, events):
+        if failures:
+            raise failures.pop()
+        audit.append(list(events))
+
+    monkeypatch.setattr(AuditLogService, "_write_batch", classmethod(write_batch))
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+    AuditLogService.start()
+    _log(50)
+    AuditLogService.stop()
+
+    assert sorted(_written_ids(audit)) == sorted(set(_written_ids(audit)))
+    assert len(_written_ids(audit)) == 50
+    assert AuditLogService.get_metrics()["failed_flushes"] == 3
+
+
+def test_backpressure_drop_and_block(audit, monkeypatch):
+    monkeypatch.setattr(AuditLogService, "_queue", queue.Queue(maxsize=10))
+    monkeypatch.setattr(AuditLogService, "ENQUEUE_TIMEOUT", 0.001)
+    # Поток записи "завис": очередь не разбирается
+    monkeypatch.setattr(AuditLogService, "_running", True)
+
+    monkeypatch.setattr(AuditLogService, "BACKPRESSURE", "drop")
+    _log(15)
+    assert AuditLogService.get_metrics()["dropped"] == 5
+    assert audit == []
+
+    # block: после ожидания событие пишется синхронно, а не теряется
+    monkeypatch.setattr(AuditLogService, "BACKPRESSURE", "block")
+    _log(3)
+    assert AuditLogService.get_metrics()["sync_writes"] == 3
+    assert len(audit) == 3
+
+    monkeypatch.setattr(AuditLogService, "_running", False)
+
+
+def _per_call_ms(calls, action="test_action"):
+    started = time.perf_counter()
+    _log(calls, action)
+    return (time.perf_counter() - started) / calls * 1000
+
+
+def test_request_latency_saved_benchmark(audit, monkeypatch):
+    """Задержка log_user_action в запросе: отдельная транзакция против очереди"""
+    commit_seconds = 0.002  # одна короткая транзакция с БД в той же сети
+
+    def write_batch(cls, events):
+        time.sleep(commit_seconds)
+        audit.append(list(events))
+
+    monkeypatch.setattr(AuditLogService, "_write_batch", classmethod(write_batch))
+    calls = 200
+
+    sync_ms = _per_call_ms(calls)
+    AuditLogService.start()
+    queued_ms = _per_call_ms(calls)
+    AuditLogService.stop()
+
+    print(
+        f"\naudit write per request ({commit_seconds * 1000:.0f} ms commit): "
+        f"sync {sync_ms:.3f} ms, queued {queued_ms:.3f} ms, saved {sync_ms - queued_ms:.3f} ms"
+    )
+
+    assert len(_written_ids(audit)) == 2 * calls
+    # Синхронно каждое событие - отдельная транзакция, в очереди - пакеты
+    assert len(audit) < calls + calls / 10
+    assert queued_ms * 10 < sync_ms
+
+
+def test_request_latency_saved_postgres_benchmark(pg_engine, monkeypatch):
+    """То же на Postgres: транзакция на событие против пакетной записи в фоне"""
+    from models.database import SessionLocal
+
+    monkeypatch.setattr(AuditLogService, "_queue", queue.Queue(maxsize=AuditLogService.QUEUE_SIZE))
+    monkeypatch.setattr(AuditLogService, "_pending", deque())
+    monkeypatch.setattr(AuditLogService, "_stop_event", threading.Event())
+    monkeypatch.setattr(AuditLogService, "_running", False)
+    action = "audit_benchmark"
+    calls = 500
+
+    try:
+        sync_ms = _per_call_ms(calls, action)
+        AuditLogService.start()
+        queued_ms = _per_call_ms(calls, action)
+        AuditLogService.stop()
+
+        with SessionLocal() as db:
+            written = db.execute(select(func.count(UserAction.id)).where(UserAction.action == action)).scalar()
+    finally:
+        AuditLogService.stop()
+        with SessionLocal() as db:
+            db.execute(delete(UserAction).where(UserAction.action == action))
+            db.commit()
+
+    print(f"\naudit write per request on Postgres: sync {sync_ms:.3f} ms, queued {queued_ms:.3f} ms")
+
+    assert written == 2 * calls
+    assert queued_ms * 5 < sync_ms
@@ -0,0 +1,71 @@
+# backend/tests/test_availability_search.py
+from datetime import timedelta
+
+from sqlalchemy import and_, select
+
+from models.extended_models import PropertyStatus, Rental
+from services.property_service import PropertyService
+import seed
+
+
+def test_search_ignores_current_status_of_bookable_properties(pg_db):
+    """Текущий статус (занято, уборка) не мешает брони на будущий период"""
+    organization_id = seed.organization(pg_db)
+    client_ids = seed.clients(pg_db, organization_id, 1)
+    bookable = {
+        status: seed.properties(pg_db, organization_id, 1, status)[0]
+        for status in [PropertyStatus.AVAILABLE, PropertyStatus.OCCUPIED, PropertyStatus.CLEANING]
+    }
+    out_of_service = [
+        seed.properties(pg_db, organization_id, 1, status)[0]
+        for status in PropertyService.OUT_OF_SERVICE_STATUSES
+    ]
+    booked = seed.properties(pg_db, organization_id, 1)[0]
+    seed.rentals(pg_db, organization_id, [booked], client_ids, 1, days=1, active_share=1.0)
+
+    start = seed.BASE_TIME + timedelta(days=1)
+    found = PropertyService.search_available(pg_db, organization_id, start - timedelta(days=1), start)
+    found_ids = {item["property_id"] for item in found}
+
+    assert found_ids == {str(property_id) for property_id in bookable.values()}
+    assert not found_ids & {str(property_id) for property_id in out_of_service + [booked]}
+
+    future = PropertyService.check_availability(pg_db, bookable[PropertyStatus.OCCUPIED], start, start + timedelta(days=2))
+    assert future["is_available"]
+
+
+def test_search_available_benchmark_100k_rentals(pg_db):
+    """Поиск свободных помещений на 100k арендах идет по GiST-индексу периода"""
+    organization_id = seed.organization(pg_db)
+    other_organization_id = seed.organization(pg_db)
+    property_ids = seed.properties(pg_db, organization_id, 500)
+    client_ids = seed.clients(pg_db, organization_id, 1000)
+    seed.rentals(pg_db, organization_id, property_ids, client_ids, 100000)
+    other_property_ids = seed.properties(pg_db, other_organization_id, 50)
+    other_client_ids = seed.clients(pg_db, other_organization_id, 100)
+    seed.rentals(pg_db, other_organization_id, other_property_ids, other_client_ids, 10000, seed=1)
+    seed.analyze(pg_db)
+
+    start = seed.BASE_TIME + timedelta(days=200)
+    end = start + timedelta(days=3)
+
+    busy = select(Rental.property_id).where(
+        and_(
+            Rental.organization_id == organization_id,
+            Rental.is_active == True,
+            Rental.period.overlaps(PropertyService._period(start, end))
+        )
+    )
+    assert "idx_rental_active_period" in seed.scanned_indexes(seed.explain(pg_db, busy))
+
+    found = PropertyService.search_available(pg_db, organization_id, start, end)
+    busy_ids = set(pg_db.execute(busy).scalars())
+    assert {item["property_id"] for item in found} == {str(property_id) for property_id in set(property_ids) - busy_ids}
+
+    elapsed = seed.timed(PropertyService.search_available, pg_db, organization_id, start, end)
+    check_elapsed = seed.timed(PropertyService.check_availability, pg_db, property_ids[0], start, end)
+    print(f"\nsearch_available: {elapsed * 1000:.1f} ms, check_availability: {check_elapsed * 1000:.1f} ms (100k rentals)")
+
+    # Поиск по индексу не зависит от объема истории аренд
+    assert elapsed < 0.5
+    assert check_elapsed < 0.05
@@ -0,0 +1,107 @@
+# backend/tests/test_change_feed_stream.py
+from dataclasses import replace
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete
+
+from models.extended_models import ChangeEvent, UserRole
+from models.models import Organization, UserStatus
+from routers import changes
+from services.change_feed_service import ChangeFeedService, ChangeFeedSubscription
+from services.principal_cache_service import Principal
+from utils.executor import MAX_BLOCKING_WORKERS, run_blocking
+import seed
+
+
+class _AsyncSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def _principal(organization_id, role=UserRole.MANAGER) -> Principal:
+    return Principal(
+        id=uuid.uuid4(), email="user@example.com", role=role, status=UserStatus.ACTIVE,
+        organization_id=organization_id, organization_status=None
+    )
+
+
+def test_stream_reads_do_not_wait_for_blocking_pool(monkeypatch):
+    """Занятый отчетами пул run_blocking не задерживает события SSE"""
+    change = {"id": 1, "entity_type": "task", "entity_id": str(uuid.uuid4()), "action": "assigned", "data": {}, "created_at": None}
+
+    async def get_changes_async(db, organization_id, user_id, role, since, limit=ChangeFeedService.MAX_BATCH):
+        return {"cursor": 1, "changes": [change], "has_more": False, "reset": False}
+
+    monkeypatch.setattr(changes, "AsyncSessionLocal", _AsyncSession)
+    monkeypatch.setattr(ChangeFeedService, "get_changes_async", staticmethod(get_changes_async))
+    monkeypatch.setattr(
+        ChangeFeedService, "subscribe",
+        classmethod(lambda cls, organization_id: ChangeFeedSubscription(organization_id, asyncio.get_running_loop()))
+    )
+    monkeypatch.setattr(ChangeFeedService, "unsubscribe", classmethod(lambda cls, subscription: None))
+
+    report_seconds = 0.5
+
+    async def first_change():
+        reports = [asyncio.ensure_future(run_blocking(time.sleep, report_seconds)) for _ in range(MAX_BLOCKING_WORKERS)]
+        await asyncio.sleep(0.01)
+
+        started = time.perf_counter()
+        response = await changes.stream_changes(None, since=0, last_event_id=None, current_user=_principal(uuid.uuid4()))
+        events = response.body_iterator
+        assert (await events.__anext__()).startswith("retry:")
+        assert (await events.__anext__()).startswith("id: 1\nevent: change")
+        elapsed = time.perf_counter() - started
+
+        await events.aclose()
+        await asyncio.gather(*reports)
+        return elapsed
+
+    assert asyncio.run(first_change()) < report_seconds / 2
+
+
+def test_async_feed_matches_sync_feed(pg_engine):
+    from models.database import AsyncSessionLocal, SessionLocal, async_engine
+
+    with SessionLocal() as db:
+        organization_id = seed.organization(db)
+        staff_id = seed.users(db, organization_id, 1)[0]
+        for index in range(30):
+            db.add(ChangeEvent(
+                organization_id=organization_id, entity_type="task", entity_id=uuid.uuid4(),
+                action="assigned", user_ids=[str(staff_id)] if index % 3 == 0 else [], payload={"index": index}
+            ))
+        db.commit()
+
+    manager = _principal(organization_id)
+    staff = replace(manager, id=staff_id, role=UserRole.CLEANER)
+    cases = [(principal, since, limit) for principal in [manager, staff] for since in [None, 0, 5] for limit in [4, 500]]
+
+    async def read_async():
+        try:
+            results = []
+            for principal, since, limit in cases:
+                async with AsyncSessionLocal() as db:
+                    results.append(await ChangeFeedService.get_changes_async(
+                        db, organization_id, principal.id, principal.role, since, limit
+                    ))
+            return results
+        finally:
+            await async_engine.dispose()
+
+    try:
+        with SessionLocal() as db:
+            expected = [
+                ChangeFeedService.get_changes(db, organization_id, principal.id, principal.role, since, limit)
+                for principal, since, limit in cases
+            ]
+        assert asyncio.run(read_async()) == expected
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(Organization).where(Organization.id == organization_id))
+            db.commit()
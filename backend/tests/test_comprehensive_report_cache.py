@@ -0,0 +1,217 @@
+# backend/tests/test_comprehensive_report_cache.py
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session
+
+from models.extended_models import DailyPropertyFact, Payroll, Rental, Task
+from schemas.comprehensive_report import ComprehensiveReportRequest, ReportFormat
+from services import comprehensive_report_service
+from services.comprehensive_report_service import ALL_ORGANIZATIONS, ComprehensiveReportService
+import seed
+
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+END = datetime(2024, 5, 31, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Кэш без БД: версия данных задается тестом, построения отчета считаются"""
+    state = {"version": 1, "builds": []}
+
+    def build_report(cls, db, organization_id, request):
+        state["builds"].append(organization_id)
+        return SimpleNamespace(organization_id=organization_id, build=len(state["builds"]))
+
+    monkeypatch.setattr(ComprehensiveReportService, "_cache", comprehensive_report_service.OrderedDict())
+    monkeypatch.setattr(ComprehensiveReportService, "_inflight", {})
+    monkeypatch.setattr(ComprehensiveReportService, "get_data_version", staticmethod(lambda db, organization_id: state["version"]))
+    monkeypatch.setattr(ComprehensiveReportService, "_build_report", classmethod(build_report))
+    return state
+
+
+def _request(**values):
+    return ComprehensiveReportRequest(start_date=START, end_date=END, **values)
+
+
+def test_generate_preview_and_export_share_one_computation(builds):
+    organization_id = uuid.uuid4()
+
+    generated = ComprehensiveReportService.generate_comprehensive_report(None, organization_id, _request())
+    # export отличается только форматом, preview собирает запрос так же, как роутер
+    exported = ComprehensiveReportService.generate_comprehensive_report(None, organization_id, _request(format=ReportFormat.XML))
+    preview = ComprehensiveReportService.generate_comprehensive_report(
+        None, organization_id,
+        _request(utility_bills_amount=0, format=ReportFormat.XLSX, additional_admin_expenses=[])
+    )
+    assert generated is exported is preview
+    assert len(builds["builds"]) == 1
+
+    # Другие входные параметры или организация - отдельный отчет
+    ComprehensiveReportService.generate_comprehensive_report(None, organization_id, _request(utility_bills_amount=100))
+    ComprehensiveReportService.generate_comprehensive_report(None, uuid.uuid4(), _request())
+    assert len(builds["builds"]) == 3
+
+
+def test_data_change_produces_new_key(builds):
+    organization_id = uuid.uuid4()
+    first = ComprehensiveReportService.generate_comprehensive_report(None, organization_id, _request())
+
+    builds["version"] += 1
+    second = ComprehensiveReportService.generate_comprehensive_report(None, organization_id, _request())
+
+    assert second is not first
+    assert len(builds["builds"]) == 2
+    assert ComprehensiveReportService.generate_comprehensive_report(None, organization_id, _request()) is second
+
+
+def test_concurrent_requests_wait_for_one_build(builds, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def slow_build(cls, db, organization_id, request):
+        calls.append(organization_id)
+        release.wait(5)
+        return SimpleNamespace(build=len(calls))
+
+    monkeypatch.setattr(ComprehensiveReportService, "_build_report", classmethod(slow_build))
+    organization_id = uuid.uuid4()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [
+            pool.submit(ComprehensiveReportService.generate_comprehensive_report, None, organization_id, _request())
+            for _ in range(4)
+        ]
+        release.set()
+        reports = [future.result(5) for future in futures]
+
+    assert len(calls) == 1
+    assert all(report is reports[0] for report in reports)
+
+
+def _collected(session):
+    return session.info.get("report_organizations", set())
+
+
+def test_flush_collects_organizations_of_source_tables():
+    session = Session()
+    organization_id = uuid.uuid4()
+
+    session.add(Rental(id=uuid.uuid4(), organization_id=organization_id))
+    # Задачи в отчет не входят
+    session.add(Task(id=uuid.uuid4(), organization_id=uuid.uuid4()))
+    comprehensive_report_service._collect_report_changes(session, None, None)
+
+    assert _collected(session) == {organization_id}
+
+
+def _statement_state(model, statement, parameters=None, session=None):
+    return SimpleNamespace(
+        is_insert=statement.is_insert, is_update=statement.is_update, is_delete=statement.is_delete,
+        bind_mapper=model.__mapper__, session=session or SimpleNamespace(info={}),
+        parameters=parameters, statement=statement
+    )
+
+
+def test_bulk_statements_collect_organizations():
+    organization_id, other_id = uuid.uuid4(), uuid.uuid4()
+
+    # Вставка пачкой: организация из строк
+    state = _statement_state(Payroll, insert(Payroll), [{"organization_id": organization_id}, {"organization_id": other_id}])
+    comprehensive_report_service._collect_report_statements(state)
+    assert _collected(state.session) == {organization_id, other_id}
+
+    # Условие по организации
+    state = _statement_state(
+        DailyPropertyFact, delete(DailyPropertyFact).where(DailyPropertyFact.organization_id == organization_id)
+        .where(DailyPropertyFact.day >= START.date())
+    )
+    comprehensive_report_service._collect_report_statements(state)
+    assert _collected(state.session) == {organization_id}
+
+    # Обновление по первичному ключу: организации читаются по id
+    session = MagicMock(info={})
+    session.execute.return_value.scalars.return_value.all.return_value = [other_id]
+    state = _statement_state(Payroll, update(Payroll), [{"id": uuid.uuid4(), "net_amount": 1}], session)
+    comprehensive_report_service._collect_report_statements(state)
+    assert _collected(session) == {other_id}
+
+    # Организацию не определить - увеличиваются версии всех организаций
+    state = _statement_state(Rental, insert(Rental).values(paid_amount=1))
+    comprehensive_report_service._collect_report_statements(state)
+    assert _collected(state.session) == {ALL_ORGANIZATIONS}
+
+    state = _statement_state(Task, update(Task).where(Task.organization_id == organization_id).values(title="x"))
+    comprehensive_report_service._collect_report_statements(state)
+    assert _collected(state.session) == set()
+
+
+def _seed_rental(db):
+    organization_id = seed.organization(db)
+    property_ids = seed.properties(db, organization_id, 1)
+    client_ids = seed.clients(db, organization_id, 1)
+    rental_ids = seed.rentals(db, organization_id, property_ids, client_ids, 1)
+    return organization_id, rental_ids[0]
+
+
+def test_writes_bump_version_in_the_writing_transaction(pg_db):
+    organization_id, rental_id = _seed_rental(pg_db)
+    other_id, _ = _seed_rental(pg_db)
+    pg_db.commit()
+
+    version = ComprehensiveReportService.get_data_version
+    request = _request()
+    key = ComprehensiveReportService._cache_key(pg_db, organization_id, request)
+    other_version = version(pg_db, other_id)
+
+    # Запись со старым updated_at и тем же числом строк: водяной знак ее не видел
+    rental = pg_db.get(Rental, rental_id)
+    rental.paid_amount = (rental.paid_amount or 0) + 100
+    rental.updated_at = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    pg_db.commit()
+    changed_key = ComprehensiveReportService._cache_key(pg_db, organization_id, request)
+    assert changed_key != key
+
+    # Пакетный UPDATE ... WHERE organization_id
+    pg_db.execute(update(Rental).where(Rental.organization_id == organization_id).values(notes="bulk"))
+    pg_db.commit()
+    assert ComprehensiveReportService._cache_key(pg_db, organization_id, request) != changed_key
+
+    # Откат не меняет версию, изменения другой организации - тоже
+    current = version(pg_db, organization_id)
+    pg_db.execute(delete(Rental).where(Rental.id == rental_id))
+    pg_db.rollback()
+    assert version(pg_db, organization_id) == current
+    assert version(pg_db, other_id) == other_version
+
+
+def test_sections_share_the_request_snapshot(pg_engine):
+    """Раздел на своем соединении видит данные на момент снимка запроса"""
+    from models.database import SessionLocal
+    from models.models import Organization
+
+    def count_organizations(db, slug):
+        return db.query(Organization).filter(Organization.slug == slug).count()
+
+    slug = f"snapshot-{uuid.uuid4().hex[:12]}"
+    with SessionLocal() as reader:
+        reader.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        snapshot_id = ComprehensiveReportService._export_snapshot(reader)
+        assert snapshot_id
+
+        with SessionLocal() as writer:
+            organization_id = seed.organization(writer, slug)
+            writer.commit()
+        try:
+            assert ComprehensiveReportService._run_section(snapshot_id, count_organizations, slug) == 0
+            assert ComprehensiveReportService._run_section(None, count_organizations, slug) == 1
+        finally:
+            with SessionLocal() as writer:
+                writer.execute(delete(Organization).where(Organization.id == organization_id))
+                writer.commit()
@@ -0,0 +1,32 @@
+# backend/tests/test_document_cache.py
+from datetime import datetime, timedelta
+import os
+
+from fakes import FakeSession
+from models.extended_models import Document
+from services.document_render_service import DocumentRenderService
+
+
+def _cached_file(organization_id: str, key: str, age_days: int) -> str:
+    path = DocumentRenderService.cache_path(organization_id, key)
+    DocumentRenderService._write_atomic(path, b"%PDF-1.4")
+    mtime = (datetime.now() - timedelta(days=age_days)).timestamp()
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_cleanup_cache_keeps_signed_document_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(DocumentRenderService, "CACHE_DIR", str(tmp_path))
+    max_age = DocumentRenderService.CACHE_MAX_AGE_DAYS
+
+    signed = _cached_file("org", "a" * 64, max_age + 10)
+    stale = _cached_file("org", "b" * 64, max_age + 10)
+    fresh = _cached_file("org", "c" * 64, 1)
+
+    # Файл подписанного документа отдается по file_path без обновления mtime
+    db = FakeSession({Document: [(signed,)]})
+    assert DocumentRenderService.cleanup_cache(db) == 1
+
+    assert os.path.exists(signed)
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
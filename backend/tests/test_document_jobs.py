@@ -0,0 +1,57 @@
+# backend/tests/test_document_jobs.py
+from datetime import timedelta
+import uuid
+
+from models.extended_models import DocumentJob, DocumentType
+from services.document_job_service import DocumentJobService
+import seed
+
+
+class _RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, function, *args):
+        self.submitted.append(args)
+
+
+def _job(db, organization_id, user_id, status, started_at=None):
+    job = DocumentJob(
+        id=uuid.uuid4(),
+        organization_id=organization_id,
+        created_by=user_id,
+        document_type=DocumentType.CONTRACT,
+        rental_ids=[],
+        status=status,
+        started_at=started_at,
+        results=[]
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def test_recover_jobs_requeues_pending_and_fails_interrupted(pg_db, monkeypatch):
+    executor = _RecordingExecutor()
+    monkeypatch.setattr(DocumentJobService, "_executor", executor)
+
+    organization_id = seed.organization(pg_db)
+    user_id = seed.users(pg_db, organization_id, 1)[0]
+    before_start = DocumentJobService._process_started_at - timedelta(minutes=5)
+    after_start = DocumentJobService._process_started_at + timedelta(seconds=1)
+
+    pending = _job(pg_db, organization_id, user_id, "pending")
+    interrupted = _job(pg_db, organization_id, user_id, "running", started_at=before_start)
+    # Задание, начатое соседним процессом уже после нашего старта, не трогаем
+    live = _job(pg_db, organization_id, user_id, "running", started_at=after_start)
+    completed = _job(pg_db, organization_id, user_id, "completed", started_at=before_start)
+
+    assert DocumentJobService.recover_jobs(pg_db) == {"requeued": 1, "failed": 1}
+    assert executor.submitted == [(pending.id,)]
+
+    pg_db.expire_all()
+    assert interrupted.status == "failed"
+    assert interrupted.error and interrupted.finished_at
+    assert live.status == "running"
+    assert completed.status == "completed"
+    assert pending.status == "pending"
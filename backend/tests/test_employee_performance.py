@@ -0,0 +1,100 @@
+# backend/tests/test_employee_performance.py
+"""Отчет по сотрудникам одним запросом против прежнего расчета по каждому сотруднику"""
+from datetime import datetime, timezone
+import time
+
+import pytest
+from sqlalchemy import and_, desc
+
+from models.extended_models import Payroll, Task, TaskStatus
+from models.models import User
+from services.reports_service import ReportsService
+import seed
+
+START = datetime(2024, 3, 10, tzinfo=timezone.utc)
+END = datetime(2024, 9, 20, tzinfo=timezone.utc)
+
+
+def _legacy_report(db, organization_id, start_date, end_date):
+    """Прежняя реализация: задачи и зарплаты запрашиваются для каждого сотрудника"""
+    reports = {}
+    for employee in db.query(User).filter(User.organization_id == organization_id).all():
+        completed_tasks = db.query(Task).filter(
+            and_(
+                Task.assigned_to == employee.id,
+                Task.status == TaskStatus.COMPLETED,
+                Task.completed_at >= start_date,
+                Task.completed_at <= end_date
+            )
+        ).all()
+
+        completion_times = [task.actual_duration for task in completed_tasks if task.actual_duration is not None]
+        quality_ratings = [task.quality_rating for task in completed_tasks if task.quality_rating is not None]
+
+        payrolls = db.query(Payroll).filter(
+            and_(
+                Payroll.user_id == employee.id,
+                Payroll.organization_id == organization_id,
+                Payroll.is_paid == True,
+                Payroll.period_start < end_date,
+                Payroll.period_end > start_date
+            )
+        ).order_by(Payroll.period_start, desc(Payroll.net_amount)).all()
+
+        if len(payrolls) <= 2:
+            earnings = ReportsService._simple_earnings_calculation(payrolls, start_date, end_date)
+        else:
+            earnings = ReportsService._monthly_grouped_earnings_calculation(payrolls, start_date, end_date)
+        earnings += sum(task.payment_amount or 0 for task in completed_tasks if task.is_paid)
+
+        average_quality = sum(quality_ratings) / len(quality_ratings) if quality_ratings else None
+        reports[str(employee.id)] = {
+            "tasks_completed": len(completed_tasks),
+            "average_completion_time": sum(completion_times) / len(completion_times) if completion_times else None,
+            "quality_rating": round(average_quality, 2) if average_quality else None,
+            "earnings": round(earnings, 2)
+        }
+    return reports
+
+
+def _seed_organization(db, employees, tasks, payrolls_per_user):
+    organization_id = seed.organization(db)
+    user_ids = seed.users(db, organization_id, employees)
+    seed.tasks(db, organization_id, user_ids, tasks)
+    seed.payrolls(db, organization_id, user_ids, payrolls_per_user)
+    seed.analyze(db)
+    return organization_id
+
+
+def test_grouped_report_matches_per_employee_calculation(pg_db):
+    organization_id = _seed_organization(pg_db, 60, 3000, 8)
+    # Данные другой организации не должны попадать в отчет
+    _seed_organization(pg_db, 10, 500, 8)
+
+    expected = _legacy_report(pg_db, organization_id, START, END)
+    actual = ReportsService.generate_employee_performance_report(pg_db, organization_id, START, END)
+
+    assert {report.user_id for report in actual} == set(expected)
+    for report in actual:
+        reference = expected[report.user_id]
+        assert report.tasks_completed == reference["tasks_completed"]
+        for field in ["average_completion_time", "quality_rating"]:
+            if reference[field] is None:
+                assert getattr(report, field) is None
+            else:
+                assert getattr(report, field) == pytest.approx(reference[field], abs=0.01)
+        assert report.earnings == pytest.approx(reference["earnings"], abs=0.01)
+
+
+def test_employee_performance_benchmark_1k_employees_100k_tasks(pg_db):
+    organization_id = _seed_organization(pg_db, 1000, 100000, 6)
+
+    started = time.perf_counter()
+    legacy = _legacy_report(pg_db, organization_id, START, END)
+    legacy_elapsed = time.perf_counter() - started
+
+    elapsed = seed.timed(ReportsService.generate_employee_performance_report, pg_db, organization_id, START, END, repeat=3)
+    print(f"\nemployee performance, 1k employees x 100k tasks: per-employee {legacy_elapsed:.2f} s, grouped {elapsed:.2f} s")
+
+    assert len(legacy) == 1000
+    assert elapsed * 5 < legacy_elapsed
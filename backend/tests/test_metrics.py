@@ -0,0 +1,174 @@
+# backend/tests/test_metrics.py
+import asyncio
+import re
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from utils import metrics
+from utils.executor import run_blocking
+from utils.metrics import MetricsMiddleware, RequestStats, instrument_engine, render_metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _parse(body):
+    """Разбор текстового формата Prometheus: {(имя, метки): значение} и типы метрик"""
+    samples, types = {}, {}
+    for line in body.strip().splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+            continue
+        if line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        labels = tuple(sorted(LABEL.findall(match.group(3) or "")))
+        samples[(match.group(1), labels)] = float(match.group(4))
+    return samples, types
+
+
+def _value(samples, name, **labels):
+    return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine, "test")
+    return engine
+
+
+def _queries(engine, count):
+    with engine.connect() as connection:
+        for _ in range(count):
+            connection.execute(text("SELECT 1"))
+
+
+def _app(engine, **middleware):
+    app = FastAPI()
+
+    @app.get("/sync")
+    def sync_route():
+        _queries(engine, 3)
+        return {"ok": True}
+
+    @app.get("/blocking/{item_id}")
+    async def blocking_route(item_id: int):
+        await run_blocking(_queries, engine, item_id)
+        return {"ok": True}
+
+    app.add_middleware(MetricsMiddleware, **middleware)
+    return app
+
+
+async def _get(app, *paths):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        return [await client.get(path) for path in paths]
+
+
+def test_run_blocking_keeps_request_context():
+    async def main():
+        stats = RequestStats()
+        metrics._request_stats.set(stats)
+        return stats, await run_blocking(metrics._request_stats.get)
+
+    stats, seen = asyncio.run(main())
+    assert seen is stats
+
+
+def test_render_metrics_is_valid_exposition_format(engine):
+    _queries(engine, 2)
+    metrics.HTTP_LATENCY.observe("GET", 'path "quoted"', value=0.03)
+
+    samples, types = _parse(render_metrics())
+
+    assert types["http_requests_total"] == "counter"
+    assert types["http_request_duration_seconds"] == "histogram"
+    assert _value(samples, "db_queries_total", engine="test") >= 2
+
+    # Корзины гистограммы накопительные, +Inf совпадает с _count
+    labels = {"method": "GET", "route": 'path \\"quoted\\"'}
+    buckets = [
+        value for (name, label_pairs), value in samples.items()
+        if name == "http_request_duration_seconds_bucket" and set(labels.items()) <= set(label_pairs)
+    ]
+    assert buckets == sorted(buckets)
+    assert _value(samples, "http_request_duration_seconds_bucket", le="+Inf", **labels) == \
+        _value(samples, "http_request_duration_seconds_count", **labels) >= 1
+
+
+def test_middleware_counts_statements_per_request(engine):
+    before, _ = _parse(render_metrics())
+    responses = asyncio.run(_get(_app(engine, query_threshold=4), "/sync", "/blocking/5", "/blocking/2", "/missing"))
+    after, _ = _parse(render_metrics())
+
+    assert [response.status_code for response in responses] == [200, 200, 200, 404]
+
+    def delta(name, **labels):
+        return _value(after, name, **labels) - _value(before, name, **labels)
+
+    # SQL синхронного маршрута и маршрута через run_blocking учитывается в запросе
+    assert delta("http_request_db_queries_sum", route="/sync") == 3
+    assert delta("http_request_db_queries_sum", route="/blocking/{item_id}") == 7
+    assert delta("http_request_db_queries_count", route="/blocking/{item_id}") == 2
+    assert delta("http_requests_total", method="GET", route="/sync", status="200") == 1
+    assert delta("http_requests_total", method="GET", route="unmatched", status="404") == 1
+
+    # Порог 4: превышает только запрос с 5 выражениями
+    assert delta("http_request_db_query_threshold_exceeded_total", route="/blocking/{item_id}") == 1
+    assert delta("http_request_db_query_threshold_exceeded_total", route="/sync") == 0
+    assert _value(after, "http_requests_in_flight") == _value(before, "http_requests_in_flight")
+
+
+def test_disabled_middleware_passes_requests_through(engine, monkeypatch):
+    before, _ = _parse(render_metrics())
+    seen = []
+
+    async def blocking_stats():
+        seen.append(await run_blocking(metrics._request_stats.get))
+        return {"ok": True}
+
+    app = _app(engine, enabled=False)
+    app.get("/stats")(blocking_stats)
+    responses = asyncio.run(_get(app, "/sync", "/stats"))
+    after, _ = _parse(render_metrics())
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert seen == [None]
+    assert _value(after, "http_request_db_queries_count", route="/sync") == \
+        _value(before, "http_request_db_queries_count", route="/sync")
+    assert _value(after, "http_requests_total", method="GET", route="/sync", status="200") == \
+        _value(before, "http_requests_total", method="GET", route="/sync", status="200")
+
+    # Эндпоинт /metrics приложения при METRICS_ENABLED=false не отдает данные
+    import main
+    monkeypatch.setattr(main, "METRICS_ENABLED", False)
+    assert asyncio.run(_get(main.app, "/metrics"))[0].status_code == 404
+
+
+def test_metrics_endpoint_token(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "METRICS_ENABLED", True)
+    monkeypatch.setenv("METRICS_TOKEN", "secret")
+
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def scrape():
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            return (
+                await client.get("/metrics"),
+                await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+            )
+
+    denied, allowed = asyncio.run(scrape())
+    assert denied.status_code == 401
+    assert allowed.status_code == 200
+    samples, types = _parse(allowed.text)
+    assert types["db_pool_saturation"] == "gauge"
+    assert any(name == "db_pool_checked_out" for name, _ in samples)
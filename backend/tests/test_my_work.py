@@ -0,0 +1,272 @@
+# backend/tests/test_my_work.py
+"""Список "моя работа": ETag по счетчику изменений сотрудника и состав ответа"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import asyncio
+import uuid
+
+from fastapi import Response
+from sqlalchemy import delete, event
+
+from models.extended_models import (
+    OrderStatus, Rental, RentalType, RoomOrder, Task, TaskPriority, TaskStatus, TaskType, UserChangeCounter, UserRole
+)
+from models.models import Organization, UserStatus
+from routers import tasks as tasks_router
+from services.auth_service import AuthService
+from services.change_feed_service import ChangeFeedService
+from services.principal_cache_service import Principal
+from services.task_service import TaskService
+import seed
+
+
+def _principal(user_id, organization_id, role=UserRole.CLEANER):
+    return Principal(
+        id=user_id, email="staff@example.com", role=role,
+        status=UserStatus.ACTIVE, organization_id=organization_id, organization_status=None
+    )
+
+
+def _get_my_work(principal, db, if_none_match=None, completed_days=0):
+    """Вызов маршрута; возвращает ответ 304 или (заголовки, тело)"""
+    request = SimpleNamespace(headers={"if-none-match": if_none_match} if if_none_match else {})
+    response = Response()
+
+    async def call():
+        return await tasks_router.get_my_work(
+            request, response, completed_days=completed_days, current_user=principal, db=db
+        )
+
+    result = asyncio.run(call())
+    if isinstance(result, Response):
+        return result
+    return response.headers, result
+
+
+def test_matching_etag_returns_304_without_reading_work(monkeypatch):
+    state = {"version": 3, "reads": []}
+
+    async def get_version(db, user_id):
+        return state["version"]
+
+    async def get_cursor(db, organization_id):
+        state["reads"].append("cursor")
+        return 42
+
+    async def get_work(db, user_id, organization_id, completed_since=None):
+        state["reads"].append("work")
+        return {"tasks": [], "orders": []}
+
+    monkeypatch.setattr(ChangeFeedService, "get_user_version_async", staticmethod(get_version))
+    monkeypatch.setattr(ChangeFeedService, "get_cursor_async", staticmethod(get_cursor))
+    monkeypatch.setattr(TaskService, "get_my_work_async", staticmethod(get_work))
+    principal = _principal(uuid.uuid4(), uuid.uuid4())
+
+    headers, body = _get_my_work(principal, None)
+    etag = headers["etag"]
+    assert body == {"version": 3, "cursor": 42, "tasks": [], "orders": []}
+    assert state["reads"] == ["cursor", "work"]
+
+    # Совпадение в списке If-None-Match: 304 без чтения курсора и данных
+    not_modified = _get_my_work(principal, None, f'W/"other", {etag}')
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert state["reads"] == ["cursor", "work"]
+
+    # Окно завершенных входит в ETag
+    headers, _ = _get_my_work(principal, None, etag, completed_days=7)
+    assert headers["etag"] != etag
+
+    # Новая версия сотрудника - старый ETag не совпадает
+    state["version"] += 1
+    headers, body = _get_my_work(principal, None, etag)
+    assert headers["etag"] != etag and body["version"] == 4
+
+
+def _my_work(principal):
+    """Маршрут на асинхронной сессии тестовой базы"""
+    from models.database import AsyncSessionLocal, async_engine
+
+    async def call(if_none_match):
+        request = SimpleNamespace(headers={"if-none-match": if_none_match} if if_none_match else {})
+        response = Response()
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await tasks_router.get_my_work(
+                    request, response, completed_days=0, current_user=principal, db=db
+                )
+        finally:
+            await async_engine.dispose()
+        if isinstance(result, Response):
+            return result.status_code, result.headers["etag"], None
+        return 200, response.headers["etag"], result
+
+    return lambda if_none_match=None: asyncio.run(call(if_none_match))
+
+
+def _seed_work(db, now):
+    """Сотрудник с задачами в помещении с гостем и в пустом помещении, заказ в номер"""
+    organization_id = seed.organization(db)
+    staff_id, other_id = seed.users(db, organization_id, 2)
+    occupied_id, empty_id = seed.properties(db, organization_id, 2)
+    guest_id, later_guest_id = seed.clients(db, organization_id, 2)
+
+    rental_ids = seed._insert(db, Rental, [
+        {
+            "organization_id": organization_id, "property_id": occupied_id, "client_id": client_id,
+            "rental_type": RentalType.DAILY, "start_date": start, "end_date": start + timedelta(days=2),
+            "rate": 100.0, "total_amount": 200.0, "is_active": True
+        }
+        # Завершенная, текущая и следующая аренды: в ответ попадает текущая
+        for client_id, start in [
+            (later_guest_id, now - timedelta(days=10)),
+            (guest_id, now - timedelta(days=1)),
+            (later_guest_id, now + timedelta(days=3))
+        ]
+    ])
+    task_ids = seed._insert(db, Task, [
+        {
+            "organization_id": organization_id, "property_id": property_id, "assigned_to": staff_id,
+            "title": title, "task_type": TaskType.CLEANING, "status": task_status,
+            "priority": TaskPriority.MEDIUM, "payment_amount": 0.0
+        }
+        for property_id, title, task_status in [
+            (occupied_id, "Occupied", TaskStatus.ASSIGNED),
+            (empty_id, "Empty", TaskStatus.IN_PROGRESS),
+            (empty_id, "Done", TaskStatus.COMPLETED)
+        ]
+    ])
+    seed._insert(db, RoomOrder, [{
+        "organization_id": organization_id, "property_id": occupied_id, "client_id": guest_id,
+        "rental_id": rental_ids[1], "assigned_to": staff_id, "order_number": f"ORD-{uuid.uuid4().hex[:10]}",
+        "title": "Breakfast", "order_type": "food", "status": OrderStatus.CONFIRMED, "total_amount": 10.0
+    }])
+    return {
+        "organization_id": organization_id, "staff_id": staff_id, "other_id": other_id,
+        "occupied_id": occupied_id, "guest_id": guest_id, "rental_id": rental_ids[1], "task_ids": task_ids
+    }
+
+
+def _delete_organization(organization_id):
+    from models.database import SessionLocal
+
+    with SessionLocal() as db:
+        db.execute(delete(Organization).where(Organization.id == organization_id))
+        db.commit()
+
+
+def test_my_work_returns_property_rental_and_guest_in_three_queries(pg_engine):
+    from models.database import AsyncSessionLocal, SessionLocal, async_engine
+
+    with SessionLocal() as db:
+        data = _seed_work(db, datetime.now(timezone.utc))
+        db.commit()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def read():
+        try:
+            async with AsyncSessionLocal() as db:
+                event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+                try:
+                    return await TaskService.get_my_work_async(db, data["staff_id"], data["organization_id"])
+                finally:
+                    event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+        finally:
+            await async_engine.dispose()
+
+    try:
+        work = asyncio.run(read())
+    finally:
+        _delete_organization(data["organization_id"])
+
+    assert len([statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]) == 3
+
+    tasks = {task["title"]: task for task in work["tasks"]}
+    assert set(tasks) == {"Occupied", "Empty"}
+    occupied = tasks["Occupied"]
+    assert occupied["property"]["id"] == str(data["occupied_id"])
+    assert occupied["rental"]["id"] == str(data["rental_id"])
+    assert occupied["rental"]["guest"] == {"id": str(data["guest_id"]), "name": "Client 0", "phone": None}
+    assert tasks["Empty"]["property"] and tasks["Empty"]["rental"] is None
+
+    [order] = work["orders"]
+    assert order["property"]["id"] == str(data["occupied_id"])
+    assert order["client"]["id"] == str(data["guest_id"])
+
+
+def test_etag_changes_after_assign_complete_and_cancel(pg_engine, monkeypatch):
+    from models.database import SessionLocal
+
+    monkeypatch.setattr(AuthService, "log_user_action", staticmethod(lambda *args, **kwargs: None))
+    with SessionLocal() as db:
+        data = _seed_work(db, datetime.now(timezone.utc))
+        db.commit()
+
+    organization_id, staff_id, other_id = data["organization_id"], data["staff_id"], data["other_id"]
+    occupied_id, empty_id, _ = data["task_ids"]
+    staff = _my_work(_principal(staff_id, organization_id))
+    other = _my_work(_principal(other_id, organization_id))
+
+    try:
+        status_code, etag, body = staff()
+        assert status_code == 200 and body["version"] == 0
+        assert staff(etag)[0] == 304
+        _, other_etag, _ = other()
+
+        # Переназначение меняет ETag и прежнего, и нового исполнителя
+        with SessionLocal() as db:
+            TaskService.assign_task(db, occupied_id, other_id, organization_id)
+        status_code, assigned_etag, body = staff(etag)
+        assert status_code == 200 and assigned_etag != etag
+        assert [task["title"] for task in body["tasks"]] == ["Empty"]
+        status_code, _, body = other(other_etag)
+        assert status_code == 200 and [task["title"] for task in body["tasks"]] == ["Occupied"]
+
+        with SessionLocal() as db:
+            TaskService.complete_task(db, empty_id, staff_id, organization_id)
+        status_code, completed_etag, body = staff(assigned_etag)
+        assert status_code == 200 and completed_etag != assigned_etag
+        assert body["tasks"] == []
+        assert staff(completed_etag)[0] == 304
+
+        # Отмена через маршрут
+        _, other_etag, _ = other()
+        with SessionLocal() as db:
+            manager = _principal(uuid.uuid4(), organization_id, UserRole.MANAGER)
+            asyncio.run(tasks_router.cancel_task(occupied_id, reason="duplicate", current_user=manager, db=db))
+        status_code, cancelled_etag, body = other(other_etag)
+        assert status_code == 200 and cancelled_etag != other_etag and body["tasks"] == []
+
+        # Изменения другого сотрудника не сбрасывают ETag
+        assert staff(completed_etag)[0] == 304
+    finally:
+        _delete_organization(organization_id)
+
+
+def _versions(db, user_ids):
+    rows = db.query(UserChangeCounter.user_id, UserChangeCounter.version).filter(
+        UserChangeCounter.user_id.in_(user_ids)
+    ).all()
+    return dict(rows)
+
+
+def test_publish_bumps_each_affected_user_once(pg_db):
+    organization_id = seed.organization(pg_db)
+    first, second, idle = seed.users(pg_db, organization_id, 3)
+
+    ChangeFeedService.publish(pg_db, organization_id, "task", uuid.uuid4(), "assigned", [first, first, None], {})
+    assert _versions(pg_db, [first, second, idle]) == {first: 1}
+
+    # Пачка событий увеличивает счетчик сотрудника один раз
+    ChangeFeedService.publish_many(pg_db, organization_id, [
+        ("task", uuid.uuid4(), "assigned", [first, second], {}),
+        ("order", uuid.uuid4(), "updated", [second, None], {})
+    ])
+    assert _versions(pg_db, [first, second, idle]) == {first: 2, second: 1}
+
+    ChangeFeedService.publish(pg_db, organization_id, "task", uuid.uuid4(), "created", [None], {})
+    assert _versions(pg_db, [first, second, idle]) == {first: 2, second: 1}
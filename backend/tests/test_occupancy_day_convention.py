@@ -0,0 +1,107 @@
+# backend/tests/test_occupancy_day_convention.py
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import random
+import uuid
+
+import pytest
+
+from models.extended_models import Rental
+from services.occupancy_service import OccupancyService
+from services.report_facts_service import ReportFactsService
+from fakes import FakeSession
+
+RentalRow = namedtuple("RentalRow", "property_id start_date end_date paid_amount")
+
+UTC = timezone.utc
+
+
+def _live_stats(monkeypatch, rentals, start, end):
+    monkeypatch.setattr(ReportFactsService, "get_property_stats", staticmethod(lambda *args, **kwargs: None))
+    return OccupancyService.calculate_property_stats(FakeSession({Rental: rentals}), uuid.uuid4(), start, end)
+
+
+def _fact_stats(rentals, start, end):
+    start_day, end_day = ReportFactsService._to_day(start), ReportFactsService._to_day(end)
+    facts = ReportFactsService._compute_facts(FakeSession({Rental: rentals}), uuid.uuid4(), start_day, end_day)
+
+    stats = {}
+    for (property_id, day), values in facts.items():
+        entry = stats.setdefault(property_id, {"occupied_days": 0, "revenue": 0.0})
+        entry["occupied_days"] += 1 if values["occupied"] else 0
+        entry["revenue"] += values["rental_revenue"]
+    return stats
+
+
+def _overlapping(rentals, start, end):
+    window_start, window_end = ReportFactsService.day_window(start, end)
+    return [r for r in rentals if r.start_date < window_end and r.end_date >= window_start]
+
+
+@pytest.mark.parametrize("start_date, end_date, nights", [
+    # 1 ночь: заезд 14:00, выезд 11:00 следующего дня
+    (datetime(2024, 1, 1, 14, tzinfo=UTC), datetime(2024, 1, 2, 11, tzinfo=UTC), 1),
+    (datetime(2024, 1, 1, 14, tzinfo=UTC), datetime(2024, 1, 3, 12, tzinfo=UTC), 2),
+    # Аренда в пределах одного дня занимает этот день
+    (datetime(2024, 1, 5, 9, tzinfo=UTC), datetime(2024, 1, 5, 18, tzinfo=UTC), 1)
+])
+def test_occupied_days_are_nights(monkeypatch, start_date, end_date, nights):
+    property_id = uuid.uuid4()
+    rentals = [RentalRow(property_id, start_date, end_date, 300.0)]
+    start, end = datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 31, tzinfo=UTC)
+
+    live = _live_stats(monkeypatch, rentals, start, end)
+    facts = _fact_stats(rentals, start, end)
+
+    assert live[property_id]["occupied_days"] == facts[property_id]["occupied_days"] == nights
+    assert live[property_id]["revenue"] == pytest.approx(facts[property_id]["revenue"]) == pytest.approx(300.0)
+
+
+def test_check_out_day_is_not_occupied(monkeypatch):
+    """Выручка делится по ночам; аренда, закончившаяся в первый день периода, его не занимает"""
+    property_id = uuid.uuid4()
+    rentals = [
+        RentalRow(property_id, datetime(2024, 1, 28, 14, tzinfo=UTC), datetime(2024, 2, 1, 11, tzinfo=UTC), 400.0),
+        RentalRow(property_id, datetime(2024, 2, 3, 14, tzinfo=UTC), datetime(2024, 2, 5, 11, tzinfo=UTC), 200.0)
+    ]
+
+    start, end = datetime(2024, 2, 1, tzinfo=UTC), datetime(2024, 2, 29, tzinfo=UTC)
+    live = _live_stats(monkeypatch, rentals, start, end)
+    facts = _fact_stats(rentals, start, end)
+    assert live[property_id]["occupied_days"] == facts[property_id]["occupied_days"] == 2
+    assert live[property_id]["revenue"] == pytest.approx(facts[property_id]["revenue"]) == pytest.approx(200.0)
+
+    start, end = datetime(2024, 1, 30, tzinfo=UTC), datetime(2024, 1, 31, tzinfo=UTC)
+    live = _live_stats(monkeypatch, rentals[:1], start, end)
+    assert live[property_id]["occupied_days"] == 2
+    assert live[property_id]["revenue"] == pytest.approx(200.0)
+
+    start, end = datetime(2024, 2, 1, tzinfo=UTC), datetime(2024, 2, 2, tzinfo=UTC)
+    assert _live_stats(monkeypatch, rentals[:1], start, end) == {}
+    assert _fact_stats(rentals[:1], start, end) == {}
+
+
+def test_live_and_fact_paths_agree(monkeypatch):
+    rng = random.Random(7)
+    properties = [uuid.uuid4() for _ in range(5)]
+    base = datetime(2024, 3, 1, tzinfo=UTC)
+
+    for _ in range(50):
+        rentals = []
+        for property_id in properties:
+            for _ in range(rng.randint(0, 4)):
+                start_date = base + timedelta(hours=rng.randint(-24 * 20, 24 * 40))
+                end_date = start_date + timedelta(hours=rng.randint(1, 24 * 10))
+                rentals.append(RentalRow(property_id, start_date, end_date, float(rng.choice([0, 1000, 2500]))))
+
+        start = base + timedelta(days=rng.randint(0, 10), hours=rng.randint(0, 23))
+        end = start + timedelta(days=rng.randint(0, 20), hours=rng.randint(0, 23))
+        rentals = sorted(_overlapping(rentals, start, end), key=lambda r: (str(r.property_id), r.start_date))
+
+        live = _live_stats(monkeypatch, rentals, start, end)
+        facts = {k: v for k, v in _fact_stats(rentals, start, end).items()}
+
+        assert set(live) == set(facts)
+        for property_id, entry in live.items():
+            assert entry["occupied_days"] == facts[property_id]["occupied_days"]
+            assert entry["revenue"] == pytest.approx(facts[property_id]["revenue"])
@@ -0,0 +1,76 @@
+# backend/tests/test_order_change_feed.py
+from unittest.mock import MagicMock
+import uuid
+
+from sqlalchemy import Column, Integer, create_engine, insert
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from models.extended_models import OrderStatus, RoomOrder
+from schemas.order import RoomOrderUpdate
+from services.auth_service import AuthService
+from services.change_feed_service import ChangeFeedService
+from services.order_service import OrderService
+from services.workload_index_service import WorkloadIndexService
+
+
+def _capture(monkeypatch):
+    published, indexed = [], []
+    monkeypatch.setattr(
+        ChangeFeedService, "order_changed",
+        classmethod(lambda cls, db, order, action, previous_assignee=None: published.append(
+            (order.assigned_to, order.status, action, previous_assignee)
+        ))
+    )
+    monkeypatch.setattr(
+        WorkloadIndexService, "order_changed",
+        classmethod(lambda cls, order, previous_assignee=None, previous_status=None: indexed.append(
+            (previous_assignee, previous_status)
+        ))
+    )
+    return published, indexed
+
+
+def test_update_order_publishes_reassignment(monkeypatch):
+    published, indexed = _capture(monkeypatch)
+    old_executor, new_executor = uuid.uuid4(), uuid.uuid4()
+    order = RoomOrder(id=uuid.uuid4(), organization_id=uuid.uuid4(), assigned_to=old_executor, status=OrderStatus.CONFIRMED)
+
+    OrderService.update_order(MagicMock(), order, RoomOrderUpdate(assigned_to=str(new_executor)), uuid.uuid4())
+
+    assert published == [(new_executor, OrderStatus.CONFIRMED, "updated", old_executor)]
+    assert indexed == [(old_executor, OrderStatus.CONFIRMED)]
+
+
+def test_update_order_publishes_status_transition(monkeypatch):
+    published, _ = _capture(monkeypatch)
+    executor = uuid.uuid4()
+    order = RoomOrder(id=uuid.uuid4(), organization_id=uuid.uuid4(), assigned_to=executor, status=OrderStatus.CONFIRMED)
+
+    OrderService.update_order(MagicMock(), order, RoomOrderUpdate(status=OrderStatus.IN_PROGRESS), uuid.uuid4())
+
+    assert published == [(executor, OrderStatus.IN_PROGRESS, "updated", executor)]
+
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+    id = Column(Integer, primary_key=True)
+
+
+def test_commit_pending_keeps_flushed_writes():
+    """Изменения, уже сброшенные flush/execute (публикация в ленту), коммитятся аудитом"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with Session() as db:
+        db.add(Item(id=1))
+        db.flush()
+        db.execute(insert(Item).values(id=2))
+        assert not (db.new or db.dirty)
+        AuthService._commit_pending(db)
+
+    with Session() as db:
+        assert db.query(Item).count() == 2
@@ -0,0 +1,82 @@
+# backend/tests/test_partition_service.py
+from datetime import date, datetime, timedelta, timezone
+import logging
+
+from sqlalchemy import insert, text
+
+from models.models import LoginAttempt
+from services.partition_service import PartitionService
+
+TABLE = "audit.login_attempts"
+
+
+def _current_month() -> date:
+    return PartitionService._month_start(datetime.now(timezone.utc))
+
+
+def _attempt(db, created_at: datetime):
+    db.execute(insert(LoginAttempt).values(email="user@example.com", success=False, created_at=created_at))
+
+
+def _rows_in(db, partition_name: str) -> int:
+    return db.execute(text(f'SELECT count(*) FROM audit."{partition_name}"')).scalar()
+
+
+def test_month_arithmetic():
+    assert PartitionService._add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert PartitionService._add_months(date(2024, 1, 1), -13) == date(2022, 12, 1)
+    # Начало месяца считается в UTC
+    local = datetime(2024, 3, 1, 1, 30, tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-5)))
+    assert PartitionService._month_start(local) == date(2024, 3, 1)
+
+
+def test_ensure_partitions_creates_months_ahead_and_default(pg_db):
+    current = _current_month()
+    PartitionService.ensure_partitions(pg_db, months_ahead=2)
+
+    partitions = PartitionService.list_partitions(pg_db, TABLE)
+    for offset in range(3):
+        assert PartitionService._add_months(current, offset) in partitions
+    assert PartitionService._default_partition(pg_db, TABLE) == "login_attempts_default"
+
+    # Повторный вызов ничего не создает
+    assert PartitionService.ensure_partitions(pg_db, months_ahead=2) == []
+
+
+def test_rows_outside_partitions_go_to_default_and_move_to_new_month(pg_db, caplog):
+    PartitionService.ensure_partitions(pg_db)
+    old_month = PartitionService._add_months(_current_month(), -30)
+    old_time = datetime(old_month.year, old_month.month, 15, tzinfo=timezone.utc)
+
+    _attempt(pg_db, old_time)
+    assert _rows_in(pg_db, "login_attempts_default") == 1
+
+    with caplog.at_level(logging.WARNING, logger="services.partition_service"):
+        PartitionService.ensure_partitions(pg_db)
+    assert "default partition" in caplog.text
+
+    partition_name = PartitionService.create_partition(pg_db, TABLE, old_month)
+    assert _rows_in(pg_db, partition_name) == 1
+    assert _rows_in(pg_db, "login_attempts_default") == 0
+    assert PartitionService.default_partition_range(pg_db, TABLE) is None
+
+
+def test_drop_expired_partitions_respects_retention(pg_db, monkeypatch):
+    current = _current_month()
+    retention = 3
+    monkeypatch.setitem(PartitionService.TABLES, TABLE, (LoginAttempt, retention))
+    PartitionService.ensure_partitions(pg_db)
+
+    expired = PartitionService._add_months(current, -retention - 1)
+    kept = PartitionService._add_months(current, -retention)
+    for month in [expired, kept]:
+        PartitionService.create_partition(pg_db, TABLE, month)
+        _attempt(pg_db, datetime(month.year, month.month, 10, tzinfo=timezone.utc))
+
+    dropped = PartitionService.drop_expired_partitions(pg_db)
+
+    assert f"audit.login_attempts_p{expired:%Y_%m}" in dropped
+    partitions = PartitionService.list_partitions(pg_db, TABLE)
+    assert expired not in partitions
+    assert kept in partitions and current in partitions
+    assert PartitionService._default_partition(pg_db, TABLE)
@@ -0,0 +1,92 @@
+# backend/tests/test_payment_report_facts.py
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import uuid
+
+from models.extended_models import OrderStatus
+from models.order_payment_models import OrderPaymentStatus
+from models.payment_models import PaymentStatus, PaymentType
+from services.change_feed_service import ChangeFeedService
+from services.order_payment_service import OrderPaymentService
+from services.payment_service import PaymentService
+from services.report_facts_service import ReportFactsService
+from services.workload_index_service import WorkloadIndexService
+
+
+def _session(events, row):
+    """Сессия, которая отдает row на любой запрос и записывает коммиты"""
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = row
+    db.commit.side_effect = lambda: events.append("commit")
+    return db
+
+
+def _capture_sync(monkeypatch, events):
+    monkeypatch.setattr(
+        ReportFactsService, "sync_days",
+        staticmethod(lambda db, organization_id, start, end: events.append(("sync_days", organization_id, start, end)))
+    )
+    monkeypatch.setattr(ChangeFeedService, "order_changed", classmethod(lambda cls, *args, **kwargs: None))
+    monkeypatch.setattr(WorkloadIndexService, "order_changed", classmethod(lambda cls, *args, **kwargs: None))
+
+
+def test_complete_payment_syncs_rental_days_after_commit(monkeypatch):
+    events = []
+    _capture_sync(monkeypatch, events)
+    rental = SimpleNamespace(
+        organization_id=uuid.uuid4(),
+        start_date=datetime(2024, 3, 1, 14, tzinfo=timezone.utc),
+        end_date=datetime(2024, 3, 4, 12, tzinfo=timezone.utc),
+        paid_amount=100.0,
+        client=None
+    )
+    payment = SimpleNamespace(
+        status=PaymentStatus.PENDING, payment_type=PaymentType.ADDITIONAL,
+        amount=50.0, rental=rental, completed_at=None
+    )
+
+    PaymentService.complete_payment(_session(events, payment), uuid.uuid4())
+
+    assert rental.paid_amount == 150.0
+    assert events == ["commit", ("sync_days", rental.organization_id, rental.start_date, rental.end_date)]
+
+
+def test_sale_payment_syncs_order_day_after_commit(monkeypatch):
+    events = []
+    _capture_sync(monkeypatch, events)
+    order = SimpleNamespace(
+        id=uuid.uuid4(), organization_id=uuid.uuid4(), order_number="ORD-1", total_amount=30.0,
+        is_paid=False, status=OrderStatus.IN_PROGRESS, assigned_to=None,
+        created_at=datetime(2024, 3, 2, 9, tzinfo=timezone.utc)
+    )
+
+    OrderPaymentService.process_sale_payment(_session(events, order), order.id, {"amount": 30.0}, order.organization_id)
+
+    assert order.is_paid
+    assert events == ["commit", ("sync_days", order.organization_id, order.created_at, order.created_at)]
+
+
+def test_order_payment_syncs_only_when_completed(monkeypatch):
+    events = []
+    _capture_sync(monkeypatch, events)
+    order = SimpleNamespace(
+        id=uuid.uuid4(), organization_id=uuid.uuid4(), order_number="ORD-2", is_paid=False,
+        created_at=datetime(2024, 3, 2, 9, tzinfo=timezone.utc)
+    )
+    db = _session(events, order)
+
+    OrderPaymentService.create_order_payment(
+        db, order.id, 30.0, "cash", auto_complete=False, organization_id=order.organization_id
+    )
+    assert events == ["commit"]
+
+    payment = SimpleNamespace(status=OrderPaymentStatus.PENDING, order=order)
+    db.query.return_value.filter.return_value.first.side_effect = [order, payment]
+    events.clear()
+
+    OrderPaymentService.create_order_payment(
+        db, order.id, 30.0, "cash", auto_complete=True, organization_id=order.organization_id
+    )
+    assert order.is_paid
+    assert events == ["commit", ("sync_days", order.organization_id, order.created_at, order.created_at)]
@@ -0,0 +1,221 @@
+# backend/tests/test_payroll_generation.py
+"""Зарплаты организации одним набором запросов против прежнего расчета по шаблонам"""
+from datetime import datetime, timezone
+import time
+import uuid
+
+import pytest
+from sqlalchemy import and_, insert, or_
+
+from models.extended_models import Payroll, PayrollType, Task, TaskStatus
+from models.payroll_operation import PayrollOperation, PayrollOperationType
+from models.payroll_template import PayrollTemplate, PayrollTemplateStatus
+from services.payroll_extended_service import PayrollExtendedService
+import seed
+
+YEAR, MONTH = 2024, 5
+INCOME_OPERATIONS = [PayrollOperationType.ALLOWANCE, PayrollOperationType.COMMISSION, PayrollOperationType.HOLIDAY_PAY]
+
+
+def _legacy_payrolls(db, organization_id, year, month):
+    """Прежняя реализация: для каждого шаблона отдельные запросы зарплаты, задач и операций"""
+    period_start, period_end = PayrollExtendedService._month_period(year, month)
+    templates = db.query(PayrollTemplate).filter(
+        and_(
+            PayrollTemplate.organization_id == organization_id,
+            PayrollTemplate.status == PayrollTemplateStatus.ACTIVE,
+            PayrollTemplate.effective_from <= period_start,
+            or_(
+                PayrollTemplate.effective_until.is_(None),
+                PayrollTemplate.effective_until >= period_end
+            )
+        )
+    ).all()
+
+    payrolls = {}
+    for template in templates:
+        existing = db.query(Payroll).filter(
+            and_(
+                Payroll.user_id == template.user_id,
+                Payroll.period_start == period_start,
+                Payroll.period_end == period_end
+            )
+        ).first()
+        if existing or template.user_id in payrolls:
+            continue
+
+        tasks_completed, tasks_payment = 0, 0
+        if template.include_task_payments:
+            completed_tasks = db.query(Task).filter(
+                and_(
+                    Task.assigned_to == template.user_id,
+                    Task.status == TaskStatus.COMPLETED,
+                    Task.completed_at >= period_start,
+                    Task.completed_at <= period_end,
+                    Task.is_paid == True
+                )
+            ).all()
+            tasks_completed = len(completed_tasks)
+            tasks_payment = sum((task.payment_amount or 0) + (template.task_payment_rate or 0) for task in completed_tasks)
+
+        operations = db.query(PayrollOperation).filter(
+            and_(
+                PayrollOperation.user_id == template.user_id,
+                PayrollOperation.apply_to_period_start <= period_end,
+                PayrollOperation.apply_to_period_end >= period_start,
+                PayrollOperation.is_applied == False
+            )
+        ).all()
+
+        def total(types, signed=True):
+            return sum(op.amount if signed else abs(op.amount) for op in operations if op.operation_type in types)
+
+        allowances = sum((template.automatic_allowances or {}).values())
+        overtime = total([PayrollOperationType.OVERTIME])
+        other_income = total(INCOME_OPERATIONS)
+        bonus = total([PayrollOperationType.BONUS])
+        gross = template.base_rate + tasks_payment + allowances + bonus + overtime + other_income
+        deductions = (
+            sum((template.automatic_deductions or {}).values())
+            + total([PayrollOperationType.PENALTY], signed=False)
+            + total([PayrollOperationType.DEDUCTION], signed=False)
+        )
+        taxes = gross * template.tax_rate + gross * template.social_rate
+
+        payrolls[template.user_id] = {
+            "tasks_completed": tasks_completed,
+            "tasks_payment": tasks_payment,
+            "bonus": bonus,
+            "other_income": allowances + overtime + other_income,
+            "deductions": deductions,
+            "taxes": taxes,
+            "gross_amount": gross,
+            "net_amount": max(0, gross - deductions - taxes),
+            "operation_ids": {op.id for op in operations}
+        }
+    return payrolls
+
+
+def _seed_organization(db, employees, tasks, operations, seed_value=0):
+    organization_id = seed.organization(db)
+    user_ids = seed.users(db, organization_id, employees)
+    seed.tasks(db, organization_id, user_ids, tasks, seed=seed_value)
+    seed.payroll_templates(db, organization_id, user_ids, seed=seed_value)
+    seed.payroll_operations(db, organization_id, user_ids, user_ids[0], operations, seed=seed_value)
+    seed.analyze(db)
+    return organization_id, user_ids
+
+
+def _period_payrolls(db, organization_id):
+    period_start, _ = PayrollExtendedService._month_period(YEAR, MONTH)
+    return {
+        payroll.user_id: payroll
+        for payroll in db.query(Payroll).filter(
+            and_(
+                Payroll.organization_id == organization_id,
+                Payroll.period_start == period_start,
+                Payroll.generated_from_template == True
+            )
+        ).all()
+    }
+
+
+def test_bulk_generation_matches_per_template_calculation(pg_db):
+    organization_id, user_ids = _seed_organization(pg_db, 40, 4000, 400)
+    # Уже созданная зарплата за период не пересоздается
+    period_start, period_end = PayrollExtendedService._month_period(YEAR, MONTH)
+    pg_db.execute(insert(Payroll).values(
+        organization_id=organization_id, user_id=user_ids[1], period_start=period_start, period_end=period_end,
+        payroll_type=PayrollType.MONTHLY_SALARY, gross_amount=1, net_amount=1
+    ))
+    _seed_organization(pg_db, 10, 1000, 100, seed_value=1)
+
+    expected = _legacy_payrolls(pg_db, organization_id, YEAR, MONTH)
+    assert user_ids[1] not in expected
+
+    result = PayrollExtendedService.generate_monthly_payrolls_bulk(pg_db, organization_id, YEAR, MONTH)
+    assert result["payrolls_created"] == len(expected)
+
+    actual = _period_payrolls(pg_db, organization_id)
+    assert set(actual) == set(expected)
+    for user_id, reference in expected.items():
+        payroll = actual[user_id]
+        assert payroll.tasks_completed == reference["tasks_completed"]
+        for field in ["tasks_payment", "bonus", "other_income", "deductions", "taxes", "gross_amount", "net_amount"]:
+            assert getattr(payroll, field) == pytest.approx(reference[field], abs=0.01), field
+
+        applied = pg_db.query(PayrollOperation.id).filter(PayrollOperation.payroll_id == payroll.id).all()
+        assert {row.id for row in applied} == reference["operation_ids"]
+
+    # Повторный запуск ничего не создает
+    assert PayrollExtendedService.generate_monthly_payrolls_bulk(pg_db, organization_id, YEAR, MONTH)["payrolls_created"] == 0
+
+
+def test_dry_run_previews_without_writing(pg_db):
+    organization_id, _ = _seed_organization(pg_db, 20, 1000, 100)
+    expected = _legacy_payrolls(pg_db, organization_id, YEAR, MONTH)
+
+    preview = PayrollExtendedService.generate_monthly_payrolls_bulk(pg_db, organization_id, YEAR, MONTH, dry_run=True)
+
+    assert preview["payrolls_created"] == 0 and preview["payroll_ids"] == []
+    assert {uuid.UUID(row["user_id"]) for row in preview["payrolls"]} == set(expected)
+    assert preview["total_net"] == pytest.approx(sum(row["net_amount"] for row in expected.values()), abs=0.01)
+    assert _period_payrolls(pg_db, organization_id) == {}
+    assert pg_db.query(PayrollOperation).filter(PayrollOperation.payroll_id.isnot(None)).count() == 0
+
+
+def test_payroll_generation_benchmark_300_employees(pg_db):
+    organization_id, _ = _seed_organization(pg_db, 300, 30000, 3000)
+
+    started = time.perf_counter()
+    legacy = _legacy_payrolls(pg_db, organization_id, YEAR, MONTH)
+    legacy_elapsed = time.perf_counter() - started
+
+    elapsed = seed.timed(
+        PayrollExtendedService.generate_monthly_payrolls_bulk, pg_db, organization_id, YEAR, MONTH, dry_run=True, repeat=3
+    )
+    print(f"\npayroll generation, 300 employees: per template {legacy_elapsed:.3f} s (reads only), bulk {elapsed:.3f} s")
+
+    assert legacy
+    assert elapsed * 3 < legacy_elapsed
+
+
+def _operation(operation_type, amount):
+    return PayrollOperation(id=uuid.uuid4(), operation_type=operation_type, amount=amount)
+
+
+def test_compute_payroll_totals():
+    template = PayrollTemplate(
+        id=uuid.uuid4(), organization_id=uuid.uuid4(), user_id=uuid.uuid4(),
+        payroll_type=PayrollType.MONTHLY_SALARY, base_rate=1000.0,
+        automatic_allowances={"transport": 100.0}, automatic_deductions={"uniform": 50.0},
+        include_task_payments=True, task_payment_rate=2.0, tax_rate=0.1, social_rate=0.05
+    )
+    operations = [
+        _operation(PayrollOperationType.BONUS, 200.0),
+        _operation(PayrollOperationType.PENALTY, -30.0),
+        _operation(PayrollOperationType.OVERTIME, 70.0),
+        _operation(PayrollOperationType.COMMISSION, 40.0),
+        _operation(PayrollOperationType.DEDUCTION, 20.0),
+        _operation(PayrollOperationType.ADVANCE, 500.0)
+    ]
+    period_start, period_end = PayrollExtendedService._month_period(2024, 12)
+    assert period_end == datetime(2024, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
+
+    row = PayrollExtendedService._compute_payroll(template, (5, 150.0), operations, period_start, period_end)
+
+    # 5 задач: 150 оплаты + 5 * 2 по ставке шаблона
+    assert row["tasks_completed"] == 5 and row["tasks_payment"] == 160.0
+    assert row["gross_amount"] == 1000 + 160 + 100 + 200 + 70 + 40
+    assert row["other_income"] == 100 + 70 + 40
+    assert row["deductions"] == 50 + 30 + 20
+    assert row["taxes"] == pytest.approx(1570 * 0.15)
+    assert row["net_amount"] == pytest.approx(1570 - 100 - 1570 * 0.15)
+    assert row["operations_summary"]["operations_count"] == 6
+
+    # Без оплаты задач статистика задач не учитывается, а нетто не уходит в минус
+    template.include_task_payments = False
+    template.base_rate = 0.0
+    row = PayrollExtendedService._compute_payroll(template, (5, 150.0), [_operation(PayrollOperationType.PENALTY, 900.0)], period_start, period_end)
+    assert row["tasks_completed"] == 0 and row["tasks_payment"] == 0
+    assert row["net_amount"] == 0
@@ -0,0 +1,244 @@
+# backend/tests/test_payroll_recalculation.py
+"""Пересчет зарплат периода и прогноз против прежних расчетов по одной зарплате и шаблону"""
+from datetime import datetime, timedelta, timezone
+import random
+
+import pytest
+from sqlalchemy import and_, func, update
+
+from models.extended_models import Payroll, PayrollType
+from models.payroll_operation import PayrollOperation, PayrollOperationType
+from models.payroll_template import PayrollTemplate, PayrollTemplateStatus
+from services.payroll_extended_service import PayrollExtendedService
+import seed
+
+YEAR, MONTH = 2024, 5
+AMOUNT_FIELDS = ["bonus", "other_income", "deductions", "gross_amount", "taxes", "net_amount"]
+OPERATION_TYPES = [
+    operation_type
+    for _, types, _ in PayrollExtendedService.OPERATION_GROUPS
+    for operation_type in types
+]
+
+
+def _seed_period(db, employees, seed_value=0):
+    """Зарплаты за месяц (каждая третья без шаблона, часть оплачена) и операции всех типов"""
+    rng = random.Random(seed_value)
+    organization_id = seed.organization(db)
+    user_ids = seed.users(db, organization_id, employees)
+    template_ids = seed.payroll_templates(db, organization_id, user_ids, seed=seed_value)
+    # Ставки шаблонов отличаются от ставок по умолчанию 0.1/0.1
+    db.execute(
+        update(PayrollTemplate).where(PayrollTemplate.organization_id == organization_id)
+        .values(tax_rate=0.13, social_rate=0.3)
+    )
+
+    period_start, period_end = PayrollExtendedService._month_period(YEAR, MONTH)
+    payrolls, operations = [], []
+    for index, user_id in enumerate(user_ids):
+        values = {name: float(rng.randint(0, 300)) for name in ["bonus", "other_income", "deductions"]}
+        payrolls.append({
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "template_id": template_ids[index] if index % 3 else None,
+            "period_start": period_start,
+            "period_end": period_end,
+            "payroll_type": PayrollType.MONTHLY_SALARY,
+            "base_rate": float(rng.randint(1000, 5000)),
+            "tasks_payment": float(rng.randint(0, 500)),
+            "gross_amount": 0.0,
+            "net_amount": float(rng.randint(0, 100)),
+            "is_paid": index % 5 == 4,
+            **values
+        })
+
+        # Операции периода всех типов, уже примененная и операция другого месяца
+        for operation_type in OPERATION_TYPES + [PayrollOperationType.CORRECTION]:
+            operations.append((user_id, operation_type, float(rng.randint(-300, 500)), datetime(YEAR, MONTH, 1), False))
+        operations.append((user_id, PayrollOperationType.BONUS, 1000.0, datetime(YEAR, MONTH, 1), True))
+        operations.append((user_id, PayrollOperationType.BONUS, 1000.0, datetime(YEAR, MONTH - 1, 1), False))
+
+    seed._insert(db, Payroll, payrolls)
+    seed._insert(db, PayrollOperation, [
+        {
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "created_by": user_ids[0],
+            "operation_type": operation_type,
+            "amount": amount,
+            "title": "Operation",
+            "apply_to_period_start": start,
+            "apply_to_period_end": start + timedelta(days=27),
+            "is_applied": is_applied
+        }
+        for user_id, operation_type, amount, start, is_applied in operations
+    ])
+    return organization_id, user_ids
+
+
+def _period_payrolls(db, organization_id):
+    return {
+        payroll.user_id: payroll
+        for payroll in db.query(Payroll).filter(Payroll.organization_id == organization_id).all()
+    }
+
+
+def _applied_amounts(db, payroll_id):
+    return sorted(
+        row.amount for row in db.query(PayrollOperation.amount).filter(PayrollOperation.payroll_id == payroll_id)
+    )
+
+
+def test_period_recalculation_matches_per_payroll_calculation(pg_db):
+    # Две одинаковые организации: прежний расчет по одной зарплате и пакетный
+    legacy_id, legacy_users = _seed_period(pg_db, 15)
+    organization_id, user_ids = _seed_period(pg_db, 15)
+
+    for payroll in _period_payrolls(pg_db, legacy_id).values():
+        if not payroll.is_paid:
+            PayrollExtendedService.recalculate_payroll_with_operations(pg_db, payroll)
+
+    result = PayrollExtendedService.recalculate_period_payrolls(pg_db, organization_id, YEAR, MONTH)
+    pg_db.expire_all()
+
+    expected, actual = _period_payrolls(pg_db, legacy_id), _period_payrolls(pg_db, organization_id)
+    unpaid = sum(1 for payroll in actual.values() if not payroll.is_paid)
+    assert result["payrolls_recalculated"] == unpaid == 12
+    assert result["operations_applied"] == unpaid * (len(OPERATION_TYPES) + 1)
+
+    for legacy_user, user_id in zip(legacy_users, user_ids):
+        reference, payroll = expected[legacy_user], actual[user_id]
+        for field in AMOUNT_FIELDS:
+            assert getattr(payroll, field) == pytest.approx(getattr(reference, field), abs=0.01), field
+        assert _applied_amounts(pg_db, payroll.id) == _applied_amounts(pg_db, reference.id)
+
+        if payroll.is_paid:
+            continue
+        assert payroll.operations_summary == pytest.approx(reference.operations_summary)
+
+        # Без шаблона - ставки 0.1/0.1, с шаблоном - ставки шаблона
+        rate = 0.43 if payroll.template_id else 0.2
+        assert payroll.taxes == pytest.approx((payroll.gross_amount - payroll.deductions) * rate)
+
+    # Примененные операции второй раз не учитываются
+    assert PayrollExtendedService.recalculate_period_payrolls(pg_db, organization_id, YEAR, MONTH)["payrolls_recalculated"] == 0
+
+
+def test_period_recalculation_dry_run_writes_nothing(pg_db):
+    organization_id, _ = _seed_period(pg_db, 10)
+    before = {
+        user_id: tuple(getattr(payroll, field) for field in AMOUNT_FIELDS)
+        for user_id, payroll in _period_payrolls(pg_db, organization_id).items()
+    }
+    applied = pg_db.query(func.count(PayrollOperation.id)).filter(
+        and_(PayrollOperation.organization_id == organization_id, PayrollOperation.is_applied == True)
+    ).scalar()
+
+    preview = PayrollExtendedService.recalculate_period_payrolls(pg_db, organization_id, YEAR, MONTH, dry_run=True)
+    pg_db.expire_all()
+
+    assert preview["dry_run"] and preview["payrolls_recalculated"] == len(preview["payrolls"]) == 8
+    assert preview["operations_applied"] == 8 * (len(OPERATION_TYPES) + 1)
+    after = {
+        user_id: tuple(getattr(payroll, field) for field in AMOUNT_FIELDS)
+        for user_id, payroll in _period_payrolls(pg_db, organization_id).items()
+    }
+    assert after == before
+    assert pg_db.query(func.count(PayrollOperation.id)).filter(
+        and_(PayrollOperation.organization_id == organization_id, PayrollOperation.is_applied == True)
+    ).scalar() == applied
+    assert pg_db.query(PayrollOperation).filter(
+        and_(PayrollOperation.organization_id == organization_id, PayrollOperation.payroll_id.isnot(None))
+    ).count() == 0
+
+
+def _legacy_forecast(db, organization_id, forecast_months=3):
+    """Прежний прогноз: средняя оплата задач отдельным запросом на каждый шаблон и месяц заново"""
+    active_templates = db.query(PayrollTemplate).filter(
+        and_(
+            PayrollTemplate.organization_id == organization_id,
+            PayrollTemplate.status == PayrollTemplateStatus.ACTIVE
+        )
+    ).all()
+
+    three_months_ago = datetime.now(timezone.utc) - timedelta(days=90)
+    avg_task_payments = {}
+    for template in active_templates:
+        if template.include_task_payments:
+            avg_task_payments[str(template.user_id)] = db.query(func.avg(Payroll.tasks_payment)).filter(
+                and_(
+                    Payroll.user_id == template.user_id,
+                    Payroll.period_start >= three_months_ago
+                )
+            ).scalar() or 0
+
+    forecast_data = []
+    for month_offset in range(1, forecast_months + 1):
+        staff_forecast = []
+        for template in active_templates:
+            task_payment_forecast = avg_task_payments.get(str(template.user_id), 0)
+            allowances = sum(template.automatic_allowances.values()) if template.automatic_allowances else 0
+            gross = template.base_rate + task_payment_forecast + allowances
+            taxes = gross * (template.tax_rate + template.social_rate)
+            staff_forecast.append({
+                "user_id": str(template.user_id),
+                "user_name": template.name,
+                "base_rate": template.base_rate,
+                "estimated_tasks": task_payment_forecast,
+                "allowances": allowances,
+                "gross_forecast": gross,
+                "net_forecast": gross - taxes
+            })
+        total_forecast = sum(item["net_forecast"] for item in staff_forecast)
+        forecast_data.append({
+            "month_offset": month_offset,
+            "total_forecast": total_forecast,
+            "staff_count": len(active_templates),
+            "staff_breakdown": staff_forecast
+        })
+    return forecast_data
+
+
+def test_forecast_matches_per_template_calculation(pg_db):
+    rng = random.Random(3)
+    organization_id = seed.organization(pg_db)
+    user_ids = seed.users(pg_db, organization_id, 30)
+    seed.payroll_templates(pg_db, organization_id, user_ids, seed=3)
+
+    # Зарплаты последних месяцев и старше трех месяцев, у части сотрудников их нет
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    seed._insert(pg_db, Payroll, [
+        {
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "period_start": now - timedelta(days=rng.choice([rng.randint(1, 80), rng.randint(100, 200)])),
+            "period_end": now,
+            "payroll_type": PayrollType.MONTHLY_SALARY,
+            "tasks_payment": float(rng.randint(0, 800)),
+            "gross_amount": 0.0,
+            "net_amount": 0.0
+        }
+        for user_id in user_ids[:25]
+        for _ in range(rng.randint(0, 4))
+    ])
+
+    expected = _legacy_forecast(pg_db, organization_id, 4)
+    forecast = PayrollExtendedService.get_payroll_forecast(pg_db, organization_id, 4)
+
+    assert forecast["forecast_period_months"] == 4
+    assert forecast["total_active_employees"] == expected[0]["staff_count"]
+    assert any(item["estimated_tasks"] for item in expected[0]["staff_breakdown"])
+    for month, reference in zip(forecast["monthly_forecasts"], expected):
+        assert month["month_offset"] == reference["month_offset"]
+        assert month["staff_count"] == reference["staff_count"]
+        assert month["total_forecast"] == pytest.approx(reference["total_forecast"])
+        assert len(month["staff_breakdown"]) == len(reference["staff_breakdown"])
+        breakdown = zip(
+            sorted(month["staff_breakdown"], key=lambda item: item["user_id"]),
+            sorted(reference["staff_breakdown"], key=lambda item: item["user_id"])
+        )
+        for item, reference_item in breakdown:
+            assert (item["user_id"], item["user_name"]) == (reference_item["user_id"], reference_item["user_name"])
+            for field in ["base_rate", "estimated_tasks", "allowances", "gross_forecast", "net_forecast"]:
+                assert item[field] == pytest.approx(reference_item[field]), field
+    assert forecast["summary"]["avg_monthly_cost"] == pytest.approx(expected[0]["total_forecast"])
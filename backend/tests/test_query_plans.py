@@ -0,0 +1,204 @@
+# backend/tests/test_query_plans.py
+"""Планы основных запросов сервисов на многотенантном наборе данных
+
+Каждая организация владеет небольшой долей строк, поэтому запросы с
+фильтром по организации или исполнителю должны идти по составным индексам
+(models/migrations.py, 0002), а не полным сканированием больших таблиц.
+Проверяется использование конкретных индексов: запрос, перешедший на
+старый одноколоночный индекс после удаления составного, тоже ошибка.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from services.dashboard_snapshot_service import DashboardSnapshotService
+from services.executor_scoring_service import ExecutorScoringService
+from services.occupancy_service import OccupancyService
+from services.order_service import OrderService
+from services.partition_service import PartitionService
+from services.payroll_extended_service import PayrollExtendedService
+from services.property_service import PropertyService
+from services.rental_service import RentalService
+from services.report_facts_service import ReportFactsService
+from services.reports_service import ReportsService
+from services.task_service import TaskService
+from services.workload_index_service import WorkloadIndexService
+import seed
+
+TENANTS = 50
+LARGE_TABLES = {"rentals", "tasks", "room_orders", "inventory_movements", "payrolls"}
+START = seed.BASE_TIME + timedelta(days=100)
+END = START + timedelta(days=30)
+
+
+@pytest.fixture(scope="module")
+def tenants(pg_module_db):
+    db = pg_module_db
+    # Помесячные секции движения материалов на год набора данных
+    for month in range(1, 13):
+        PartitionService.create_partition(db, "public.inventory_movements", date(2024, month, 1))
+
+    data = []
+    for index in range(TENANTS):
+        organization_id = seed.organization(db)
+        property_ids = seed.properties(db, organization_id, 25)
+        client_ids = seed.clients(db, organization_id, 100)
+        staff_ids = seed.users(db, organization_id, 10)
+        inventory_ids = seed.inventory(db, organization_id, 20)
+        seed.rentals(db, organization_id, property_ids, client_ids, 3000, seed=index)
+        seed.tasks(db, organization_id, staff_ids, 3000, seed=index)
+        seed.orders(db, organization_id, property_ids, staff_ids, 1000, seed=index)
+        seed.movements(db, organization_id, inventory_ids, staff_ids, 3000, seed=index)
+        seed.payrolls(db, organization_id, staff_ids, 12, seed=index)
+        data.append({"organization_id": organization_id, "staff_ids": staff_ids, "property_ids": property_ids})
+    seed.analyze(db)
+    return db, data[0]
+
+
+def _assert_indexed(db, plans, expected_indexes):
+    """Большие таблицы читаются по индексам, и все ожидаемые индексы используются
+
+    Секции таблиц и их индексов сводятся к именам родителей.
+    """
+    parents = seed.partition_parents(db)
+    used = set()
+    for statement, plan in plans:
+        scanned = {parents.get(name, name) for name in seed.seq_scanned_tables(plan)}
+        assert not scanned & LARGE_TABLES, statement
+        used |= {parents.get(name, name) for name in seed.scanned_indexes(plan)}
+    assert set(expected_indexes) <= used, used
+
+
+def test_active_task_counts_use_assignee_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, ExecutorScoringService.get_active_task_counts, tenant["staff_ids"][:3])
+    _assert_indexed(db, plans, ["idx_task_assignee_status_completed"])
+
+
+def test_workload_index_load_uses_assignee_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, WorkloadIndexService._load_organization, tenant["organization_id"])
+    _assert_indexed(db, plans, ["idx_task_assignee_status_completed", "idx_order_assignee_status"])
+
+
+def test_live_occupancy_uses_rental_org_dates_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, OccupancyService.calculate_occupancy_rate, tenant["organization_id"], START, END)
+    _assert_indexed(db, plans, ["idx_rental_org_dates"])
+
+
+def test_report_facts_use_tenant_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(
+        db, ReportFactsService._compute_facts, tenant["organization_id"], START.date(), END.date()
+    )
+    _assert_indexed(db, plans, ["idx_rental_org_dates", "idx_order_org_status_created", "idx_movement_org_type_date"])
+
+
+def test_employee_performance_uses_completed_tasks_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(
+        db, ReportsService.generate_employee_performance_report, tenant["organization_id"], START, END
+    )
+    _assert_indexed(db, plans, ["idx_task_assignee_status_completed", "idx_payroll_org_period"])
+
+
+def test_dashboard_counters_use_tenant_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(
+        db, DashboardSnapshotService.compute_data, tenant["organization_id"], seed.BASE_TIME + timedelta(days=180)
+    )
+    _assert_indexed(db, plans, [
+        "idx_rental_org_created", "idx_task_org_status_created", "idx_order_org_status_created",
+        "idx_payroll_org_period", "idx_rental_org_dates"
+    ])
+
+
+def test_financial_summary_uses_tenant_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, ReportsService.generate_financial_summary, tenant["organization_id"], START, END)
+    _assert_indexed(db, plans, [
+        "idx_rental_org_dates", "idx_rental_org_active_end", "idx_order_org_status_created", "idx_movement_org_type_date"
+    ])
+
+
+def test_monthly_summary_uses_tenant_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, ReportsService.generate_monthly_summary_report, tenant["organization_id"], 2024, 5)
+    _assert_indexed(db, plans, [
+        "idx_rental_org_dates", "idx_rental_org_created", "idx_task_org_status_created",
+        "idx_task_assignee_status_completed", "idx_order_org_status_created", "idx_movement_org_type_date",
+        "idx_payroll_org_period", "idx_client_org_created"
+    ])
+
+
+def test_client_analytics_uses_tenant_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(
+        db, ReportsService.generate_client_analytics_report, tenant["organization_id"], START, END
+    )
+    _assert_indexed(db, plans, ["idx_client_org_created", "idx_rental_org_created"])
+
+
+def test_material_expenses_use_movement_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, ReportsService._get_material_expenses, tenant["organization_id"], START, END)
+    _assert_indexed(db, plans, ["idx_movement_org_type_date"])
+
+
+def test_rental_forecast_and_cancellations_use_created_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, ReportsService.generate_forecast_report, tenant["organization_id"])
+    plans += seed.statement_plans(db, ReportsService._calculate_cancellation_rate, tenant["organization_id"], START, END)
+    _assert_indexed(db, plans, ["idx_rental_org_created"])
+
+
+def test_rental_statistics_use_tenant_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, RentalService.get_rental_statistics, tenant["organization_id"])
+    _assert_indexed(db, plans, ["idx_rental_org_created", "idx_rental_org_active_end", "idx_rental_org_dates"])
+
+
+def test_availability_uses_active_period_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, PropertyService.search_available, tenant["organization_id"], START, END)
+    plans += seed.statement_plans(db, PropertyService.check_availability, tenant["property_ids"][0], START, END)
+    _assert_indexed(db, plans, ["idx_rental_active_period"])
+
+
+def test_task_statistics_use_org_status_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, TaskService.get_task_statistics, tenant["organization_id"])
+    plans += seed.statement_plans(db, TaskService.get_task_statistics, tenant["organization_id"], tenant["staff_ids"][0])
+    plans += seed.statement_plans(db, ReportsService._calculate_avg_satisfaction, tenant["organization_id"], START, END)
+    _assert_indexed(db, plans, ["idx_task_org_status_created"])
+
+
+def test_urgent_tasks_use_open_tasks_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, TaskService.get_urgent_tasks, tenant["organization_id"])
+    _assert_indexed(db, plans, ["idx_task_org_open_due"])
+
+
+def test_executor_workload_summary_uses_assignee_indexes(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, OrderService.get_executor_workload_summary, tenant["organization_id"])
+    _assert_indexed(db, plans, ["idx_task_assignee_status_completed", "idx_order_assignee_status"])
+
+
+def test_order_analytics_use_org_status_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(db, OrderService.get_assignment_analytics, tenant["organization_id"])
+    plans += seed.statement_plans(db, OrderService._generate_order_number, tenant["organization_id"])
+    _assert_indexed(db, plans, ["idx_order_org_status_created"])
+
+
+def test_payroll_period_queries_use_org_period_index(tenants):
+    db, tenant = tenants
+    plans = seed.statement_plans(
+        db, PayrollExtendedService.recalculate_period_payrolls, tenant["organization_id"], 2024, 5, dry_run=True
+    )
+    plans += seed.statement_plans(
+        db, PayrollExtendedService.generate_monthly_payrolls_bulk, tenant["organization_id"], 2024, 5, dry_run=True
+    )
+    _assert_indexed(db, plans, ["idx_payroll_org_period"])
@@ -0,0 +1,141 @@
+# backend/tests/test_rate_limiter.py
+import asyncio
+import random
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from fakes import FakeClock, FakeRateLimitBackend
+from utils import rate_limit_middleware, rate_limiter
+from utils.rate_limit_middleware import RateLimitMiddleware, RateLimitPolicy
+from utils.rate_limiter import MemoryRateLimitBackend, RateLimiter
+
+
+def test_gcra_allows_burst_then_spaces_requests():
+    clock = FakeClock()
+    backend = MemoryRateLimitBackend(clock)
+
+    results = [backend.hit_sync("key", 5, 10) for _ in range(6)]
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert [result.remaining for result in results] == [4, 3, 2, 1, 0, 0]
+    # Следующий запрос разрешен через window / limit секунд
+    assert results[-1].retry_after == pytest.approx(2.0)
+
+    clock.advance(1.9)
+    assert not backend.hit_sync("key", 5, 10).allowed
+    clock.advance(0.1)
+    assert backend.hit_sync("key", 5, 10).allowed
+    assert not backend.hit_sync("key", 5, 10).allowed
+
+    # Ключи независимы, за полное окно лимит восстанавливается
+    assert backend.hit_sync("other", 5, 10).allowed
+    clock.advance(10)
+    assert backend.hit_sync("key", 5, 10).remaining == 4
+
+
+def test_memory_backend_matches_postgres_upsert_semantics():
+    """Память и UPSERT Postgres (через фейк) принимают одинаковые решения"""
+    rng = random.Random(7)
+    memory_clock, fake_clock = FakeClock(), FakeClock()
+    memory = MemoryRateLimitBackend(memory_clock)
+    fake = FakeRateLimitBackend(fake_clock)
+
+    for _ in range(5000):
+        step = rng.choice([0, 0, 0.01, 0.1, 0.5, 3])
+        memory_clock.advance(step)
+        fake_clock.advance(step)
+        key = rng.choice(["a", "b", "c"])
+        expected = memory.hit_sync(key, 10, 5)
+        actual = fake.hit_sync(key, 10, 5)
+        assert (actual.allowed, actual.remaining) == (expected.allowed, expected.remaining)
+        assert actual.retry_after == pytest.approx(expected.retry_after)
+
+
+def test_sweep_drops_only_expired_keys():
+    clock = FakeClock()
+    backend = MemoryRateLimitBackend(clock)
+    backend.hit_sync("old", 10, 10)
+    clock.advance(5)
+    backend.hit_sync("fresh", 10, 10)
+
+    assert backend.cleanup() == 1
+    assert set(backend.buckets) == {"fresh"}
+
+
+def test_check_cost_is_constant_benchmark():
+    """Стоимость проверки не зависит от лимита и числа ключей"""
+    checks = 20000
+
+    def cost_per_check(limit, keys):
+        backend = MemoryRateLimitBackend()
+        for index in range(keys):
+            backend.hit_sync(f"key:{index}", limit, 60)
+        names = [f"key:{index % keys}" for index in range(checks)]
+        started = time.perf_counter()
+        for name in names:
+            backend.hit_sync(name, limit, 60)
+        return (time.perf_counter() - started) / checks
+
+    small = min(cost_per_check(10, 10) for _ in range(3))
+    large = min(cost_per_check(100000, 10000) for _ in range(3))
+    print(f"\nrate limit check: {small * 1e6:.2f} us (limit 10, 10 keys), {large * 1e6:.2f} us (limit 100k, 10k keys)")
+
+    assert large < small * 3
+
+
+def _app(backend, limit=2):
+    app = FastAPI()
+
+    @app.get("/api/items")
+    async def items():
+        return {"ok": True}
+
+    policies = [RateLimitPolicy("api", "/api/", limit, 60, scope="ip")]
+    app.add_middleware(RateLimitMiddleware, policies=policies, limiter=RateLimiter(backend), enabled=True)
+    app.add_middleware(CORSMiddleware, allow_origins=["*"])
+    return app
+
+
+async def _get(app, count, headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        return [await client.get("/api/items", headers=headers) for _ in range(count)]
+
+
+def test_middleware_rejects_with_retry_after_and_cors_headers():
+    backend = FakeRateLimitBackend()
+    responses = asyncio.run(_get(_app(backend), 3, headers={"Origin": "http://frontend"}))
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[0].headers["x-ratelimit-remaining"] == "1"
+    assert responses[2].headers["retry-after"] == "30"
+    assert responses[2].headers["access-control-allow-origin"] == "*"
+    assert backend.keys == ["api:ip:127.0.0.1"] * 3
+
+
+def test_middleware_allows_requests_when_storage_is_unavailable():
+    backend = FakeRateLimitBackend()
+    backend.unavailable = True
+
+    responses = asyncio.run(_get(_app(backend, limit=1), 3))
+    assert [response.status_code for response in responses] == [200] * 3
+
+
+def test_app_runs_rate_limit_inside_cors(monkeypatch):
+    """В приложении 429 от лимитов проходит через CORSMiddleware"""
+    import main
+
+    classes = [middleware.cls for middleware in main.app.user_middleware]
+    assert classes.index(CORSMiddleware) < classes.index(RateLimitMiddleware)
+
+    # Один запрос в минуту для всех /api/ маршрутов; стек middleware пересобирается
+    monkeypatch.setattr(rate_limiter, "_shared_rate_limiter", RateLimiter(FakeRateLimitBackend()))
+    monkeypatch.setattr(rate_limit_middleware, "DEFAULT_POLICIES", [RateLimitPolicy("api", "/api/", 1, 60, scope="ip")])
+    monkeypatch.setattr(main.app, "middleware_stack", None)
+
+    responses = asyncio.run(_get(main.app, 2, headers={"Origin": "http://frontend"}))
+    assert responses[-1].status_code == 429
+    assert "access-control-allow-origin" in responses[-1].headers
@@ -0,0 +1,212 @@
+# backend/tests/test_workload_index.py
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+import asyncio
+import random
+import time
+import uuid
+
+import pytest
+
+from fakes import workload_state
+from models.extended_models import OrderStatus, RoomOrder, Task, TaskStatus, UserRole
+from models.models import UserStatus
+from routers import tasks as tasks_router
+from schemas.task import TaskUpdate
+from services.auth_service import AuthService
+from services.change_feed_service import ChangeFeedService
+from services.principal_cache_service import Principal
+from services.workload_index_service import WorkloadIndexService
+
+ORGANIZATION_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Индекс организации с тремя уборщиками (загрузка 2/0/1) и техником"""
+    users = [uuid.UUID(int=index) for index in range(1, 5)]
+    state = workload_state({
+        users[0]: (UserRole.CLEANER, 2),
+        users[1]: (UserRole.CLEANER, 0),
+        users[2]: (UserRole.CLEANER, 1),
+        users[3]: (UserRole.TECHNICAL_STAFF, 5)
+    })
+    monkeypatch.setitem(WorkloadIndexService._organizations, ORGANIZATION_ID, state)
+    return state, users
+
+
+def _least_loaded(role=UserRole.CLEANER, exclude=None):
+    return WorkloadIndexService.least_loaded(None, ORGANIZATION_ID, role, exclude)
+
+
+def _task(assigned_to, status, **values):
+    return Task(id=uuid.uuid4(), organization_id=ORGANIZATION_ID, assigned_to=assigned_to, status=status, **values)
+
+
+def test_least_loaded_respects_load_exclude_and_activity(index):
+    state, users = index
+
+    assert _least_loaded() == users[1]
+    assert _least_loaded(exclude=[users[1]]) == users[2]
+    # Исключенные записи возвращаются в кучу
+    assert _least_loaded() == users[1]
+    assert _least_loaded(UserRole.TECHNICAL_STAFF) == users[3]
+    assert _least_loaded(UserRole.STOREKEEPER) is None
+
+    state["executors"][users[1]]["is_active"] = False
+    assert _least_loaded() == users[2]
+    assert _least_loaded(exclude=[users[2]]) == users[0]
+    assert _least_loaded(exclude=[users[0], users[2]]) is None
+
+
+def test_transitions_move_load_and_old_heap_entries_are_skipped(index):
+    state, users = index
+
+    # Назначение уборщику без задач, затем переназначение на другого
+    task = _task(users[1], TaskStatus.ASSIGNED)
+    WorkloadIndexService.task_changed(task)
+    WorkloadIndexService.task_changed(task)
+    assert state["executors"][users[1]]["active_tasks"] == 2
+    assert _least_loaded() == users[2]
+
+    task.assigned_to = users[2]
+    WorkloadIndexService.task_changed(task, users[1], TaskStatus.ASSIGNED)
+    assert state["executors"][users[1]]["active_tasks"] == 1
+    assert state["executors"][users[2]]["active_tasks"] == 2
+    assert _least_loaded() == users[1]
+
+    # Запуск задачи не меняет загрузку, завершение снимает ее и попадает в историю
+    task.status, task.started_at = TaskStatus.IN_PROGRESS, datetime.now(timezone.utc)
+    WorkloadIndexService.task_changed(task, users[2], TaskStatus.ASSIGNED)
+    assert state["executors"][users[2]]["active_tasks"] == 2
+    assert task.id in state["executors"][users[2]]["in_progress"]
+
+    task.status, task.quality_rating, task.actual_duration = TaskStatus.COMPLETED, 4, 30
+    WorkloadIndexService.task_changed(task, users[2], TaskStatus.IN_PROGRESS)
+    entry = state["executors"][users[2]]
+    assert entry["active_tasks"] == 1 and not entry["in_progress"]
+    assert [(rating, duration) for _, rating, duration in entry["task_completions"]] == [(4, 30)]
+
+    # Заказы учитываются в той же загрузке
+    order = RoomOrder(id=uuid.uuid4(), organization_id=ORGANIZATION_ID, assigned_to=users[1], status=OrderStatus.CONFIRMED)
+    WorkloadIndexService.order_changed(order)
+    WorkloadIndexService.order_changed(order)
+    assert _least_loaded() == users[2]
+
+    # В куче остаются устаревшие версии, но выбор идет только по актуальным
+    heap = state["heaps"][UserRole.CLEANER]
+    outdated = [item for item in heap if state["executors"][item[3]]["version"] != item[2]]
+    assert outdated
+    assert len(heap) - len(outdated) == 3
+
+
+def test_heap_is_rebuilt_when_stale_entries_accumulate(index):
+    state, users = index
+    task = _task(users[0], TaskStatus.ASSIGNED)
+
+    for _ in range(100):
+        task.status = TaskStatus.ASSIGNED
+        WorkloadIndexService.task_changed(task)
+        task.status = TaskStatus.CANCELLED
+        WorkloadIndexService.task_changed(task, users[0], TaskStatus.ASSIGNED)
+
+    assert len(state["heaps"][UserRole.CLEANER]) <= 4 * len(state["executors"]) + 16
+    assert state["executors"][users[0]]["active_tasks"] == 2
+    assert _least_loaded() == users[1]
+
+
+def test_unknown_or_stale_index_is_not_updated(index):
+    state, users = index
+
+    # Сотрудник, которого нет в индексе: индекс перечитается при следующем обращении
+    WorkloadIndexService.task_changed(_task(uuid.uuid4(), TaskStatus.ASSIGNED))
+    assert state["stale"]
+
+    WorkloadIndexService.task_changed(_task(users[1], TaskStatus.ASSIGNED))
+    assert state["executors"][users[1]]["active_tasks"] == 0
+
+    # Организация без индекса в памяти не создается
+    other = Task(id=uuid.uuid4(), organization_id=uuid.uuid4(), assigned_to=users[1], status=TaskStatus.ASSIGNED)
+    WorkloadIndexService.task_changed(other)
+    assert other.organization_id not in WorkloadIndexService._organizations
+
+
+def test_window_stats_and_history_trimming(index):
+    state, users = index
+    now = datetime.now(timezone.utc)
+    entry = state["executors"][users[0]]
+    entry["task_completions"].extend([
+        (now - timedelta(days=40), 1, 100),
+        (now - timedelta(days=20), 3, 60),
+        (now - timedelta(days=2), 5, 20)
+    ])
+
+    week = WorkloadIndexService.get_window_stats(None, ORGANIZATION_ID, [users[0], uuid.uuid4()], days=7)[users[0]]
+    month = WorkloadIndexService.get_window_stats(None, ORGANIZATION_ID, [users[0]], days=30)[users[0]]
+    assert (week["completed_tasks"], week["avg_quality"], week["avg_task_duration"]) == (1, 5, 20)
+    assert (month["completed_tasks"], month["avg_quality"], month["avg_task_duration"]) == (2, 4, 40)
+
+    # Новое завершение отбрасывает записи старше HISTORY_DAYS
+    task = _task(users[0], TaskStatus.COMPLETED, completed_at=now, quality_rating=2, actual_duration=10)
+    WorkloadIndexService.task_changed(task, users[0], TaskStatus.IN_PROGRESS)
+    assert len(entry["task_completions"]) == 3
+    assert entry["task_completions"][0][0] == now - timedelta(days=20)
+
+
+def test_least_loaded_cost_benchmark(monkeypatch):
+    """Выбор исполнителя после потока переходов: O(log n) на 10k сотрудников"""
+    rng = random.Random(5)
+    users = [uuid.uuid4() for _ in range(10000)]
+    state = workload_state({user_id: (UserRole.CLEANER, rng.randint(0, 20)) for user_id in users})
+    monkeypatch.setitem(WorkloadIndexService._organizations, ORGANIZATION_ID, state)
+
+    tasks = []
+    for _ in range(50000):
+        if tasks and rng.random() < 0.5:
+            task = tasks.pop(rng.randrange(len(tasks)))
+            previous = task.assigned_to
+            task.status = TaskStatus.COMPLETED
+            WorkloadIndexService.task_changed(task, previous, TaskStatus.ASSIGNED)
+        else:
+            task = _task(rng.choice(users), TaskStatus.ASSIGNED)
+            WorkloadIndexService.task_changed(task)
+            tasks.append(task)
+
+    calls = 2000
+    started = time.perf_counter()
+    for _ in range(calls):
+        user_id = _least_loaded()
+    per_call = (time.perf_counter() - started) / calls
+    print(f"\nleast_loaded, 10k executors after 50k transitions: {per_call * 1e6:.1f} us per call")
+
+    loads = {user_id: entry["active_tasks"] for user_id, entry in state["executors"].items()}
+    assert loads[user_id] == min(loads.values())
+    assert per_call < 0.001
+
+
+def _call_route(monkeypatch, route, task, **kwargs):
+    """Вызов маршрута задач с сессией-заглушкой; индекс должен учесть переход после коммита"""
+    monkeypatch.setattr(ChangeFeedService, "task_changed", classmethod(lambda cls, *args: None))
+    monkeypatch.setattr(AuthService, "log_user_action", staticmethod(lambda *args, **kwargs: None))
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = task
+    manager = Principal(
+        id=uuid.uuid4(), email="manager@example.com", role=UserRole.MANAGER,
+        status=UserStatus.ACTIVE, organization_id=ORGANIZATION_ID, organization_status=None
+    )
+    asyncio.run(getattr(tasks_router, route)(task.id, current_user=manager, db=db, **kwargs))
+    assert db.commit.called
+
+
+def test_update_and_cancel_routes_update_the_index(index, monkeypatch):
+    state, users = index
+    task = _task(users[0], TaskStatus.ASSIGNED)
+
+    _call_route(monkeypatch, "update_task", task, task_data=TaskUpdate(assigned_to=str(users[1])))
+    assert state["executors"][users[0]]["active_tasks"] == 1
+    assert state["executors"][users[1]]["active_tasks"] == 1
+
+    _call_route(monkeypatch, "cancel_task", task, reason="duplicate")
+    assert task.status == TaskStatus.CANCELLED
+    assert state["executors"][users[1]]["active_tasks"] == 0
+    assert _least_loaded() == users[1]
@@ -7,9 +7,10 @@ from sqlalchemy.orm import Session
 import uuid
 import logging
 
-from models.database import get_db
+from models.database import get_db, AsyncSessionLocal
 from models.models import User, UserRole, UserStatus
 from services.auth_service import AuthService
+from services.principal_cache_service import Principal, PrincipalCacheService
 
 # Setup logging for debugging
 logger = logging.getLogger(__name__)
@@ -18,10 +19,16 @@ security = HTTPBearer()
 
 
 async def get_current_user(
-    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-    db: Session = Depends(get_db)
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]
 ) -> User:
-    """Получение текущего пользователя по токену"""
+    """
+    Получение текущего пользователя по токену
+    
+    Пользователь с организацией читается в короткой асинхронной сессии и
+    возвращается отсоединенным от нее: обработчики работают со своей
+    синхронной сессией (для изменений - db.merge), а соединение
+    асинхронного пула не удерживается до конца запроса.
+    """
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,12 +47,17 @@ async def get_current_user(
         
         logger.debug(f"Token verified for user_id: {token_data.user_id}")
         
-        # Получаем пользователя
-        user = db.query(User).filter(User.id == uuid.UUID(token_data.user_id)).first()
+        # Получаем пользователя (организация подгружается сразу, без lazy load)
+        generation = PrincipalCacheService.generation(token_data.user_id)
+        async with AsyncSessionLocal() as db:
+            user = await AuthService.get_user_by_id_async(db, uuid.UUID(token_data.user_id))
         if user is None:
             logger.error(f"User not found in database: {token_data.user_id}")
             raise credentials_exception
         
+        # Снимок пригодится следующим запросам, которым хватает get_current_principal
+        PrincipalCacheService.put(token_data.user_id, token_data.iat, Principal.from_user(user), generation)
+        
         logger.debug(f"User found: {user.email}, role: {user.role}")
         return user
         
@@ -54,34 +66,83 @@ async def get_current_user(
         raise credentials_exception
 
 
-async def get_current_active_user(
-    current_user: Annotated[User, Depends(get_current_user)]
-) -> User:
-    """Получение активного пользователя"""
-    
-    logger.debug(f"Checking user status: {current_user.email}, status: {current_user.status}")
+def _check_principal_active(principal: Principal):
+    """Проверка статуса пользователя и его организации"""
     
-    if current_user.status != UserStatus.ACTIVE:
-        logger.warning(f"User {current_user.email} is not active: {current_user.status}")
+    if principal.status != UserStatus.ACTIVE:
+        logger.warning(f"User {principal.email} is not active: {principal.status}")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is not active"
         )
     
     # Проверяем статус организации (если пользователь не system_owner)
-    if (current_user.organization and 
-        current_user.role != UserRole.SYSTEM_OWNER and
-        current_user.organization.status not in ["active", "trial"]):
-        logger.warning(f"Organization {current_user.organization_id} is not active: {current_user.organization.status}")
+    if (principal.organization_status is not None and
+        principal.role != UserRole.SYSTEM_OWNER and
+        principal.organization_status not in ["active", "trial"]):
+        logger.warning(f"Organization {principal.organization_id} is not active: {principal.organization_status}")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Organization account is not active"
         )
+
+
+async def get_current_active_user(
+    current_user: Annotated[User, Depends(get_current_user)]
+) -> User:
+    """Получение активного пользователя"""
+    
+    logger.debug(f"Checking user status: {current_user.email}, status: {current_user.status}")
+    
+    _check_principal_active(Principal.from_user(current_user))
     
     logger.debug(f"User {current_user.email} is active and authorized")
     return current_user
 
 
+async def get_current_principal(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]
+) -> Principal:
+    """
+    Снимок активного пользователя по токену
+    
+    При попадании в кэш БД не используется; при промахе пользователь
+    с организацией читается одним обращением и кэшируется по (user_id, iat).
+    """
+    
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    token_data = AuthService.verify_token(credentials.credentials)
+    if token_data is None or token_data.user_id is None:
+        logger.error("Token verification failed: invalid token data")
+        raise credentials_exception
+    
+    principal = PrincipalCacheService.get(token_data.user_id, token_data.iat)
+    
+    if principal is None:
+        try:
+            generation = PrincipalCacheService.generation(token_data.user_id)
+            async with AsyncSessionLocal() as db:
+                user = await AuthService.get_user_by_id_async(db, uuid.UUID(token_data.user_id))
+                principal = Principal.from_user(user) if user else None
+        except Exception as e:
+            logger.error(f"Error in get_current_principal: {str(e)}")
+            raise credentials_exception
+        
+        if principal is None:
+            logger.error(f"User not found in database: {token_data.user_id}")
+            raise credentials_exception
+        
+        PrincipalCacheService.put(token_data.user_id, token_data.iat, principal, generation)
+    
+    _check_principal_active(principal)
+    return principal
+
+
 def require_role(*required_roles: UserRole):
     """Декоратор для проверки роли пользователя"""
     def role_checker(current_user: Annotated[User, Depends(get_current_active_user)]) -> User:
@@ -118,6 +179,24 @@ def require_role(*required_roles: UserRole):
     return role_checker
 
 
+def require_principal_role(*required_roles: UserRole):
+    """Проверка роли по снимку пользователя (без обращения к БД при попадании в кэш)"""
+    def role_checker(principal: Annotated[Principal, Depends(get_current_principal)]) -> Principal:
+        
+        if principal.role not in required_roles:
+            logger.warning(f"Access denied for user {principal.email}. "
+                         f"Role {principal.role} not in {required_roles}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Not enough permissions. Required: {[r.value for r in required_roles]}, "
+                       f"Current: {principal.role.value}"
+            )
+        
+        return principal
+    
+    return role_checker
+
+
 def require_scope(*required_scopes: str):
     """Декоратор для проверки разрешений пользователя"""
     def scope_checker(current_user: Annotated[User, Depends(get_current_active_user)]) -> User:
@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+
+
+# Ограниченный пул потоков для тяжелых синхронных операций (отчеты, экспорт)
+MAX_BLOCKING_WORKERS = int(os.getenv("BLOCKING_EXECUTOR_WORKERS", "4"))
+
+blocking_executor = ThreadPoolExecutor(
+    max_workers=MAX_BLOCKING_WORKERS,
+    thread_name_prefix="blocking-worker"
+)
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Выполнить синхронную функцию в пуле потоков, не блокируя event loop
+
+    Сессия БД, переданная в функцию, используется только рабочим потоком,
+    пока корутина ожидает результат, поэтому последовательный доступ
+    к ней сохраняется. Функция выполняется в копии контекста запроса
+    (contextvars), чтобы ее SQL учитывался в метриках запроса.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, context.run, partial(func, *args, **kwargs))
+
+
+# Пул процессов для CPU-тяжелых задач (рендеринг PDF), создается при первом вызове
+MAX_PROCESS_WORKERS = int(os.getenv("PROCESS_EXECUTOR_WORKERS", "2"))
+
+_process_executor: Optional[ProcessPoolExecutor] = None
+_process_executor_lock = threading.Lock()
+
+
+def get_process_executor() -> ProcessPoolExecutor:
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is None:
+            # spawn: дочерний процесс не наследует потоки и соединения с БД
+            _process_executor = ProcessPoolExecutor(
+                max_workers=MAX_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_executor
+
+
+async def run_in_process(func: Callable[..., Any], *args) -> Any:
+    """
+    Выполнить функцию в отдельном процессе
+
+    Функция и аргументы передаются через pickle: функция должна быть
+    объявлена на уровне модуля, аргументы - простыми данными (не ORM).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_executor(), func, *args)
+
+
+def shutdown_blocking_executor():
+    """Остановить пулы потоков и процессов при завершении приложения"""
+    global _process_executor
+    blocking_executor.shutdown(wait=False, cancel_futures=True)
+    with _process_executor_lock:
+        if _process_executor is not None:
+            _process_executor.shutdown(wait=False, cancel_futures=True)
+            _process_executor = None
@@ -1,12 +1,62 @@
+import atexit
+import json
 import logging
 import logging.config
+import logging.handlers
 import os
-from datetime import datetime
-from typing import Optional
+import queue
+import random
+import re
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+
+class JsonFormatter(logging.Formatter):
+    """Структурированный формат: одна JSON-строка на запись
+
+    Поля, переданные через extra={...}, попадают в запись как есть.
+    """
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _module_levels() -> Dict[str, str]:
+    """Уровни отдельных модулей из LOG_LEVELS: "services.reports_service=DEBUG,uvicorn=WARNING" """
+    levels = {}
+    for item in os.getenv("LOG_LEVELS", "").split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
 
 
 def setup_logging():
-    """Настройка логирования"""
+    """
+    Настройка логирования
+
+    Обработчики (консоль, файлы) вызываются из отдельного потока
+    QueueListener, а логгеры лишь кладут запись в очередь, поэтому вывод
+    не блокирует обработку запросов. Уровень задается LOG_LEVEL, уровни
+    модулей - LOG_LEVELS, формат - LOG_FORMAT (text|json).
+    """
+    global _queue_listener
     
     # Создаем директорию для логов
     log_dir = os.path.join(os.getcwd(), "logs")
@@ -23,6 +73,9 @@ def setup_logging():
         print("📝 Using console logging only")
         use_file_logging = False
     
+    root_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    console_formatter = "json" if os.getenv("LOG_FORMAT", "text").lower() == "json" else "default"
+    
     # Базовая конфигурация логирования
     LOGGING_CONFIG = {
         "version": 1,
@@ -37,28 +90,31 @@ def setup_logging():
                 "format": "[{asctime}] {levelname} in {name} ({filename}:{lineno}): {message}",
                 "style": "{",
                 "datefmt": "%Y-%m-%d %H:%M:%S"
+            },
+            "json": {
+                "()": JsonFormatter
             }
         },
         "handlers": {
             "console": {
                 "class": "logging.StreamHandler",
-                "level": "INFO",
-                "formatter": "default",
+                # Отбор по уровню делают логгеры (LOG_LEVEL/LOG_LEVELS)
+                "level": "DEBUG",
+                "formatter": console_formatter,
                 "stream": "ext://sys.stdout"
             }
         },
         "loggers": {
             "": {  # root logger
-                "level": "INFO",
+                "level": root_level,
                 "handlers": ["console"]
             },
+            # Остальные логгеры задают только уровень и пишут через root
             "uvicorn": {
-                "level": "INFO",
-                "handlers": ["console"]
+                "level": "INFO"
             },
             "sqlalchemy.engine": {
-                "level": "WARNING",
-                "handlers": ["console"]
+                "level": "WARNING"
             }
         }
     }
@@ -69,7 +125,7 @@ def setup_logging():
             "file": {
                 "class": "logging.handlers.RotatingFileHandler",
                 "level": "DEBUG",
-                "formatter": "detailed",
+                "formatter": "json" if console_formatter == "json" else "detailed",
                 "filename": os.path.join(log_dir, "app.log"),
                 "maxBytes": 10485760,  # 10MB
                 "backupCount": 5
@@ -86,10 +142,25 @@ def setup_logging():
         
         # Обновляем обработчики для логгеров
         LOGGING_CONFIG["loggers"][""]["handlers"].extend(["file", "error_file"])
-        LOGGING_CONFIG["loggers"]["uvicorn"]["handlers"].append("file")
-        LOGGING_CONFIG["loggers"]["sqlalchemy.engine"]["handlers"].append("file")
     
+    for name, level in _module_levels().items():
+        LOGGING_CONFIG["loggers"].setdefault(name, {})["level"] = level
+    
+    shutdown_logging()
     logging.config.dictConfig(LOGGING_CONFIG)
+    
+    # Переносим обработчики root за очередь
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    
+    _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+    atexit.register(shutdown_logging)
+    
     logger = logging.getLogger(__name__)
     if use_file_logging:
         logger.info("✅ Logging configured with file support")
@@ -97,6 +168,36 @@ def setup_logging():
         logger.info("✅ Logging configured (console only)")
 
 
+def shutdown_logging():
+    """Дописать записи из очереди и остановить поток вывода"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.close()
+        _queue_listener = None
+
+
+class AccessLogSampler:
+    """
+    Выборка записей журнала запросов
+
+    Ошибки (status >= 500) и медленные запросы пишутся всегда, остальные -
+    с вероятностью ACCESS_LOG_SAMPLE_RATE (0 - не писать, 1 - писать все).
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, slow_ms: Optional[float] = None):
+        self.sample_rate = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0")) if sample_rate is None else sample_rate
+        self.slow_ms = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000")) if slow_ms is None else slow_ms
+
+    def should_log(self, status_code: int, duration_ms: float) -> bool:
+        if status_code >= 500 or duration_ms >= self.slow_ms:
+            return True
+        if self.sample_rate >= 1:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
 def sanitize_string(value: str, max_length: Optional[int] = None) -> str:
     """Очистка строки от потенциально опасных символов"""
     if not value:
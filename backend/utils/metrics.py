@@ -0,0 +1,303 @@
+# backend/utils/metrics.py
+"""
+Метрики производительности в формате Prometheus
+
+Собираются в памяти процесса и отдаются эндпоинтом /metrics:
+- латентность и число запросов по маршрутам, запросы в обработке;
+- число и длительность SQL-запросов (события движков SQLAlchemy),
+  в том числе на один HTTP запрос - для поиска N+1;
+- ожидание соединения из пула и заполненность пулов.
+
+METRICS_ENABLED=false отключает сбор: middleware пропускает запросы
+без обработки, обработчики событий движков не регистрируются.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import bisect
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Запросы с большим числом SQL-выражений отмечаются как вероятные N+1
+QUERY_COUNT_THRESHOLD = int(os.getenv("METRICS_QUERY_THRESHOLD", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам..., +Inf], сумма
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, *labels: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(counts), total[0]) for labels, (counts, total) in self._values.items()]
+
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+# ========== РЕЕСТР ==========
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being processed")
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements per HTTP request", ("route",), buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_QUERY_THRESHOLD = Counter(
+    "http_request_db_query_threshold_exceeded_total",
+    "HTTP requests that executed more SQL statements than METRICS_QUERY_THRESHOLD",
+    ("route",)
+)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ("engine",))
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement duration", ("engine",))
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("pool",))
+
+_METRICS: List[_Metric] = [
+    HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, REQUEST_QUERIES, REQUEST_QUERY_THRESHOLD,
+    DB_QUERIES, DB_QUERY_LATENCY, POOL_WAIT,
+]
+
+# Источники значений, снимаемых в момент запроса /metrics
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    _collectors.append(collector)
+
+
+def gauge_lines(name: str, documentation: str, samples: Dict[str, float], label: Optional[str] = None) -> List[str]:
+    """Строки gauge для коллектора: samples - {значение метки: число}"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for label_value, value in samples.items():
+        labels = f'{{{label}="{_escape(label_value)}"}}' if label else ""
+        lines.append(f"{name}{labels} {value}")
+    return lines
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", getattr(collector, "__name__", collector), e)
+    return "\n".join(lines) + "\n"
+
+
+# ========== SQL НА ЗАПРОС ==========
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def instrument_engine(engine, name: str):
+    """Подписаться на события движка: число и длительность SQL-выражений"""
+    if not METRICS_ENABLED:
+        return
+
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed = time.perf_counter() - started
+
+        DB_QUERIES.inc(name)
+        DB_QUERY_LATENCY.observe(name, value=elapsed)
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def observe_pool_wait(pool_name: str, seconds: float):
+    if METRICS_ENABLED:
+        POOL_WAIT.observe(pool_name, value=seconds)
+
+
+def pool_collector(pools: Dict[str, object]) -> Callable[[], List[str]]:
+    """Коллектор занятости пулов QueuePool: занято, свободно, переполнение, заполненность"""
+    def collect() -> List[str]:
+        checked_out, checked_in, overflow, saturation = {}, {}, {}, {}
+        for name, pool in pools.items():
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            checked_out[name] = pool.checkedout()
+            checked_in[name] = pool.checkedin()
+            overflow[name] = max(pool.overflow(), 0)
+            saturation[name] = round(pool.checkedout() / capacity, 4) if capacity else 0
+        return (
+            gauge_lines("db_pool_checked_out", "Connections checked out of the pool", checked_out, "pool")
+            + gauge_lines("db_pool_checked_in", "Idle connections in the pool", checked_in, "pool")
+            + gauge_lines("db_pool_overflow", "Overflow connections in use", overflow, "pool")
+            + gauge_lines("db_pool_saturation", "Checked out connections / (pool_size + max_overflow)", saturation, "pool")
+        )
+    return collect
+
+
+# ========== MIDDLEWARE ==========
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: латентность, статусы и число SQL-выражений по маршрутам
+
+    Маршрут берется шаблоном пути (/api/tasks/{task_id}), неизвестные
+    пути объединяются в "unmatched", чтобы не раздувать число меток.
+    """
+
+    def __init__(self, app, enabled: bool = METRICS_ENABLED, query_threshold: int = QUERY_COUNT_THRESHOLD):
+        self.app = app
+        self.enabled = enabled
+        self.query_threshold = query_threshold
+        self._route_paths: Dict[object, str] = {}
+
+    def _route_name(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None and getattr(route, "path", None):
+            return route.path
+
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+
+        if not self._route_paths and scope.get("app") is not None:
+            self._route_paths = {
+                getattr(r, "endpoint", None): r.path for r in scope["app"].routes if hasattr(r, "path")
+            }
+        return self._route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        HTTP_IN_FLIGHT.inc(value=1)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.inc(value=-1)
+            _request_stats.reset(token)
+
+            route = self._route_name(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status["code"]))
+            HTTP_LATENCY.observe(method, route, value=elapsed)
+            REQUEST_QUERIES.observe(route, value=stats.queries)
+
+            if stats.queries > self.query_threshold:
+                REQUEST_QUERY_THRESHOLD.inc(route)
+                logger.warning(
+                    "Possible N+1: %s %s executed %s SQL statements (%.1f ms in DB, %.1f ms total)",
+                    method, route, stats.queries, stats.query_seconds * 1000, elapsed * 1000,
+                    extra={"route": route, "db_queries": stats.queries}
+                )
@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+
+from utils.rate_limiter import RateLimiter, RateLimitResult, get_rate_limiter, retry_after_header
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+
+@dataclass
+class RateLimitPolicy:
+    """
+    Политика лимита для группы маршрутов
+
+    scope: "user" - отдельный лимит на пользователя из access токена
+    (для анонимных запросов - на IP), "ip" - всегда на IP клиента.
+    """
+    name: str
+    path_prefix: str
+    limit: int
+    window_seconds: int
+    scope: str = "user"
+    methods: Optional[Tuple[str, ...]] = None
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        return path.startswith(self.path_prefix)
+
+
+# Проверяются по порядку, применяется первая подходящая политика
+DEFAULT_POLICIES: List[RateLimitPolicy] = [
+    # Вход и сброс пароля дополнительно ограничены в роутере auth
+    RateLimitPolicy("auth", "/api/auth", 60, 60, scope="ip"),
+    RateLimitPolicy("export", "/api/export", 20, 60),
+    RateLimitPolicy("reports", "/api/reports", 60, 60),
+    RateLimitPolicy("comprehensive_reports", "/api/comprehensive-reports", 30, 60),
+    RateLimitPolicy("documents", "/api/documents", 60, 60, methods=("POST",)),
+    RateLimitPolicy("api", "/api/", int(os.getenv("RATE_LIMIT_PER_MINUTE", "600")), 60),
+]
+
+EXEMPT_PATHS = ("/api/health", "/api/docs", "/api/redoc", "/api/openapi.json")
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware, применяющее политики лимитов к HTTP запросам
+
+    При превышении лимита возвращает 429 с заголовком Retry-After, иначе
+    добавляет к ответу заголовки X-RateLimit-Limit и X-RateLimit-Remaining.
+    """
+
+    def __init__(
+        self,
+        app,
+        policies: Optional[Iterable[RateLimitPolicy]] = None,
+        limiter: Optional[RateLimiter] = None,
+        enabled: bool = RATE_LIMIT_ENABLED
+    ):
+        self.app = app
+        self.policies = list(policies) if policies is not None else DEFAULT_POLICIES
+        self.limiter = limiter or get_rate_limiter()
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+
+        if method == "OPTIONS" or path.startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        policy = self._match_policy(method, path)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = f"{policy.name}:{self._identity(scope, policy)}"
+
+        try:
+            result = await self.limiter.hit(key, policy.limit, policy.window_seconds)
+        except Exception as e:
+            # Недоступность хранилища лимитов не должна останавливать API
+            logger.warning(f"Rate limiter unavailable, request allowed: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        if not result.allowed:
+            await self._reject(send, result)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-ratelimit-limit", str(result.limit).encode()))
+                headers.append((b"x-ratelimit-remaining", str(result.remaining).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def _match_policy(self, method: str, path: str) -> Optional[RateLimitPolicy]:
+        for policy in self.policies:
+            if policy.matches(method, path):
+                return policy
+        return None
+
+    @staticmethod
+    def _client_ip(scope) -> str:
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _identity(self, scope, policy: RateLimitPolicy) -> str:
+        if policy.scope == "user":
+            user_id = self._user_id(scope)
+            if user_id:
+                return f"user:{user_id}"
+        return f"ip:{self._client_ip(scope)}"
+
+    @staticmethod
+    def _user_id(scope) -> Optional[str]:
+        """Пользователь из Bearer токена (без обращения к БД)"""
+        from services.auth_service import AuthService
+
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return None
+                token_data = AuthService.verify_token(token)
+                return token_data.user_id if token_data else None
+        return None
+
+    @staticmethod
+    async def _reject(send, result: RateLimitResult):
+        body = json.dumps({"detail": "Too many requests. Try again later."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after_header(result).encode()),
+                (b"x-ratelimit-limit", str(result.limit).encode()),
+                (b"x-ratelimit-remaining", b"0"),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,66 +1,219 @@
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+import math
+import os
 import threading
+import time
 
+from sqlalchemy import text
 
-class RateLimiter:
-    """Простой rate limiter в памяти"""
-    
-    def __init__(self):
-        self.requests: Dict[str, list] = {}
+
+@dataclass
+class RateLimitResult:
+    """Результат проверки лимита"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+
+def _gcra_result(allowed: bool, tat: float, now: float, max_requests: int, window_seconds: float) -> RateLimitResult:
+    """
+    Построить результат по теоретическому времени прибытия (TAT)
+
+    Для разрешенного запроса tat - уже сдвинутое значение, для
+    отклоненного - сохраненное (не изменившееся).
+    """
+    increment = window_seconds / max_requests
+
+    if allowed:
+        remaining = int((window_seconds - (tat - now)) / increment + 1e-9)
+        return RateLimitResult(True, max_requests, max(0, remaining))
+
+    retry_after = tat + increment - window_seconds - now
+    return RateLimitResult(False, max_requests, 0, max(0.0, retry_after))
+
+
+class MemoryRateLimitBackend:
+    """
+    Хранилище GCRA в памяти процесса
+
+    На ключ хранится одно число (TAT), поэтому проверка выполняется за O(1)
+    независимо от числа запросов в окне. Истекшие ключи удаляются
+    периодически при проверках. Часы можно подменить - бэкенд используется
+    как фейк общего хранилища в тестах.
+    """
+
+    SWEEP_EVERY = 10000
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.buckets: Dict[str, float] = {}
         self.lock = threading.Lock()
-    
+        self._checks = 0
+
+    def hit_sync(self, key: str, max_requests: int, window_seconds: float) -> RateLimitResult:
+        increment = window_seconds / max_requests
+
+        with self.lock:
+            now = self.clock()
+            tat = max(self.buckets.get(key, now), now)
+            new_tat = tat + increment
+
+            self._checks += 1
+            if self._checks >= self.SWEEP_EVERY:
+                self._sweep(now)
+
+            if new_tat - window_seconds > now:
+                return _gcra_result(False, tat, now, max_requests, window_seconds)
+
+            self.buckets[key] = new_tat
+            return _gcra_result(True, new_tat, now, max_requests, window_seconds)
+
+    async def hit(self, key: str, max_requests: int, window_seconds: float) -> RateLimitResult:
+        return self.hit_sync(key, max_requests, window_seconds)
+
+    def _sweep(self, now: float):
+        """Удалить ключи, TAT которых уже в прошлом (их состояние равно пустому)"""
+        self._checks = 0
+        expired = [key for key, tat in self.buckets.items() if tat <= now]
+        for key in expired:
+            del self.buckets[key]
+
+    def cleanup(self) -> int:
+        with self.lock:
+            before = len(self.buckets)
+            self._sweep(self.clock())
+            return before - len(self.buckets)
+
+
+class PostgresRateLimitBackend:
+    """
+    Общее для всех воркеров хранилище GCRA в таблице rate_limit_buckets
+
+    Проверка и сдвиг TAT выполняются одним атомарным UPSERT, поэтому
+    конкурирующие воркеры не могут превысить лимит.
+    """
+
+    HIT_SQL = text("""
+        INSERT INTO rate_limit_buckets AS bucket (key, tat, allowed)
+        VALUES (:key, CAST(:now AS double precision) + CAST(:increment AS double precision), true)
+        ON CONFLICT (key) DO UPDATE SET
+            allowed = GREATEST(bucket.tat, CAST(:now AS double precision))
+                + CAST(:increment AS double precision) - CAST(:window AS double precision)
+                <= CAST(:now AS double precision),
+            tat = CASE
+                WHEN GREATEST(bucket.tat, CAST(:now AS double precision))
+                    + CAST(:increment AS double precision) - CAST(:window AS double precision)
+                    <= CAST(:now AS double precision)
+                THEN GREATEST(bucket.tat, CAST(:now AS double precision)) + CAST(:increment AS double precision)
+                ELSE bucket.tat
+            END
+        RETURNING tat, allowed
+    """)
+
+    CLEANUP_SQL = text("DELETE FROM rate_limit_buckets WHERE tat < CAST(:now AS double precision)")
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+
+    def _params(self, key: str, max_requests: int, window_seconds: float, now: float) -> dict:
+        return {
+            "key": key,
+            "now": now,
+            "increment": window_seconds / max_requests,
+            "window": float(window_seconds)
+        }
+
+    def _result(self, row, now: float, max_requests: int, window_seconds: float) -> RateLimitResult:
+        # Для отклоненного запроса TAT не сдвигается, в ответе - текущее значение
+        return _gcra_result(bool(row.allowed), row.tat, now, max_requests, window_seconds)
+
+    async def hit(self, key: str, max_requests: int, window_seconds: float) -> RateLimitResult:
+        from models.database import async_engine
+
+        now = self.clock()
+        async with async_engine.begin() as conn:
+            result = await conn.execute(self.HIT_SQL, self._params(key, max_requests, window_seconds, now))
+            row = result.one()
+        return self._result(row, now, max_requests, window_seconds)
+
+    def hit_sync(self, key: str, max_requests: int, window_seconds: float) -> RateLimitResult:
+        from models.database import engine
+
+        now = self.clock()
+        with engine.begin() as conn:
+            row = conn.execute(self.HIT_SQL, self._params(key, max_requests, window_seconds, now)).one()
+        return self._result(row, now, max_requests, window_seconds)
+
+    def cleanup(self) -> int:
+        from models.database import engine
+
+        with engine.begin() as conn:
+            result = conn.execute(self.CLEANUP_SQL, {"now": self.clock()})
+        return result.rowcount or 0
+
+
+class RateLimiter:
+    """Rate limiter на основе GCRA с подключаемым хранилищем"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryRateLimitBackend()
+
     def check_rate_limit(self, key: str, max_requests: int, window_seconds: int) -> bool:
         """
         Проверка лимита запросов
-        
+
         Args:
             key: Ключ для идентификации (IP, user_id и т.д.)
             max_requests: Максимальное количество запросов
             window_seconds: Окно времени в секундах
-            
+
         Returns:
             True если запрос разрешен, False если превышен лимит
         """
-        with self.lock:
-            now = datetime.now()
-            cutoff_time = now - timedelta(seconds=window_seconds)
-            
-            # Инициализируем список для ключа если его нет
-            if key not in self.requests:
-                self.requests[key] = []
-            
-            # Удаляем старые запросы
-            self.requests[key] = [
-                req_time for req_time in self.requests[key] 
-                if req_time > cutoff_time
-            ]
-            
-            # Проверяем лимит
-            if len(self.requests[key]) >= max_requests:
-                return False
-            
-            # Добавляем текущий запрос
-            self.requests[key].append(now)
-            return True
-    
-    def cleanup_old_entries(self, max_age_hours: int = 24):
-        """Очистка старых записей"""
-        with self.lock:
-            cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
-            
-            keys_to_remove = []
-            for key, requests in self.requests.items():
-                # Фильтруем старые запросы
-                self.requests[key] = [
-                    req_time for req_time in requests 
-                    if req_time > cutoff_time
-                ]
-                
-                # Помечаем пустые ключи для удаления
-                if not self.requests[key]:
-                    keys_to_remove.append(key)
-            
-            # Удаляем пустые ключи
-            for key in keys_to_remove:
-                del self.requests[key]
\ No newline at end of file
+        return self.backend.hit_sync(key, max_requests, window_seconds).allowed
+
+    async def hit(self, key: str, max_requests: int, window_seconds: int) -> RateLimitResult:
+        """Асинхронная проверка лимита с данными для заголовков X-RateLimit-*"""
+        return await self.backend.hit(key, max_requests, window_seconds)
+
+    def cleanup_old_entries(self, max_age_hours: int = 24) -> int:
+        """
+        Очистка истекших записей
+
+        При GCRA запись истекает, как только ее TAT в прошлом, поэтому
+        max_age_hours оставлен только для совместимости.
+        """
+        return self.backend.cleanup()
+
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+
+_shared_rate_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Общий для приложения rate limiter
+
+    RATE_LIMIT_BACKEND=postgres включает хранилище в БД, общее для всех
+    воркеров uvicorn; по умолчанию лимиты считаются в памяти процесса.
+    """
+    global _shared_rate_limiter
+
+    if _shared_rate_limiter is None:
+        with _shared_lock:
+            if _shared_rate_limiter is None:
+                if RATE_LIMIT_BACKEND == "postgres":
+                    backend = PostgresRateLimitBackend()
+                else:
+                    backend = MemoryRateLimitBackend()
+                _shared_rate_limiter = RateLimiter(backend)
+
+    return _shared_rate_limiter
+
+
+def retry_after_header(result: RateLimitResult) -> str:
+    return str(max(1, math.ceil(result.retry_after)))
@@ -0,0 +1,105 @@
+from typing import Any, Callable, Iterable, Iterator, List
+from fastapi.responses import StreamingResponse
+import csv
+import io
+import os
+import tempfile
+
+from models.database import SessionLocal
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+FILE_READ_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+
+def iter_query(query, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Итерировать ORM-запрос серверным курсором порциями по chunk_size строк
+
+    Связи, подгружаемые через selectinload, загружаются отдельным запросом
+    на каждую порцию, а не на каждую строку.
+    """
+    return query.execution_options(stream_results=True).yield_per(chunk_size)
+
+
+def with_session(produce: Callable[[Any], Iterator[bytes]]) -> Iterator[bytes]:
+    """
+    Выполнить генератор экспорта в собственной сессии БД
+
+    Сессия живет, пока ответ отдается клиенту, и закрывается при
+    завершении или обрыве передачи.
+    """
+    with SessionLocal() as db:
+        yield from produce(db)
+
+
+def csv_stream(
+    headers: List[str],
+    rows: Iterable[List[Any]],
+    delimiter: str = ';',
+    flush_every: int = EXPORT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Инкрементальная генерация CSV (с BOM для корректного открытия в Excel)"""
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    for index, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if index % flush_every == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_stream(build: Callable[[Any], None]) -> Iterator[bytes]:
+    """
+    Сформировать XLSX в режиме constant_memory и отдать его порциями
+
+    build получает Workbook и должен записывать строки по порядку:
+    в этом режиме xlsxwriter сбрасывает каждую строку на диск, поэтому
+    память не зависит от размера выгрузки. XLSX - zip-архив, он
+    собирается при закрытии книги во временный файл, который затем
+    читается блоками.
+    """
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        try:
+            build(workbook)
+        finally:
+            workbook.close()
+
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(FILE_READ_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def streaming_file_response(chunks: Iterator[bytes], filename: str, media_type: str) -> StreamingResponse:
+    """StreamingResponse с заголовком скачивания файла"""
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )